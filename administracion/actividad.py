@@ -0,0 +1,45 @@
+"""
+Registro de actividad de los usuarios para el conteo de "usuarios activos".
+
+En lugar de decodificar cada fila de ``django_session``, el middleware anota
+la última petición de cada usuario en ``ActividadUsuario``. Una clave en la
+caché limita la escritura a una por usuario cada ``ACTIVIDAD_USUARIO_MINUTOS``,
+así que el resto de peticiones no toca la base. El conteo es un COUNT sobre
+el índice de ``ultima_actividad``, con la precisión de ese intervalo.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ActividadUsuario
+
+
+def _clave(usuario_id):
+    return f'actividad:{usuario_id}'
+
+
+def registrar_actividad(usuario, ahora=None):
+    """Anota la actividad del usuario si no se anotó en los últimos minutos; True si escribió"""
+    minutos = getattr(settings, 'ACTIVIDAD_USUARIO_MINUTOS', 5)
+    # cache.add solo guarda si la clave no existe: una sola petición por intervalo escribe
+    if not cache.add(_clave(usuario.pk), True, timeout=minutos * 60):
+        return False
+
+    ahora = ahora or timezone.now()
+    if not ActividadUsuario.objects.filter(usuario_id=usuario.pk).update(ultima_actividad=ahora):
+        ActividadUsuario.objects.bulk_create(
+            [ActividadUsuario(usuario_id=usuario.pk, ultima_actividad=ahora)],
+            ignore_conflicts=True
+        )
+    return True
+
+
+def usuarios_activos(desde):
+    """Usuarios con alguna petición desde ``desde``"""
+    return ActividadUsuario.objects.filter(ultima_actividad__gte=desde).count()
+
+
+def usuarios_activos_24h(ahora=None):
+    return usuarios_activos((ahora or timezone.now()) - timedelta(hours=24))
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class AdministracionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'administracion'
-    verbose_name = 'Panel de Administración'
\ No newline at end of file
+    verbose_name = 'Panel de Administración'
+
+    def ready(self):
+        import administracion.signals  # noqa
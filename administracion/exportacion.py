@@ -0,0 +1,699 @@
+"""
+Motor de exportación del dashboard de administración.
+
+Cada hoja del reporte es una función que *genera* filas (la primera es el
+encabezado) recorriendo los querysets con ``.iterator(chunk_size=...)``, de
+modo que nunca se cargan todas las filas en memoria. Los escritores de Excel
+(openpyxl en modo ``write_only``) y de CSV dentro de un ZIP consumen esos
+generadores fila a fila, y el ancho de las columnas se calcula con una
+muestra de las primeras filas en lugar de recorrer todas las celdas.
+"""
+import csv
+import io
+import tempfile
+import zipfile
+from itertools import chain, islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Q, Sum
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from clientes.models import Cliente
+from mascotas.models import Mascota
+from citas.models import Cita
+from tienda.models import Producto, Categoria, Orden
+from notificaciones.models import Notificacion
+
+# Filas que se piden a la base de datos en cada viaje del iterador
+TAMANO_LOTE = getattr(settings, 'EXPORTACION_TAMANO_LOTE', 2000)
+
+# Filas que se examinan para estimar el ancho de cada columna
+FILAS_MUESTRA_ANCHO = 200
+ANCHO_MAXIMO_COLUMNA = 40
+
+# Filas CSV escritas antes de entregar un trozo al cliente
+FILAS_POR_TROZO_CSV = 500
+
+
+def _nombre(nombre, apellido, username):
+    """Equivalente a ``User.get_full_name() or username`` sobre columnas proyectadas"""
+    return f"{nombre or ''} {apellido or ''}".strip() or username
+
+
+def _etiquetas(modelo, campo):
+    """Diccionario valor -> etiqueta de un campo con choices (como get_FOO_display)"""
+    return {str(k): str(v) for k, v in modelo._meta.get_field(campo).flatchoices}
+
+
+def _porcentajes(encabezado, filas, etiqueta):
+    """
+    Tabla de distribución ``[etiqueta, cantidad, porcentaje]``. El total se
+    obtiene sumando los grupos, así la tabla cuesta una sola consulta.
+    """
+    filas = list(filas)
+    total = sum(f['total'] for f in filas)
+    tabla = [encabezado]
+    if total > 0:
+        tabla += [
+            [etiqueta(f), f['total'], f"{(f['total'] / total * 100):.1f}%"]
+            for f in filas
+        ]
+    return tabla
+
+
+# ---------------------------------------------------------------------------
+# Hojas de resumen (pocas filas, se calculan completas)
+# ---------------------------------------------------------------------------
+
+def filas_estadisticas_generales(hoy):
+    productos = Producto.objects.aggregate(activos=Count('id', filter=Q(activo=True)))
+    categorias = Categoria.objects.aggregate(activas=Count('id', filter=Q(activo=True)))
+
+    yield ['Métrica', 'Valor']
+    yield ['Total de Clientes', f"{Cliente.objects.count():,}"]
+    yield ['Total de Mascotas', f"{Mascota.objects.count():,}"]
+    yield ['Total de Usuarios', f"{User.objects.count():,}"]
+    yield ['Total de Productos Activos', f"{productos['activos']:,}"]
+    yield ['Total de Categorías Activas', f"{categorias['activas']:,}"]
+    yield ['Total de Órdenes', f"{Orden.objects.count():,}"]
+
+
+def filas_estadisticas_mes(hoy):
+    citas = Cita.objects.filter(fecha__date__month=hoy.month, fecha__date__year=hoy.year).aggregate(
+        total=Count('id'),
+        completadas=Count('id', filter=Q(estado='completada')),
+    )
+    clientes_nuevos_mes = Cliente.objects.filter(fecha_registro__month=hoy.month, fecha_registro__year=hoy.year).count()
+    ordenes = Orden.objects.filter(fecha_creacion__month=hoy.month, fecha_creacion__year=hoy.year).aggregate(
+        cantidad=Count('id'),
+        ventas=Sum('total'),
+    )
+
+    cumplimiento_pct = 0
+    if citas['total'] > 0:
+        cumplimiento_pct = round((citas['completadas'] / citas['total']) * 100, 1)
+
+    yield ['Métrica', 'Valor']
+    yield ['Citas programadas este mes', f"{citas['total']:,}"]
+    yield ['Citas completadas este mes', f"{citas['completadas']:,}"]
+    yield ['Porcentaje de cumplimiento', f"{cumplimiento_pct}%"]
+    yield ['Clientes nuevos este mes', f"{clientes_nuevos_mes:,}"]
+    yield ['Ventas tienda este mes', f"${(ordenes['ventas'] or 0):,.2f}"]
+    yield ['Órdenes tienda este mes', f"{ordenes['cantidad']:,}"]
+
+
+def filas_citas_estado(hoy):
+    return _porcentajes(
+        ['Estado de Cita', 'Cantidad', 'Porcentaje'],
+        Cita.objects.values('estado').annotate(total=Count('id')).order_by('-total'),
+        lambda f: f['estado'].title(),
+    )
+
+
+def filas_mascotas_tipo(hoy):
+    return _porcentajes(
+        ['Tipo de Mascota', 'Cantidad', 'Porcentaje'],
+        Mascota.objects.values('tipo').annotate(total=Count('id')).order_by('-total'),
+        lambda f: f['tipo'].title(),
+    )
+
+
+def filas_productos_categoria(hoy):
+    return _porcentajes(
+        ['Categoría de Producto', 'Cantidad', 'Porcentaje'],
+        Producto.objects.filter(activo=True).values('categoria__nombre').annotate(total=Count('id')).order_by('-total'),
+        lambda f: f['categoria__nombre'] or 'Sin Categoría',
+    )
+
+
+def filas_ordenes_estado(hoy):
+    return _porcentajes(
+        ['Estado de Orden', 'Cantidad', 'Porcentaje'],
+        Orden.objects.values('estado').annotate(total=Count('id')).order_by('-total'),
+        lambda f: f['estado'].title(),
+    )
+
+
+def filas_stock_bajo(hoy):
+    yield ['Producto', 'Stock Actual', 'Stock Mínimo', 'Estado']
+    productos = (
+        Producto.objects
+        .filter(stock__lte=F('stock_minimo'), activo=True)
+        .order_by('stock')
+        .values_list('nombre', 'stock', 'stock_minimo')
+    )
+    for nombre, stock, stock_minimo in productos.iterator(chunk_size=TAMANO_LOTE):
+        estado = "SIN STOCK" if stock == 0 else "STOCK BAJO"
+        yield [nombre, stock, stock_minimo, estado]
+
+
+def filas_citas_hoy(hoy):
+    tipos = _etiquetas(Cita, 'tipo')
+    estados = _etiquetas(Cita, 'estado')
+
+    yield ['Hora', 'Mascota', 'Dueño', 'Tipo', 'Estado']
+    citas = Cita.objects.filter(fecha__date=hoy).values_list(
+        'fecha', 'mascota__nombre',
+        'mascota__cliente__usuario__first_name', 'mascota__cliente__usuario__last_name',
+        'mascota__cliente__usuario__username',
+        'tipo', 'estado',
+    )
+    for fecha, mascota, nombre, apellido, username, tipo, estado in citas.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            fecha.strftime('%H:%M'),
+            mascota,
+            _nombre(nombre, apellido, username),
+            tipos.get(tipo, tipo),
+            estados.get(estado, estado),
+        ]
+
+
+def filas_ordenes_pendientes(hoy):
+    estados = _etiquetas(Orden, 'estado')
+
+    yield ['Número Orden', 'Cliente', 'Total', 'Fecha Creación', 'Estado']
+    ordenes = Orden.objects.filter(estado='pendiente').order_by('-fecha_creacion').values_list(
+        'numero_orden', 'usuario__first_name', 'usuario__last_name', 'usuario__username',
+        'total', 'fecha_creacion', 'estado',
+    )
+    for numero, nombre, apellido, username, total, fecha, estado in ordenes.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            numero,
+            _nombre(nombre, apellido, username),
+            f"${float(total):,.2f}",
+            fecha.strftime('%d/%m/%Y %H:%M'),
+            estados.get(estado, estado),
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Hojas con los registros completos (pueden tener decenas de miles de filas).
+# Todas usan una única consulta con values_list: sin instanciar modelos ni
+# consultas adicionales por fila.
+# ---------------------------------------------------------------------------
+
+def filas_clientes(hoy):
+    yield ['ID', 'Usuario', 'Nombre', 'Apellido', 'Email', 'Teléfono', 'Dirección', 'Fecha Registro']
+    clientes = Cliente.objects.values_list(
+        'id', 'usuario__username', 'usuario__first_name', 'usuario__last_name', 'usuario__email',
+        'telefono', 'direccion', 'fecha_registro',
+    )
+    for pk, username, nombre, apellido, email, telefono, direccion, fecha in clientes.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            pk,
+            username,
+            nombre,
+            apellido,
+            email,
+            telefono or '',
+            direccion or '',
+            fecha.strftime('%d/%m/%Y'),
+        ]
+
+
+def filas_mascotas(hoy):
+    tipos = _etiquetas(Mascota, 'tipo')
+    sexos = _etiquetas(Mascota, 'sexo')
+
+    yield ['ID', 'Nombre', 'Tipo', 'Raza', 'Sexo', 'Fecha Nacimiento', 'Cliente', 'Fecha Registro']
+    mascotas = Mascota.objects.values_list(
+        'id', 'nombre', 'tipo', 'raza', 'sexo', 'fecha_nacimiento',
+        'cliente__usuario__first_name', 'cliente__usuario__last_name', 'cliente__usuario__username',
+        'fecha_registro',
+    )
+    for pk, nombre_mascota, tipo, raza, sexo, nacimiento, nombre, apellido, username, registro in mascotas.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            pk,
+            nombre_mascota,
+            tipos.get(tipo, tipo),
+            raza or '',
+            sexos.get(sexo, sexo),
+            nacimiento.strftime('%d/%m/%Y') if nacimiento else '',
+            _nombre(nombre, apellido, username),
+            registro.strftime('%d/%m/%Y'),
+        ]
+
+
+def filas_citas(hoy):
+    tipos = _etiquetas(Cita, 'tipo')
+    estados = _etiquetas(Cita, 'estado')
+
+    yield ['ID', 'Fecha', 'Mascota', 'Cliente', 'Tipo', 'Estado', 'Notas']
+    citas = Cita.objects.values_list(
+        'id', 'fecha', 'mascota__nombre',
+        'mascota__cliente__usuario__first_name', 'mascota__cliente__usuario__last_name',
+        'mascota__cliente__usuario__username',
+        'tipo', 'estado', 'notas',
+    )
+    for pk, fecha, mascota, nombre, apellido, username, tipo, estado, notas in citas.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            pk,
+            fecha.strftime('%d/%m/%Y %H:%M'),
+            mascota,
+            _nombre(nombre, apellido, username),
+            tipos.get(tipo, tipo),
+            estados.get(estado, estado),
+            notas or '',
+        ]
+
+
+def filas_productos(hoy):
+    yield ['ID', 'Nombre', 'Categoría', 'Precio Base', 'Precio Final', 'Stock', 'Stock Mínimo', 'Estado Stock', 'Activo', 'Destacado']
+    productos = Producto.objects.order_by('nombre').values_list(
+        'id', 'nombre', 'categoria__nombre', 'precio', 'precio_descuento',
+        'stock', 'stock_minimo', 'activo', 'destacado',
+    )
+    for pk, nombre, categoria, precio, descuento, stock, stock_minimo, activo, destacado in productos.iterator(chunk_size=TAMANO_LOTE):
+        # Misma regla que Producto.precio_final
+        precio_final = descuento if descuento is not None and descuento < precio else precio
+        estado_stock = "SIN STOCK" if stock == 0 else ("BAJO" if stock <= stock_minimo else "NORMAL")
+        yield [
+            pk,
+            nombre,
+            categoria or 'Sin Categoría',
+            f"${float(precio):,.2f}",
+            f"${float(precio_final):,.2f}",
+            stock,
+            stock_minimo,
+            estado_stock,
+            'ACTIVO' if activo else 'INACTIVO',
+            'DESTACADO' if destacado else 'NORMAL',
+        ]
+
+
+def filas_ordenes(hoy):
+    estados = _etiquetas(Orden, 'estado')
+
+    yield ['ID', 'Número Orden', 'Cliente', 'Subtotal', 'Impuesto', 'Envío', 'Total', 'Estado', 'Fecha Creación', 'Productos']
+    ordenes = (
+        Orden.objects
+        .annotate(productos_count=Count('items'))
+        .order_by('-fecha_creacion')
+        .values_list(
+            'id', 'numero_orden', 'usuario__first_name', 'usuario__last_name', 'usuario__username',
+            'subtotal', 'impuesto', 'total', 'estado', 'fecha_creacion', 'productos_count',
+        )
+    )
+    for pk, numero, nombre, apellido, username, subtotal, impuesto, total, estado, fecha, productos_count in ordenes.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            pk,
+            numero,
+            _nombre(nombre, apellido, username),
+            f"${float(subtotal):,.2f}",
+            f"${float(impuesto):,.2f}",
+            "$0.00",  # Envío no está en el modelo
+            f"${float(total):,.2f}",
+            estados.get(estado, estado),
+            fecha.strftime('%d/%m/%Y %H:%M'),
+            productos_count,
+        ]
+
+
+def filas_notificaciones(hoy):
+    tipos = _etiquetas(Notificacion, 'tipo')
+    prioridades = _etiquetas(Notificacion, 'prioridad')
+
+    yield ['ID', 'Cliente', 'Tipo', 'Título', 'Mensaje', 'Prioridad', 'Leída', 'Fecha Creación']
+    notificaciones = Notificacion.objects.values_list(
+        'id', 'cliente_id',
+        'cliente__usuario__first_name', 'cliente__usuario__last_name', 'cliente__usuario__username',
+        'tipo', 'titulo', 'mensaje', 'prioridad', 'leida', 'fecha_creacion',
+    )
+    for pk, cliente_id, nombre, apellido, username, tipo, titulo, mensaje, prioridad, leida, fecha in notificaciones.iterator(chunk_size=TAMANO_LOTE):
+        yield [
+            pk,
+            _nombre(nombre, apellido, username) if cliente_id else 'Global',
+            tipos.get(tipo, tipo),
+            titulo,
+            mensaje[:100] + '...' if len(mensaje) > 100 else mensaje,
+            prioridades.get(prioridad, prioridad),
+            'Sí' if leida else 'No',
+            fecha.strftime('%d/%m/%Y %H:%M'),
+        ]
+
+
+# Tablas de la hoja "Resumen"
+TABLAS_RESUMEN = [
+    ('Estadísticas Generales', filas_estadisticas_generales),
+    ('Estadísticas del Mes', filas_estadisticas_mes),
+]
+
+# (nombre de hoja, función de filas) en el orden en que aparecen en el reporte
+HOJAS_REPORTE = [
+    ('Citas por Estado', filas_citas_estado),
+    ('Mascotas por Tipo', filas_mascotas_tipo),
+    ('Prod. por Categoría', filas_productos_categoria),
+    ('Órdenes por Estado', filas_ordenes_estado),
+    ('Stock Bajo', filas_stock_bajo),
+    ('Citas Hoy', filas_citas_hoy),
+    ('Órdenes Pendientes', filas_ordenes_pendientes),
+    ('Todos los Clientes', filas_clientes),
+    ('Todas las Mascotas', filas_mascotas),
+    ('Todas las Citas', filas_citas),
+    ('Todos los Productos', filas_productos),
+    ('Todas las Órdenes', filas_ordenes),
+    ('Todas las Notificaciones', filas_notificaciones),
+]
+
+
+# ---------------------------------------------------------------------------
+# Escritores
+# ---------------------------------------------------------------------------
+
+def _anchos_columnas(filas):
+    anchos = {}
+    for fila in filas:
+        for idx, valor in enumerate(fila, start=1):
+            if valor is None:
+                continue
+            anchos[idx] = max(anchos.get(idx, 0), len(str(valor)))
+    return {idx: min(ancho + 2, ANCHO_MAXIMO_COLUMNA) for idx, ancho in anchos.items()}
+
+
+class _EstilosExcel:
+    def __init__(self):
+        thin = Side(border_style='thin', color='DEE2E6')
+        self.header_fill = PatternFill('solid', fgColor='F1F3F5')
+        self.header_font = Font(bold=True, color='212529')
+        self.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        self.center = Alignment(horizontal='center', vertical='center')
+
+    def titulo(self, ws, texto, size=12):
+        celda = WriteOnlyCell(ws, value=texto)
+        celda.font = Font(bold=True, size=size)
+        return celda
+
+    def encabezado(self, ws, valores):
+        celdas = []
+        for valor in valores:
+            celda = WriteOnlyCell(ws, value=valor)
+            celda.fill = self.header_fill
+            celda.font = self.header_font
+            celda.alignment = self.center
+            celda.border = self.border
+            celdas.append(celda)
+        return celdas
+
+
+def _escribir_tablas(ws, estilos, tablas):
+    """
+    Escribe una o varias tablas ``(título, filas)`` en una hoja write-only.
+    Las hojas write-only exigen fijar el ancho antes de la primera fila, así
+    que se toma una muestra de cada tabla, se calculan los anchos y luego se
+    escribe la muestra seguida del resto del iterador.
+    """
+    preparadas = []
+    muestra_total = []
+    for titulo, filas in tablas:
+        filas = iter(filas)
+        muestra = list(islice(filas, FILAS_MUESTRA_ANCHO))
+        muestra_total.extend(muestra)
+        preparadas.append((titulo, muestra, filas))
+
+    for idx, ancho in _anchos_columnas(muestra_total).items():
+        ws.column_dimensions[get_column_letter(idx)].width = ancho
+
+    for titulo, muestra, resto in preparadas:
+        ws.append([estilos.titulo(ws, titulo)])
+        if not muestra:
+            ws.append([])
+            continue
+        ws.append(estilos.encabezado(ws, muestra[0]))
+        for fila in chain(muestra[1:], resto):
+            ws.append(fila)
+        ws.append([])
+
+
+def escribir_excel(destino, hoy, generado_por, fecha_gen):
+    """
+    Genera el reporte completo en ``destino`` (ruta o archivo binario) con un
+    libro write-only: openpyxl vuelca cada fila a disco al recibirla, por lo
+    que la memoria no crece con la cantidad de registros.
+    """
+    estilos = _EstilosExcel()
+    wb = Workbook(write_only=True)
+
+    ws = wb.create_sheet('Resumen')
+    ws.append([estilos.titulo(ws, 'Reporte de Administración - Veterinaria Vet Love', size=14)])
+    ws.append([f'Generado por: {generado_por}   Fecha: {fecha_gen}'])
+    ws.append([])
+    _escribir_tablas(ws, estilos, [(titulo, filas(hoy)) for titulo, filas in TABLAS_RESUMEN])
+
+    for nombre, filas in HOJAS_REPORTE:
+        ws = wb.create_sheet(nombre)
+        _escribir_tablas(ws, estilos, [(nombre, filas(hoy))])
+
+    wb.save(destino)
+    return destino
+
+
+def excel_temporal(hoy, generado_por, fecha_gen):
+    """Escribe el Excel en un archivo temporal y lo devuelve posicionado al inicio"""
+    archivo = tempfile.TemporaryFile()
+    escribir_excel(archivo, hoy, generado_por, fecha_gen)
+    archivo.seek(0)
+    return archivo
+
+
+class _SalidaEnTrozos(io.RawIOBase):
+    """Archivo no posicionable que acumula bytes hasta que se retiran"""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def retirar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def zip_csv_streaming(hoy):
+    """
+    Genera un ZIP con un CSV por hoja, entregando bytes a medida que se
+    escriben. Pensado para ``StreamingHttpResponse``: nada se guarda completo
+    ni en memoria ni en disco.
+    """
+    salida = _SalidaEnTrozos()
+    hojas = [('Resumen', filas_estadisticas_generales), ('Resumen del Mes', filas_estadisticas_mes)] + HOJAS_REPORTE
+
+    with zipfile.ZipFile(salida, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, filas in hojas:
+            with zf.open(f'{nombre}.csv', mode='w') as entrada:
+                texto = io.TextIOWrapper(entrada, encoding='utf-8-sig', newline='')
+                writer = csv.writer(texto)
+                for numero, fila in enumerate(filas(hoy), start=1):
+                    writer.writerow(fila)
+                    if numero % FILAS_POR_TROZO_CSV == 0:
+                        texto.flush()
+                        trozo = salida.retirar()
+                        if trozo:
+                            yield trozo
+                texto.flush()
+                texto.detach()
+            yield salida.retirar()
+    yield salida.retirar()
+
+
+def escribir_pdf(hoy, generado_por, fecha_gen):
+    """
+    Genera el reporte completo en PDF con ReportLab y devuelve los bytes.
+    A diferencia del Excel, ReportLab necesita todas las tablas en memoria,
+    por eso se ejecuta en el worker de reportes y no en la petición.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
+    styles = getSampleStyleSheet()
+
+    # Estilos personalizados
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=18,
+        spaceAfter=20,
+        alignment=1,  # Center
+        textColor=colors.HexColor('#2c3e50')
+    )
+
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=15,
+        textColor=colors.HexColor('#34495e')
+    )
+
+    section_style = ParagraphStyle(
+        'CustomSection',
+        parent=styles['Heading3'],
+        fontSize=12,
+        spaceAfter=10,
+        textColor=colors.HexColor('#2c3e50'),
+        borderColor=colors.HexColor('#3498db'),
+        borderWidth=1,
+        borderPadding=5,
+        borderRadius=3
+    )
+
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=8
+    )
+
+    elems = []
+
+    stats_generales = list(filas_estadisticas_generales(hoy))
+    stats_mes = list(filas_estadisticas_mes(hoy))
+    citas_estado = list(filas_citas_estado(hoy))
+    mascotas_tipo = list(filas_mascotas_tipo(hoy))
+    prod_por_categoria = list(filas_productos_categoria(hoy))
+    ordenes_estado = list(filas_ordenes_estado(hoy))
+    productos_bajo = list(filas_stock_bajo(hoy))
+    citas_hoy_rows = list(filas_citas_hoy(hoy))
+    ordenes_pend_rows = list(filas_ordenes_pendientes(hoy))
+    clientes_rows = list(filas_clientes(hoy))
+    mascotas_rows = list(filas_mascotas(hoy))
+    citas_rows = list(filas_citas(hoy))
+    productos_rows = list(filas_productos(hoy))
+    ordenes_rows = list(filas_ordenes(hoy))
+    notificaciones_rows = list(filas_notificaciones(hoy))
+
+    # Header con título principal
+    title = Paragraph('<b>Reporte de Administración</b>', title_style)
+    subtitle = Paragraph('<b>Veterinaria Vet Love</b>', subtitle_style)
+    meta = Paragraph(f'<i>Generado por: {generado_por}<br/>Fecha: {fecha_gen}</i>', normal_style)
+
+    elems += [title, subtitle, meta, Spacer(1, 20)]
+
+    def add_professional_table(title_text, data, col_widths=None):
+        # Título de sección
+        elems.append(Paragraph(f'<b>{title_text}</b>', section_style))
+
+        if not data:
+            return
+
+        # Crear tabla
+        t = Table(data, colWidths=col_widths, hAlign='LEFT')
+
+        # Estilos profesionales
+        table_style = TableStyle([
+            # Header
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 10),
+            ('ALIGN', (0,0), (-1,0), 'CENTER'),
+            ('VALIGN', (0,0), (-1,0), 'MIDDLE'),
+            ('BOTTOMPADDING', (0,0), (-1,0), 8),
+            ('TOPPADDING', (0,0), (-1,0), 8),
+
+            # Cuerpo
+            ('BACKGROUND', (0,1), (-1,-1), colors.white),
+            ('TEXTCOLOR', (0,1), (-1,-1), colors.black),
+            ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
+            ('FONTSIZE', (0,1), (-1,-1), 9),
+            ('ALIGN', (0,1), (-1,-1), 'LEFT'),
+            ('VALIGN', (0,1), (-1,-1), 'MIDDLE'),
+
+            # Bordes
+            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#bdc3c7')),
+            ('INNERGRID', (0,0), (-1,-1), 0.25, colors.HexColor('#ecf0f1')),
+
+            # Filas alternas
+            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.HexColor('#f8f9fa')]),
+
+            # Padding
+            ('BOTTOMPADDING', (0,1), (-1,-1), 5),
+            ('TOPPADDING', (0,1), (-1,-1), 5),
+            ('LEFTPADDING', (0,0), (-1,-1), 6),
+            ('RIGHTPADDING', (0,0), (-1,-1), 6),
+        ])
+
+        t.setStyle(table_style)
+        elems.extend([t, Spacer(1, 15)])
+
+    # Primera página: Estadísticas principales
+    add_professional_table('📊 ESTADÍSTICAS GENERALES DEL SISTEMA', stats_generales)
+    add_professional_table('📈 ESTADÍSTICAS DEL MES ACTUAL', stats_mes)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Segunda página: Análisis detallado
+    add_professional_table('📅 ANÁLISIS DE CITAS POR ESTADO', citas_estado)
+    add_professional_table('🐾 DISTRIBUCIÓN DE MASCOTAS POR TIPO', mascotas_tipo)
+    add_professional_table('🛒 PRODUCTOS POR CATEGORÍA', prod_por_categoria)
+    add_professional_table('📦 ESTADO DE ÓRDENES DE COMPRA', ordenes_estado)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Tercera página: Alertas y pendientes
+    add_professional_table('⚠️ ALERTA: PRODUCTOS CON STOCK CRÍTICO', productos_bajo)
+    add_professional_table('📋 CITAS PROGRAMADAS PARA HOY', citas_hoy_rows)
+    add_professional_table('⏳ ÓRDENES PENDIENTES DE PROCESAMIENTO', ordenes_pend_rows)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Cuarta página: Datos completos - Clientes
+    add_professional_table('👥 REGISTRO COMPLETO DE CLIENTES', clientes_rows)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Quinta página: Mascotas
+    add_professional_table('🐾 REGISTRO COMPLETO DE MASCOTAS', mascotas_rows)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Sexta página: Citas
+    add_professional_table('📅 HISTORIAL COMPLETO DE CITAS', citas_rows)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Séptima página: Productos
+    add_professional_table('🛒 CATÁLOGO COMPLETO DE PRODUCTOS', productos_rows)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Octava página: Órdenes
+    add_professional_table('📦 HISTORIAL COMPLETO DE ÓRDENES', ordenes_rows)
+
+    # Salto de página
+    elems.append(PageBreak())
+
+    # Novena página: Notificaciones
+    add_professional_table('🔔 REGISTRO COMPLETO DE NOTIFICACIONES', notificaciones_rows)
+
+    # Footer
+    footer_text = f"Reporte generado el {hoy.strftime('%d/%m/%Y')} - Veterinaria Vet Love"
+    footer = Paragraph(f'<i>{footer_text}</i>', ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.gray, alignment=1))
+    elems.append(Spacer(1, 20))
+    elems.append(footer)
+
+    doc.build(elems)
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    return pdf_data
@@ -0,0 +1,94 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _inicializar_proceso():
+    """
+    Los procesos se crean con 'spawn': no heredan las conexiones del padre y
+    cada uno configura Django y abre las suyas. Por eso este módulo no importa
+    modelos a nivel global.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _ejecutar(job_id):
+    from administracion.reportes import procesar_job
+
+    try:
+        return job_id, procesar_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de reportes PDF (ReporteJob) con un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'REPORTES_WORKERS', 2),
+            help='Procesos en paralelo (0 procesa en el proceso actual)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando no hay trabajos pendientes'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa lo que haya pendiente y termina'
+        )
+
+    def handle(self, *args, **options):
+        from administracion import reportes
+
+        workers = options['workers']
+        liberados = reportes.liberar_atascados(getattr(settings, 'REPORTES_MINUTOS_ATASCADO', 30))
+        if liberados:
+            self.stdout.write(self.style.WARNING(f'{liberados} trabajos atascados devueltos a la cola'))
+
+        if workers <= 0:
+            self._procesar_en_linea(options)
+            return
+
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto, initializer=_inicializar_proceso) as pool:
+            self.stdout.write(f'Procesando reportes con {workers} procesos...')
+            while True:
+                ids = reportes.reclamar_pendientes(workers * 2)
+                for job_id, estado in pool.map(_ejecutar, ids):
+                    self._informar(job_id, estado)
+                if not ids:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+
+    def _procesar_en_linea(self, options):
+        from administracion.reportes import procesar_job, reclamar_pendientes
+
+        while True:
+            ids = reclamar_pendientes(10)
+            for job_id in ids:
+                self._informar(job_id, procesar_job(job_id))
+            if not ids:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+
+    def _informar(self, job_id, estado):
+        if estado == 'completado':
+            self.stdout.write(self.style.SUCCESS(f'Reporte {job_id} generado'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Reporte {job_id} falló'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from administracion.metricas import refrescar_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el snapshot de métricas del dashboard de administración'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando métricas del dashboard...')
+        snapshot = refrescar_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Snapshot actualizado el {snapshot.actualizado_en.strftime("%d/%m/%Y %H:%M:%S")}'
+            )
+        )
@@ -0,0 +1,173 @@
+"""
+Snapshot de métricas del dashboard de administración.
+
+El dashboard lee una única fila de ``MetricasSnapshot`` en lugar de lanzar
+decenas de COUNT/SUM en cada carga. Los totales simples se mantienen al día
+con deltas aplicados desde señales (ver ``administracion.signals``) y el resto
+de agregados se recalculan con el comando ``refrescar_metricas`` o, como
+último recurso, cuando el dashboard encuentra el snapshot obsoleto: una sola
+petición lo recalcula (candado en caché) y las demás muestran el anterior.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .actividad import usuarios_activos_24h
+from .models import MetricasSnapshot
+from .series import ESTADOS_VENTA, serie_citas, serie_ventas
+
+SNAPSHOT_PK = 1
+
+# Candado del recálculo desde el dashboard; vence solo si el proceso muere a mitad
+CANDADO_REFRESCO = 'metricas:refrescando'
+CANDADO_REFRESCO_SEGUNDOS = 120
+
+# Totales que las señales actualizan con deltas (+1 / -1)
+CONTADORES_INCREMENTALES = (
+    'total_clientes',
+    'total_mascotas',
+    'total_usuarios',
+    'total_ordenes',
+    'total_notificaciones',
+)
+
+
+def calcular_metricas(hoy=None):
+    """Calcula todos los agregados del dashboard y los devuelve como diccionario"""
+    from clientes.models import Cliente
+    from mascotas.models import Mascota
+    from citas.models import Cita
+    from tienda.models import Producto, Categoria, Orden
+    from notificaciones.models import Notificacion, Recordatorio
+
+    ahora = timezone.now()
+    hoy = hoy or timezone.localdate(ahora)
+
+    citas_del_mes = Cita.objects.filter(fecha__date__month=hoy.month, fecha__date__year=hoy.year)
+
+    try:
+        ingresos_mes = citas_del_mes.filter(estado='completada').aggregate(total=Sum('precio'))['total'] or 0
+    except Exception:
+        # Cita no tiene campo precio en todas las instalaciones
+        ingresos_mes = 0
+
+    ventas_mes_tienda = Orden.objects.filter(
+        fecha_creacion__month=hoy.month,
+        fecha_creacion__year=hoy.year,
+        estado__in=ESTADOS_VENTA
+    ).aggregate(total=Sum('total'))['total'] or 0
+
+    hace_7_dias = hoy - timedelta(days=6)
+    citas_ultimos_7_dias = [
+        {'dia': punto['periodo'].strftime('%d/%m'), 'total': punto['total']}
+        for punto in serie_citas(hace_7_dias, hoy)
+    ]
+    ventas_ultimos_7_dias = [
+        {'dia': punto['periodo'].strftime('%d/%m'), 'total': float(punto['total'])}
+        for punto in serie_ventas(hace_7_dias, hoy)
+    ]
+
+    graficos = {
+        'citas_por_estado': list(Cita.objects.values('estado').annotate(total=Count('id')).order_by('-total')),
+        'mascotas_por_tipo': list(Mascota.objects.values('tipo').annotate(total=Count('id')).order_by('-total')),
+        'productos_por_categoria': list(Producto.objects.filter(activo=True).annotate(
+            categoria_nombre=Coalesce('categoria__nombre', Value('SIN CATEGORÍA'))
+        ).values('categoria_nombre').annotate(total=Count('id')).order_by('-total')),
+        'ordenes_por_estado': list(Orden.objects.values('estado').annotate(total=Count('id')).order_by('-total')),
+        'citas_ultimos_7_dias': citas_ultimos_7_dias,
+        'ventas_ultimos_7_dias': ventas_ultimos_7_dias,
+    }
+
+    return {
+        'total_clientes': Cliente.objects.count(),
+        'total_mascotas': Mascota.objects.count(),
+        'total_usuarios': User.objects.count(),
+        'total_ordenes': Orden.objects.count(),
+        'total_notificaciones': Notificacion.objects.count(),
+
+        'usuarios_activos_24h': usuarios_activos_24h(ahora),
+        'usuarios_recientes': User.objects.filter(last_login__gte=ahora - timedelta(days=7)).count(),
+        'usuarios_sin_login': User.objects.filter(last_login__isnull=True).count(),
+        'usuarios_staff': User.objects.filter(is_staff=True).count(),
+        'usuarios_veterinarios': User.objects.filter(groups__name='Veterinarios').count(),
+        'usuarios_clientes': User.objects.filter(is_staff=False).exclude(groups__name='Veterinarios').count(),
+        'usuarios_activos': User.objects.filter(is_active=True, last_login__isnull=False).count(),
+        'usuarios_inactivos': User.objects.filter(Q(is_active=False) | Q(last_login__isnull=True)).count(),
+
+        'citas_mes': citas_del_mes.count(),
+        'citas_completadas_mes': citas_del_mes.filter(estado='completada').count(),
+        'citas_urgentes': Cita.objects.filter(
+            fecha__date=hoy,
+            tipo='urgencia',
+            estado__in=['programada', 'confirmada']
+        ).count(),
+        'clientes_nuevos_mes': Cliente.objects.filter(
+            fecha_registro__month=hoy.month,
+            fecha_registro__year=hoy.year
+        ).count(),
+        'ingresos_mes': ingresos_mes,
+
+        'total_productos': Producto.objects.filter(activo=True).count(),
+        'total_categorias': Categoria.objects.filter(activo=True).count(),
+        'ventas_mes_tienda': ventas_mes_tienda,
+        'ordenes_pendientes': Orden.objects.filter(estado='pendiente').count(),
+        'productos_stock_bajo': Producto.objects.filter(stock__lte=F('stock_minimo'), activo=True).count(),
+
+        'notificaciones_no_leidas': Notificacion.objects.filter(leida=False).count(),
+        'notificaciones_ultima_semana': Notificacion.objects.filter(
+            fecha_creacion__date__gte=hoy - timedelta(days=7)
+        ).count(),
+        'recordatorios_activos': Recordatorio.objects.filter(activo=True).count(),
+        'recordatorios_pendientes': Recordatorio.objects.filter(
+            activo=True,
+            enviado=False,
+            fecha_recordatorio__date__gte=hoy
+        ).count(),
+
+        'graficos': graficos,
+        'fecha_calculo': hoy,
+    }
+
+
+def refrescar_snapshot():
+    """Recalcula todas las métricas y las guarda en la fila del snapshot"""
+    valores = calcular_metricas()
+    valores['actualizado_en'] = timezone.now()
+    snapshot, _ = MetricasSnapshot.objects.update_or_create(pk=SNAPSHOT_PK, defaults=valores)
+    return snapshot
+
+
+def obtener_snapshot(max_edad=None):
+    """
+    Devuelve el snapshot, recalculándolo si no existe o si es más antiguo que
+    ``max_edad`` segundos (por defecto METRICAS_SNAPSHOT_MAX_EDAD). Si otra
+    petición ya lo está recalculando se devuelve el obsoleto en lugar de
+    repetir el cálculo.
+    """
+    if max_edad is None:
+        max_edad = getattr(settings, 'METRICAS_SNAPSHOT_MAX_EDAD', 300)
+
+    snapshot = MetricasSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    if snapshot is not None and not snapshot.esta_obsoleto(max_edad):
+        return snapshot
+    if not cache.add(CANDADO_REFRESCO, True, CANDADO_REFRESCO_SEGUNDOS):
+        if snapshot is not None:
+            return snapshot
+        # Todavía no hay ninguno que mostrar: se calcula igual
+        return refrescar_snapshot()
+    try:
+        return refrescar_snapshot()
+    finally:
+        cache.delete(CANDADO_REFRESCO)
+
+
+def aplicar_delta(campo, delta):
+    """Suma ``delta`` a un contador del snapshot con un único UPDATE atómico"""
+    if campo not in CONTADORES_INCREMENTALES:
+        raise ValueError(f'El campo {campo} no admite actualización incremental')
+    MetricasSnapshot.objects.filter(pk=SNAPSHOT_PK).update(**{campo: F(campo) + delta})
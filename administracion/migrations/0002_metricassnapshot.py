@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricasSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_clientes', models.IntegerField(default=0)),
+                ('total_mascotas', models.IntegerField(default=0)),
+                ('total_usuarios', models.IntegerField(default=0)),
+                ('total_ordenes', models.IntegerField(default=0)),
+                ('total_notificaciones', models.IntegerField(default=0)),
+                ('usuarios_activos_24h', models.IntegerField(default=0)),
+                ('usuarios_recientes', models.IntegerField(default=0)),
+                ('usuarios_sin_login', models.IntegerField(default=0)),
+                ('usuarios_staff', models.IntegerField(default=0)),
+                ('usuarios_veterinarios', models.IntegerField(default=0)),
+                ('usuarios_clientes', models.IntegerField(default=0)),
+                ('usuarios_activos', models.IntegerField(default=0)),
+                ('usuarios_inactivos', models.IntegerField(default=0)),
+                ('citas_mes', models.IntegerField(default=0)),
+                ('citas_completadas_mes', models.IntegerField(default=0)),
+                ('citas_urgentes', models.IntegerField(default=0)),
+                ('clientes_nuevos_mes', models.IntegerField(default=0)),
+                ('ingresos_mes', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_productos', models.IntegerField(default=0)),
+                ('total_categorias', models.IntegerField(default=0)),
+                ('ventas_mes_tienda', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ordenes_pendientes', models.IntegerField(default=0)),
+                ('productos_stock_bajo', models.IntegerField(default=0)),
+                ('notificaciones_no_leidas', models.IntegerField(default=0)),
+                ('notificaciones_ultima_semana', models.IntegerField(default=0)),
+                ('recordatorios_activos', models.IntegerField(default=0)),
+                ('recordatorios_pendientes', models.IntegerField(default=0)),
+                ('graficos', models.JSONField(blank=True, default=dict)),
+                ('fecha_calculo', models.DateField(blank=True, null=True, verbose_name='Día de cálculo')),
+                ('actualizado_en', models.DateTimeField(blank=True, null=True, verbose_name='Actualizado en')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de métricas',
+                'verbose_name_plural': 'Snapshots de métricas',
+            },
+        ),
+    ]
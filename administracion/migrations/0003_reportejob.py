@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0002_metricassnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('reporte_admin_pdf', 'Reporte de administración (PDF)'), ('carnet_vacunacion', 'Carnet de vacunación'), ('plantilla_carnet_vacunacion', 'Plantilla de carnet de vacunación'), ('carnet_identificacion', 'Carnet de identificación'), ('plantilla_carnet_admin', 'Plantilla de carnet (administración)')], max_length=40, verbose_name='Tipo de reporte')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('archivo', models.FileField(blank=True, upload_to='reportes/%Y/%m/', verbose_name='Archivo')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=200, verbose_name='Nombre de descarga')),
+                ('error', models.TextField(blank=True, verbose_name='Detalle del error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de solicitud')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio de procesamiento')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin de procesamiento')),
+                ('solicitado_por', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reportes', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de reporte',
+                'verbose_name_plural': 'Trabajos de reportes',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='administrac_estado_3356b7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_desde_last_login(apps, schema_editor):
+    # Punto de partida aproximado: el último inicio de sesión de cada usuario
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    ActividadUsuario = apps.get_model('administracion', 'ActividadUsuario')
+    usuarios = User.objects.filter(last_login__isnull=False).values_list('pk', 'last_login')
+    lote = []
+    for usuario_id, last_login in usuarios.iterator(chunk_size=1000):
+        lote.append(ActividadUsuario(usuario_id=usuario_id, ultima_actividad=last_login))
+        if len(lote) == 1000:
+            ActividadUsuario.objects.bulk_create(lote)
+            lote = []
+    ActividadUsuario.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administracion', '0003_reportejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActividadUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_actividad', models.DateTimeField(db_index=True, verbose_name='Última actividad')),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='actividad', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Actividad de usuario',
+                'verbose_name_plural': 'Actividad de usuarios',
+            },
+        ),
+        migrations.RunPython(poblar_desde_last_login, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Veterinario(models.Model):
     """Modelo para veterinarios del sistema"""
@@ -23,4 +24,128 @@ class Veterinario(models.Model):
         super().save(*args, **kwargs)
         from django.contrib.auth.models import Group
         grupo_veterinarios, created = Group.objects.get_or_create(name='Veterinarios')
-        self.usuario.groups.add(grupo_veterinarios)
\ No newline at end of file
+        self.usuario.groups.add(grupo_veterinarios)
+
+class MetricasSnapshot(models.Model):
+    """Agregados precalculados del dashboard de administración (una sola fila)"""
+    # Totales mantenidos de forma incremental por señales
+    total_clientes = models.IntegerField(default=0)
+    total_mascotas = models.IntegerField(default=0)
+    total_usuarios = models.IntegerField(default=0)
+    total_ordenes = models.IntegerField(default=0)
+    total_notificaciones = models.IntegerField(default=0)
+
+    # Actividad de usuarios
+    usuarios_activos_24h = models.IntegerField(default=0)
+    usuarios_recientes = models.IntegerField(default=0)
+    usuarios_sin_login = models.IntegerField(default=0)
+    usuarios_staff = models.IntegerField(default=0)
+    usuarios_veterinarios = models.IntegerField(default=0)
+    usuarios_clientes = models.IntegerField(default=0)
+    usuarios_activos = models.IntegerField(default=0)
+    usuarios_inactivos = models.IntegerField(default=0)
+
+    # Citas y clientes del mes
+    citas_mes = models.IntegerField(default=0)
+    citas_completadas_mes = models.IntegerField(default=0)
+    citas_urgentes = models.IntegerField(default=0)
+    clientes_nuevos_mes = models.IntegerField(default=0)
+    ingresos_mes = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Tienda
+    total_productos = models.IntegerField(default=0)
+    total_categorias = models.IntegerField(default=0)
+    ventas_mes_tienda = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ordenes_pendientes = models.IntegerField(default=0)
+    productos_stock_bajo = models.IntegerField(default=0)
+
+    # Notificaciones
+    notificaciones_no_leidas = models.IntegerField(default=0)
+    notificaciones_ultima_semana = models.IntegerField(default=0)
+    recordatorios_activos = models.IntegerField(default=0)
+    recordatorios_pendientes = models.IntegerField(default=0)
+
+    # Series y distribuciones para los gráficos
+    graficos = models.JSONField(default=dict, blank=True)
+
+    fecha_calculo = models.DateField(null=True, blank=True, verbose_name="Día de cálculo")
+    actualizado_en = models.DateTimeField(null=True, blank=True, verbose_name="Actualizado en")
+
+    class Meta:
+        verbose_name = "Snapshot de métricas"
+        verbose_name_plural = "Snapshots de métricas"
+
+    def __str__(self):
+        if self.actualizado_en:
+            return f"Métricas del dashboard - {self.actualizado_en.strftime('%d/%m/%Y %H:%M')}"
+        return "Métricas del dashboard - sin calcular"
+
+    def esta_obsoleto(self, max_edad):
+        """Indica si el snapshot supera la edad máxima o pertenece a otro día"""
+        if not self.actualizado_en:
+            return True
+        ahora = timezone.now()
+        if self.fecha_calculo != timezone.localdate(ahora):
+            return True
+        return (ahora - self.actualizado_en).total_seconds() > max_edad
+
+
+class ReporteJob(models.Model):
+    """Solicitud de un reporte PDF que se genera fuera del ciclo de la petición"""
+    TIPO_CHOICES = [
+        ('reporte_admin_pdf', 'Reporte de administración (PDF)'),
+        ('carnet_vacunacion', 'Carnet de vacunación'),
+        ('plantilla_carnet_vacunacion', 'Plantilla de carnet de vacunación'),
+        ('carnet_identificacion', 'Carnet de identificación'),
+        ('plantilla_carnet_admin', 'Plantilla de carnet (administración)'),
+    ]
+
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=40, choices=TIPO_CHOICES, verbose_name="Tipo de reporte")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parámetros")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
+    solicitado_por = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reportes', verbose_name="Solicitado por")
+    archivo = models.FileField(upload_to='reportes/%Y/%m/', blank=True, verbose_name="Archivo")
+    nombre_archivo = models.CharField(max_length=200, blank=True, verbose_name="Nombre de descarga")
+    error = models.TextField(blank=True, verbose_name="Detalle del error")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de solicitud")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio de procesamiento")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin de procesamiento")
+
+    class Meta:
+        verbose_name = "Trabajo de reporte"
+        verbose_name_plural = "Trabajos de reportes"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def terminado(self):
+        return self.estado in ('completado', 'error')
+
+
+class ActividadUsuario(models.Model):
+    """
+    Último momento en que cada usuario hizo una petición. Lo registra
+    ``ActividadUsuarioMiddleware`` como máximo una vez cada
+    ``ACTIVIDAD_USUARIO_MINUTOS`` por usuario (ver administracion/actividad.py).
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='actividad', verbose_name="Usuario")
+    ultima_actividad = models.DateTimeField(db_index=True, verbose_name="Última actividad")
+
+    class Meta:
+        verbose_name = "Actividad de usuario"
+        verbose_name_plural = "Actividad de usuarios"
+
+    def __str__(self):
+        return f"{self.usuario} - {self.ultima_actividad:%d/%m/%Y %H:%M}"
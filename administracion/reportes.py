@@ -0,0 +1,130 @@
+"""
+Cola de reportes PDF generados en segundo plano.
+
+Las vistas solo registran un ``ReporteJob`` y redirigen a una página que
+consulta su estado; el comando ``procesar_reportes`` toma los trabajos
+pendientes, los genera en un pool de procesos y guarda el archivo en el
+almacenamiento de MEDIA (``reportes/``). Solo producción activa
+``REPORTES_EN_SEGUNDO_PLANO``; sin él (desarrollo) el trabajo se procesa en la
+misma petición y no hace falta el worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import ReporteJob
+
+logger = logging.getLogger(__name__)
+
+
+def _mascota(parametros):
+    from mascotas.models import Mascota
+    return Mascota.objects.select_related('cliente__usuario').get(pk=parametros['mascota_id'])
+
+
+def _reporte_admin_pdf(parametros, usuario):
+    from .exportacion import escribir_pdf
+
+    hoy = timezone.localdate()
+    generado_por = usuario.get_full_name() or usuario.username
+    fecha_gen = timezone.localtime().strftime("%d/%m/%Y %H:%M:%S")
+    return f"reporte_admin_{hoy.strftime('%Y%m%d')}.pdf", escribir_pdf(hoy, generado_por, fecha_gen)
+
+
+def _carnet_vacunacion(parametros, usuario):
+    from mascotas.views import construir_carnet_pdf
+    return construir_carnet_pdf(_mascota(parametros))
+
+
+def _plantilla_carnet_vacunacion(parametros, usuario):
+    from mascotas.views import construir_plantilla_carnet_pdf
+    return construir_plantilla_carnet_pdf(_mascota(parametros))
+
+
+def _carnet_identificacion(parametros, usuario):
+    from mascotas.views import construir_carnet_identificacion_pdf
+    return construir_carnet_identificacion_pdf(_mascota(parametros))
+
+
+def _plantilla_carnet_admin(parametros, usuario):
+    from .views import construir_plantilla_carnet_pdf
+    return construir_plantilla_carnet_pdf(_mascota(parametros), usuario)
+
+
+# tipo de ReporteJob -> función (parametros, usuario) que devuelve (nombre, bytes)
+GENERADORES = {
+    'reporte_admin_pdf': _reporte_admin_pdf,
+    'carnet_vacunacion': _carnet_vacunacion,
+    'plantilla_carnet_vacunacion': _plantilla_carnet_vacunacion,
+    'carnet_identificacion': _carnet_identificacion,
+    'plantilla_carnet_admin': _plantilla_carnet_admin,
+}
+
+
+def encolar_reporte(usuario, tipo, parametros=None):
+    """Registra un trabajo de reporte; si la cola está desactivada lo procesa en el acto"""
+    if tipo not in GENERADORES:
+        raise ValueError(f'Tipo de reporte desconocido: {tipo}')
+
+    job = ReporteJob.objects.create(tipo=tipo, parametros=parametros or {}, solicitado_por=usuario)
+    if not getattr(settings, 'REPORTES_EN_SEGUNDO_PLANO', False):
+        procesar_job(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def responder_con_reporte(request, tipo, parametros=None):
+    """Encola el reporte y redirige a su página de estado (o a la descarga si ya está listo)"""
+    job = encolar_reporte(request.user, tipo, parametros)
+    if job.estado == 'completado':
+        return redirect('administracion:descargar_reporte', job_id=job.pk)
+    return redirect('administracion:estado_reporte', job_id=job.pk)
+
+
+def reclamar_pendientes(limite):
+    """
+    Pasa a 'procesando' hasta ``limite`` trabajos pendientes y devuelve sus ids.
+    El UPDATE condicionado al estado evita que dos workers tomen el mismo.
+    """
+    candidatos = ReporteJob.objects.filter(estado='pendiente').order_by('fecha_creacion').values_list('id', flat=True)[:limite]
+    reclamados = []
+    for job_id in candidatos:
+        tomado = ReporteJob.objects.filter(pk=job_id, estado='pendiente').update(
+            estado='procesando',
+            fecha_inicio=timezone.now()
+        )
+        if tomado:
+            reclamados.append(job_id)
+    return reclamados
+
+
+def liberar_atascados(minutos):
+    """Devuelve a la cola los trabajos que llevan demasiado tiempo en 'procesando'"""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return ReporteJob.objects.filter(estado='procesando', fecha_inicio__lt=limite).update(estado='pendiente')
+
+
+def procesar_job(job_id):
+    """Genera el archivo de un trabajo y guarda el resultado. Devuelve el estado final."""
+    job = ReporteJob.objects.select_related('solicitado_por').get(pk=job_id)
+    if job.fecha_inicio is None:
+        job.fecha_inicio = timezone.now()
+
+    try:
+        nombre, contenido = GENERADORES[job.tipo](job.parametros, job.solicitado_por)
+        job.nombre_archivo = nombre
+        job.archivo.save(f'{job.pk}_{nombre}', ContentFile(contenido), save=False)
+        job.estado = 'completado'
+        job.error = ''
+    except Exception as e:
+        logger.exception('Error generando el reporte %s', job_id)
+        job.estado = 'error'
+        job.error = str(e)
+
+    job.fecha_fin = timezone.now()
+    job.save()
+    return job.estado
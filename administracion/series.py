@@ -0,0 +1,104 @@
+"""
+Series temporales agregadas para gráficos y estadísticas.
+
+Cada serie se obtiene con una única consulta ``GROUP BY`` sobre la fecha
+truncada (día, semana o mes) y luego se rellena con ceros en Python, de modo
+que el número de consultas no depende de la cantidad de días solicitados.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import ExtractIsoWeekDay, TruncDate, TruncMonth, TruncWeek
+
+ESTADOS_VENTA = ['entregada', 'enviada', 'en_proceso']
+
+DIAS_SEMANA = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+
+_TRUNCADORES = {
+    'dia': lambda campo: TruncDate(campo),
+    'semana': lambda campo: TruncWeek(campo, output_field=DateField()),
+    'mes': lambda campo: TruncMonth(campo, output_field=DateField()),
+}
+
+
+def _inicio_periodo(fecha, periodo):
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _siguiente_periodo(fecha, periodo):
+    if periodo == 'semana':
+        return fecha + timedelta(weeks=1)
+    if periodo == 'mes':
+        if fecha.month == 12:
+            return date(fecha.year + 1, 1, 1)
+        return date(fecha.year, fecha.month + 1, 1)
+    return fecha + timedelta(days=1)
+
+
+def serie_temporal(queryset, campo_fecha, desde, hasta, periodo='dia', valor=None):
+    """
+    Agrega ``queryset`` por día, semana o mes entre ``desde`` y ``hasta``
+    (ambos inclusive) y devuelve una lista de ``{'periodo': date, 'total': n}``
+    sin huecos. ``valor`` es la agregación a aplicar (por defecto Count('id')).
+    """
+    if periodo not in _TRUNCADORES:
+        raise ValueError(f'Periodo no soportado: {periodo}')
+
+    valor = valor if valor is not None else Count('id')
+    inicio = _inicio_periodo(desde, periodo)
+    filas = (
+        queryset
+        .filter(**{f'{campo_fecha}__date__range': (inicio, hasta)})
+        .annotate(periodo=_TRUNCADORES[periodo](campo_fecha))
+        .values('periodo')
+        .annotate(total=valor)
+        .order_by('periodo')
+    )
+    totales = {fila['periodo']: fila['total'] or 0 for fila in filas}
+
+    serie = []
+    actual = inicio
+    while actual <= hasta:
+        serie.append({'periodo': actual, 'total': totales.get(actual, 0)})
+        actual = _siguiente_periodo(actual, periodo)
+    return serie
+
+
+def serie_citas(desde, hasta, periodo='dia'):
+    """Cantidad de citas por periodo"""
+    from citas.models import Cita
+    return serie_temporal(Cita.objects.all(), 'fecha', desde, hasta, periodo)
+
+
+def serie_ventas(desde, hasta, periodo='dia'):
+    """Total vendido en la tienda por periodo (solo órdenes efectivas)"""
+    from tienda.models import Orden
+    return serie_temporal(
+        Orden.objects.filter(estado__in=ESTADOS_VENTA),
+        'fecha_creacion', desde, hasta, periodo,
+        valor=Sum('total')
+    )
+
+
+def promedio_por_dia_semana(queryset, campo_fecha, desde, semanas):
+    """
+    Promedio de registros por día de la semana (lunes a domingo) desde
+    ``desde``, dividiendo entre ``semanas``. Una sola consulta agrupada.
+    """
+    filas = (
+        queryset
+        .filter(**{f'{campo_fecha}__date__gte': desde})
+        .annotate(dia_semana=ExtractIsoWeekDay(campo_fecha))
+        .values('dia_semana')
+        .annotate(total=Count('id'))
+        .order_by('dia_semana')
+    )
+    totales = {fila['dia_semana']: fila['total'] for fila in filas}
+    return [
+        {'dia': nombre, 'promedio': round(totales.get(i + 1, 0) / semanas, 1)}
+        for i, nombre in enumerate(DIAS_SEMANA)
+    ]
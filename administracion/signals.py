@@ -0,0 +1,58 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from clientes.models import Cliente
+from mascotas.models import Mascota
+from tienda.models import Orden
+from notificaciones.models import Notificacion
+from .metricas import aplicar_delta
+
+@receiver(post_save, sender=Cliente)
+def sumar_cliente_metricas(sender, instance, created, **kwargs):
+    """Actualizar el total de clientes del snapshot al registrar un cliente"""
+    if created:
+        aplicar_delta('total_clientes', 1)
+
+@receiver(post_delete, sender=Cliente)
+def restar_cliente_metricas(sender, instance, **kwargs):
+    aplicar_delta('total_clientes', -1)
+
+@receiver(post_save, sender=Mascota)
+def sumar_mascota_metricas(sender, instance, created, **kwargs):
+    """Actualizar el total de mascotas del snapshot al registrar una mascota"""
+    if created:
+        aplicar_delta('total_mascotas', 1)
+
+@receiver(post_delete, sender=Mascota)
+def restar_mascota_metricas(sender, instance, **kwargs):
+    aplicar_delta('total_mascotas', -1)
+
+@receiver(post_save, sender=User)
+def sumar_usuario_metricas(sender, instance, created, **kwargs):
+    """Actualizar el total de usuarios del snapshot al crear un usuario"""
+    if created:
+        aplicar_delta('total_usuarios', 1)
+
+@receiver(post_delete, sender=User)
+def restar_usuario_metricas(sender, instance, **kwargs):
+    aplicar_delta('total_usuarios', -1)
+
+@receiver(post_save, sender=Orden)
+def sumar_orden_metricas(sender, instance, created, **kwargs):
+    """Actualizar el total de órdenes del snapshot al crear una orden"""
+    if created:
+        aplicar_delta('total_ordenes', 1)
+
+@receiver(post_delete, sender=Orden)
+def restar_orden_metricas(sender, instance, **kwargs):
+    aplicar_delta('total_ordenes', -1)
+
+@receiver(post_save, sender=Notificacion)
+def sumar_notificacion_metricas(sender, instance, created, **kwargs):
+    """Actualizar el total de notificaciones del snapshot al crear una notificación"""
+    if created:
+        aplicar_delta('total_notificaciones', 1)
+
+@receiver(post_delete, sender=Notificacion)
+def restar_notificacion_metricas(sender, instance, **kwargs):
+    aplicar_delta('total_notificaciones', -1)
@@ -33,4 +33,441 @@ class AdministracionTestCase(TestCase):
     
     def test_dashboard_sin_autenticar(self):
         response = self.client.get(reverse('administracion:dashboard_admin'))
-        self.assertEqual(response.status_code, 302)  # Redirección a login
\ No newline at end of file
+        self.assertEqual(response.status_code, 302)  # Redirección a login
+
+class MetricasSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(
+            username='admin',
+            password='admin123',
+            is_staff=True
+        )
+
+    def test_snapshot_se_crea_al_consultar(self):
+        from administracion.metricas import obtener_snapshot
+
+        snapshot = obtener_snapshot()
+        self.assertIsNotNone(snapshot.actualizado_en)
+        self.assertEqual(snapshot.total_usuarios, 1)
+        self.assertEqual(len(snapshot.graficos['citas_ultimos_7_dias']), 7)
+
+    def test_snapshot_vigente_no_recalcula(self):
+        from administracion.metricas import obtener_snapshot, refrescar_snapshot
+
+        refrescar_snapshot()
+        with self.assertNumQueries(1):
+            obtener_snapshot(max_edad=3600)
+
+    def test_delta_incremental_al_crear_usuario(self):
+        from administracion.metricas import obtener_snapshot
+
+        obtener_snapshot()
+        User.objects.create_user(username='nuevo', password='nuevo123')
+        self.assertEqual(obtener_snapshot(max_edad=3600).total_usuarios, 2)
+
+    def test_snapshot_obsoleto_se_recalcula(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from administracion.metricas import obtener_snapshot, refrescar_snapshot
+        from administracion.models import MetricasSnapshot
+
+        refrescar_snapshot()
+        antiguo = timezone.now() - timedelta(hours=1)
+        MetricasSnapshot.objects.update(actualizado_en=antiguo)
+        self.assertGreater(obtener_snapshot(max_edad=60).actualizado_en, antiguo)
+
+    def test_snapshot_obsoleto_en_recalculo_se_sirve_sin_recalcular(self):
+        from datetime import timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        from administracion.metricas import CANDADO_REFRESCO, obtener_snapshot, refrescar_snapshot
+        from administracion.models import MetricasSnapshot
+
+        refrescar_snapshot()
+        antiguo = timezone.now() - timedelta(hours=1)
+        MetricasSnapshot.objects.update(actualizado_en=antiguo)
+        # Otra petición tiene el candado: esta muestra el snapshot que hay
+        cache.set(CANDADO_REFRESCO, True)
+        try:
+            with self.assertNumQueries(1):
+                self.assertEqual(obtener_snapshot(max_edad=60).actualizado_en, antiguo)
+        finally:
+            cache.delete(CANDADO_REFRESCO)
+        self.assertGreater(obtener_snapshot(max_edad=60).actualizado_en, antiguo)
+
+    def test_dashboard_muestra_fecha_snapshot(self):
+        self.client.login(username='admin', password='admin123')
+        response = self.client.get(reverse('administracion:dashboard_admin'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('metricas_actualizadas', response.context)
+
+
+class ActividadUsuarioTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.usuario = User.objects.create_user(username='activo', password='clave123')
+        self.client.login(username='activo', password='clave123')
+
+    def _escrituras_actividad(self, url, veces):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            for _ in range(veces):
+                self.client.get(url)
+        return [q['sql'] for q in consultas.captured_queries if 'administracion_actividadusuario' in q['sql']]
+
+    def test_una_escritura_por_intervalo(self):
+        from administracion.models import ActividadUsuario
+
+        escrituras = self._escrituras_actividad(reverse('notificaciones:estado_widgets'), 5)
+        self.assertEqual(len(escrituras), 2)  # UPDATE sin filas + INSERT de la primera petición
+        self.assertTrue(ActividadUsuario.objects.filter(usuario=self.usuario).exists())
+
+        # Vencido el intervalo se vuelve a registrar con un solo UPDATE
+        from django.core.cache import cache
+        cache.clear()
+        escrituras = self._escrituras_actividad(reverse('notificaciones:estado_widgets'), 3)
+        self.assertEqual(len(escrituras), 1)
+        self.assertTrue(escrituras[0].startswith('UPDATE'))
+
+    def test_usuarios_activos_24h_cuenta_por_indice(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from administracion.actividad import usuarios_activos_24h
+        from administracion.models import ActividadUsuario
+
+        ahora = timezone.now()
+        otro = User.objects.create_user(username='ausente', password='clave123')
+        ActividadUsuario.objects.create(usuario=self.usuario, ultima_actividad=ahora - timedelta(hours=2))
+        ActividadUsuario.objects.create(usuario=otro, ultima_actividad=ahora - timedelta(days=3))
+        with self.assertNumQueries(1):
+            self.assertEqual(usuarios_activos_24h(ahora), 1)
+
+
+class RenovacionSesionTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='sesion', password='clave123')
+        self.client.login(username='sesion', password='clave123')
+
+    def _escrituras_sesion(self, url, veces):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            for _ in range(veces):
+                self.client.get(url)
+        return [
+            q['sql'] for q in consultas.captured_queries
+            if 'django_session' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE'))
+        ]
+
+    def test_sondeo_no_reescribe_la_sesion(self):
+        url = reverse('notificaciones:estado_widgets')
+        self.assertEqual(len(self._escrituras_sesion(url, 20)), 1)  # la primera fija el vencimiento
+        self.assertEqual(self._escrituras_sesion(url, 20), [])
+
+    def test_renueva_cuando_queda_poco_tiempo(self):
+        import time
+        from django.conf import settings
+        from veterinaria_project.middleware import RenovarSesionMiddleware
+
+        url = reverse('notificaciones:estado_widgets')
+        self._escrituras_sesion(url, 1)
+        sesion = self.client.session
+        sesion[RenovarSesionMiddleware.CLAVE] = int(time.time()) + 3600
+        sesion.save()
+
+        self.assertEqual(len(self._escrituras_sesion(url, 5)), 1)
+        vence = self.client.session[RenovarSesionMiddleware.CLAVE]
+        self.assertGreater(vence, int(time.time()) + settings.SESSION_COOKIE_AGE - 60)
+
+    def test_visitante_anonimo_no_crea_sesion(self):
+        self.client.logout()
+        self.assertEqual(self._escrituras_sesion('/', 3), [])
+
+
+class SeriesTemporalesTestCase(TestCase):
+    def setUp(self):
+        from decimal import Decimal
+        from django.utils import timezone
+        from tienda.models import Orden
+
+        self.staff_user = User.objects.create_user(
+            username='admin',
+            password='admin123',
+            is_staff=True
+        )
+        self.hoy = timezone.localdate()
+        orden = Orden.objects.create(
+            usuario=self.staff_user,
+            numero_orden='ORD-SERIE-1',
+            estado='entregada',
+            subtotal=Decimal('100.00'),
+            total=Decimal('100.00'),
+            direccion_envio='Calle 1'
+        )
+        Orden.objects.create(
+            usuario=self.staff_user,
+            numero_orden='ORD-SERIE-2',
+            estado='cancelada',
+            subtotal=Decimal('50.00'),
+            total=Decimal('50.00'),
+            direccion_envio='Calle 1'
+        )
+        self.orden = orden
+
+    def test_serie_rellena_dias_sin_datos(self):
+        from datetime import timedelta
+        from administracion.series import serie_ventas
+
+        serie = serie_ventas(self.hoy - timedelta(days=6), self.hoy)
+        self.assertEqual(len(serie), 7)
+        self.assertEqual(serie[-1]['periodo'], self.hoy)
+        self.assertEqual(float(serie[-1]['total']), 100.0)
+        self.assertEqual(sum(float(p['total']) for p in serie[:-1]), 0)
+
+    def test_serie_una_consulta_sin_importar_el_rango(self):
+        from datetime import timedelta
+        from administracion.series import serie_citas
+
+        with self.assertNumQueries(1):
+            serie_citas(self.hoy - timedelta(days=6), self.hoy)
+        with self.assertNumQueries(1):
+            serie = serie_citas(self.hoy - timedelta(days=364), self.hoy)
+        self.assertEqual(len(serie), 365)
+
+    def test_serie_por_mes(self):
+        from datetime import timedelta
+        from administracion.series import serie_ventas
+
+        serie = serie_ventas(self.hoy - timedelta(days=90), self.hoy, periodo='mes')
+        self.assertTrue(all(p['periodo'].day == 1 for p in serie))
+        self.assertEqual(float(serie[-1]['total']), 100.0)
+
+    def test_estadisticas_api_consultas_constantes(self):
+        self.client.login(username='admin', password='admin123')
+        url = reverse('administracion:estadisticas_api')
+        self.client.get(url)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(len(datos['citas_30_dias']), 30)
+        self.assertEqual(len(datos['citas_semana']), 7)
+        self.assertEqual(datos['ventas_30_dias'][-1]['total'], 100.0)
+        # 3 series agrupadas + 4 distribuciones + sesión/usuario; antes eran 67+
+        self.assertLess(len(consultas), 15)
+
+
+class ExportacionStreamingTestCase(TestCase):
+    def setUp(self):
+        from clientes.models import Cliente
+
+        self.staff_user = User.objects.create_user(
+            username='admin',
+            password='admin123',
+            is_staff=True
+        )
+        for i in range(5):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='x')
+            Cliente.objects.get_or_create(usuario=usuario)
+        self.client.login(username='admin', password='admin123')
+
+    def _contenido(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_exportar_excel_write_only(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse('administracion:exportar_datos') + '?formato=excel')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        libro = load_workbook(BytesIO(self._contenido(response)), read_only=True)
+        self.assertIn('Resumen', libro.sheetnames)
+        filas = list(libro['Todos los Clientes'].iter_rows(values_only=True))
+        # título + encabezado + registros + fila en blanco
+        self.assertEqual(filas[1][0], 'ID')
+        self.assertEqual(len([f for f in filas[2:] if f and f[0] is not None]), 5)
+
+    def test_exportar_csv_zip_streaming(self):
+        import zipfile
+        from io import BytesIO
+
+        response = self.client.get(reverse('administracion:exportar_datos') + '?formato=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archivo = zipfile.ZipFile(BytesIO(self._contenido(response)))
+        self.assertIn('Todos los Clientes.csv', archivo.namelist())
+        lineas = archivo.read('Todos los Clientes.csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 6)
+
+    def test_anchos_calculados_con_muestra(self):
+        from administracion.exportacion import _anchos_columnas
+
+        anchos = _anchos_columnas([['ID', 'Nombre'], [1, 'x' * 100]])
+        self.assertEqual(anchos[1], 4)
+        self.assertEqual(anchos[2], 40)
+
+
+class ReporteJobTestCase(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        from clientes.models import Cliente
+        from mascotas.models import Mascota
+
+        self._media = tempfile.TemporaryDirectory()
+        self._override = override_settings(MEDIA_ROOT=self._media.name, REPORTES_EN_SEGUNDO_PLANO=True)
+        self._override.enable()
+
+        self.staff_user = User.objects.create_user(
+            username='admin',
+            password='admin123',
+            is_staff=True
+        )
+        self.dueno = User.objects.create_user(username='dueno', password='dueno123')
+        cliente, _ = Cliente.objects.get_or_create(
+            usuario=self.dueno,
+            defaults={'telefono': '3001234567', 'direccion': 'Calle 1'}
+        )
+        self.mascota = Mascota.objects.create(nombre='Firulais', tipo='perro', sexo='macho', cliente=cliente)
+
+    def tearDown(self):
+        self._override.disable()
+        self._media.cleanup()
+
+    def test_exportar_pdf_encola_y_redirige(self):
+        from administracion.models import ReporteJob
+
+        self.client.login(username='admin', password='admin123')
+        response = self.client.get(reverse('administracion:exportar_datos') + '?formato=pdf')
+        job = ReporteJob.objects.get()
+        self.assertEqual(job.estado, 'pendiente')
+        self.assertRedirects(response, reverse('administracion:estado_reporte', args=[job.pk]))
+
+        estado = self.client.get(reverse('administracion:estado_reporte_api', args=[job.pk])).json()
+        self.assertFalse(estado['terminado'])
+
+    def test_worker_genera_archivo_y_descarga(self):
+        from django.core.management import call_command
+        from administracion.models import ReporteJob
+
+        self.client.login(username='dueno', password='dueno123')
+        self.client.get(reverse('mascotas:descargar_carnet_pdf', args=[self.mascota.pk]))
+        job = ReporteJob.objects.get()
+
+        call_command('procesar_reportes', workers=0, una_vez=True, stdout=open('/dev/null', 'w'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.estado, 'completado')
+        self.assertTrue(job.archivo.name.startswith('reportes/'))
+        estado = self.client.get(reverse('administracion:estado_reporte_api', args=[job.pk])).json()
+        self.assertEqual(estado['url_descarga'], reverse('administracion:descargar_reporte', args=[job.pk]))
+
+        response = self.client.get(estado['url_descarga'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_reporte_ajeno_no_visible(self):
+        from administracion.reportes import encolar_reporte
+
+        job = encolar_reporte(self.staff_user, 'reporte_admin_pdf')
+        self.client.login(username='dueno', password='dueno123')
+        response = self.client.get(reverse('administracion:estado_reporte', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_error_de_generacion_queda_registrado(self):
+        from administracion.reportes import encolar_reporte, procesar_job
+
+        job = encolar_reporte(self.staff_user, 'carnet_vacunacion', {'mascota_id': 999999})
+        self.assertEqual(procesar_job(job.pk), 'error')
+        job.refresh_from_db()
+        self.assertTrue(job.error)
+
+
+class ExportacionConsultasTestCase(TestCase):
+    """Cada hoja del reporte se construye con un número fijo de consultas"""
+
+    # Consultas esperadas por hoja, independientes del número de registros
+    CONSULTAS_POR_HOJA = {
+        'Estadísticas Generales': 6,
+        'Estadísticas del Mes': 3,
+    }
+
+    def setUp(self):
+        from django.utils import timezone
+        from administracion.exportacion import HOJAS_REPORTE, TABLAS_RESUMEN
+
+        self.hoy = timezone.localdate()
+        self.hojas = TABLAS_RESUMEN + HOJAS_REPORTE
+        self.staff_user = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self._crear_datos(3)
+
+    def _crear_datos(self, cantidad):
+        from decimal import Decimal
+        from django.utils import timezone
+        from clientes.models import Cliente
+        from mascotas.models import Mascota
+        from citas.models import Cita
+        from tienda.models import Categoria, Producto, Orden, ItemOrden
+        from notificaciones.models import Notificacion
+
+        categoria = Categoria.objects.create(nombre=f'Categoría {Categoria.objects.count()}')
+        for _ in range(cantidad):
+            n = User.objects.count()
+            usuario = User.objects.create_user(username=f'cliente{n}', password='x', first_name='Ana')
+            cliente, _ = Cliente.objects.get_or_create(
+                usuario=usuario, defaults={'telefono': '300', 'direccion': 'Calle 1'}
+            )
+            mascota = Mascota.objects.create(nombre=f'Mascota {n}', tipo='gato', sexo='hembra', cliente=cliente)
+            Cita.objects.create(mascota=mascota, fecha=timezone.now(), tipo='consulta', motivo='Control')
+            producto = Producto.objects.create(
+                nombre=f'Producto {n}', descripcion='-', precio=Decimal('10.00'),
+                categoria=categoria, stock=1
+            )
+            orden = Orden.objects.create(
+                usuario=usuario, numero_orden=f'ORD-{n}', subtotal=Decimal('20.00'),
+                total=Decimal('20.00'), direccion_envio='Calle 1'
+            )
+            for _ in range(2):
+                ItemOrden.objects.create(
+                    orden=orden, producto=producto, cantidad=1,
+                    precio=Decimal('10.00'), subtotal=Decimal('10.00')
+                )
+            Notificacion.objects.create(cliente=cliente, titulo='Hola', mensaje='Mensaje')
+
+    def _medir(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        consultas = {}
+        for nombre, filas in self.hojas:
+            with CaptureQueriesContext(connection) as capturadas:
+                list(filas(self.hoy))
+            consultas[nombre] = len(capturadas)
+        return consultas
+
+    def test_consultas_fijas_por_hoja(self):
+        for nombre, total in self._medir().items():
+            with self.subTest(hoja=nombre):
+                self.assertEqual(total, self.CONSULTAS_POR_HOJA.get(nombre, 1))
+
+    def test_consultas_no_crecen_con_los_registros(self):
+        antes = self._medir()
+        self._crear_datos(5)
+        self.assertEqual(self._medir(), antes)
+
+    def test_conteo_de_productos_por_orden(self):
+        from administracion.exportacion import filas_ordenes
+
+        filas = list(filas_ordenes(self.hoy))
+        self.assertEqual(filas[0][-1], 'Productos')
+        self.assertTrue(all(fila[-1] == 2 for fila in filas[1:]))
@@ -16,6 +16,7 @@ urlpatterns = [
     # Gestión de notificaciones
     path('notificaciones/', administrador_required(views.gestion_notificaciones), name='gestion_notificaciones'),
     path('notificaciones/crear/', administrador_required(views.crear_notificacion), name='crear_notificacion'),
+    path('notificaciones/envios/<int:envio_id>/estado/', administrador_required(views.estado_envio_masivo_api), name='estado_envio_masivo_api'),
 
     # Gestión de usuarios
     path('usuarios/', administrador_required(views.gestionar_usuarios), name='gestion_usuarios'),
@@ -28,6 +29,11 @@ urlpatterns = [
     # Plantillas de carnets
     path('plantillas-carnets/', administrador_required(views.descargar_plantillas_carnets), name='descargar_plantillas_carnets'),
 
+    # Reportes generados en segundo plano
+    path('reportes/<int:job_id>/', views.estado_reporte, name='estado_reporte'),
+    path('reportes/<int:job_id>/estado/', views.estado_reporte_api, name='estado_reporte_api'),
+    path('reportes/<int:job_id>/descargar/', views.descargar_reporte, name='descargar_reporte'),
+
     # Asignación de veterinarios
     path('asignar-veterinario/', administrador_required(views.asignar_veterinario), name='asignar_veterinario'),
     path('asignar-veterinario-mascota/<int:mascota_id>/', administrador_required(views.asignar_veterinario_mascota_page), name='asignar_veterinario_mascota_page'),
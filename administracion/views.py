@@ -1,12 +1,11 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from datetime import timedelta, datetime, date
-from django.db.models import Count, Q, Sum, F, Value
-from django.db.models.functions import Coalesce, Concat
-from django.db.models import Value
+from django.db.models import Count, Q, F
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django import forms
 import csv
 import json
@@ -16,12 +15,20 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
+from busqueda.indice import buscar
 from clientes.models import Cliente
+from .models import ReporteJob
 from mascotas.models import Mascota
 from citas.models import Cita
 from tienda.models import Producto, Categoria, Orden
 from django.contrib.auth.models import User
-from notificaciones.models import Notificacion, Recordatorio
+from notificaciones.masivas import registrar_envio
+from notificaciones.models import Notificacion, NotificacionMasiva
+from . import exportacion
+from .metricas import obtener_snapshot
+from veterinaria_project.modelos import RegistroDesactualizado
+from .reportes import responder_con_reporte
+from .series import promedio_por_dia_semana, serie_citas, serie_ventas
 
 def staff_required(login_url=None):
     return user_passes_test(lambda u: u.is_staff, login_url=login_url)
@@ -32,92 +39,13 @@ def veterinario_required(login_url=None):
 def dashboard(request):
     hoy = timezone.now().date()
 
-    # ESTADÍSTICAS EXISTENTES
-    total_clientes = Cliente.objects.count()
-    total_mascotas = Mascota.objects.count()
-    total_usuarios = User.objects.count()
-
-    # ESTADÍSTICAS DE ACTIVIDAD DE USUARIOS
-    from django.contrib.sessions.models import Session
-    import datetime
-
-    # Usuarios activos (con sesiones activas en las últimas 24 horas)
-    sesiones_activas = Session.objects.filter(expire_date__gte=timezone.now())
-    usuarios_activos_24h = set()
-
-    for session in sesiones_activas:
-        try:
-            session_data = session.get_decoded()
-            user_id = session_data.get('_auth_user_id')
-            if user_id:
-                usuarios_activos_24h.add(int(user_id))
-        except:
-            continue
-
-    usuarios_activos_count = len(usuarios_activos_24h)
-
-    # Usuarios que iniciaron sesión en los últimos 7 días
-    usuarios_recientes = User.objects.filter(
-        last_login__gte=timezone.now() - datetime.timedelta(days=7)
-    ).count()
-
-    # Usuarios que nunca han iniciado sesión
-    usuarios_sin_login = User.objects.filter(last_login__isnull=True).count()
+    # ESTADÍSTICAS PRECALCULADAS (una sola fila, ver administracion.metricas)
+    metricas = obtener_snapshot()
+    graficos = metricas.graficos
 
     # Lista de usuarios recientes para mostrar en la tabla
     usuarios_recientes_list = User.objects.order_by('-last_login')[:10]
     
-    # Citas
-    citas_hoy = Cita.objects.filter(
-        fecha__date=hoy,
-        estado__in=['programada', 'confirmada']
-    ).select_related('mascota__cliente__usuario').order_by('fecha')
-
-    citas_mes = Cita.objects.filter(
-        fecha__date__month=hoy.month,
-        fecha__date__year=hoy.year
-    ).count()
-
-    citas_completadas_mes = Cita.objects.filter(
-        fecha__date__month=hoy.month,
-        fecha__date__year=hoy.year,
-        estado='completada'
-    ).count()
-    
-    # Clientes
-    clientes_nuevos_mes = Cliente.objects.filter(
-        fecha_registro__month=hoy.month,
-        fecha_registro__year=hoy.year
-    ).count()
-    
-    # Ingresos (asumiendo que tienes campo precio en Cita)
-    try:
-        ingresos_mes = Cita.objects.filter(
-            fecha__date__month=hoy.month,
-            fecha__date__year=hoy.year,
-            estado='completada'
-        ).aggregate(total=Sum('precio'))['total'] or 0
-    except:
-        ingresos_mes = 0
-    
-    # NUEVAS ESTADÍSTICAS DE LA TIENDA
-    total_productos = Producto.objects.filter(activo=True).count()
-    total_categorias = Categoria.objects.filter(activo=True).count()
-    total_ordenes = Orden.objects.count()
-    
-    # Estadísticas de ventas de la tienda
-    try:
-        ventas_mes_tienda = Orden.objects.filter(
-            fecha_creacion__month=hoy.month,
-            fecha_creacion__year=hoy.year,
-            estado__in=['entregada', 'enviada', 'en_proceso']
-        ).aggregate(total=Sum('total'))['total'] or 0
-    except:
-        ventas_mes_tienda = 0
-    
-    ordenes_pendientes = Orden.objects.filter(estado='pendiente').count()
-    productos_stock_bajo = Producto.objects.filter(stock__lte=F('stock_minimo'), activo=True).count()
-    
     # Órdenes recientes (para el resumen)
     ordenes_recientes = Orden.objects.select_related('usuario').order_by('-fecha_creacion')[:5]
 
@@ -156,12 +84,7 @@ def dashboard(request):
 
     # Filtro por búsqueda
     if orden_busqueda:
-        ordenes_query = ordenes_query.filter(
-            Q(numero_orden__icontains=orden_busqueda) |
-            Q(usuario__username__icontains=orden_busqueda) |
-            Q(usuario__first_name__icontains=orden_busqueda) |
-            Q(usuario__last_name__icontains=orden_busqueda)
-        )
+        ordenes_query = ordenes_query.filter(pk__in=buscar('orden', orden_busqueda))
 
     # Órdenes para gestión (con filtros aplicados)
     ordenes_gestion = ordenes_query.order_by('-fecha_creacion')[:50]
@@ -193,11 +116,7 @@ def dashboard(request):
         productos_query = productos_query.filter(stock=0)
 
     if busqueda:
-        productos_query = productos_query.filter(
-            Q(nombre__icontains=busqueda) |
-            Q(descripcion__icontains=busqueda) |
-            Q(categoria__nombre__icontains=busqueda)
-        )
+        productos_query = productos_query.filter(pk__in=buscar('producto', busqueda))
 
     # Productos para gestión (con filtros aplicados)
     productos_gestion = productos_query[:50]  # Limitar a 50 para rendimiento
@@ -208,81 +127,16 @@ def dashboard(request):
         activo=True
     ).order_by('stock')[:5]
     
-    # DATOS PARA GRÁFICOS EXISTENTES
-    # Citas por estado
-    citas_por_estado = list(Cita.objects.values('estado').annotate(
-        total=Count('id')
-    ).order_by('-total'))
-    
-    # Mascotas por tipo
-    mascotas_por_tipo = list(Mascota.objects.values('tipo').annotate(
-        total=Count('id')
-    ).order_by('-total'))
-    
-    # Citas últimos 7 días
-    citas_ultimos_7_dias = []
-    for i in range(6, -1, -1):
-        dia = hoy - timedelta(days=i)
-        count = Cita.objects.filter(fecha__date=dia).count()
-        citas_ultimos_7_dias.append({
-            'dia': dia.strftime('%d/%m'),
-            'total': count
-        })
-    
-    # NUEVOS DATOS PARA GRÁFICOS DE TIENDA
-    # Productos por categoría
-    productos_por_categoria = list(Producto.objects.filter(activo=True).annotate(
-        categoria_nombre=Coalesce('categoria__nombre', Value('SIN CATEGORÍA'))
-    ).values('categoria_nombre').annotate(total=Count('id')).order_by('-total'))
-    
-    # Órdenes por estado
-    ordenes_por_estado = list(Orden.objects.values('estado').annotate(
-        total=Count('id')
-    ).order_by('-total'))
-    
-    # Ventas últimos 7 días (tienda)
-    ventas_ultimos_7_dias = []
-    for i in range(6, -1, -1):
-        dia = hoy - timedelta(days=i)
-        ventas_dia = Orden.objects.filter(
-            fecha_creacion__date=dia,
-            estado__in=['entregada', 'enviada', 'en_proceso']
-        ).aggregate(total=Sum('total'))['total'] or 0
-        ventas_ultimos_7_dias.append({
-            'dia': dia.strftime('%d/%m'),
-            'total': float(ventas_dia)
-        })
-    
     # Próximas citas
     proximas_citas = Cita.objects.filter(
         fecha__date__gte=hoy,
         estado__in=['programada', 'confirmada']
     ).select_related('mascota__cliente__usuario').order_by('fecha')[:10]
-    
-    # Citas urgentes
-    citas_urgentes = Cita.objects.filter(
-        fecha__date=hoy,
-        tipo='urgencia',
-        estado__in=['programada', 'confirmada']
-    ).count()
 
     # Cálculo de cumplimiento de citas
     cumplimiento_citas = 0
-    if citas_mes > 0:
-        cumplimiento_citas = round((citas_completadas_mes / citas_mes) * 100)
-
-    # ESTADÍSTICAS DE NOTIFICACIONES
-    total_notificaciones = Notificacion.objects.count()
-    notificaciones_no_leidas = Notificacion.objects.filter(leida=False).count()
-    notificaciones_ultima_semana = Notificacion.objects.filter(
-        fecha_creacion__date__gte=hoy - timedelta(days=7)
-    ).count()
-    recordatorios_activos = Recordatorio.objects.filter(activo=True).count()
-    recordatorios_pendientes = Recordatorio.objects.filter(
-        activo=True,
-        enviado=False,
-        fecha_recordatorio__date__gte=hoy
-    ).count()
+    if metricas.citas_mes > 0:
+        cumplimiento_citas = round((metricas.citas_completadas_mes / metricas.citas_mes) * 100)
 
     # FILTROS PARA GESTIÓN DE CITAS
     cita_busqueda = request.GET.get('cita_busqueda', '')
@@ -319,13 +173,7 @@ def dashboard(request):
 
     # Filtro por búsqueda
     if cita_busqueda:
-        citas_query = citas_query.filter(
-            Q(mascota__nombre__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__first_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__last_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__username__icontains=cita_busqueda) |
-            Q(tipo__icontains=cita_busqueda)
-        )
+        citas_query = citas_query.filter(pk__in=buscar('cita', cita_busqueda))
 
     # Citas filtradas para gestión (ordenadas por fecha)
     citas_gestion = citas_query.order_by('fecha')[:50]
@@ -338,25 +186,12 @@ def dashboard(request):
         mascotas_query = mascotas_query.filter(tipo=tipo_filtro)
 
     if cliente_filtro:
-        mascotas_query = mascotas_query.filter(
-            Q(cliente__usuario__username__icontains=cliente_filtro) |
-            Q(cliente__usuario__first_name__icontains=cliente_filtro) |
-            Q(cliente__usuario__last_name__icontains=cliente_filtro)
-        )
+        mascotas_query = mascotas_query.filter(cliente_id__in=buscar('cliente', cliente_filtro))
 
     if busqueda:
-        mascotas_query = mascotas_query.filter(
-            Q(nombre__icontains=busqueda) |
-            Q(raza__icontains=busqueda) |
-            Q(color__icontains=busqueda)
-        )
+        mascotas_query = mascotas_query.filter(pk__in=buscar('mascota', busqueda))
 
-    # Estadísticas específicas para la pestaña de mascotas (antes del slice)
-    total_mascotas_mostradas = mascotas_query.count()
-    mascotas_sin_asignar = mascotas_query.filter(veterinario_asignado__isnull=True).count()
-    mascotas_asignadas = mascotas_query.filter(veterinario_asignado__isnull=False).count()
-
-    # Mascotas para gestión (después de calcular estadísticas)
+    # Mascotas para gestión
     mascotas_gestion = mascotas_query.order_by('-fecha_registro')[:100]
 
     # FILTROS PARA GESTIÓN DE USUARIOS
@@ -386,60 +221,36 @@ def dashboard(request):
         )
 
     if busqueda:
-        usuarios_query = usuarios_query.filter(
-            Q(username__icontains=busqueda) |
-            Q(first_name__icontains=busqueda) |
-            Q(last_name__icontains=busqueda) |
-            Q(email__icontains=busqueda)
-        )
+        usuarios_query = usuarios_query.filter(pk__in=buscar('usuario', busqueda))
 
     # Obtener usuarios
     usuarios = usuarios_query.order_by('-date_joined')[:100]
 
-    # Estadísticas de usuarios (actualizadas para considerar usuarios que nunca iniciaron sesión como inactivos)
-    usuarios_staff = User.objects.filter(is_staff=True).count()
-    usuarios_veterinarios = User.objects.filter(groups__name='Veterinarios').count()
-    usuarios_clientes = User.objects.filter(is_staff=False).exclude(groups__name='Veterinarios').count()
-    usuarios_activos = User.objects.filter(is_active=True, last_login__isnull=False).count()
-    usuarios_inactivos = User.objects.filter(
-        Q(is_active=False) | Q(last_login__isnull=True)
-    ).count()
-
-    # Estadísticas adicionales para mascotas
-    from veterinario.models import Veterinario
-    veterinarios_activos = Veterinario.objects.filter(activo=True).count()
-    mascotas_sin_veterinario = Mascota.objects.filter(veterinario_asignado__isnull=True).count()
-    mascotas_por_tipo = list(Mascota.objects.values('tipo').annotate(total=Count('id')).order_by('-total'))
-
-    # Lista de todos los veterinarios para el modal
-    veterinarios_activos_list = Veterinario.objects.all().order_by('nombre_completo')
-
-
     context = {
         # ESTADÍSTICAS EXISTENTES
-        'total_clientes': total_clientes,
-        'total_mascotas': total_mascotas,
-        'total_usuarios': total_usuarios,
+        'total_clientes': metricas.total_clientes,
+        'total_mascotas': metricas.total_mascotas,
+        'total_usuarios': metricas.total_usuarios,
 
         # ESTADÍSTICAS DE ACTIVIDAD DE USUARIOS
-        'usuarios_activos_24h': usuarios_activos_count,
-        'usuarios_recientes': usuarios_recientes,
-        'usuarios_sin_login': usuarios_sin_login,
+        'usuarios_activos_24h': metricas.usuarios_activos_24h,
+        'usuarios_recientes': metricas.usuarios_recientes,
+        'usuarios_sin_login': metricas.usuarios_sin_login,
         'usuarios_recientes_list': usuarios_recientes_list,
-        'citas_mes': citas_mes,
-        'citas_completadas_mes': citas_completadas_mes,
-        'clientes_nuevos_mes': clientes_nuevos_mes,
-        'ingresos_mes': ingresos_mes,
-        'citas_urgentes': citas_urgentes,
+        'citas_mes': metricas.citas_mes,
+        'citas_completadas_mes': metricas.citas_completadas_mes,
+        'clientes_nuevos_mes': metricas.clientes_nuevos_mes,
+        'ingresos_mes': metricas.ingresos_mes,
+        'citas_urgentes': metricas.citas_urgentes,
         'cumplimiento_citas': cumplimiento_citas,
 
         # NUEVAS ESTADÍSTICAS TIENDA
-        'total_productos': total_productos,
-        'total_categorias': total_categorias,
-        'total_ordenes': total_ordenes,
-        'ventas_mes_tienda': ventas_mes_tienda,
-        'ordenes_pendientes': ordenes_pendientes,
-        'productos_stock_bajo': productos_stock_bajo,
+        'total_productos': metricas.total_productos,
+        'total_categorias': metricas.total_categorias,
+        'total_ordenes': metricas.total_ordenes,
+        'ventas_mes_tienda': metricas.ventas_mes_tienda,
+        'ordenes_pendientes': metricas.ordenes_pendientes,
+        'productos_stock_bajo': metricas.productos_stock_bajo,
         'ordenes_recientes': ordenes_recientes,
         'productos_destacados': productos_destacados,
         'productos_bajo_stock': productos_bajo_stock,
@@ -461,18 +272,19 @@ def dashboard(request):
         'cita_periodo': cita_periodo,
 
         # DATOS PARA GRÁFICOS EXISTENTES
-        'citas_por_estado_json': json.dumps(citas_por_estado, cls=DjangoJSONEncoder),
-        'mascotas_por_tipo_json': json.dumps(mascotas_por_tipo, cls=DjangoJSONEncoder),
-        'citas_ultimos_7_dias_json': json.dumps(citas_ultimos_7_dias, cls=DjangoJSONEncoder),
+        'citas_por_estado_json': json.dumps(graficos.get('citas_por_estado', []), cls=DjangoJSONEncoder),
+        'mascotas_por_tipo_json': json.dumps(graficos.get('mascotas_por_tipo', []), cls=DjangoJSONEncoder),
+        'citas_ultimos_7_dias_json': json.dumps(graficos.get('citas_ultimos_7_dias', []), cls=DjangoJSONEncoder),
 
         # NUEVOS DATOS PARA GRÁFICOS DE TIENDA
-        'productos_por_categoria_json': json.dumps(productos_por_categoria, cls=DjangoJSONEncoder),
-        'ordenes_por_estado_json': json.dumps(ordenes_por_estado, cls=DjangoJSONEncoder),
-        'ventas_ultimos_7_dias_json': json.dumps(ventas_ultimos_7_dias, cls=DjangoJSONEncoder),
+        'productos_por_categoria_json': json.dumps(graficos.get('productos_por_categoria', []), cls=DjangoJSONEncoder),
+        'ordenes_por_estado_json': json.dumps(graficos.get('ordenes_por_estado', []), cls=DjangoJSONEncoder),
+        'ventas_ultimos_7_dias_json': json.dumps(graficos.get('ventas_ultimos_7_dias', []), cls=DjangoJSONEncoder),
 
         # FECHAS EXISTENTES
         'hoy': hoy,
         'mes_actual': hoy.strftime('%B %Y'),
+        'metricas_actualizadas': metricas.actualizado_en,
 
         # FILTROS PRODUCTOS
         'productos_gestion': productos_gestion,
@@ -493,11 +305,11 @@ def dashboard(request):
         'estados_orden': Orden.ESTADO_ORDEN,
 
         # ESTADÍSTICAS DE NOTIFICACIONES
-        'total_notificaciones': total_notificaciones,
-        'notificaciones_no_leidas': notificaciones_no_leidas,
-        'notificaciones_ultima_semana': notificaciones_ultima_semana,
-        'recordatorios_activos': recordatorios_activos,
-        'recordatorios_pendientes': recordatorios_pendientes,
+        'total_notificaciones': metricas.total_notificaciones,
+        'notificaciones_no_leidas': metricas.notificaciones_no_leidas,
+        'notificaciones_ultima_semana': metricas.notificaciones_ultima_semana,
+        'recordatorios_activos': metricas.recordatorios_activos,
+        'recordatorios_pendientes': metricas.recordatorios_pendientes,
         'notificaciones_recientes': Notificacion.objects.select_related('cliente__usuario').order_by('-fecha_creacion')[:5],
 
         # FILTROS Y DATOS PARA GESTIÓN DE USUARIOS
@@ -505,11 +317,11 @@ def dashboard(request):
         'tipo_filtro': tipo_filtro,
         'busqueda': busqueda,
         'estado_filtro': estado_filtro,
-        'usuarios_staff': usuarios_staff,
-        'usuarios_veterinarios': usuarios_veterinarios,
-        'usuarios_clientes': usuarios_clientes,
-        'usuarios_activos': usuarios_activos,
-        'usuarios_inactivos': usuarios_inactivos,
+        'usuarios_staff': metricas.usuarios_staff,
+        'usuarios_veterinarios': metricas.usuarios_veterinarios,
+        'usuarios_clientes': metricas.usuarios_clientes,
+        'usuarios_activos': metricas.usuarios_activos,
+        'usuarios_inactivos': metricas.usuarios_inactivos,
     }
     
     return render(request, 'administracion/dashboard.html', context)
@@ -526,442 +338,27 @@ def exportar_datos(request):
     generado_por = request.user.get_full_name() or request.user.username
     fecha_gen = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
 
-    # Construir datos con mejor formato
-    total_clientes = Cliente.objects.count()
-    total_mascotas = Mascota.objects.count()
-    total_usuarios = User.objects.count()
-    total_productos = Producto.objects.filter(activo=True).count()
-    total_categorias = Categoria.objects.filter(activo=True).count()
-    total_ordenes = Orden.objects.count()
-
-    stats_generales = [
-        ['Métrica', 'Valor'],
-        ['Total de Clientes', f"{total_clientes:,}"],
-        ['Total de Mascotas', f"{total_mascotas:,}"],
-        ['Total de Usuarios', f"{total_usuarios:,}"],
-        ['Total de Productos Activos', f"{total_productos:,}"],
-        ['Total de Categorías Activas', f"{total_categorias:,}"],
-        ['Total de Órdenes', f"{total_ordenes:,}"],
-    ]
-
-    # Estadísticas del mes con mejor formato
-    citas_mes_count = Cita.objects.filter(fecha__date__month=hoy.month, fecha__date__year=hoy.year).count()
-    citas_completadas_mes = Cita.objects.filter(fecha__date__month=hoy.month, fecha__date__year=hoy.year, estado='completada').count()
-    clientes_nuevos_mes = Cliente.objects.filter(fecha_registro__month=hoy.month, fecha_registro__year=hoy.year).count()
-    ventas_mes = Orden.objects.filter(fecha_creacion__month=hoy.month, fecha_creacion__year=hoy.year).aggregate(total=Sum('total'))['total'] or 0
-    ordenes_mes = Orden.objects.filter(fecha_creacion__month=hoy.month, fecha_creacion__year=hoy.year).count()
-
-    # Calcular porcentaje de cumplimiento
-    cumplimiento_pct = 0
-    if citas_mes_count > 0:
-        cumplimiento_pct = round((citas_completadas_mes / citas_mes_count) * 100, 1)
-
-    stats_mes = [
-        ['Métrica', 'Valor'],
-        ['Citas programadas este mes', f"{citas_mes_count:,}"],
-        ['Citas completadas este mes', f"{citas_completadas_mes:,}"],
-        ['Porcentaje de cumplimiento', f"{cumplimiento_pct}%"],
-        ['Clientes nuevos este mes', f"{clientes_nuevos_mes:,}"],
-        ['Ventas tienda este mes', f"${ventas_mes:,.2f}"],
-        ['Órdenes tienda este mes', f"{ordenes_mes:,}"],
-    ]
-    # Datos mejor formateados para análisis
-    citas_estado = [['Estado de Cita', 'Cantidad', 'Porcentaje']] + [
-        [e['estado'].title(), e['total'], f"{(e['total']/total_citas*100):.1f}%"]
-        for e in Cita.objects.values('estado').annotate(total=Count('id')).order_by('-total')
-    ] if (total_citas := Cita.objects.count()) > 0 else [['Estado de Cita', 'Cantidad', 'Porcentaje']]
-
-    mascotas_tipo = [['Tipo de Mascota', 'Cantidad', 'Porcentaje']] + [
-        [e['tipo'].title(), e['total'], f"{(e['total']/total_mascotas*100):.1f}%"]
-        for e in Mascota.objects.values('tipo').annotate(total=Count('id')).order_by('-total')
-    ] if total_mascotas > 0 else [['Tipo de Mascota', 'Cantidad', 'Porcentaje']]
-
-    prod_por_categoria = [['Categoría de Producto', 'Cantidad', 'Porcentaje']] + [
-        [e['categoria__nombre'] or 'Sin Categoría', e['total'], f"{(e['total']/total_productos*100):.1f}%"]
-        for e in Producto.objects.filter(activo=True).values('categoria__nombre').annotate(total=Count('id')).order_by('-total')
-    ] if total_productos > 0 else [['Categoría de Producto', 'Cantidad', 'Porcentaje']]
-
-    ordenes_estado = [['Estado de Orden', 'Cantidad', 'Porcentaje']] + [
-        [e['estado'].title(), e['total'], f"{(e['total']/total_ordenes*100):.1f}%"]
-        for e in Orden.objects.values('estado').annotate(total=Count('id')).order_by('-total')
-    ] if total_ordenes > 0 else [['Estado de Orden', 'Cantidad', 'Porcentaje']]
-    productos_bajo = [['Producto', 'Stock Actual', 'Stock Mínimo', 'Estado']]
-    for p in Producto.objects.filter(stock__lte=F('stock_minimo'), activo=True).order_by('stock'):
-        estado = "SIN STOCK" if p.stock == 0 else "STOCK BAJO"
-        productos_bajo.append([p.nombre, p.stock, p.stock_minimo, estado])
-    citas_hoy_rows = [['Hora', 'Mascota', 'Dueño', 'Tipo', 'Estado']]
-    for c in Cita.objects.filter(fecha__date=hoy).select_related('mascota__cliente__usuario'):
-        citas_hoy_rows.append([
-            c.fecha.strftime('%H:%M'),
-            c.mascota.nombre,
-            c.mascota.cliente.usuario.get_full_name() or c.mascota.cliente.usuario.username,
-            c.get_tipo_display(),
-            c.get_estado_display(),
-        ])
-    ordenes_pend_rows = [['Número Orden', 'Cliente', 'Total', 'Fecha Creación', 'Estado']]
-    for o in Orden.objects.filter(estado='pendiente').select_related('usuario').order_by('-fecha_creacion'):
-        ordenes_pend_rows.append([
-            o.numero_orden,
-            o.usuario.get_full_name() or o.usuario.username,
-            f"${float(o.total):,.2f}",
-            o.fecha_creacion.strftime('%d/%m/%Y %H:%M'),
-            o.get_estado_display()
-        ])
-
-    # Datos completos de la base de datos
-    clientes_rows = [['ID', 'Usuario', 'Nombre', 'Apellido', 'Email', 'Teléfono', 'Dirección', 'Fecha Registro']]
-    for c in Cliente.objects.select_related('usuario'):
-        clientes_rows.append([
-            c.id,
-            c.usuario.username,
-            c.usuario.first_name,
-            c.usuario.last_name,
-            c.usuario.email,
-            c.telefono or '',
-            c.direccion or '',
-            c.fecha_registro.strftime('%d/%m/%Y')
-        ])
-
-    mascotas_rows = [['ID', 'Nombre', 'Tipo', 'Raza', 'Sexo', 'Fecha Nacimiento', 'Cliente', 'Fecha Registro']]
-    for m in Mascota.objects.select_related('cliente__usuario'):
-        mascotas_rows.append([
-            m.id,
-            m.nombre,
-            m.get_tipo_display(),
-            m.raza or '',
-            m.get_sexo_display(),
-            m.fecha_nacimiento.strftime('%d/%m/%Y') if m.fecha_nacimiento else '',
-            m.cliente.usuario.get_full_name() or m.cliente.usuario.username,
-            m.fecha_registro.strftime('%d/%m/%Y')
-        ])
-
-    citas_rows = [['ID', 'Fecha', 'Mascota', 'Cliente', 'Tipo', 'Estado', 'Notas']]
-    for c in Cita.objects.select_related('mascota__cliente__usuario'):
-        citas_rows.append([
-            c.id,
-            c.fecha.strftime('%d/%m/%Y %H:%M'),
-            c.mascota.nombre,
-            c.mascota.cliente.usuario.get_full_name() or c.mascota.cliente.usuario.username,
-            c.get_tipo_display(),
-            c.get_estado_display(),
-            c.notas or ''
-        ])
-
-    productos_rows = [['ID', 'Nombre', 'Categoría', 'Precio Base', 'Precio Final', 'Stock', 'Stock Mínimo', 'Estado Stock', 'Activo', 'Destacado']]
-    for p in Producto.objects.select_related('categoria').order_by('nombre'):
-        estado_stock = "SIN STOCK" if p.stock == 0 else ("BAJO" if p.stock <= p.stock_minimo else "NORMAL")
-        productos_rows.append([
-            p.id,
-            p.nombre,
-            p.categoria.nombre if p.categoria else 'Sin Categoría',
-            f"${float(p.precio):,.2f}",
-            f"${float(p.precio_final):,.2f}",
-            p.stock,
-            p.stock_minimo,
-            estado_stock,
-            'ACTIVO' if p.activo else 'INACTIVO',
-            'DESTACADO' if p.destacado else 'NORMAL'
-        ])
-
-    ordenes_rows = [['ID', 'Número Orden', 'Cliente', 'Subtotal', 'Impuesto', 'Envío', 'Total', 'Estado', 'Fecha Creación', 'Productos']]
-    for o in Orden.objects.select_related('usuario').order_by('-fecha_creacion'):
-        # Contar productos en la orden (si hay relación many-to-many)
-        try:
-            productos_count = o.items.count() if hasattr(o, 'items') else 0
-        except:
-            productos_count = 0
-
-        ordenes_rows.append([
-            o.id,
-            o.numero_orden,
-            o.usuario.get_full_name() or o.usuario.username,
-            f"${float(o.subtotal):,.2f}",
-            f"${float(o.impuesto):,.2f}",
-            "$0.00",  # Envío no está en el modelo
-            f"${float(o.total):,.2f}",
-            o.get_estado_display(),
-            o.fecha_creacion.strftime('%d/%m/%Y %H:%M'),
-            productos_count
-        ])
-
-    notificaciones_rows = [['ID', 'Cliente', 'Tipo', 'Título', 'Mensaje', 'Prioridad', 'Leída', 'Fecha Creación']]
-    for n in Notificacion.objects.select_related('cliente__usuario'):
-        notificaciones_rows.append([
-            n.id,
-            n.cliente.usuario.get_full_name() or n.cliente.usuario.username if n.cliente else 'Global',
-            n.get_tipo_display(),
-            n.titulo,
-            n.mensaje[:100] + '...' if len(n.mensaje) > 100 else n.mensaje,
-            n.get_prioridad_display(),
-            'Sí' if n.leida else 'No',
-            n.fecha_creacion.strftime('%d/%m/%Y %H:%M')
-        ])
-
-    if formato.lower() == 'pdf':
-        # Generación de PDF profesional con reportlab
-        try:
-            from reportlab.lib.pagesizes import A4, letter
-            from reportlab.lib import colors
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
-            from reportlab.lib.units import inch
-        except ImportError:
-            messages.error(request, 'La exportación a PDF requiere reportlab. Instala con: pip install reportlab')
-            return redirect('administracion:dashboard_admin')
-
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4,
-                                leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
-        styles = getSampleStyleSheet()
-
-        # Estilos personalizados
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=1,  # Center
-            textColor=colors.HexColor('#2c3e50')
-        )
-
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=15,
-            textColor=colors.HexColor('#34495e')
+    if formato.lower() == 'csv':
+        # ZIP con un CSV por hoja, transmitido a medida que se genera
+        response = StreamingHttpResponse(
+            exportacion.zip_csv_streaming(hoy),
+            content_type='application/zip'
         )
-
-        section_style = ParagraphStyle(
-            'CustomSection',
-            parent=styles['Heading3'],
-            fontSize=12,
-            spaceAfter=10,
-            textColor=colors.HexColor('#2c3e50'),
-            borderColor=colors.HexColor('#3498db'),
-            borderWidth=1,
-            borderPadding=5,
-            borderRadius=3
-        )
-
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=8
-        )
-
-        elems = []
-
-        # Header con título principal
-        title = Paragraph('<b>Reporte de Administración</b>', title_style)
-        subtitle = Paragraph('<b>Veterinaria Vet Love</b>', subtitle_style)
-        meta = Paragraph(f'<i>Generado por: {generado_por}<br/>Fecha: {fecha_gen}</i>', normal_style)
-
-        elems += [title, subtitle, meta, Spacer(1, 20)]
-
-        def add_professional_table(title_text, data, col_widths=None):
-            # Título de sección
-            elems.append(Paragraph(f'<b>{title_text}</b>', section_style))
-
-            if not data:
-                return
-
-            # Crear tabla
-            t = Table(data, colWidths=col_widths, hAlign='LEFT')
-
-            # Estilos profesionales
-            table_style = TableStyle([
-                # Header
-                ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
-                ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0,0), (-1,0), 10),
-                ('ALIGN', (0,0), (-1,0), 'CENTER'),
-                ('VALIGN', (0,0), (-1,0), 'MIDDLE'),
-                ('BOTTOMPADDING', (0,0), (-1,0), 8),
-                ('TOPPADDING', (0,0), (-1,0), 8),
-
-                # Cuerpo
-                ('BACKGROUND', (0,1), (-1,-1), colors.white),
-                ('TEXTCOLOR', (0,1), (-1,-1), colors.black),
-                ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-                ('FONTSIZE', (0,1), (-1,-1), 9),
-                ('ALIGN', (0,1), (-1,-1), 'LEFT'),
-                ('VALIGN', (0,1), (-1,-1), 'MIDDLE'),
-
-                # Bordes
-                ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#bdc3c7')),
-                ('INNERGRID', (0,0), (-1,-1), 0.25, colors.HexColor('#ecf0f1')),
-
-                # Filas alternas
-                ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.HexColor('#f8f9fa')]),
-
-                # Padding
-                ('BOTTOMPADDING', (0,1), (-1,-1), 5),
-                ('TOPPADDING', (0,1), (-1,-1), 5),
-                ('LEFTPADDING', (0,0), (-1,-1), 6),
-                ('RIGHTPADDING', (0,0), (-1,-1), 6),
-            ])
-
-            t.setStyle(table_style)
-            elems.extend([t, Spacer(1, 15)])
-
-        # Primera página: Estadísticas principales
-        add_professional_table('📊 ESTADÍSTICAS GENERALES DEL SISTEMA', stats_generales)
-        add_professional_table('📈 ESTADÍSTICAS DEL MES ACTUAL', stats_mes)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Segunda página: Análisis detallado
-        add_professional_table('📅 ANÁLISIS DE CITAS POR ESTADO', citas_estado)
-        add_professional_table('🐾 DISTRIBUCIÓN DE MASCOTAS POR TIPO', mascotas_tipo)
-        add_professional_table('🛒 PRODUCTOS POR CATEGORÍA', prod_por_categoria)
-        add_professional_table('📦 ESTADO DE ÓRDENES DE COMPRA', ordenes_estado)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Tercera página: Alertas y pendientes
-        add_professional_table('⚠️ ALERTA: PRODUCTOS CON STOCK CRÍTICO', productos_bajo)
-        add_professional_table('📋 CITAS PROGRAMADAS PARA HOY', citas_hoy_rows)
-        add_professional_table('⏳ ÓRDENES PENDIENTES DE PROCESAMIENTO', ordenes_pend_rows)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Cuarta página: Datos completos - Clientes
-        add_professional_table('👥 REGISTRO COMPLETO DE CLIENTES', clientes_rows)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Quinta página: Mascotas
-        add_professional_table('🐾 REGISTRO COMPLETO DE MASCOTAS', mascotas_rows)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Sexta página: Citas
-        add_professional_table('📅 HISTORIAL COMPLETO DE CITAS', citas_rows)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Séptima página: Productos
-        add_professional_table('🛒 CATÁLOGO COMPLETO DE PRODUCTOS', productos_rows)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Octava página: Órdenes
-        add_professional_table('📦 HISTORIAL COMPLETO DE ÓRDENES', ordenes_rows)
-
-        # Salto de página
-        elems.append(PageBreak())
-
-        # Novena página: Notificaciones
-        add_professional_table('🔔 REGISTRO COMPLETO DE NOTIFICACIONES', notificaciones_rows)
-
-        # Footer
-        footer_text = f"Reporte generado el {date.today().strftime('%d/%m/%Y')} - Veterinaria Vet Love"
-        footer = Paragraph(f'<i>{footer_text}</i>', ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.gray, alignment=1))
-        elems.append(Spacer(1, 20))
-        elems.append(footer)
-
-        doc.build(elems)
-        pdf_data = buffer.getvalue()
-        buffer.close()
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_admin_{date.today().strftime('%Y%m%d')}.pdf"'
-        response.write(pdf_data)
+        response['Content-Disposition'] = f'attachment; filename="reporte_admin_{date.today().strftime('%Y%m%d')}.zip"'
         return response
 
-    # Generación de Excel profesional con openpyxl
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Resumen'
-
-    # Estilos
-    header_fill = PatternFill('solid', fgColor='F1F3F5')
-    header_font = Font(bold=True, color='212529')
-    thin = Side(border_style='thin', color='DEE2E6')
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    center = Alignment(horizontal='center', vertical='center')
-
-    def write_table(sheet, start_row, start_col, title, data):
-        sheet.merge_cells(start_row=start_row, start_column=start_col, end_row=start_row, end_column=start_col+len(data[0])-1)
-        title_cell = sheet.cell(row=start_row, column=start_col, value=title)
-        title_cell.font = Font(bold=True, size=12)
-        row = start_row + 1
-        # Header
-        for j, val in enumerate(data[0], start=start_col):
-            c = sheet.cell(row=row, column=j, value=val)
-            c.fill = header_fill
-            c.font = header_font
-            c.alignment = center
-            c.border = border
-        # Rows
-        for rdata in data[1:]:
-            row += 1
-            for j, val in enumerate(rdata, start=start_col):
-                c = sheet.cell(row=row, column=j, value=val)
-                c.border = border
-        # Auto width
-        for idx in range(start_col, start_col + len(data[0])):
-            letter = get_column_letter(idx)
-            max_len = 0
-            for r in range(start_row, row+1):
-                v = sheet.cell(row=r, column=idx).value
-                if v is None:
-                    continue
-                max_len = max(max_len, len(str(v)))
-            sheet.column_dimensions[letter].width = min(max_len + 2, 40)
-        return row + 2
-
-    # Header general
-    ws.merge_cells('A1:F1')
-    ws['A1'] = 'Reporte de Administración - Veterinaria Vet Love'
-    ws['A1'].font = Font(size=14, bold=True)
-    ws['A2'] = f'Generado por: {generado_por}   Fecha: {fecha_gen}'
-
-    r = 4
-    r = write_table(ws, r, 1, 'Estadísticas Generales', stats_generales)
-    r = write_table(ws, r, 1, 'Estadísticas del Mes', stats_mes)
-
-    # Hojas adicionales
-    def add_sheet(name, data):
-        sh = wb.create_sheet(title=name)
-        write_table(sh, 1, 1, name, data)
-
-    add_sheet('Citas por Estado', citas_estado)
-    add_sheet('Mascotas por Tipo', mascotas_tipo)
-    add_sheet('Prod. por Categoría', prod_por_categoria)
-    add_sheet('Órdenes por Estado', ordenes_estado)
-    add_sheet('Stock Bajo', productos_bajo)
-    add_sheet('Citas Hoy', citas_hoy_rows)
-    add_sheet('Órdenes Pendientes', ordenes_pend_rows)
-
-    # Hojas con datos completos
-    add_sheet('Todos los Clientes', clientes_rows)
-    add_sheet('Todas las Mascotas', mascotas_rows)
-    add_sheet('Todas las Citas', citas_rows)
-    add_sheet('Todos los Productos', productos_rows)
-    add_sheet('Todas las Órdenes', ordenes_rows)
-    add_sheet('Todas las Notificaciones', notificaciones_rows)
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = HttpResponse(
-        output.getvalue(),
+    if formato.lower() == 'pdf':
+        # El PDF completo puede tardar minutos: se genera en el worker de reportes
+        return responder_con_reporte(request, 'reporte_admin_pdf', {})
+
+    # Excel write-only volcado a un archivo temporal y servido por bloques
+    archivo = exportacion.excel_temporal(hoy, generado_por, fecha_gen)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f"reporte_admin_{date.today().strftime('%Y%m%d')}.xlsx",
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
-    response['Content-Disposition'] = f'attachment; filename="reporte_admin_{date.today().strftime('%Y%m%d')}.xlsx"'
-    return response
     
 @login_required
 @veterinario_required(login_url='/admin/login/')
@@ -1051,13 +448,7 @@ def dashboard_veterinario(request):
 
     # Filtro por búsqueda
     if cita_busqueda:
-        citas_query = citas_query.filter(
-            Q(mascota__nombre__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__first_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__last_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__username__icontains=cita_busqueda) |
-            Q(tipo__icontains=cita_busqueda)
-        )
+        citas_query = citas_query.filter(pk__in=buscar('cita', cita_busqueda))
 
     # Citas filtradas para gestión
     citas_gestion = citas_query.order_by('fecha')[:50]
@@ -1326,45 +717,21 @@ def estadisticas_api(request):
     if request.method == 'GET':
         hoy = timezone.now().date()
         
-        # Citas por día de la semana (últimas 4 semanas)
-        datos_semana = []
-        dias_semana = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
-        
-        for i in range(7):
-            # Promedio de las últimas 4 semanas para este día
-            citas_dia = Cita.objects.filter(
-                fecha__week_day=i+2,  # Django: 2=Lunes, 3=Martes, etc.
-                fecha__date__gte=hoy - timedelta(weeks=4)
-            ).count()
-            promedio = citas_dia / 4
-            
-            datos_semana.append({
-                'dia': dias_semana[i],
-                'promedio': round(promedio, 1)
-            })
-        
-        # Citas últimos 30 días
-        citas_30_dias = []
-        for i in range(29, -1, -1):
-            fecha = hoy - timedelta(days=i)
-            count = Cita.objects.filter(fecha__date=fecha).count()
-            citas_30_dias.append({
-                'fecha': fecha.strftime('%d/%m'),
-                'total': count
-            })
-        
-        # Ventas últimos 30 días (tienda)
-        ventas_30_dias = []
-        for i in range(29, -1, -1):
-            fecha = hoy - timedelta(days=i)
-            ventas_dia = Orden.objects.filter(
-                fecha_creacion__date=fecha,
-                estado__in=['entregada', 'enviada', 'en_proceso']
-            ).aggregate(total=Sum('total'))['total'] or 0
-            ventas_30_dias.append({
-                'fecha': fecha.strftime('%d/%m'),
-                'total': float(ventas_dia)
-            })
+        # Citas por día de la semana (promedio de las últimas 4 semanas)
+        datos_semana = promedio_por_dia_semana(
+            Cita.objects.all(), 'fecha', hoy - timedelta(weeks=4), semanas=4
+        )
+
+        # Citas y ventas de la tienda de los últimos 30 días (una consulta agrupada cada una)
+        hace_30_dias = hoy - timedelta(days=29)
+        citas_30_dias = [
+            {'fecha': punto['periodo'].strftime('%d/%m'), 'total': punto['total']}
+            for punto in serie_citas(hace_30_dias, hoy)
+        ]
+        ventas_30_dias = [
+            {'fecha': punto['periodo'].strftime('%d/%m'), 'total': float(punto['total'])}
+            for punto in serie_ventas(hace_30_dias, hoy)
+        ]
         
         return JsonResponse({
             'citas_semana': datos_semana,
@@ -1398,12 +765,7 @@ def gestion_notificaciones(request):
 
     if cliente_filtro:
         # Buscar en username, nombre, apellido, email
-        notificaciones_query = notificaciones_query.filter(
-            Q(cliente__usuario__username__icontains=cliente_filtro) |
-            Q(cliente__usuario__first_name__icontains=cliente_filtro) |
-            Q(cliente__usuario__last_name__icontains=cliente_filtro) |
-            Q(cliente__usuario__email__icontains=cliente_filtro)
-        )
+        notificaciones_query = notificaciones_query.filter(cliente_id__in=buscar('cliente', cliente_filtro))
 
     if estado_filtro == 'leida':
         notificaciones_query = notificaciones_query.filter(leida=True)
@@ -1427,6 +789,7 @@ def gestion_notificaciones(request):
 
     # Estadísticas para las tarjetas
     notificaciones_no_leidas = Notificacion.objects.filter(leida=False).count()
+    envios_masivos = NotificacionMasiva.objects.select_related('creada_por')[:5]
 
     context = {
         'notificaciones': notificaciones,
@@ -1437,10 +800,26 @@ def gestion_notificaciones(request):
         'busqueda': busqueda,
         'tipos_notificacion': Notificacion.TIPO_CHOICES,
         'notificaciones_no_leidas': notificaciones_no_leidas,
+        'envios_masivos': envios_masivos,
     }
 
     return render(request, 'administracion/gestion_notificaciones.html', context)
 
+
+@login_required
+@staff_required(login_url='/admin/login/')
+def estado_envio_masivo_api(request, envio_id):
+    """Avance de un envío masivo de notificaciones (consultado por la página de gestión)"""
+    envio = get_object_or_404(NotificacionMasiva, pk=envio_id)
+    return JsonResponse({
+        'estado': envio.estado,
+        'estado_display': envio.get_estado_display(),
+        'enviadas': envio.enviadas,
+        'total_destinatarios': envio.total_destinatarios,
+        'porcentaje': envio.porcentaje,
+        'terminado': envio.terminado,
+    })
+
 @login_required
 @staff_required(login_url='/admin/login/')
 def crear_notificacion(request):
@@ -1498,22 +877,15 @@ def crear_notificacion(request):
             destinatario = form.cleaned_data['destinatario']
 
             if destinatario == 'todos':
-                # Crear notificación para todos los clientes
-                clientes = Cliente.objects.all()
-                notificaciones_creadas = 0
-
-                for cliente in clientes:
-                    Notificacion.objects.create(
-                        cliente=cliente,
-                        tipo=form.cleaned_data['tipo'],
-                        titulo=form.cleaned_data['titulo'],
-                        mensaje=form.cleaned_data['mensaje'],
-                        prioridad=form.cleaned_data['prioridad'],
-                        url_relacionada=form.cleaned_data.get('url_relacionada')
+                # Las notificaciones de cada cliente se crean por lotes fuera de la petición
+                envio = registrar_envio(request.user, form.cleaned_data)
+                if envio.estado == 'completado':
+                    messages.success(request, f'Notificación enviada exitosamente a {envio.enviadas} clientes')
+                else:
+                    messages.success(
+                        request,
+                        f'Envío a {envio.total_destinatarios} clientes en curso; puedes seguir su avance en esta página'
                     )
-                    notificaciones_creadas += 1
-
-                messages.success(request, f'Notificación enviada exitosamente a {notificaciones_creadas} clientes')
             else:
                 # Crear notificación para cliente específico
                 notificacion = form.save()
@@ -1593,12 +965,7 @@ def gestionar_usuarios(request):
         usuarios_query = usuarios_query.filter(is_active=False)
 
     if busqueda:
-        usuarios_query = usuarios_query.filter(
-            Q(username__icontains=busqueda) |
-            Q(first_name__icontains=busqueda) |
-            Q(last_name__icontains=busqueda) |
-            Q(email__icontains=busqueda)
-        )
+        usuarios_query = usuarios_query.filter(pk__in=buscar('usuario', busqueda))
 
     # Obtener usuarios
     usuarios = usuarios_query.order_by('-date_joined')[:100]
@@ -2073,9 +1440,15 @@ def cambiar_estado_cita(request, cita_id):
         if cita.estado == 'cancelada' and nuevo_estado != 'cancelada':
             return JsonResponse({'success': False, 'error': 'No se puede cambiar el estado de una cita cancelada'})
 
-        # Cambiar el estado
+        # Versión de la cita que se mostraba en la página: si otro la cambió después, no se pisa
+        version = request.POST.get('version')
+        if version is None:
+            return JsonResponse({'success': False, 'error': 'Versión no especificada'})
+        cita.comprobar_version(version)
+
+        # Cambiar el estado (solo se escriben las columnas modificadas)
         cita.estado = nuevo_estado
-        cita.save()
+        cita.guardar_cambios()
 
         # Crear notificación para el cliente si es necesario
         if nuevo_estado in ['confirmada', 'completada', 'cancelada']:
@@ -2098,11 +1471,15 @@ def cambiar_estado_cita(request, cita_id):
         return JsonResponse({
             'success': True,
             'nuevo_estado': nuevo_estado,
+            'version': cita.version,
             'mensaje': f'Cita cambiada a {nuevo_estado} exitosamente'
         })
 
     except Cita.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Cita no encontrada'})
+    except RegistroDesactualizado as e:
+        # Otro usuario cambió la cita después de que se cargara: no se pisa su cambio
+        return JsonResponse({'success': False, 'error': str(e), 'desactualizada': True}, status=409)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
@@ -2172,17 +1549,10 @@ def asignar_veterinario(request):
         mascotas_query = mascotas_query.filter(tipo=tipo_filtro)
 
     if cliente_filtro:
-        mascotas_query = mascotas_query.filter(
-            Q(cliente__usuario__username__icontains=cliente_filtro) |
-            Q(cliente__usuario__first_name__icontains=cliente_filtro) |
-            Q(cliente__usuario__last_name__icontains=cliente_filtro)
-        )
+        mascotas_query = mascotas_query.filter(cliente_id__in=buscar('cliente', cliente_filtro))
 
     if busqueda:
-        mascotas_query = mascotas_query.filter(
-            Q(nombre__icontains=busqueda) |
-            Q(raza__icontains=busqueda)
-        )
+        mascotas_query = mascotas_query.filter(pk__in=buscar('mascota', busqueda))
 
     # Calcular estadísticas antes del slice
     total_mascotas_mostradas = mascotas_query.count()
@@ -2234,7 +1604,7 @@ def asignar_veterinario_mascota(request):
             # Desasignar veterinario
             veterinario_anterior = mascota.veterinario_asignado.nombre_completo if mascota.veterinario_asignado else None
             mascota.veterinario_asignado = None
-            mascota.save()
+            mascota.guardar_cambios()
 
             mensaje = f'Veterinario removido de {mascota.nombre} exitosamente'
             if veterinario_anterior:
@@ -2261,7 +1631,7 @@ def asignar_veterinario_mascota(request):
         # Asignar veterinario
         veterinario_anterior = mascota.veterinario_asignado.nombre_completo if mascota.veterinario_asignado else None
         mascota.veterinario_asignado = veterinario
-        mascota.save()
+        mascota.guardar_cambios()
 
         mensaje = f'Dr. {veterinario.nombre_completo} asignado a {mascota.nombre} exitosamente'
         if veterinario_anterior:
@@ -2342,8 +1712,8 @@ def descargar_plantillas_carnets(request):
             messages.error(request, 'No tiene permisos para descargar plantillas.')
             return redirect('administracion:dashboard_admin')
 
-        # Generar PDF de plantilla individual
-        return generar_plantilla_carnet_pdf(mascota, request.user)
+        # La plantilla se genera en el worker de reportes
+        return responder_con_reporte(request, 'plantilla_carnet_admin', {'mascota_id': mascota.id})
 
     # Si es GET, mostrar formulario de selección
     # Filtros para la lista de mascotas
@@ -2359,17 +1729,10 @@ def descargar_plantillas_carnets(request):
         mascotas_query = mascotas_query.filter(tipo=tipo_filtro)
 
     if cliente_filtro:
-        mascotas_query = mascotas_query.filter(
-            Q(cliente__usuario__username__icontains=cliente_filtro) |
-            Q(cliente__usuario__first_name__icontains=cliente_filtro) |
-            Q(cliente__usuario__last_name__icontains=cliente_filtro)
-        )
+        mascotas_query = mascotas_query.filter(cliente_id__in=buscar('cliente', cliente_filtro))
 
     if busqueda:
-        mascotas_query = mascotas_query.filter(
-            Q(nombre__icontains=busqueda) |
-            Q(raza__icontains=busqueda)
-        )
+        mascotas_query = mascotas_query.filter(pk__in=buscar('mascota', busqueda))
 
     mascotas = mascotas_query[:100]  # Limitar para rendimiento
 
@@ -2384,15 +1747,16 @@ def descargar_plantillas_carnets(request):
     return render(request, 'administracion/plantillas_carnets.html', context)
 
 
-def generar_plantilla_carnet_pdf(mascota, usuario):
+def construir_plantilla_carnet_pdf(mascota, usuario):
     """
-    Función auxiliar para generar PDF de plantilla de carnet individual
+    Función auxiliar para generar PDF de plantilla de carnet individual.
+    Devuelve ``(nombre_archivo, contenido)``; lo ejecuta el worker de reportes.
     """
     from reportlab.pdfgen import canvas
     from reportlab.lib.pagesizes import A4
     from reportlab.lib import colors
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
     from reportlab.lib.units import inch
     from io import BytesIO
     from django.utils import timezone
@@ -2608,9 +1972,50 @@ def generar_plantilla_carnet_pdf(mascota, usuario):
     # Generar PDF
     doc.build(elements)
 
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Plantilla_Carnet_{mascota.nombre.replace(' ', '_')}.pdf"'
+    return f"Plantilla_Carnet_{mascota.nombre.replace(' ', '_')}.pdf", buffer.getvalue()
+
+
+def _obtener_reporte(request, job_id):
+    """Un reporte solo es visible para quien lo pidió o para el personal"""
+    job = get_object_or_404(ReporteJob, pk=job_id)
+    if job.solicitado_por_id != request.user.id and not request.user.is_staff:
+        raise Http404
+    return job
+
+
+@login_required
+def estado_reporte(request, job_id):
+    """
+    Página de espera de un reporte en segundo plano; consulta su estado por JSON
+    """
+    job = _obtener_reporte(request, job_id)
+    return render(request, 'administracion/estado_reporte.html', {'job': job})
 
-    return response
\ No newline at end of file
+
+@login_required
+def estado_reporte_api(request, job_id):
+    job = _obtener_reporte(request, job_id)
+    datos = {
+        'id': job.pk,
+        'estado': job.estado,
+        'estado_display': job.get_estado_display(),
+        'terminado': job.terminado,
+        'url_descarga': None,
+        'error': job.error if job.estado == 'error' else '',
+    }
+    if job.estado == 'completado':
+        datos['url_descarga'] = reverse('administracion:descargar_reporte', args=[job.pk])
+    return JsonResponse(datos)
+
+
+@login_required
+def descargar_reporte(request, job_id):
+    job = _obtener_reporte(request, job_id)
+    if job.estado != 'completado' or not job.archivo:
+        return redirect('administracion:estado_reporte', job_id=job.pk)
+    return FileResponse(
+        job.archivo.open('rb'),
+        as_attachment=True,
+        filename=job.nombre_archivo or job.archivo.name.rsplit('/', 1)[-1],
+        content_type='application/pdf'
+    )
@@ -0,0 +1,155 @@
+"""
+Índice de búsqueda de los paneles de administración y de veterinarios.
+
+Cada objeto buscable tiene un ``DocumentoBusqueda`` con el texto de los campos
+por los que se busca, incluidos los de sus relaciones (el nombre de la mascota
+y del cliente en una cita, por ejemplo), normalizado sin acentos y en
+minúsculas. Las señales de ``busqueda.signals`` lo mantienen al día cuando
+cambia el objeto o alguno de sus relacionados.
+
+``buscar(tipo, texto)`` devuelve una subconsulta con los ids que coinciden,
+para usarla en el queryset de cada vista::
+
+    mascotas.filter(pk__in=buscar('mascota', busqueda))
+
+En SQLite la coincidencia se resuelve con una tabla FTS5 con tokenizador
+trigram y en PostgreSQL con un índice GIN ``gin_trgm_ops`` sobre el texto; en
+ambos casos la consulta es por subcadena, como el ``icontains`` que reemplaza,
+sin recorrer las tablas unidas.
+"""
+import unicodedata
+
+from django.apps import apps as apps_globales
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'busqueda_documentobusqueda_fts'
+
+# tipo: (modelo, campos del documento)
+ENTIDADES = {
+    'mascota': ('mascotas.Mascota', ('nombre', 'raza', 'color')),
+    'cliente': ('clientes.Cliente', ('usuario__username', 'usuario__first_name', 'usuario__last_name', 'usuario__email')),
+    'usuario': ('auth.User', ('username', 'first_name', 'last_name', 'email')),
+    'cita': ('citas.Cita', (
+        'mascota__nombre', 'mascota__cliente__usuario__username',
+        'mascota__cliente__usuario__first_name', 'mascota__cliente__usuario__last_name', 'tipo'
+    )),
+    'producto': ('tienda.Producto', ('nombre', 'descripcion', 'categoria__nombre')),
+    'orden': ('tienda.Orden', ('numero_orden', 'usuario__username', 'usuario__first_name', 'usuario__last_name')),
+}
+
+# Modelos relacionados cuyos cambios alteran el documento: tipo -> {modelo: ruta desde el objeto}
+RELACIONES = {
+    'cliente': {'auth.User': 'usuario'},
+    'cita': {'mascotas.Mascota': 'mascota', 'auth.User': 'mascota__cliente__usuario'},
+    'producto': {'tienda.Categoria': 'categoria'},
+    'orden': {'auth.User': 'usuario'},
+}
+
+TAMANO_LOTE = 1000
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con los espacios colapsados: 'José  Pérez' -> 'jose perez'"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+def dependencias(modelo):
+    """
+    Documentos que dependen de ``modelo`` (una etiqueta 'app.Modelo'): lista de
+    ``(tipo, ruta, campos)`` donde ``ruta`` lleva del objeto indexado a
+    ``modelo`` y ``campos`` son los campos de ``modelo`` que aparecen en el
+    documento (para ignorar un ``save(update_fields=...)`` que no los toca).
+    """
+    resultado = []
+    for tipo, (etiqueta, campos) in ENTIDADES.items():
+        rutas = dict(RELACIONES.get(tipo, {}), **{etiqueta: 'pk'})
+        ruta = rutas.get(modelo)
+        if ruta is None:
+            continue
+        if ruta == 'pk':
+            propios = {campo.split('__')[0] for campo in campos}
+        else:
+            propios = {campo[len(ruta) + 2:].split('__')[0] for campo in campos if campo.startswith(ruta + '__')}
+        resultado.append((tipo, ruta, propios))
+    return resultado
+
+
+def indexar(tipo, filtro=None, apps=apps_globales):
+    """
+    Crea o actualiza los documentos de los objetos ``tipo`` que cumplen
+    ``filtro`` (un dict de lookups; todos si es None), por lotes de un INSERT
+    con ON CONFLICT. ``apps`` permite usarlo desde una migración. Devuelve
+    cuántos documentos escribió.
+    """
+    etiqueta, campos = ENTIDADES[tipo]
+    Documento = apps.get_model('busqueda', 'DocumentoBusqueda')
+    objetos = apps.get_model(etiqueta)._base_manager.order_by('pk')
+    if filtro:
+        objetos = objetos.filter(**filtro)
+
+    escritos = 0
+    lote = []
+    for pk, *valores in objetos.values_list('pk', *campos).iterator(chunk_size=TAMANO_LOTE):
+        lote.append(Documento(
+            tipo=tipo,
+            objeto_id=pk,
+            texto=normalizar(' '.join(str(valor) for valor in valores if valor))
+        ))
+        if len(lote) == TAMANO_LOTE:
+            escritos += _guardar(Documento, lote)
+            lote = []
+    return escritos + _guardar(Documento, lote)
+
+
+def _guardar(Documento, documentos):
+    Documento.objects.bulk_create(
+        documentos,
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=['texto', 'fecha_actualizacion']
+    )
+    return len(documentos)
+
+
+def quitar(tipo, ids):
+    from .models import DocumentoBusqueda
+
+    DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids).delete()
+
+
+def reindexar(tipos=None):
+    """Reconstruye los documentos de ``tipos`` (todos si es None), incluidos los de objetos borrados"""
+    from .models import DocumentoBusqueda
+
+    escritos = {}
+    for tipo in tipos or ENTIDADES:
+        DocumentoBusqueda.objects.filter(tipo=tipo).delete()
+        escritos[tipo] = indexar(tipo)
+    return escritos
+
+
+def _frase_fts(consulta):
+    return '"' + consulta.replace('"', '""') + '"'
+
+
+def buscar(tipo, texto):
+    """
+    Subconsulta con los ``objeto_id`` de tipo ``tipo`` cuyo documento contiene
+    ``texto`` (sin distinguir acentos ni mayúsculas), para usar con ``__in``.
+    """
+    from .models import DocumentoBusqueda
+
+    consulta = normalizar(texto)
+    # El tokenizador trigram necesita al menos 3 caracteres; con menos se recorren
+    # solo los documentos del tipo
+    if connection.vendor == 'sqlite' and len(consulta) >= 3:
+        # CROSS JOIN fija el orden: primero las coincidencias del índice y luego su tipo
+        return RawSQL(
+            f'SELECT d.objeto_id FROM {TABLA_FTS} CROSS JOIN busqueda_documentobusqueda d ON d.id = {TABLA_FTS}.rowid '
+            f'WHERE {TABLA_FTS} MATCH %s AND d.tipo = %s',
+            [_frase_fts(consulta), tipo]
+        )
+    return DocumentoBusqueda.objects.filter(tipo=tipo, texto__contains=consulta).values('objeto_id')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from busqueda.indice import ENTIDADES, reindexar
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los documentos de búsqueda (p. ej. después de cargas masivas que no disparan señales)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipos', nargs='*', choices=sorted(ENTIDADES), help='Tipos a reconstruir (todos por defecto)')
+
+    def handle(self, *args, **options):
+        for tipo, escritos in reindexar(options['tipos']).items():
+            self.stdout.write(f'{tipo}: {escritos} documentos')
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda reconstruido'))
@@ -0,0 +1,72 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+from busqueda.indice import ENTIDADES, TABLA_FTS, indexar
+
+SQLITE = [
+    f"CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(texto, content='busqueda_documentobusqueda', "
+    "content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER busqueda_documento_ai AFTER INSERT ON busqueda_documentobusqueda BEGIN "
+    f"INSERT INTO {TABLA_FTS}(rowid, texto) VALUES (new.id, new.texto); END",
+    f"CREATE TRIGGER busqueda_documento_ad AFTER DELETE ON busqueda_documentobusqueda BEGIN "
+    f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, texto) VALUES ('delete', old.id, old.texto); END",
+    f"CREATE TRIGGER busqueda_documento_au AFTER UPDATE ON busqueda_documentobusqueda BEGIN "
+    f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, texto) VALUES ('delete', old.id, old.texto); "
+    f"INSERT INTO {TABLA_FTS}(rowid, texto) VALUES (new.id, new.texto); END",
+]
+
+POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX busqueda_documento_trgm_idx ON busqueda_documentobusqueda USING gin (texto gin_trgm_ops)',
+]
+
+
+def crear_indice_texto(apps, schema_editor):
+    # Índice por subcadena según el motor; en otros motores se busca con LIKE sobre la tabla
+    sentencias = {'sqlite': SQLITE, 'postgresql': POSTGRESQL}.get(schema_editor.connection.vendor, [])
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def borrar_indice_texto(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+def poblar_documentos(apps, schema_editor):
+    for tipo in ENTIDADES:
+        indexar(tipo, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('citas', '0004_cita_veterinario_asignado_alter_cita_veterinario'),
+        ('clientes', '0005_auto_20251028_1528'),
+        ('mascotas', '0006_mascota_cumple_mmdd'),
+        ('tienda', '0005_producto_producto_catalogo_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=20, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID del objeto')),
+                ('texto', models.TextField(verbose_name='Texto')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda',
+                'verbose_name_plural': 'Documentos de búsqueda',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='documento_busqueda_unico')],
+            },
+        ),
+        migrations.RunPython(crear_indice_texto, borrar_indice_texto),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+    ]
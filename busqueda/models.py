@@ -0,0 +1,24 @@
+from django.db import models
+
+
+class DocumentoBusqueda(models.Model):
+    """
+    Texto de búsqueda de un objeto (mascota, cliente, cita...), sin acentos y en
+    minúsculas, con los campos propios y los de sus relaciones ya unidos. Las
+    búsquedas de los paneles consultan esta tabla en lugar de encadenar
+    ``icontains`` sobre varias tablas unidas (ver busqueda.indice).
+    """
+    tipo = models.CharField(max_length=20, verbose_name='Tipo')
+    objeto_id = models.PositiveBigIntegerField(verbose_name='ID del objeto')
+    texto = models.TextField(verbose_name='Texto')
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')
+
+    class Meta:
+        verbose_name = 'Documento de búsqueda'
+        verbose_name_plural = 'Documentos de búsqueda'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='documento_busqueda_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.tipo} {self.objeto_id}'
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+
+from .indice import ENTIDADES, RELACIONES, dependencias, indexar, quitar
+
+# Cada modelo que aparece en algún documento reindexa los que dependen de él al
+# guardarse; los documentos propios se borran con el objeto
+
+
+def actualizar_documentos(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    for tipo, ruta, campos in dependencias(sender._meta.label):
+        if update_fields is not None and not campos & set(update_fields):
+            continue
+        indexar(tipo, {ruta: instance.pk})
+
+
+def borrar_documentos(sender, instance, **kwargs):
+    for tipo, ruta, _ in dependencias(sender._meta.label):
+        if ruta == 'pk':
+            quitar(tipo, [instance.pk])
+
+
+_modelos = {etiqueta for etiqueta, _ in ENTIDADES.values()}
+_modelos.update(modelo for relaciones in RELACIONES.values() for modelo in relaciones)
+for _modelo in sorted(_modelos):
+    post_save.connect(actualizar_documentos, sender=_modelo, dispatch_uid=f'busqueda_guardar_{_modelo}')
+    post_delete.connect(borrar_documentos, sender=_modelo, dispatch_uid=f'busqueda_borrar_{_modelo}')
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from citas.models import Cita
+from clientes.models import Cliente
+from mascotas.models import Mascota
+from .indice import buscar, normalizar, reindexar
+from .models import DocumentoBusqueda
+
+
+class IndiceBusquedaTestCase(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='jperez', password='testpass123', first_name='José', last_name='Pérez')
+        self.cliente = Cliente.objects.create(usuario=self.usuario, telefono='+34123456789', direccion='Calle Test 123')
+        self.mascota = Mascota.objects.create(nombre='Ñoño', tipo='perro', raza='Labrador', sexo='macho', cliente=self.cliente)
+        self.cita = Cita.objects.create(
+            mascota=self.mascota,
+            fecha=timezone.now() + timedelta(days=1),
+            tipo='consulta_general',
+            motivo='Consulta de rutina',
+            estado='programada'
+        )
+
+    def _ids(self, tipo, texto):
+        documentos = DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id__in=buscar(tipo, texto))
+        return list(documentos.values_list('objeto_id', flat=True))
+
+    def test_busca_sin_acentos_ni_mayusculas_en_campos_relacionados(self):
+        self.assertEqual(normalizar('  José   PÉREZ '), 'jose perez')
+        self.assertEqual(self._ids('cliente', 'jose per'), [self.cliente.pk])
+        self.assertEqual(self._ids('mascota', 'ÑOÑO'), [self.mascota.pk])
+        # La cita se encuentra por el nombre de la mascota, del dueño o por su tipo
+        for texto in ('noño', 'Pérez', 'jperez', 'consulta', 'no'):
+            self.assertEqual(self._ids('cita', texto), [self.cita.pk], texto)
+        self.assertEqual(self._ids('cita', 'garcia'), [])
+
+    def test_los_documentos_siguen_a_los_cambios(self):
+        self.usuario.last_name = 'García'
+        self.usuario.save()
+        self.assertEqual(self._ids('cita', 'garcia'), [self.cita.pk])
+        self.assertEqual(self._ids('cliente', 'jose perez'), [])
+
+        self.mascota.nombre = 'Rocky'
+        self.mascota.guardar_cambios()
+        self.assertEqual(self._ids('cita', 'rocky'), [self.cita.pk])
+
+        # Guardar campos que no están en ningún documento no reindexa nada
+        with self.assertNumQueries(1):
+            self.usuario.save(update_fields=['last_login'])
+
+        self.mascota.delete()
+        self.assertFalse(DocumentoBusqueda.objects.filter(tipo__in=['mascota', 'cita']).exists())
+        self.assertEqual(self._ids('cita', 'rocky'), [])
+
+    def test_reindexar_corrige_documentos_desactualizados(self):
+        User.objects.filter(pk=self.usuario.pk).update(first_name='Mariana')
+        self.assertEqual(self._ids('usuario', 'mariana'), [])
+        reindexar(['usuario', 'cliente'])
+        self.assertEqual(self._ids('usuario', 'mariana'), [self.usuario.pk])
+        self.assertEqual(self._ids('cliente', 'mariana'), [self.cliente.pk])
+
+    def test_vista_filtra_con_el_indice(self):
+        admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        otro = Cliente.objects.create(
+            usuario=User.objects.create_user(username='otro', password='testpass123', first_name='Ana'),
+            telefono='+34123456780',
+            direccion='Calle Test 456'
+        )
+        Mascota.objects.create(nombre='Luna', tipo='gato', sexo='hembra', cliente=otro)
+        self.client.force_login(admin)
+
+        respuesta = self.client.get(reverse('administracion:asignar_veterinario'), {'cliente': 'PEREZ'})
+        self.assertEqual(list(respuesta.context['mascotas']), [self.mascota])
+        respuesta = self.client.get(reverse('administracion:asignar_veterinario'), {'busqueda': 'labra'})
+        self.assertEqual(list(respuesta.context['mascotas']), [self.mascota])
@@ -1,9 +1,15 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import HttpResponseRedirect
+from veterinaria_project.modelos import RegistroDesactualizado
+from .agenda import agendar
 from .models import Cita
 from .forms import CitaAdminForm
 
 @admin.register(Cita)
 class CitaAdmin(admin.ModelAdmin):
+    form = CitaAdminForm
     list_display = ['mascota', 'fecha', 'tipo', 'estado', 'veterinario', 'fecha_creacion']
     list_filter = ['estado', 'tipo', 'fecha', 'fecha_creacion']
     search_fields = ['mascota__nombre', 'motivo', 'veterinario']
@@ -13,11 +19,14 @@ class CitaAdmin(admin.ModelAdmin):
     
     fieldsets = (
         (None, {
-            'fields': ('mascota', 'fecha', 'tipo', 'estado')
+            'fields': ('mascota', 'fecha', 'tipo', 'estado', 'version_cargada')
         }),
         ('Detalles de la cita', {
             'fields': ('motivo', 'veterinario', 'notas')
         }),
+        ('Agenda', {
+            'fields': ('veterinario_asignado', 'sala', 'duracion_estimada')
+        }),
         ('Recordatorio', {
             'fields': ('recordatorio_enviado',),
             'classes': ('collapse',)
@@ -26,4 +35,26 @@ class CitaAdmin(admin.ModelAdmin):
             'fields': ('fecha_creacion',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+    def save_model(self, request, obj, form, change):
+        # El formulario ya validó versión y solapamientos con la agenda bloqueada; si aun así
+        # algo cambió, se deshace la transacción del admin y se vuelve al formulario
+        try:
+            agendar(obj)
+        except (ValidationError, RegistroDesactualizado) as e:
+            transaction.set_rollback(True)
+            errores = e.messages if isinstance(e, ValidationError) else [str(e)]
+            for error in errores:
+                self.message_user(request, error, messages.ERROR)
+            request._cita_no_guardada = True
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if getattr(request, '_cita_no_guardada', False):
+            return HttpResponseRedirect(request.path)
+        return super().response_add(request, obj, post_url_continue)
+
+    def response_change(self, request, obj):
+        if getattr(request, '_cita_no_guardada', False):
+            return HttpResponseRedirect(request.path)
+        return super().response_change(request, obj)
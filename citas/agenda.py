@@ -0,0 +1,72 @@
+"""
+Reserva de citas sin dobles reservas.
+
+Validar el formulario y guardar son dos pasos: entre uno y otro otra petición
+puede ocupar el mismo horario. ``agendar`` guarda la cita dentro de una
+transacción que primero bloquea una fila de ``BloqueoAgenda`` por cada recurso
+(veterinario, sala, mascota) y día que ocupa la cita, y solo entonces vuelve a
+buscar solapamientos con ``Cita.clean``. Dos reservas que comparten un recurso
+el mismo día esperan una a la otra y la segunda ve la cita de la primera; las
+que no comparten nada no se bloquean entre sí.
+
+En PostgreSQL el bloqueo es ``SELECT ... FOR UPDATE`` sobre las filas, tomadas
+en orden de clave para no producir interbloqueos. SQLite no tiene bloqueos de
+fila: el INSERT de las claves ya toma el bloqueo de escritura de la base, que
+serializa igualmente las transacciones.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import BloqueoAgenda, Cita
+
+
+def _dia(fecha):
+    return timezone.localtime(fecha).date() if timezone.is_aware(fecha) else fecha.date()
+
+
+def claves_bloqueo(cita):
+    """Claves 'recurso:valor:día' de cada recurso asignado a ``cita`` y cada día que ocupa"""
+    inicio = _dia(cita.fecha)
+    fin = _dia(cita.fecha + timedelta(minutes=cita.duracion_estimada))
+    dias = [inicio + timedelta(days=n) for n in range((fin - inicio).days + 1)]
+    recursos = [
+        ('veterinario', cita.veterinario_asignado_id),
+        ('sala', cita.sala),
+        ('mascota', cita.mascota_id),
+    ]
+    return sorted(f'{recurso}:{valor}:{dia.isoformat()}' for recurso, valor in recursos if valor for dia in dias)
+
+
+def bloquear(claves):
+    """Bloquea las filas de ``claves`` (creándolas si no existen) hasta el final de la transacción"""
+    BloqueoAgenda.objects.bulk_create([BloqueoAgenda(clave=clave) for clave in claves], ignore_conflicts=True)
+    if connection.features.has_select_for_update:
+        list(
+            BloqueoAgenda.objects.select_for_update()
+            .filter(clave__in=claves).order_by('clave').values_list('pk', flat=True)
+        )
+
+
+def bloquear_cita(cita):
+    """Bloquea la agenda de los recursos de ``cita`` si la ocupa; True si bloqueó algo"""
+    if not (cita.fecha and cita.estado in Cita.ESTADOS_AGENDA):
+        return False
+    claves = claves_bloqueo(cita)
+    if claves:
+        bloquear(claves)
+    return bool(claves)
+
+
+def agendar(cita, update_fields=None):
+    """
+    Guarda ``cita`` comprobando los solapamientos con la agenda bloqueada.
+    Lanza ``ValidationError`` (como ``Cita.clean``) si choca con otra cita;
+    en ese caso no se guarda nada.
+    """
+    with transaction.atomic():
+        if bloquear_cita(cita):
+            cita.clean()
+        cita.save(update_fields=update_fields)
+    return cita
@@ -1,4 +1,6 @@
 from django import forms
+from django.db import transaction
+from django.db.models import F
 from .models import Cita
 from mascotas.models import Mascota
 from veterinario.models import Veterinario
@@ -136,6 +138,11 @@ class CitaForm(forms.ModelForm):
         sintomas = cleaned_data.get('sintomas', '')
         mascota = cleaned_data.get('mascota')
         
+        # La duración depende del tipo; se fija antes de validar los solapamientos (Cita.clean)
+        tipo = cleaned_data.get('tipo')
+        if tipo:
+            self.instance.duracion_estimada = Cita.DURACION_POR_TIPO.get(tipo, 30)
+
         # Si es urgente o emergencia, requerir descripción de síntomas
         if prioridad in ['urgente', 'emergencia'] and not sintomas.strip():
             self.add_error('sintomas', 'Para citas urgentes o de emergencia, es obligatorio describir los síntomas.')
@@ -164,10 +171,46 @@ class CitaAdminForm(forms.ModelForm):
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
+    # Versión de la cita al abrir el formulario: si otro la guardó después, no se pisa su cambio
+    version_cargada = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Cita
         fields = '__all__'
+        # La fecha usa el widget de fecha y hora del admin
         widgets = {
-            'fecha': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'duracion_estimada': forms.NumberInput(attrs={'min': 15, 'max': 240, 'step': 15}),
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['version_cargada'].initial = self.instance.version
+
+    def clean(self):
+        from .agenda import bloquear_cita
+
+        cleaned_data = super().clean()
+        # El admin valida y guarda en una misma transacción: los bloqueos que se toman aquí
+        # duran hasta el guardado, así que los choques se informan como errores del formulario
+        if self.instance.pk:
+            version = cleaned_data.get('version_cargada')
+            # UPDATE sin cambios: comprueba la versión y deja la fila bloqueada
+            vigente = version is not None and Cita.objects.filter(pk=self.instance.pk, version=version).update(
+                version=F('version')
+            )
+            if not vigente:
+                raise forms.ValidationError(
+                    'Otro usuario modificó esta cita mientras la editabas. Recarga la página y vuelve a aplicar tus cambios.'
+                )
+        if not transaction.get_autocommit():
+            # Cita.clean busca los solapamientos después, ya con la agenda bloqueada
+            bloquear_cita(Cita(
+                fecha=cleaned_data.get('fecha'),
+                duracion_estimada=cleaned_data.get('duracion_estimada') or 0,
+                estado=cleaned_data.get('estado'),
+                sala=cleaned_data.get('sala') or '',
+                veterinario_asignado=cleaned_data.get('veterinario_asignado'),
+                mascota=cleaned_data.get('mascota'),
+            ))
+        return cleaned_data
\ No newline at end of file
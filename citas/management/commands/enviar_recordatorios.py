@@ -1,9 +1,11 @@
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
+from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import timedelta
 from citas.models import Cita
+from notificaciones.correo import despachar_pendientes, encolar_correo, liberar_atascados
 
 class Command(BaseCommand):
     help = 'Envía recordatorios de citas por email'
@@ -17,45 +19,61 @@ class Command(BaseCommand):
             fecha__range=(ahora, mañana),
             estado__in=['programada', 'confirmada'],
             recordatorio_enviado=False
-        )
+        ).select_related('mascota__cliente__usuario')
         
+        metricas = {'encolados': 0, 'omitidos': 0, 'fallidos': 0}
         for cita in citas:
-            # Enviar email de recordatorio
-            subject = f'Recordatorio de cita veterinaria para {cita.mascota.nombre}'
-            
-            context = {
-                'cita': cita,
-                'cliente': cita.mascota.cliente,
-                'mascota': cita.mascota,
-                'tipo_display': cita.get_tipo_display(),
-                'prioridad_display': cita.get_prioridad_display(),
-            }
-            
-            html_message = render_to_string('citas/emails/recordatorio_cita.html', context)
-            plain_message = render_to_string('citas/emails/recordatorio_cita.txt', context)
-            
+            # Reclamar la cita con un UPDATE condicionado: si otra ejecución ya la
+            # tomó no se actualiza ninguna fila y se omite. El correo queda en la
+            # bandeja de salida en la misma transacción, que sirve de punto de control.
             try:
-                send_mail(
-                    subject,
-                    plain_message,
-                    'clinica@veterinariaejemplo.com',  # Remitente profesional
-                    [cita.mascota.cliente.usuario.email],  # Destinatario
-                    html_message=html_message,
-                    fail_silently=False,
-                )
-                
-                # Marcar como recordatorio enviado
-                cita.recordatorio_enviado = True
-                cita.save()
-                
-                self.stdout.write(
-                    self.style.SUCCESS(f'Recordatorio enviado para cita de {cita.mascota.nombre} con {cita.mascota.cliente.usuario.get_full_name()}')
-                )
+                with transaction.atomic():
+                    if not Cita.objects.filter(pk=cita.pk, recordatorio_enviado=False).update(recordatorio_enviado=True):
+                        metricas['omitidos'] += 1
+                        continue
+                    if not encolar_correo(f'cita:{cita.pk}:recordatorio', *self._mensaje(cita)):
+                        metricas['omitidos'] += 1
+                        continue
             except Exception as e:
+                metricas['fallidos'] += 1
                 self.stdout.write(
-                    self.style.ERROR(f'Error enviando recordatorio: {str(e)}')
+                    self.style.ERROR(f'Error preparando el recordatorio de la cita {cita.pk}: {str(e)}')
                 )
+                continue
+            metricas['encolados'] += 1
+            
+            self.stdout.write(
+                self.style.SUCCESS(f'Recordatorio encolado para cita de {cita.mascota.nombre} con {cita.mascota.cliente.usuario.get_full_name()}')
+            )
+        
+        liberar_atascados(getattr(settings, 'CORREO_MINUTOS_ATASCADO', 30))
+        enviados, fallidos_envio = despachar_pendientes()
+        if fallidos_envio:
+            self.stdout.write(
+                self.style.ERROR(f'Error enviando {fallidos_envio} emails; se reintentarán en la próxima ejecución')
+            )
         
         self.stdout.write(
-            self.style.SUCCESS(f'Proceso de recordatorios completado. {citas.count()} recordatorios enviados.')
-        )
\ No newline at end of file
+            self.style.SUCCESS(
+                f'Proceso de recordatorios completado. {metricas["encolados"]} encolados, '
+                f'{metricas["omitidos"]} omitidos, {metricas["fallidos"]} fallidos; '
+                f'{enviados} emails enviados, {fallidos_envio} con error.'
+            )
+        )
+    
+    def _mensaje(self, cita):
+        """Asunto, texto, destinatario y versión HTML del recordatorio de una cita"""
+        context = {
+            'cita': cita,
+            'cliente': cita.mascota.cliente,
+            'mascota': cita.mascota,
+            'tipo_display': cita.get_tipo_display(),
+            'prioridad_display': cita.get_prioridad_display(),
+        }
+        return (
+            f'Recordatorio de cita veterinaria para {cita.mascota.nombre}',
+            render_to_string('citas/emails/recordatorio_cita.txt', context),
+            cita.mascota.cliente.usuario.email,
+            render_to_string('citas/emails/recordatorio_cita.html', context),
+            'clinica@veterinariaejemplo.com',  # Remitente profesional
+        )
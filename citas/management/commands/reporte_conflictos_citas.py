@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from citas.conflictos import RECURSOS, reporte_conflictos
+
+
+class Command(BaseCommand):
+    help = 'Lista las citas que se solapan por veterinario, sala o mascota en los próximos días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Días a revisar desde hoy (por defecto 30)')
+        parser.add_argument('--recurso', choices=RECURSOS, action='append', help='Revisar solo este recurso (repetible)')
+
+    def handle(self, *args, **options):
+        desde = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        hasta = desde + timedelta(days=options['dias'])
+        conflictos = reporte_conflictos(desde, hasta, options['recurso'] or RECURSOS)
+        for recurso, valor, cita_id, otra_id in conflictos:
+            self.stdout.write(self.style.WARNING(f'{recurso} {valor}: cita {cita_id} se solapa con la cita {otra_id}'))
+        self.stdout.write(self.style.SUCCESS(f'{len(conflictos)} conflictos entre {desde:%d/%m/%Y} y {hasta:%d/%m/%Y}'))
@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-18 13:00
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def poblar_fecha_fin(apps, schema_editor):
+    Cita = apps.get_model('citas', 'Cita')
+    lote = []
+    for cita in Cita.objects.only('fecha', 'duracion_estimada').iterator(chunk_size=1000):
+        cita.fecha_fin = cita.fecha + timedelta(minutes=cita.duracion_estimada)
+        lote.append(cita)
+        if len(lote) == 1000:
+            Cita.objects.bulk_update(lote, ['fecha_fin'])
+            lote = []
+    Cita.objects.bulk_update(lote, ['fecha_fin'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0004_cita_veterinario_asignado_alter_cita_veterinario'),
+        ('mascotas', '0006_mascota_cumple_mmdd'),
+        ('veterinario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='fecha_fin',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Fin Estimado'),
+        ),
+        migrations.RunPython(poblar_fecha_fin, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['veterinario_asignado', 'fecha_fin'], name='cita_agenda_veterinario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['sala', 'fecha_fin'], name='cita_agenda_sala_idx'),
+        ),
+    ]
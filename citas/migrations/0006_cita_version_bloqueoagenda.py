@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0005_cita_fecha_fin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueoAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=120, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Bloqueo de Agenda',
+                'verbose_name_plural': 'Bloqueos de Agenda',
+            },
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,9 +1,16 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from mascotas.models import Mascota
 from veterinario.models import Veterinario
 from django.utils import timezone
+from veterinaria_project.modelos import VersionadoMixin
+
+# Estados que ocupan la agenda del veterinario, la sala y la mascota
+ESTADOS_AGENDA = ['programada', 'confirmada', 'en_progreso', 'reprogramada']
 
-class Cita(models.Model):
+class Cita(VersionadoMixin, models.Model):
     ESTADO_CHOICES = [
         ('programada', 'Programada'),
         ('confirmada', 'Confirmada'),
@@ -35,6 +42,25 @@ class Cita(models.Model):
         ('emergencia', 'Emergencia'),
     ]
 
+    ESTADOS_AGENDA = ESTADOS_AGENDA
+
+    # Duración estimada (minutos) según el tipo de cita
+    DURACION_POR_TIPO = {
+        'consulta_general': 30,
+        'vacunacion': 20,
+        'desparasitacion': 15,
+        'urgencia': 60,
+        'cirugia': 120,
+        'estetica': 90,
+        'odontologia': 45,
+        'analisis': 30,
+        'radiologia': 40,
+        'ecografia': 50,
+        'control': 20,
+        'comportamiento': 60,
+        'nutricion': 40,
+    }
+
    
    
    ##BD
@@ -55,6 +81,8 @@ class Cita(models.Model):
     )
     veterinario = models.CharField(max_length=100, blank=True, verbose_name="Veterinario Asignado (Texto)")
     duracion_estimada = models.PositiveIntegerField(default=30, verbose_name="Duración Estimada (minutos)")
+    # fecha + duracion_estimada, guardada para buscar solapamientos por índice (ver citas.conflictos)
+    fecha_fin = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Fin Estimado")
     sala = models.CharField(max_length=50, blank=True, verbose_name="Sala/Consultorio")
     notas = models.TextField(blank=True, verbose_name="Notas Adicionales")
     antecedentes = models.TextField(blank=True, verbose_name="Antecedentes Relevantes")
@@ -64,6 +92,8 @@ class Cita(models.Model):
     confirmada_por_cliente = models.BooleanField(default=False, verbose_name="Confirmada por Cliente")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
     fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
+    # Control optimista de concurrencia (ver VersionadoMixin)
+    version = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['fecha']
@@ -72,10 +102,49 @@ class Cita(models.Model):
         indexes = [
             models.Index(fields=['fecha', 'estado']),
             models.Index(fields=['mascota', 'fecha']),
+            # Solapamientos: las citas del recurso que terminan después del inicio buscado
+            models.Index(fields=['veterinario_asignado', 'fecha_fin'], name='cita_agenda_veterinario_idx'),
+            models.Index(fields=['sala', 'fecha_fin'], name='cita_agenda_sala_idx'),
         ]
     
     def __str__(self):
         return f"{self.mascota.nombre} - {self.fecha.strftime('%d/%m/%Y %H:%M')} - {self.get_tipo_display()}"
     
+    def save(self, *args, **kwargs):
+        self.fecha_fin = self.fecha + timedelta(minutes=self.duracion_estimada) if self.fecha else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'fecha', 'duracion_estimada'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'fecha_fin'}
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        # Sin solapamientos con otra cita del mismo veterinario, sala o mascota
+        from .conflictos import conflictos_de
+
+        if self.fecha and self.estado in self.ESTADOS_AGENDA:
+            errores = [
+                f'{recurso} ya tiene la cita del {otra.fecha.strftime("%d/%m/%Y %H:%M")} '
+                f'hasta las {otra.fecha_fin.strftime("%H:%M")}.'
+                for recurso, otra in conflictos_de(self)
+            ]
+            if errores:
+                raise ValidationError({'fecha': errores})
+
     def puede_ser_cancelada(self):
-        return self.estado in ['programada', 'confirmada']
\ No newline at end of file
+        return self.estado in ['programada', 'confirmada']
+
+class BloqueoAgenda(models.Model):
+    """
+    Fila de bloqueo por recurso y día ('veterinario:3:2026-05-04'). Agendar una
+    cita bloquea las de sus recursos con SELECT ... FOR UPDATE antes de volver a
+    comprobar solapamientos, así que dos reservas del mismo veterinario, sala o
+    mascota en el mismo día se serializan (ver citas.agenda).
+    """
+    clave = models.CharField(max_length=120, unique=True)
+
+    class Meta:
+        verbose_name = 'Bloqueo de Agenda'
+        verbose_name_plural = 'Bloqueos de Agenda'
+
+    def __str__(self):
+        return self.clave
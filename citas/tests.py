@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
@@ -83,4 +83,357 @@ class CitasTestCase(TestCase):
             tipo='vacunacion',
             estado='completada'
         )
-        self.assertFalse(cita_completada.puede_ser_cancelada())
\ No newline at end of file
+        self.assertFalse(cita_completada.puede_ser_cancelada())
+
+class EnviarRecordatoriosTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='recordar', password='testpass123', email='dueno@example.com')
+        cliente = Cliente.objects.create(usuario=user, telefono='+34123456789', direccion='Calle Test 123')
+        mascota = Mascota.objects.create(nombre='Luna', tipo='gato', sexo='hembra', cliente=cliente)
+        self.citas = [
+            Cita.objects.create(
+                mascota=mascota, fecha=timezone.now() + timedelta(hours=horas),
+                tipo='consulta', motivo='Control', estado='programada'
+            )
+            for horas in (2, 5, 30)
+        ]
+
+    def _ejecutar(self):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from citas.management.commands.enviar_recordatorios import Command
+
+        salida = StringIO()
+        mensaje = ('Recordatorio', 'Texto', 'dueno@example.com', '<p>Texto</p>', 'clinica@veterinariaejemplo.com')
+        with mock.patch.object(Command, '_mensaje', return_value=mensaje):
+            call_command('enviar_recordatorios', stdout=salida)
+        return salida.getvalue()
+
+    def test_reclama_cada_cita_una_sola_vez(self):
+        from django.core import mail
+
+        salida = self._ejecutar()
+        self.assertIn('2 encolados, 0 omitidos, 0 fallidos; 2 emails enviados', salida)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Cita.objects.filter(recordatorio_enviado=True).count(), 2)
+
+        # Una segunda ejecución (o una simultánea) no vuelve a enviar nada
+        salida = self._ejecutar()
+        self.assertIn('0 encolados', salida)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_cita_tomada_por_otra_ejecucion_se_omite(self):
+        from unittest import mock
+        from citas.management.commands import enviar_recordatorios
+
+        tomada = self.citas[0]
+        filtrar = Cita.objects.filter
+
+        def otra_ejecucion_se_adelanta(*args, **kwargs):
+            # Simula que otro proceso reclamó la cita entre la lectura y el UPDATE
+            if kwargs.get('pk') == tomada.pk:
+                return Cita.objects.none()
+            return filtrar(*args, **kwargs)
+
+        with mock.patch.object(enviar_recordatorios.Cita.objects, 'filter', side_effect=otra_ejecucion_se_adelanta):
+            salida = self._ejecutar()
+        self.assertIn('1 encolados, 1 omitidos', salida)
+
+@override_settings(NOTIFICACIONES_EVENTOS_BACKEND='notificaciones.eventos.BackendCola')
+class CamposRastreadosTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='rastreo', password='testpass123')
+        cliente = Cliente.objects.create(usuario=user, telefono='+34123456789', direccion='Calle Test 123')
+        mascota = Mascota.objects.create(nombre='Kira', tipo='perro', sexo='hembra', cliente=cliente)
+        self.cita = Cita.objects.create(
+            mascota=mascota, fecha=timezone.now() + timedelta(days=2),
+            tipo='consulta', motivo='Control', estado='programada'
+        )
+
+    def test_cambio_de_estado_sin_select_y_solo_columnas_modificadas(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from notificaciones.models import EventoNotificacion
+
+        cita = Cita.objects.get(pk=self.cita.pk)
+        self.assertEqual(cita.campos_modificados(), [])
+        cita.estado = 'confirmada'
+        self.assertEqual(cita.campos_modificados(), ['estado'])
+        self.assertEqual(cita.valor_original('estado'), 'programada')
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(cita.guardar_cambios(), ['estado', 'fecha_actualizacion'])
+        sql = [q['sql'] for q in consultas.captured_queries if 'citas_cita' in q['sql']]
+        self.assertEqual(len(sql), 1)
+        self.assertTrue(sql[0].startswith('UPDATE'))
+        self.assertNotIn('"motivo"', sql[0])
+
+        evento = EventoNotificacion.objects.get(nombre='cita_cambio_estado')
+        self.assertEqual(evento.datos, {'cita_id': cita.pk, 'estado': 'confirmada'})
+
+        # Después de guardar, los valores nuevos pasan a ser los originales
+        self.assertEqual(cita.campos_modificados(), [])
+        self.assertEqual(cita.guardar_cambios(), [])
+        cita.save()
+        self.assertEqual(EventoNotificacion.objects.filter(nombre='cita_cambio_estado').count(), 1)
+
+    def test_instancia_sin_valores_cargados_consulta_el_estado(self):
+        from notificaciones.models import EventoNotificacion
+
+        cita = Cita(pk=self.cita.pk, estado='cancelada')
+        cita.save(update_fields=['estado'])
+        self.assertEqual(EventoNotificacion.objects.get(nombre='cita_cambio_estado').datos['estado'], 'cancelada')
+
+class ConflictosAgendaTestCase(TestCase):
+    def setUp(self):
+        from veterinario.models import Veterinario
+
+        user = User.objects.create_user(username='agenda', password='testpass123')
+        cliente = Cliente.objects.create(usuario=user, telefono='+34123456789', direccion='Calle Test 123')
+        self.mascotas = [
+            Mascota.objects.create(nombre=f'Paciente {i}', tipo='perro', sexo='macho', cliente=cliente)
+            for i in range(3)
+        ]
+        vet_user = User.objects.create_user(username='vet_agenda', password='testpass123')
+        self.veterinario = Veterinario.objects.create(usuario=vet_user, nombre_completo='Ana Pérez')
+        self.inicio = (timezone.now() + timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def _cita(self, minutos, duracion=30, mascota=0, **extra):
+        datos = {'veterinario_asignado': self.veterinario, 'estado': 'programada', **extra}
+        return Cita.objects.create(
+            mascota=self.mascotas[mascota], fecha=self.inicio + timedelta(minutes=minutos),
+            tipo='consulta_general', motivo='Control', duracion_estimada=duracion, **datos
+        )
+
+    def test_fecha_fin_sigue_a_fecha_y_duracion(self):
+        cita = self._cita(0, duracion=45)
+        self.assertEqual(cita.fecha_fin, self.inicio + timedelta(minutes=45))
+        cita.fecha = self.inicio + timedelta(hours=1)
+        cita.save(update_fields=['fecha'])
+        self.assertEqual(Cita.objects.get(pk=cita.pk).fecha_fin, self.inicio + timedelta(minutes=105))
+
+    def test_solapamiento_por_veterinario_sala_y_mascota(self):
+        from django.core.exceptions import ValidationError
+        from .conflictos import citas_superpuestas
+
+        primera = self._cita(0, duracion=60, sala='Sala 1')
+        self._cita(60, mascota=1)  # empieza justo cuando termina la primera
+        self._cita(15, mascota=2, estado='cancelada')
+
+        fin = self.inicio + timedelta(minutes=90)
+        self.assertEqual(
+            list(citas_superpuestas(self.inicio + timedelta(minutes=30), fin, veterinario_asignado=self.veterinario)),
+            list(Cita.objects.filter(estado='programada').order_by('fecha'))
+        )
+        self.assertEqual(list(citas_superpuestas(self.inicio + timedelta(minutes=60), fin, sala='Sala 1')), [])
+
+        nueva = Cita(
+            mascota=self.mascotas[2], fecha=self.inicio + timedelta(minutes=30), tipo='consulta_general',
+            motivo='Control', sala='Sala 1'
+        )
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as error:
+                nueva.clean()
+        self.assertIn('La sala Sala 1', error.exception.message_dict['fecha'][0])
+
+        nueva.sala = 'Sala 2'
+        nueva.clean()
+        # Editar una cita no choca consigo misma, pero sí con la mascota en otra cita
+        primera.clean()
+        primera.fecha = self.inicio + timedelta(minutes=30)
+        primera.mascota = self.mascotas[1]
+        with self.assertRaises(ValidationError):
+            primera.clean()
+
+    def test_reporte_por_barrido_igual_a_comparar_todos_los_pares(self):
+        from .conflictos import reporte_conflictos
+
+        for minutos, duracion in [(0, 60), (30, 30), (45, 60), (120, 30), (150, 15), (160, 10), (200, 30)]:
+            self._cita(minutos, duracion=duracion, mascota=minutos % 3)
+
+        citas = list(Cita.objects.order_by('fecha', 'pk'))
+        esperados = {
+            (a.pk, b.pk) for i, a in enumerate(citas) for b in citas[i + 1:]
+            if a.fecha < b.fecha_fin and b.fecha < a.fecha_fin
+        }
+        reporte = reporte_conflictos(self.inicio, self.inicio + timedelta(days=1), recursos=['veterinario_asignado'])
+        self.assertEqual({(a, b) for _, _, a, b in reporte}, esperados)
+        self.assertEqual(len(reporte), len(esperados))
+        self.assertTrue(all(valor == self.veterinario.pk for _, valor, _, _ in reporte))
+
+
+class VersionCitaTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='version', password='testpass123', is_staff=True)
+        cliente = Cliente.objects.create(usuario=user, telefono='+34123456789', direccion='Calle Test 123')
+        mascota = Mascota.objects.create(nombre='Toby', tipo='perro', sexo='macho', cliente=cliente)
+        self.cita = Cita.objects.create(
+            mascota=mascota, fecha=timezone.now() + timedelta(days=2),
+            tipo='consulta', motivo='Control', estado='programada'
+        )
+        self.client.force_login(user)
+
+    def test_cambio_sobre_una_version_vieja_no_pisa_el_otro(self):
+        from veterinaria_project.modelos import RegistroDesactualizado
+
+        primera = Cita.objects.get(pk=self.cita.pk)
+        segunda = Cita.objects.get(pk=self.cita.pk)
+        primera.estado = 'cancelada'
+        primera.guardar_cambios()
+        self.assertEqual(primera.version, 1)
+
+        segunda.estado = 'confirmada'
+        with self.assertRaises(RegistroDesactualizado):
+            segunda.guardar_cambios()
+        self.assertEqual(segunda.version, 0)
+        self.assertEqual(Cita.objects.get(pk=self.cita.pk).estado, 'cancelada')
+
+        # Recargada, la segunda ya puede guardar
+        segunda.refresh_from_db()
+        segunda.notas = 'Reprogramar'
+        segunda.guardar_cambios()
+        self.assertEqual(Cita.objects.values_list('version', flat=True).get(pk=self.cita.pk), 2)
+
+    def test_vistas_de_estado_comparan_la_version_de_la_pagina(self):
+        urls = [
+            reverse('citas:cambiar_estado_cita', args=[self.cita.pk]),
+            reverse('administracion:cambiar_estado_cita', args=[self.cita.pk]),
+        ]
+        for url in urls:
+            Cita.objects.filter(pk=self.cita.pk).update(estado='programada')
+            version = Cita.objects.values_list('version', flat=True).get(pk=self.cita.pk)
+            respuesta = self.client.post(url, {'estado': 'confirmada', 'version': version})
+            self.assertTrue(respuesta.json()['success'], url)
+            self.assertEqual(respuesta.json()['version'], version + 1)
+
+            # Otra página abierta antes de ese cambio ya no puede guardar
+            respuesta = self.client.post(url, {'estado': 'programada', 'version': version})
+            self.assertEqual(respuesta.status_code, 409, url)
+            self.assertTrue(respuesta.json()['desactualizada'])
+            self.assertEqual(Cita.objects.get(pk=self.cita.pk).estado, 'confirmada')
+
+            self.assertFalse(self.client.post(url, {'estado': 'programada'}).json()['success'])
+
+    def test_admin_informa_version_vieja_y_choques_como_errores(self):
+        from veterinario.models import Veterinario
+
+        self.client.force_login(User.objects.create_superuser(username='super', password='testpass123'))
+        veterinario = Veterinario.objects.create(
+            usuario=User.objects.create_user(username='vet_admin', password='testpass123'), nombre_completo='Ana Pérez'
+        )
+        otra = Cita.objects.create(
+            mascota=self.cita.mascota, fecha=self.cita.fecha + timedelta(hours=2), tipo='consulta',
+            motivo='Control', estado='programada', veterinario_asignado=veterinario
+        )
+        url = reverse('admin:citas_cita_change', args=[self.cita.pk])
+        formulario = self.client.get(url).context['adminform'].form
+        datos = {
+            campo: formulario.initial.get(campo) for campo in ('mascota', 'estado', 'motivo', 'duracion_estimada')
+        }
+        datos.update({
+            'tipo': 'consulta_general',
+            'fecha_0': timezone.localtime(self.cita.fecha).strftime('%Y-%m-%d'),
+            'fecha_1': timezone.localtime(self.cita.fecha).strftime('%H:%M'),
+            'version_cargada': formulario['version_cargada'].value(),
+            'veterinario_asignado': veterinario.pk,
+        })
+
+        # Choca con la otra cita del veterinario: error del formulario, sin guardar
+        respuesta = self.client.post(url, dict(datos, fecha_1=timezone.localtime(otra.fecha).strftime('%H:%M')))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Ana Pérez ya tiene la cita', str(respuesta.context['adminform'].form.errors['fecha']))
+
+        # Otro usuario guarda la cita mientras el formulario sigue abierto
+        cambiada = Cita.objects.get(pk=self.cita.pk)
+        cambiada.notas = 'Cambio de otro usuario'
+        cambiada.guardar_cambios()
+        respuesta = self.client.post(url, datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Otro usuario modificó esta cita', str(respuesta.context['adminform'].form.non_field_errors()))
+        self.assertEqual(Cita.objects.get(pk=self.cita.pk).notas, 'Cambio de otro usuario')
+
+        respuesta = self.client.post(url, dict(datos, version_cargada=cambiada.version))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Cita.objects.get(pk=self.cita.pk).veterinario_asignado, veterinario)
+
+
+class AgendarConcurrenteTestCase(TransactionTestCase):
+    """Reservas simultáneas del mismo horario: solo una puede quedar en la agenda"""
+
+    RESERVAS = 8
+
+    def setUp(self):
+        from veterinario.models import Veterinario
+
+        user = User.objects.create_user(username='concurrente', password='testpass123')
+        cliente = Cliente.objects.create(usuario=user, telefono='+34123456789', direccion='Calle Test 123')
+        self.mascotas = [
+            Mascota.objects.create(nombre=f'Paciente {i}', tipo='perro', sexo='macho', cliente=cliente)
+            for i in range(self.RESERVAS)
+        ]
+        vet_user = User.objects.create_user(username='vet_concurrente', password='testpass123')
+        self.veterinario = Veterinario.objects.create(usuario=vet_user, nombre_completo='Ana Pérez')
+        self.fecha = (timezone.now() + timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def test_reservas_en_paralelo_del_mismo_horario(self):
+        import threading
+        from django.core.exceptions import ValidationError
+        from django.db import connection
+        from .agenda import agendar
+
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('requiere una base de pruebas en archivo (ver DATABASES en settings/base.py)')
+
+        barrera = threading.Barrier(self.RESERVAS)
+        resultados = []
+
+        def reservar(mascota):
+            try:
+                cita = Cita(
+                    mascota=mascota, fecha=self.fecha, tipo='consulta_general', motivo='Control',
+                    estado='confirmada', veterinario_asignado=self.veterinario
+                )
+                barrera.wait()
+                agendar(cita)
+                resultados.append('ok')
+            except ValidationError:
+                resultados.append('conflicto')
+            except Exception as e:
+                resultados.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(mascota,)) for mascota in self.mascotas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(sorted(resultados, key=str), ['conflicto'] * (self.RESERVAS - 1) + ['ok'])
+        self.assertEqual(Cita.objects.filter(veterinario_asignado=self.veterinario).count(), 1)
+
+    def test_claves_por_recurso_y_dia(self):
+        from datetime import datetime, time
+        from .agenda import agendar, claves_bloqueo
+
+        dia = timezone.localdate() + timedelta(days=3)
+        cita = Cita(
+            mascota=self.mascotas[0], fecha=timezone.make_aware(datetime.combine(dia, time(23, 45))),
+            tipo='consulta_general', motivo='Control', estado='confirmada',
+            veterinario_asignado=self.veterinario, sala='Sala 1'
+        )
+        # Una cita que cruza la medianoche bloquea los dos días de cada recurso
+        siguiente = dia + timedelta(days=1)
+        self.assertEqual(claves_bloqueo(cita), sorted(
+            f'{recurso}:{d.isoformat()}'
+            for recurso in (f'veterinario:{self.veterinario.pk}', 'sala:Sala 1', f'mascota:{self.mascotas[0].pk}')
+            for d in (dia, siguiente)
+        ))
+        agendar(cita)
+
+        # Sin recursos en común no hay conflicto aunque coincida el horario
+        agendar(Cita(
+            mascota=self.mascotas[1], fecha=cita.fecha, tipo='consulta_general', motivo='Control', estado='confirmada'
+        ))
+        self.assertEqual(Cita.objects.count(), 2)
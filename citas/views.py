@@ -2,9 +2,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
+from django.core.exceptions import ValidationError
 from datetime import timedelta
+from .agenda import agendar
 from .forms import CitaForm
 from .models import Cita
+from veterinaria_project.modelos import RegistroDesactualizado
 from mascotas.models import Mascota
 
 def solicitar_cita(request):
@@ -28,25 +31,10 @@ def solicitar_cita(request):
                 cita.estado = 'confirmada'  # Cambiar a 'confirmada' directamente desde el modal
                 cita.confirmada_por_cliente = True  # Marcar como confirmada por el cliente
                 
-                # Calcular duración estimada basada en el tipo de cita
-                duraciones = {
-                    'consulta_general': 30,
-                    'vacunacion': 20,
-                    'desparasitacion': 15,
-                    'urgencia': 60,
-                    'cirugia': 120,
-                    'estetica': 90,
-                    'odontologia': 45,
-                    'analisis': 30,
-                    'radiologia': 40,
-                    'ecografia': 50,
-                    'control': 20,
-                    'comportamiento': 60,
-                    'nutricion': 40,
-                }
-                cita.duracion_estimada = duraciones.get(cita.tipo, 30)
-                
-                cita.save()
+                # La duración estimada según el tipo ya la fijó el formulario (CitaForm.clean).
+                # agendar vuelve a comprobar los solapamientos con la agenda bloqueada, por si
+                # otra reserva tomó el horario después de validar el formulario
+                agendar(cita)
                 
                 messages.success(request, 
                     f'¡Cita confirmada correctamente para {cita.mascota.nombre}! '
@@ -54,6 +42,9 @@ def solicitar_cita(request):
                     f'Fecha: {cita.fecha.strftime("%d/%m/%Y a las %H:%M")}'
                 )
                 return redirect('citas:mis_citas')
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, 'El horario elegido ya no está disponible. Por favor elige otro.')
             except Exception as e:
                 messages.error(request, f'Error al guardar la cita: {str(e)}')
         else:
@@ -107,8 +98,11 @@ def cancelar_cita(request, cita_id):
 
     if cita.puede_ser_cancelada():
         cita.estado = 'cancelada'
-        cita.save()
-        messages.success(request, 'Cita cancelada correctamente.')
+        try:
+            cita.guardar_cambios()
+            messages.success(request, 'Cita cancelada correctamente.')
+        except RegistroDesactualizado:
+            messages.error(request, 'La cita cambió mientras la cancelabas. Revisa su estado e inténtalo de nuevo.')
     else:
         messages.error(request, 'No se puede cancelar una cita en su estado actual.')
 
@@ -135,15 +129,25 @@ def cambiar_estado_cita(request, cita_id):
         if nuevo_estado not in estados_validos:
             return JsonResponse({'success': False, 'error': 'Estado no válido'})
 
-        # Cambiar el estado
+        # Versión de la cita que se mostraba en la página: si otro la cambió después, no se pisa
+        version = request.POST.get('version')
+        if version is None:
+            return JsonResponse({'success': False, 'error': 'Versión no especificada'})
+        cita.comprobar_version(version)
+
+        # Cambiar el estado (solo se escriben las columnas modificadas)
         cita.estado = nuevo_estado
-        cita.save()
+        cita.guardar_cambios()
 
         return JsonResponse({
             'success': True,
+            'version': cita.version,
             'mensaje': f'Cita cambiada a {nuevo_estado} correctamente'
         })
 
+    except RegistroDesactualizado as e:
+        return JsonResponse({'success': False, 'error': str(e), 'desactualizada': True}, status=409)
+
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
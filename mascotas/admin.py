@@ -69,18 +69,15 @@ class MascotaAdmin(admin.ModelAdmin):
     )
 
     def save_model(self, request, obj, form, change):
-        # Guardar el veterinario anterior para comparar
-        veterinario_anterior = None
-        if change:  # Si es una edición
-            mascota_original = Mascota.objects.get(pk=obj.pk)
-            veterinario_anterior = mascota_original.veterinario_asignado
+        # El veterinario anterior sale de los valores cargados (CamposRastreadosMixin)
+        veterinario_cambiado = change and obj.campo_modificado('veterinario_asignado')
 
         # Guardar el objeto
         super().save_model(request, obj, form, change)
 
         # Mensajes personalizados
         if change:
-            if obj.veterinario_asignado != veterinario_anterior:
+            if veterinario_cambiado:
                 if obj.veterinario_asignado:
                     messages.success(
                         request,
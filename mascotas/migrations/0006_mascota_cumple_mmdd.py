@@ -0,0 +1,32 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+def poblar_cumple_mmdd(apps, schema_editor):
+    Mascota = apps.get_model('mascotas', 'Mascota')
+    con_fecha = Mascota.objects.filter(fecha_nacimiento__isnull=False).only('fecha_nacimiento')
+    lote = []
+    for mascota in con_fecha.iterator(chunk_size=1000):
+        mascota.cumple_mmdd = mascota.fecha_nacimiento.month * 100 + mascota.fecha_nacimiento.day
+        lote.append(mascota)
+        if len(lote) == 1000:
+            Mascota.objects.bulk_update(lote, ['cumple_mmdd'])
+            lote = []
+    Mascota.objects.bulk_update(lote, ['cumple_mmdd'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mascotas', '0005_mascota_veterinario_asignado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mascota',
+            name='cumple_mmdd',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(poblar_cumple_mmdd, migrations.RunPython.noop),
+    ]
@@ -3,8 +3,9 @@ from clientes.models import Cliente
 from veterinario.models import Veterinario
 from datetime import date
 from decimal import Decimal
+from veterinaria_project.modelos import CamposRastreadosMixin
 
-class Mascota(models.Model):
+class Mascota(CamposRastreadosMixin, models.Model):
     TIPO_CHOICES = [
         ('perro', 'Perro'),
         ('gato', 'Gato'),
@@ -53,6 +54,8 @@ class Mascota(models.Model):
     raza = models.CharField(max_length=100, verbose_name="Raza")
     sexo = models.CharField(max_length=10, choices=SEXO_CHOICES, verbose_name="Sexo")
     fecha_nacimiento = models.DateField(null=True, blank=True, verbose_name="Fecha de nacimiento")
+    # Mes y día de nacimiento como MMDD (p. ej. 1024), para buscar cumpleaños por índice
+    cumple_mmdd = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='mascotas', verbose_name="Cliente")
     
     # Identificación
@@ -124,6 +127,13 @@ class Mascota(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.get_tipo_display()})"
     
+    def save(self, *args, **kwargs):
+        self.cumple_mmdd = self.fecha_nacimiento.month * 100 + self.fecha_nacimiento.day if self.fecha_nacimiento else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'fecha_nacimiento' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'cumple_mmdd'}
+        super().save(*args, **kwargs)
+    
     def edad(self):
         if self.fecha_nacimiento:
             today = date.today()
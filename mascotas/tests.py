@@ -61,4 +61,29 @@ class MascotasTestCase(TestCase):
         
         self.client.login(username='testuser2', password='testpass123')
         response = self.client.get(reverse('mascotas:detalle_mascota', args=[self.mascota.id]))
-        self.assertEqual(response.status_code, 403)  # Debería ser prohibido
\ No newline at end of file
+        self.assertEqual(response.status_code, 403)  # Debería ser prohibido
+
+
+class AsignacionVeterinarioTestCase(TestCase):
+    def test_cambio_de_veterinario_sin_releer_la_mascota(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from veterinario.models import Veterinario
+
+        user = User.objects.create_user(username='dueno', password='testpass123')
+        cliente = Cliente.objects.create(usuario=user, telefono='+34123456789', direccion='Calle Test 123')
+        Mascota.objects.create(nombre='Max', tipo='perro', sexo='macho', cliente=cliente)
+        vet_user = User.objects.create_user(username='vet', password='testpass123')
+        veterinario = Veterinario.objects.create(usuario=vet_user, nombre_completo='Ana Pérez')
+
+        mascota = Mascota.objects.get(nombre='Max')
+        mascota.veterinario_asignado = veterinario
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(mascota.campo_modificado('veterinario_asignado'))
+            self.assertFalse(mascota.campo_modificado('nombre'))
+        self.assertEqual(len(consultas), 0)
+        self.assertIsNone(mascota.valor_original('veterinario_asignado'))
+
+        self.assertEqual(mascota.guardar_cambios(), ['veterinario_asignado'])
+        self.assertFalse(mascota.campo_modificado('veterinario_asignado'))
+        self.assertEqual(Mascota.objects.get(pk=mascota.pk).veterinario_asignado, veterinario)
@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
+from django.http import HttpResponseForbidden, JsonResponse
 from django.utils import timezone
 from django.template.loader import render_to_string
 from django.conf import settings
@@ -16,6 +16,7 @@ from PIL import Image as PILImage
 import os
 from .models import Mascota, HistorialMedico, Vacuna
 from .forms import MascotaForm, HistorialMedicoForm, VacunaForm
+from administracion.reportes import responder_con_reporte
 from datetime import date, timedelta
 
 def lista_mascotas(request):
@@ -257,8 +258,8 @@ def calendario_vacunas(request, mascota_id):
 
 def descargar_carnet_pdf(request, mascota_id):
     """
-    Genera y descarga el carnet de vacunación como PDF usando ReportLab
-    con el estilo visual del carnet oficial
+    Solicita el carnet de vacunación en PDF; el documento se genera en
+    segundo plano con ``construir_carnet_pdf``
     """
     mascota = get_object_or_404(Mascota, id=mascota_id)
 
@@ -268,6 +269,15 @@ def descargar_carnet_pdf(request, mascota_id):
         if not hasattr(request.user, 'cliente') or mascota.cliente != request.user.cliente:
             return HttpResponseForbidden("No tienes permiso para descargar este carnet")
 
+    # La generación del PDF se delega al worker de reportes
+    return responder_con_reporte(request, 'carnet_vacunacion', {'mascota_id': mascota.id})
+
+
+def construir_carnet_pdf(mascota):
+    """
+    Construye el PDF del carnet de vacunación con el estilo visual del carnet oficial.
+    Devuelve ``(nombre_archivo, contenido)``; lo ejecuta el worker de reportes.
+    """
     # Crear buffer para el PDF
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -444,18 +454,13 @@ def descargar_carnet_pdf(request, mascota_id):
     # Generar PDF
     doc.build(elements)
 
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Carnet_Vacunacion_{mascota.nombre}.pdf"'
-
-    return response
+    return f"Carnet_Vacunacion_{mascota.nombre}.pdf", buffer.getvalue()
 
 
 def descargar_plantilla_carnet_pdf(request, mascota_id):
     """
-    Genera y descarga una plantilla del carnet de vacunación con celdas vacías
-    para llenado físico usando ReportLab
+    Solicita la plantilla del carnet de vacunación con celdas vacías para
+    llenado físico; se genera en segundo plano con ``construir_plantilla_carnet_pdf``
     """
     mascota = get_object_or_404(Mascota, id=mascota_id)
 
@@ -464,6 +469,15 @@ def descargar_plantilla_carnet_pdf(request, mascota_id):
     if not es_admin:
         return HttpResponseForbidden("Solo los administradores pueden descargar plantillas")
 
+    # La generación del PDF se delega al worker de reportes
+    return responder_con_reporte(request, 'plantilla_carnet_vacunacion', {'mascota_id': mascota.id})
+
+
+def construir_plantilla_carnet_pdf(mascota):
+    """
+    Construye la plantilla del carnet de vacunación con celdas vacías.
+    Devuelve ``(nombre_archivo, contenido)``; lo ejecuta el worker de reportes.
+    """
     # Crear buffer para el PDF
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -675,18 +689,13 @@ def descargar_plantilla_carnet_pdf(request, mascota_id):
     # Generar PDF
     doc.build(elements)
 
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Plantilla_Carnet_Vacunacion_{mascota.nombre}.pdf"'
-
-    return response
+    return f"Plantilla_Carnet_Vacunacion_{mascota.nombre}.pdf", buffer.getvalue()
 
 
 def descargar_carnet_identificacion_pdf(request, mascota_id):
     """
-    Genera y descarga el carnet de identificación de mascota como PDF usando ReportLab
-    con diseño oficial colombiano
+    Solicita el carnet de identificación de la mascota en PDF; se genera en
+    segundo plano con ``construir_carnet_identificacion_pdf``
     """
     mascota = get_object_or_404(Mascota, id=mascota_id)
 
@@ -696,6 +705,15 @@ def descargar_carnet_identificacion_pdf(request, mascota_id):
         if not hasattr(request.user, 'cliente') or mascota.cliente != request.user.cliente:
             return HttpResponseForbidden("No tienes permiso para descargar este carnet")
 
+    # La generación del PDF se delega al worker de reportes
+    return responder_con_reporte(request, 'carnet_identificacion', {'mascota_id': mascota.id})
+
+
+def construir_carnet_identificacion_pdf(mascota):
+    """
+    Construye el carnet de identificación de la mascota con diseño oficial colombiano.
+    Devuelve ``(nombre_archivo, contenido)``; lo ejecuta el worker de reportes.
+    """
     # Crear buffer para el PDF
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -875,12 +893,7 @@ def descargar_carnet_identificacion_pdf(request, mascota_id):
     # Generar PDF
     doc.build(elements)
 
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Carnet_Identificacion_{mascota.nombre}.pdf"'
-
-    return response
+    return f"Carnet_Identificacion_{mascota.nombre}.pdf", buffer.getvalue()
 
 
 
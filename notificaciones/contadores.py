@@ -0,0 +1,197 @@
+"""
+Contadores de notificaciones no leídas por destinatario.
+
+Cada cliente, cada veterinario y el grupo de administradores tienen una fila en
+``ContadorNotificaciones``. Las señales de ``Notificacion`` la ajustan con un
+UPDATE atómico (+1 al crear una no leída, -1 al leerla o borrarla), y las
+operaciones masivas que no disparan señales (``update(leida=True)``,
+``bulk_create``) deben llamar a ``ajustar`` o ``recalcular``. Si una fila no existe se calcula
+desde la tabla de notificaciones; el comando ``reconciliar_contadores`` corrige
+cualquier desvío.
+
+Una notificación para un cliente (o veterinario) que además es para
+administradores suma en los dos contadores y también en 'admin+cliente:<id>'.
+Un usuario del personal con perfil ve ambas listas, así que su total resta ese
+contador: cada notificación cuenta una vez, como en la lista.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from .models import ContadorNotificaciones, Notificacion
+
+ADMIN = 'admin'
+
+
+def clave_cliente(cliente_id):
+    return f'cliente:{cliente_id}'
+
+
+def clave_veterinario(veterinario_id):
+    return f'veterinario:{veterinario_id}'
+
+
+def clave_admin_y(clave):
+    """Contador de las no leídas de ``clave`` que también son para administradores"""
+    return f'{ADMIN}+{clave}'
+
+
+def claves_notificacion(cliente_id=None, veterinario_id=None, para_admin=False):
+    """Destinatarios cuyo contador incluye una notificación con estos datos"""
+    claves = []
+    if cliente_id:
+        claves.append(clave_cliente(cliente_id))
+    if veterinario_id:
+        claves.append(clave_veterinario(veterinario_id))
+    if para_admin:
+        claves += [clave_admin_y(clave) for clave in claves]
+        claves.append(ADMIN)
+    return claves
+
+
+def claves_usuario(usuario):
+    """
+    Destinatarios cuyas notificaciones ve el usuario (mismo criterio que la
+    lista de notificaciones). Lista vacía si no tiene perfil.
+    """
+    from clientes.models import Cliente
+    from veterinario.models import Veterinario
+
+    if usuario.groups.filter(name='Veterinarios').exists():
+        ids = Veterinario.objects.filter(usuario=usuario).values_list('id', flat=True)[:1]
+        claves = [clave_veterinario(pk) for pk in ids]
+    else:
+        ids = Cliente.objects.filter(usuario=usuario).values_list('id', flat=True)[:1]
+        claves = [clave_cliente(pk) for pk in ids]
+
+    if claves and (usuario.is_staff or usuario.is_superuser):
+        claves.append(ADMIN)
+    return claves
+
+
+def _filtro(clave):
+    if clave == ADMIN:
+        return {'para_admin': True}
+    filtro = {}
+    if clave.startswith(clave_admin_y('')):
+        filtro['para_admin'] = True
+        clave = clave[len(clave_admin_y('')):]
+    tipo, pk = clave.split(':')
+    filtro[f'{tipo}_id'] = int(pk)
+    return filtro
+
+
+def contar(clave):
+    """Conteo real en la tabla de notificaciones (usa los índices compuestos con ``leida``)"""
+    return Notificacion.objects.filter(leida=False, **_filtro(clave)).count()
+
+
+def _contar_agrupado(claves):
+    """Conteo real de varios destinatarios con una consulta agrupada por tipo"""
+    reales = dict.fromkeys(claves, 0)
+    ids = {'cliente': [], 'veterinario': []}
+    for clave in reales:
+        if clave == ADMIN or clave.startswith(clave_admin_y('')):
+            reales[clave] = contar(clave)
+        else:
+            tipo, pk = clave.split(':')
+            ids[tipo].append(int(pk))
+
+    pendientes = Notificacion.objects.filter(leida=False)
+    for tipo, hacer_clave in (('cliente', clave_cliente), ('veterinario', clave_veterinario)):
+        if ids[tipo]:
+            campo = f'{tipo}_id'
+            filas = pendientes.filter(**{f'{campo}__in': ids[tipo]}).values(campo).annotate(total=Count('id')).order_by()
+            reales.update((hacer_clave(fila[campo]), fila['total']) for fila in filas)
+    return reales
+
+
+def recalcular(claves):
+    """Recalcula desde la tabla los contadores indicados"""
+    reales = _contar_agrupado(claves)
+    existentes = list(ContadorNotificaciones.objects.filter(destinatario__in=reales))
+    for contador in existentes:
+        contador.no_leidas = reales.pop(contador.destinatario)
+    ContadorNotificaciones.objects.bulk_update(existentes, ['no_leidas'])
+    ContadorNotificaciones.objects.bulk_create(
+        [ContadorNotificaciones(destinatario=clave, no_leidas=total) for clave, total in reales.items()],
+        ignore_conflicts=True
+    )
+
+
+def ajustar(claves, delta):
+    """Suma ``delta`` a los contadores; los que aún no existen se calculan desde la tabla"""
+    if not claves:
+        return
+    actualizados = ContadorNotificaciones.objects.filter(destinatario__in=claves).update(
+        no_leidas=Greatest(F('no_leidas') + delta, Value(0))
+    )
+    if actualizados < len(claves):
+        existentes = set(ContadorNotificaciones.objects.filter(destinatario__in=claves).values_list('destinatario', flat=True))
+        recalcular([clave for clave in claves if clave not in existentes])
+
+
+def sumar(claves):
+    """Suma una no leída por cada aparición de la clave (un UPDATE por cada cantidad distinta)"""
+    por_cantidad = {}
+    for clave, cantidad in Counter(claves).items():
+        por_cantidad.setdefault(cantidad, []).append(clave)
+    for cantidad, grupo in por_cantidad.items():
+        ajustar(grupo, cantidad)
+
+
+def no_leidas(claves):
+    """
+    Total de no leídas de varios destinatarios, leyendo solo los contadores.
+    Con 'admin' entre las claves, las que también son de otra clave se cuentan una vez.
+    """
+    if not claves:
+        return 0
+    repetidas = [clave_admin_y(clave) for clave in claves if clave != ADMIN] if ADMIN in claves else []
+    todas = list(claves) + repetidas
+    valores = dict(
+        ContadorNotificaciones.objects.filter(destinatario__in=todas).values_list('destinatario', 'no_leidas')
+    )
+    faltantes = [clave for clave in todas if clave not in valores]
+    if faltantes:
+        recalcular(faltantes)
+        valores.update(
+            ContadorNotificaciones.objects.filter(destinatario__in=faltantes).values_list('destinatario', 'no_leidas')
+        )
+    return sum(valores[clave] for clave in claves) - sum(valores[clave] for clave in repetidas)
+
+
+def no_leidas_usuario(usuario):
+    return no_leidas(claves_usuario(usuario))
+
+
+def reconciliar():
+    """
+    Recalcula todos los contadores con cinco consultas agrupadas y corrige los
+    que no coinciden. Devuelve ``{destinatario: (antes, despues)}`` de los corregidos.
+    """
+    reales = {ADMIN: Notificacion.objects.filter(leida=False, para_admin=True).count()}
+    pendientes = Notificacion.objects.filter(leida=False)
+    for campo, clave in (('cliente_id', clave_cliente), ('veterinario_id', clave_veterinario)):
+        filas = pendientes.filter(**{f'{campo}__isnull': False}).values(campo).annotate(total=Count('id')).order_by()
+        reales.update((clave(fila[campo]), fila['total']) for fila in filas)
+        filas = pendientes.filter(**{f'{campo}__isnull': False}, para_admin=True).values(campo).annotate(
+            total=Count('id')
+        ).order_by()
+        reales.update((clave_admin_y(clave(fila[campo])), fila['total']) for fila in filas)
+
+    corregidos = {}
+    guardados = {c.destinatario: c for c in ContadorNotificaciones.objects.all()}
+    for clave, contador in guardados.items():
+        real = reales.pop(clave, 0)
+        if contador.no_leidas != real:
+            corregidos[clave] = (contador.no_leidas, real)
+            contador.no_leidas = real
+    if corregidos:
+        ContadorNotificaciones.objects.bulk_update([guardados[clave] for clave in corregidos], ['no_leidas'])
+
+    nuevos = [ContadorNotificaciones(destinatario=clave, no_leidas=total) for clave, total in reales.items()]
+    ContadorNotificaciones.objects.bulk_create(nuevos, ignore_conflicts=True)
+    corregidos.update((c.destinatario, (None, c.no_leidas)) for c in nuevos)
+    return corregidos
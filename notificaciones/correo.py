@@ -0,0 +1,194 @@
+"""
+Bandeja de salida de correos (``CorreoSaliente``).
+
+Los comandos de recordatorios encolan sus mensajes con ``encolar_correo`` y
+luego llaman a ``despachar_pendientes``, que:
+
+- reclama los correos pendientes con un UPDATE condicionado al estado, como
+  la cola de reportes, así que dos ejecuciones simultáneas no toman el mismo;
+- reparte los mensajes en lotes entre un pool acotado de hilos. Cada hilo abre
+  una sola conexión SMTP (``get_connection``) para todo su lote;
+- respeta un límite de mensajes por segundo compartido por todos los hilos;
+- registra cada resultado apenas se conoce. Un fallo vuelve a 'pendiente' con
+  espera exponencial hasta agotar los intentos.
+
+Solo el hilo principal escribe en la base de datos; los hilos solo hablan con
+el servidor de correo. Si el proceso muere a mitad de un envío, los correos
+quedan en 'enviando' y ``liberar_atascados`` los devuelve a la cola: a lo sumo
+se repite el mensaje que estaba en vuelo.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CorreoSaliente
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_correo(clave, asunto, cuerpo, destinatario, cuerpo_html='', remitente=''):
+    """
+    Registra un correo para enviar. Si ya existe uno con la misma clave no se
+    vuelve a encolar; devuelve True solo si se creó.
+    """
+    if not destinatario:
+        return False
+    _, creado = CorreoSaliente.objects.get_or_create(
+        clave=clave,
+        defaults={
+            'asunto': asunto,
+            'cuerpo': cuerpo,
+            'cuerpo_html': cuerpo_html,
+            'remitente': remitente,
+            'destinatario': destinatario,
+        }
+    )
+    return creado
+
+
+class LimitadorTasa:
+    """Reparte los envíos para no superar ``por_segundo`` mensajes por segundo entre todos los hilos"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0
+        self.siguiente = time.monotonic()
+        self.candado = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self.candado:
+            ahora = time.monotonic()
+            turno = max(self.siguiente, ahora)
+            self.siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def _mensaje(correo, conexion):
+    mensaje = EmailMultiAlternatives(
+        subject=correo.asunto,
+        body=correo.cuerpo,
+        from_email=correo.remitente or settings.DEFAULT_FROM_EMAIL,
+        to=[correo.destinatario],
+        connection=conexion,
+    )
+    if correo.cuerpo_html:
+        mensaje.attach_alternative(correo.cuerpo_html, 'text/html')
+    return mensaje
+
+
+def _enviar_lote(correos, limitador, resultados):
+    """Envía un lote por una sola conexión; publica (id, error) por cada correo"""
+    conexion = None
+    informados = set()
+    try:
+        # Dentro del try: si crear el backend falla, cada correo igual recibe su resultado
+        conexion = get_connection(fail_silently=False)
+        conexion.open()
+        for correo in correos:
+            limitador.esperar()
+            try:
+                conexion.send_messages([_mensaje(correo, conexion)])
+                error = None
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+            resultados.put((correo.pk, error))
+            informados.add(correo.pk)
+            if error:
+                # La conexión puede haber quedado inutilizable: se abre otra para el resto
+                conexion.close()
+                conexion.open()
+    except Exception as e:
+        # Sin conexión con el servidor: el resto del lote vuelve a la cola
+        logger.warning('No se pudo conectar al servidor de correo: %s', e)
+        for correo in correos:
+            if correo.pk not in informados:
+                resultados.put((correo.pk, str(e) or e.__class__.__name__))
+    finally:
+        try:
+            if conexion is not None:
+                conexion.close()
+        except Exception:
+            pass
+
+
+def reclamar_pendientes(limite):
+    """Pasa a 'enviando' hasta ``limite`` correos listos para enviar y los devuelve"""
+    candidatos = CorreoSaliente.objects.filter(
+        estado='pendiente',
+        proximo_intento__lte=timezone.now()
+    ).order_by('proximo_intento', 'pk').values_list('id', flat=True)[:limite]
+    reclamados = []
+    for correo_id in candidatos:
+        tomado = CorreoSaliente.objects.filter(pk=correo_id, estado='pendiente').update(
+            estado='enviando',
+            proximo_intento=timezone.now()
+        )
+        if tomado:
+            reclamados.append(correo_id)
+    return list(CorreoSaliente.objects.filter(pk__in=reclamados).order_by('pk'))
+
+
+def liberar_atascados(minutos):
+    """Devuelve a la cola los correos que quedaron en 'enviando' por una ejecución interrumpida"""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return CorreoSaliente.objects.filter(estado='enviando', proximo_intento__lt=limite).update(estado='pendiente')
+
+
+def _registrar(correo_id, error, max_intentos, espera_base):
+    ahora = timezone.now()
+    if error is None:
+        CorreoSaliente.objects.filter(pk=correo_id).update(
+            estado='enviado', fecha_envio=ahora, intentos=F('intentos') + 1, ultimo_error=''
+        )
+        return True
+
+    correo = CorreoSaliente.objects.get(pk=correo_id)
+    correo.intentos += 1
+    correo.ultimo_error = error
+    if correo.intentos >= max_intentos:
+        correo.estado = 'error'
+    else:
+        correo.estado = 'pendiente'
+        correo.proximo_intento = ahora + timedelta(seconds=espera_base * 2 ** (correo.intentos - 1))
+    correo.save(update_fields=['intentos', 'ultimo_error', 'estado', 'proximo_intento'])
+    logger.warning('Error enviando el correo %s (intento %s): %s', correo_id, correo.intentos, error)
+    return False
+
+
+def despachar_pendientes(workers=None, tamano_lote=None, por_segundo=None, max_intentos=None, espera_base=None):
+    """
+    Envía los correos listos. Devuelve ``(enviados, fallidos)``; los fallidos
+    que aún tienen intentos quedan programados para más tarde.
+    """
+    workers = workers or getattr(settings, 'CORREO_WORKERS', 4)
+    tamano_lote = tamano_lote or getattr(settings, 'CORREO_TAMANO_LOTE', 50)
+    por_segundo = getattr(settings, 'CORREO_MAX_POR_SEGUNDO', 10) if por_segundo is None else por_segundo
+    max_intentos = max_intentos or getattr(settings, 'CORREO_MAX_INTENTOS', 5)
+    espera_base = getattr(settings, 'CORREO_ESPERA_REINTENTO', 60) if espera_base is None else espera_base
+
+    limitador = LimitadorTasa(por_segundo)
+    enviados = fallidos = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='correo') as pool:
+        while True:
+            correos = reclamar_pendientes(workers * tamano_lote)
+            if not correos:
+                break
+            resultados = queue.Queue()
+            for inicio in range(0, len(correos), tamano_lote):
+                pool.submit(_enviar_lote, correos[inicio:inicio + tamano_lote], limitador, resultados)
+            for _ in correos:
+                if _registrar(*resultados.get(), max_intentos, espera_base):
+                    enviados += 1
+                else:
+                    fallidos += 1
+    return enviados, fallidos
@@ -0,0 +1,153 @@
+"""
+Bus de eventos para los efectos de las señales de notificaciones.
+
+Las señales de ``Cita``, ``Vacuna``, ``Mascota``, ``Orden`` y ``Comentario``
+ya no crean recordatorios ni notificaciones dentro de la petición: publican un
+evento con los ids necesarios (``publicar``) y un manejador registrado con
+``@manejador`` lo ejecuta después de confirmar la transacción. Los manejadores
+reciben una lista de eventos del mismo tipo, así que crean sus filas con un
+``bulk_create`` por lote.
+
+El backend se elige con ``NOTIFICACIONES_EVENTOS_BACKEND``:
+
+- ``BackendCola`` (producción): guarda un ``EventoNotificacion`` en la misma
+  transacción del cambio, así que un rollback lo descarta y el comando
+  ``procesar_eventos`` solo lo ve una vez confirmado. El comando reclama los
+  eventos por lotes, los agrupa por nombre y reintenta los que fallan con
+  espera exponencial (``proximo_intento``), como la bandeja de correos.
+- ``BackendInline`` (tests y desarrollo): ejecuta el manejador con
+  ``transaction.on_commit`` en el mismo proceso.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EventoNotificacion
+
+logger = logging.getLogger(__name__)
+
+_manejadores = {}
+
+
+def manejador(nombre):
+    """Registra la función que procesa una lista de eventos ``nombre``"""
+    def registrar(funcion):
+        _manejadores[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def despachar(nombre, lista_datos):
+    _manejadores[nombre](lista_datos)
+
+
+class BackendInline:
+    """Ejecuta el manejador en el proceso actual al confirmar la transacción"""
+
+    def publicar(self, nombre, datos):
+        # robust: un fallo se registra en el log sin afectar al cambio ya confirmado
+        transaction.on_commit(lambda: despachar(nombre, [datos]), robust=True)
+
+
+class BackendCola:
+    """Guarda el evento para el comando procesar_eventos"""
+
+    def publicar(self, nombre, datos):
+        EventoNotificacion.objects.create(nombre=nombre, datos=datos)
+
+
+def obtener_backend():
+    return import_string(getattr(settings, 'NOTIFICACIONES_EVENTOS_BACKEND', 'notificaciones.eventos.BackendInline'))()
+
+
+def publicar(nombre, **datos):
+    """Publica un evento; ``datos`` debe ser serializable a JSON (ids, no instancias)"""
+    obtener_backend().publicar(nombre, datos)
+
+
+def reclamar_pendientes(limite):
+    """Pasa a 'procesando' hasta ``limite`` eventos pendientes cuya espera venció y los devuelve en orden"""
+    ahora = timezone.now()
+    candidatos = EventoNotificacion.objects.filter(
+        estado='pendiente',
+        proximo_intento__lte=ahora
+    ).order_by('pk').values_list('pk', flat=True)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            # Las filas bloqueadas por otro worker se saltan: cada uno toma las suyas
+            ids = list(candidatos.select_for_update(skip_locked=True)[:limite])
+            EventoNotificacion.objects.filter(pk__in=ids).update(estado='procesando', fecha_actualizacion=ahora)
+        else:
+            ids = [
+                evento_id for evento_id in list(candidatos[:limite])
+                if EventoNotificacion.objects.filter(pk=evento_id, estado='pendiente').update(
+                    estado='procesando', fecha_actualizacion=ahora
+                )
+            ]
+    return list(EventoNotificacion.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def liberar_atascados(minutos):
+    """Devuelve a la cola los eventos que quedaron en 'procesando' por un worker interrumpido"""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return EventoNotificacion.objects.filter(estado='procesando', fecha_actualizacion__lt=limite).update(estado='pendiente')
+
+
+def _ejecutar(nombre, eventos):
+    with transaction.atomic():
+        despachar(nombre, [evento.datos for evento in eventos])
+        EventoNotificacion.objects.filter(pk__in=[evento.pk for evento in eventos]).delete()
+
+
+def _registrar_fallo(evento, error, max_intentos, espera_base):
+    evento.intentos += 1
+    evento.ultimo_error = str(error) or error.__class__.__name__
+    if evento.intentos >= max_intentos:
+        evento.estado = 'error'
+    else:
+        evento.estado = 'pendiente'
+        evento.proximo_intento = timezone.now() + timedelta(seconds=espera_base * 2 ** (evento.intentos - 1))
+    evento.save(update_fields=['intentos', 'ultimo_error', 'estado', 'proximo_intento', 'fecha_actualizacion'])
+    logger.warning('Error procesando el evento %s %s (intento %s): %s', evento.nombre, evento.pk, evento.intentos, error)
+
+
+def procesar_pendientes(tamano_lote=None, max_intentos=None, espera_base=None):
+    """
+    Procesa un lote de eventos: un llamado al manejador (y una transacción)
+    por cada nombre de evento. Si el lote de un nombre falla se reintenta
+    evento por evento para aislar el que falla. Devuelve ``(procesados, fallidos)``;
+    ``(0, 0)`` significa que no había nada listo.
+    """
+    tamano_lote = tamano_lote or getattr(settings, 'NOTIFICACIONES_EVENTOS_LOTE', 200)
+    max_intentos = max_intentos or getattr(settings, 'NOTIFICACIONES_EVENTOS_MAX_INTENTOS', 5)
+    espera_base = getattr(settings, 'NOTIFICACIONES_EVENTOS_ESPERA_REINTENTO', 30) if espera_base is None else espera_base
+
+    por_nombre = {}
+    for evento in reclamar_pendientes(tamano_lote):
+        por_nombre.setdefault(evento.nombre, []).append(evento)
+
+    procesados = fallidos = 0
+    for nombre, eventos in por_nombre.items():
+        try:
+            _ejecutar(nombre, eventos)
+            procesados += len(eventos)
+            continue
+        except Exception as e:
+            if len(eventos) == 1:
+                _registrar_fallo(eventos[0], e, max_intentos, espera_base)
+                fallidos += 1
+                continue
+            logger.warning('Falló el lote de eventos %s; se reintentan uno por uno: %s', nombre, e)
+
+        for evento in eventos:
+            try:
+                _ejecutar(nombre, [evento])
+                procesados += 1
+            except Exception as e:
+                _registrar_fallo(evento, e, max_intentos, espera_base)
+                fallidos += 1
+    return procesados, fallidos
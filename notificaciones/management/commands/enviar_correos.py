@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notificaciones.correo import despachar_pendientes, liberar_atascados
+
+
+class Command(BaseCommand):
+    help = 'Envía los correos pendientes de la bandeja de salida (incluidos los reintentos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'CORREO_WORKERS', 4),
+            help='Hilos de envío, cada uno con su propia conexión SMTP'
+        )
+        parser.add_argument(
+            '--por-segundo',
+            type=float,
+            default=getattr(settings, 'CORREO_MAX_POR_SEGUNDO', 10),
+            help='Máximo de mensajes por segundo entre todos los hilos (0 sin límite)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=30.0,
+            help='Segundos de espera entre revisiones de la bandeja'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Envía lo que haya pendiente y termina'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            liberados = liberar_atascados(getattr(settings, 'CORREO_MINUTOS_ATASCADO', 30))
+            if liberados:
+                self.stdout.write(self.style.WARNING(f'{liberados} correos atascados devueltos a la cola'))
+
+            enviados, fallidos = despachar_pendientes(workers=options['workers'], por_segundo=options['por_segundo'])
+            if enviados or fallidos:
+                self.stdout.write(self.style.SUCCESS(f'{enviados} correos enviados, {fallidos} con error'))
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
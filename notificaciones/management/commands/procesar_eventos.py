@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notificaciones import eventos
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta por lotes los efectos pendientes de las señales (recordatorios y notificaciones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=getattr(settings, 'NOTIFICACIONES_EVENTOS_LOTE', 200),
+            help='Eventos reclamados por cada vuelta'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando una vuelta no procesa ningún evento'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa lo que haya pendiente y termina'
+        )
+
+    def handle(self, *args, **options):
+        liberados = eventos.liberar_atascados(getattr(settings, 'NOTIFICACIONES_EVENTOS_MINUTOS_ATASCADO', 10))
+        if liberados:
+            self.stdout.write(self.style.WARNING(f'{liberados} eventos atascados devueltos a la cola'))
+
+        total_procesados = total_fallidos = 0
+        while True:
+            procesados, fallidos = eventos.procesar_pendientes(tamano_lote=options['lote'])
+            total_procesados += procesados
+            total_fallidos += fallidos
+            if fallidos:
+                self.stdout.write(self.style.ERROR(f'{fallidos} eventos con error (se reintentarán)'))
+            if not procesados:
+                # Sin avance (nada pendiente o solo fallos, que esperan su reintento)
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f'Eventos procesados: {total_procesados}, con error: {total_fallidos}'))
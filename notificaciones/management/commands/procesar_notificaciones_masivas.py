@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notificaciones import masivas
+
+
+class Command(BaseCommand):
+    help = 'Crea por lotes las notificaciones de los envíos masivos pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=getattr(settings, 'NOTIFICACIONES_MASIVAS_LOTE', 1000),
+            help='Notificaciones creadas por cada INSERT'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5.0,
+            help='Segundos de espera cuando no hay envíos pendientes'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa lo que haya pendiente y termina'
+        )
+
+    def handle(self, *args, **options):
+        liberados = masivas.liberar_atascados(getattr(settings, 'NOTIFICACIONES_MASIVAS_MINUTOS_ATASCADO', 10))
+        if liberados:
+            self.stdout.write(self.style.WARNING(f'{liberados} envíos atascados devueltos a la cola'))
+
+        while True:
+            ids = masivas.reclamar_pendientes(1)
+            for envio_id in ids:
+                self._procesar(envio_id, options['lote'])
+            if not ids:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+
+    def _procesar(self, envio_id, lote):
+        inicio = time.monotonic()
+
+        def progreso(envio):
+            self.stdout.write(f'Envío {envio_id}: {envio.enviadas}/{envio.total_destinatarios} ({envio.porcentaje}%)')
+
+        estado = masivas.procesar_envio(envio_id, tamano_lote=lote, progreso=progreso)
+        duracion = time.monotonic() - inicio
+        if estado == 'completado':
+            self.stdout.write(self.style.SUCCESS(f'Envío {envio_id} completado en {duracion:.1f} s'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Envío {envio_id} falló'))
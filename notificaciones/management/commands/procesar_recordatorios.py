@@ -1,9 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
-from notificaciones.models import Recordatorio, Notificacion
-from datetime import timedelta
+from notificaciones.correo import despachar_pendientes, encolar_correo, liberar_atascados
+from notificaciones.recordatorios import enviar_pendientes, notificar_cumpleanos
 
 class Command(BaseCommand):
     help = 'Procesa recordatorios pendientes y envía notificaciones'
@@ -11,32 +10,12 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Procesando recordatorios...')
 
-        # Obtener recordatorios que deben enviarse hoy
-        recordatorios_pendientes = Recordatorio.objects.filter(
-            activo=True,
-            enviado=False
-        )
-
-        enviados = 0
-        for recordatorio in recordatorios_pendientes:
-            if recordatorio.debe_enviarse():
-                # Crear notificación
-                Notificacion.objects.create(
-                    cliente=recordatorio.cliente,
-                    tipo=recordatorio.tipo,
-                    titulo=recordatorio.titulo,
-                    mensaje=recordatorio.mensaje,
-                    url_relacionada=self._get_url_relacionada(recordatorio)
-                )
-
-                # Enviar email si el cliente prefiere email
-                if hasattr(recordatorio.cliente, 'preferencias_comunicacion') and recordatorio.cliente.preferencias_comunicacion == 'email':
-                    self._enviar_email_recordatorio(recordatorio)
-
-                # Marcar como enviado
-                recordatorio.marcar_enviado()
-                enviados += 1
-
+        # Los recordatorios que vencen hoy se reclaman en SQL y se envían por lotes;
+        # sus emails se encolan en la misma transacción que marca el lote como enviado.
+        # Varias ejecuciones a la vez se reparten la cola sin duplicar envíos.
+        self.metricas = {'emails_encolados': 0, 'emails_omitidos': 0}
+        for lote in enviar_pendientes(en_transaccion=self._encolar_emails, metricas=self.metricas):
+            for recordatorio in lote:
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'Recordatorio enviado: {recordatorio.titulo} para {recordatorio.cliente}'
@@ -46,91 +25,70 @@ class Command(BaseCommand):
         # Procesar recordatorios recurrentes (cumpleaños)
         self._procesar_recordatorios_recurrentes()
 
-        if enviados == 0:
+        self._despachar_correos()
+
+        if self.metricas['enviados'] == 0:
             self.stdout.write('No hay recordatorios pendientes para enviar.')
         else:
             self.stdout.write(
-                self.style.SUCCESS(f'Se enviaron {enviados} recordatorios.')
+                self.style.SUCCESS(f'Se enviaron {self.metricas["enviados"]} recordatorios.')
             )
+        self.stdout.write(
+            'Cumpleaños notificados: {cumpleanos}. '
+            'Emails: {emails_encolados} encolados, {emails_omitidos} omitidos, '
+            '{emails_enviados} enviados, {emails_fallidos} con error. '
+            'Lotes reintentados por concurrencia: {lotes_reintentados}.'.format(**self.metricas)
+        )
 
-    def _get_url_relacionada(self, recordatorio):
-        """Obtener URL relacionada según el tipo de recordatorio"""
-        if recordatorio.objeto_relacionado_tipo == 'cita':
-            return '/citas/mis-citas/'
-        elif recordatorio.objeto_relacionado_tipo == 'vacuna':
-            return f'/mascotas/detalle/{recordatorio.objeto_relacionado_id}/'
-        return None
+    def _encolar_emails(self, lote):
+        for recordatorio in lote:
+            # Enviar email si el cliente prefiere email
+            if recordatorio.cliente.preferencias_comunicacion == 'email':
+                self._enviar_email_recordatorio(recordatorio)
 
     def _enviar_email_recordatorio(self, recordatorio):
-        """Enviar email de recordatorio"""
-        try:
-            subject = f'Recordatorio: {recordatorio.titulo}'
-            message = f"""
+        """Encolar email de recordatorio"""
+        subject = f'Recordatorio: {recordatorio.titulo}'
+        message = f"""
 Hola {recordatorio.cliente.usuario.first_name},
 
 {recordatorio.mensaje}
 
 Atentamente,
 Equipo de Veterinaria Vet Love
-            """.strip()
-
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recordatorio.cliente.usuario.email],
-                fail_silently=True
-            )
-            self.stdout.write(
-                f'Email enviado a {recordatorio.cliente.usuario.email}'
-            )
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error enviando email: {e}')
-            )
+        """.strip()
 
-    def _procesar_recordatorios_recurrentes(self):
-        """Procesar recordatorios recurrentes como cumpleaños"""
-        from mascotas.models import Mascota
-
-        hoy = timezone.now().date()
-        mascotas_cumpleaneras = Mascota.objects.filter(
-            fecha_nacimiento__month=hoy.month,
-            fecha_nacimiento__day=hoy.day
-        )
+        self._contar_email(encolar_correo(
+            f'recordatorio:{recordatorio.pk}',
+            subject,
+            message,
+            recordatorio.cliente.usuario.email
+        ))
 
-        for mascota in mascotas_cumpleaneras:
-            # Verificar si ya se creó una notificación hoy para este cumpleaños
-            notificaciones_hoy = Notificacion.objects.filter(
-                cliente=mascota.cliente,
-                tipo='cumpleanos',
-                fecha_creacion__date=hoy,
-                titulo__contains=mascota.nombre
-            )
-
-            if not notificaciones_hoy.exists():
-                Notificacion.objects.create(
-                    cliente=mascota.cliente,
-                    tipo='cumpleanos',
-                    titulo=f'¡Feliz cumpleaños {mascota.nombre}!',
-                    mensaje=f'Hoy {mascota.nombre} cumple {mascota.edad()} años. ¡No olvides felicitarlo!',
-                    url_relacionada=f'/mascotas/{mascota.id}/',
-                    prioridad='normal'
-                )
-
-                # Enviar email si corresponde
-                if hasattr(mascota.cliente, 'preferencias_comunicacion') and mascota.cliente.preferencias_comunicacion == 'email':
-                    self._enviar_email_cumpleanos(mascota)
+    def _contar_email(self, encolado):
+        # Omitido: el cliente no tiene email o el correo ya estaba en la bandeja
+        self.metricas['emails_encolados' if encolado else 'emails_omitidos'] += 1
 
+    def _procesar_recordatorios_recurrentes(self):
+        """Procesar recordatorios recurrentes como cumpleaños"""
+        # Las mascotas se buscan por índice (cumple_mmdd) y cada notificación tiene
+        # una clave única por mascota y día, así que no se repiten al re-ejecutar.
+        for mascotas in notificar_cumpleanos(en_transaccion=self._encolar_emails_cumpleanos, metricas=self.metricas):
+            for mascota in mascotas:
                 self.stdout.write(
                     self.style.SUCCESS(f'Notificación de cumpleaños enviada para {mascota.nombre}')
                 )
 
+    def _encolar_emails_cumpleanos(self, mascotas):
+        for mascota in mascotas:
+            # Enviar email si corresponde
+            if mascota.cliente.preferencias_comunicacion == 'email':
+                self._enviar_email_cumpleanos(mascota)
+
     def _enviar_email_cumpleanos(self, mascota):
-        """Enviar email de felicitación por cumpleaños"""
-        try:
-            subject = f'¡Feliz cumpleaños {mascota.nombre}!'
-            message = f"""
+        """Encolar email de felicitación por cumpleaños"""
+        subject = f'¡Feliz cumpleaños {mascota.nombre}!'
+        message = f"""
 Hola {mascota.cliente.usuario.first_name},
 
 ¡Hoy es el cumpleaños de {mascota.nombre}!
@@ -140,19 +98,20 @@ Tu mascota cumple {mascota.edad()} años hoy.
 
 Atentamente,
 Equipo de Veterinaria Vet Love
-            """.strip()
-
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[mascota.cliente.usuario.email],
-                fail_silently=True
-            )
+        """.strip()
+
+        self._contar_email(encolar_correo(
+            f'cumpleanos:{mascota.pk}:{timezone.now().date().isoformat()}',
+            subject,
+            message,
+            mascota.cliente.usuario.email
+        ))
+
+    def _despachar_correos(self):
+        """Enviar los correos encolados por una conexión compartida por lote"""
+        liberar_atascados(getattr(settings, 'CORREO_MINUTOS_ATASCADO', 30))
+        self.metricas['emails_enviados'], self.metricas['emails_fallidos'] = despachar_pendientes()
+        if self.metricas['emails_fallidos']:
             self.stdout.write(
-                f'Email de cumpleaños enviado a {mascota.cliente.usuario.email}'
+                self.style.ERROR(f'Emails con error (se reintentarán): {self.metricas["emails_fallidos"]}')
             )
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error enviando email de cumpleaños: {e}')
-            )
\ No newline at end of file
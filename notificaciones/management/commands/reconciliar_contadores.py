@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from notificaciones.contadores import reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de notificaciones no leídas y corrige los que no coinciden'
+
+    def handle(self, *args, **options):
+        corregidos = reconciliar()
+        for destinatario, (antes, despues) in sorted(corregidos.items()):
+            if antes is None:
+                self.stdout.write(f'{destinatario}: creado con {despues}')
+            else:
+                self.stdout.write(self.style.WARNING(f'{destinatario}: {antes} -> {despues}'))
+        self.stdout.write(self.style.SUCCESS(f'{len(corregidos)} contadores corregidos'))
@@ -0,0 +1,235 @@
+"""
+Manejadores de los eventos que publican las señales (ver eventos.py). Cada uno
+recibe la lista de datos de varios eventos del mismo tipo, carga los objetos
+con una consulta y crea recordatorios y notificaciones con ``bulk_create``.
+Un objeto borrado antes de procesar su evento se ignora.
+"""
+from django.utils import timezone
+
+from citas.models import Cita
+from mascotas.models import Mascota, Vacuna
+from tienda.models import Comentario, Orden
+from . import contadores
+from .eventos import manejador
+from .models import Notificacion, Recordatorio
+from .widgets import marcar_cambio_admin, marcar_cambio_usuario
+
+
+def _cargar(queryset, lista_datos, campo):
+    """Objetos de ``queryset`` en el orden de los eventos, sin los que ya no existen"""
+    objetos = queryset.in_bulk([datos[campo] for datos in lista_datos])
+    return [(objetos[datos[campo]], datos) for datos in lista_datos if datos[campo] in objetos]
+
+
+def _crear_recordatorios(recordatorios):
+    # bulk_create no llama a save(): la fecha programada se calcula aquí
+    for recordatorio in recordatorios:
+        recordatorio.calcular_fecha_envio_programada()
+    Recordatorio.objects.bulk_create(recordatorios)
+
+
+def _crear_notificaciones(notificaciones):
+    """Un INSERT para todas; contadores y encabezado se ajustan a mano (bulk_create no dispara señales)"""
+    Notificacion.objects.bulk_create(notificaciones)
+    contadores.sumar(
+        clave for n in notificaciones if not n.leida
+        for clave in contadores.claves_notificacion(n.cliente_id, n.veterinario_id, n.para_admin)
+    )
+    marcar_cambio_usuario(*{n.cliente.usuario_id for n in notificaciones if n.cliente_id})
+    if any(n.para_admin for n in notificaciones):
+        marcar_cambio_admin()
+
+
+def _prioridad_cita(cita):
+    if cita.prioridad == 'urgente':
+        return 'alta'
+    elif cita.prioridad == 'emergencia':
+        return 'urgente'
+    return 'normal'
+
+
+@manejador('cita_creada')
+def crear_recordatorio_cita(lista_datos):
+    """Recordatorio 1 día antes, aviso al cliente y aviso al administrador"""
+    citas = _cargar(Cita.objects.select_related('mascota__cliente__usuario'), lista_datos, 'cita_id')
+    recordatorios = []
+    notificaciones = []
+    for cita, _ in citas:
+        mascota = cita.mascota
+        fecha = cita.fecha.strftime("%d/%m/%Y a las %H:%M")
+        prioridad = _prioridad_cita(cita)
+        recordatorios.append(Recordatorio(
+            cliente=mascota.cliente,
+            tipo='cita',
+            titulo=f'Recordatorio: Cita de {mascota.nombre}',
+            mensaje=f'Tienes una cita programada para {mascota.nombre} el {fecha}. Tipo: {cita.get_tipo_display()}.',
+            fecha_recordatorio=cita.fecha,
+            dias_anticipacion=1,
+            objeto_relacionado_id=cita.id,
+            objeto_relacionado_tipo='cita'
+        ))
+        notificaciones.append(Notificacion(
+            cliente=mascota.cliente,
+            tipo='cita',
+            titulo=f'Cita programada para {mascota.nombre}',
+            mensaje=f'Se ha programado una cita para {mascota.nombre} el {fecha}. Tipo: {cita.get_tipo_display()}.',
+            url_relacionada='/citas/mis-citas/',
+            prioridad=prioridad
+        ))
+        notificaciones.append(Notificacion(
+            tipo='cita',
+            titulo=f'Nueva cita programada: {mascota.nombre}',
+            mensaje=f'El cliente {mascota.cliente} ha programado una cita para {mascota.nombre} el {fecha}. Tipo: {cita.get_tipo_display()}.',
+            url_relacionada=f'/admin/citas/cita/{cita.id}/change/',
+            prioridad=prioridad,
+            para_admin=True
+        ))
+    _crear_recordatorios(recordatorios)
+    _crear_notificaciones(notificaciones)
+
+
+@manejador('cita_cambio_estado')
+def notificar_cambio_estado_cita(lista_datos):
+    """Avisar al cliente que su cita se canceló, reprogramó, confirmó o completó"""
+    notificaciones = []
+    for cita, datos in _cargar(Cita.objects.select_related('mascota__cliente__usuario'), lista_datos, 'cita_id'):
+        nombre = cita.mascota.nombre
+        prioridad = 'normal'
+        if datos['estado'] == 'cancelada':
+            prioridad = 'alta'
+            titulo = f'Cita cancelada para {nombre}'
+            mensaje = f'La cita programada para {nombre} el {cita.fecha.strftime("%d/%m/%Y a las %H:%M")} ha sido cancelada.'
+        elif datos['estado'] == 'reprogramada':
+            prioridad = 'alta'
+            titulo = f'Cita reprogramada para {nombre}'
+            mensaje = f'La cita de {nombre} ha sido reprogramada. Nueva fecha: {cita.fecha.strftime("%d/%m/%Y a las %H:%M")}.'
+        elif datos['estado'] == 'confirmada':
+            titulo = f'Cita confirmada para {nombre}'
+            mensaje = f'Su cita para {nombre} el {cita.fecha.strftime("%d/%m/%Y a las %H:%M")} ha sido confirmada.'
+        elif datos['estado'] == 'completada':
+            titulo = f'Cita completada para {nombre}'
+            mensaje = f'La cita de {nombre} del {cita.fecha.strftime("%d/%m/%Y")} ha sido completada exitosamente.'
+        else:
+            continue
+
+        notificaciones.append(Notificacion(
+            cliente=cita.mascota.cliente,
+            tipo='cita',
+            titulo=titulo,
+            mensaje=mensaje,
+            url_relacionada='/citas/mis-citas/',
+            prioridad=prioridad
+        ))
+    _crear_notificaciones(notificaciones)
+
+
+@manejador('vacuna_creada')
+def crear_recordatorio_vacuna(lista_datos):
+    """Recordatorio 7 días antes de la próxima dosis (o menos si es muy cercana)"""
+    hoy = timezone.now().date()
+    recordatorios = []
+    notificaciones = []
+    for vacuna, _ in _cargar(Vacuna.objects.select_related('mascota__cliente__usuario'), lista_datos, 'vacuna_id'):
+        dias_anticipacion = min(7, (vacuna.fecha_proxima - hoy).days - 1)
+        if dias_anticipacion <= 0:
+            continue
+        mascota = vacuna.mascota
+        recordatorios.append(Recordatorio(
+            cliente=mascota.cliente,
+            tipo='vacuna',
+            titulo=f'Recordatorio: Vacuna de {mascota.nombre}',
+            mensaje=f'La próxima vacuna de {mascota.nombre} ({vacuna.nombre}) está programada para el {vacuna.fecha_proxima.strftime("%d/%m/%Y")}.',
+            fecha_recordatorio=timezone.datetime.combine(vacuna.fecha_proxima, timezone.datetime.min.time()),
+            dias_anticipacion=dias_anticipacion,
+            objeto_relacionado_id=vacuna.id,
+            objeto_relacionado_tipo='vacuna'
+        ))
+        # Las vacunas tienen prioridad alta por defecto
+        notificaciones.append(Notificacion(
+            cliente=mascota.cliente,
+            tipo='vacuna',
+            titulo=f'Vacuna registrada para {mascota.nombre}',
+            mensaje=f'Se ha registrado la vacuna "{vacuna.nombre}" para {mascota.nombre}. Próxima dosis: {vacuna.fecha_proxima.strftime("%d/%m/%Y")}.',
+            url_relacionada=f'/mascotas/{mascota.id}/',
+            prioridad='alta'
+        ))
+    _crear_recordatorios(recordatorios)
+    _crear_notificaciones(notificaciones)
+
+
+@manejador('mascota_creada')
+def crear_recordatorio_cumpleanos(lista_datos):
+    """Recordatorio anual de cumpleaños y avisos de registro al cliente y al administrador"""
+    hoy = timezone.now().date()
+    recordatorios = []
+    notificaciones = []
+    for mascota, _ in _cargar(Mascota.objects.select_related('cliente__usuario'), lista_datos, 'mascota_id'):
+        # Como la señal, solo las mascotas con fecha de nacimiento
+        if not mascota.fecha_nacimiento:
+            continue
+        fecha_cumple = mascota.fecha_nacimiento.replace(year=hoy.year)
+        # Si el cumpleaños ya pasó este año, programar para el próximo año
+        if fecha_cumple < hoy:
+            fecha_cumple = fecha_cumple.replace(year=hoy.year + 1)
+
+        recordatorios.append(Recordatorio(
+            cliente=mascota.cliente,
+            tipo='cumpleanos',
+            titulo=f'¡Feliz cumpleaños {mascota.nombre}!',
+            mensaje=f'Hoy {mascota.nombre} cumple {mascota.edad() + 1 if mascota.edad() else "años"}. ¡No olvides felicitarlo!',
+            fecha_recordatorio=timezone.datetime.combine(fecha_cumple, timezone.datetime.min.time()),
+            dias_anticipacion=0,  # El mismo día
+            objeto_relacionado_id=mascota.id,
+            objeto_relacionado_tipo='mascota'
+        ))
+
+        notificaciones.append(Notificacion(
+            cliente=mascota.cliente,
+            tipo='sistema',
+            titulo=f'Mascota registrada: {mascota.nombre}',
+            mensaje=f'Se ha registrado exitosamente a {mascota.nombre} en el sistema veterinario.',
+            url_relacionada=f'/mascotas/{mascota.id}/',
+            prioridad='normal'
+        ))
+        notificaciones.append(Notificacion(
+            tipo='sistema',
+            titulo=f'Nueva mascota registrada: {mascota.nombre}',
+            mensaje=f'El cliente {mascota.cliente} ha registrado una nueva mascota: {mascota.nombre} ({mascota.tipo}).',
+            url_relacionada=f'/admin/mascotas/mascota/{mascota.id}/change/',
+            prioridad='normal',
+            para_admin=True
+        ))
+    _crear_recordatorios(recordatorios)
+    _crear_notificaciones(notificaciones)
+
+
+@manejador('orden_creada')
+def notificar_nueva_orden(lista_datos):
+    """Avisar al administrador de las órdenes nuevas"""
+    _crear_notificaciones([
+        Notificacion(
+            tipo='sistema',
+            titulo=f'Nueva orden creada: #{orden.numero_orden}',
+            mensaje=f'El cliente {orden.usuario.username} ha creado una nueva orden por ${orden.total}. Estado: {orden.get_estado_display()}.',
+            url_relacionada=f'/admin/tienda/orden/{orden.id}/change/',
+            prioridad='alta',
+            para_admin=True
+        )
+        for orden, _ in _cargar(Orden.objects.select_related('usuario'), lista_datos, 'orden_id')
+    ])
+
+
+@manejador('comentario_creado')
+def notificar_nuevo_comentario(lista_datos):
+    """Avisar al administrador de los comentarios nuevos"""
+    _crear_notificaciones([
+        Notificacion(
+            tipo='sistema',
+            titulo=f'Nuevo comentario en {comentario.producto.nombre}',
+            mensaje=f'El usuario {comentario.usuario.username} ha comentado en el producto "{comentario.producto.nombre}". Calificación: {comentario.calificacion} estrellas.',
+            url_relacionada=f'/admin/tienda/comentario/{comentario.id}/change/',
+            prioridad='normal',
+            para_admin=True
+        )
+        for comentario, _ in _cargar(Comentario.objects.select_related('producto', 'usuario'), lista_datos, 'comentario_id')
+    ])
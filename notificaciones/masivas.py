@@ -0,0 +1,113 @@
+"""
+Envío de una notificación a todos los clientes.
+
+La vista solo registra un ``NotificacionMasiva``; el comando
+``procesar_notificaciones_masivas`` recorre los clientes por lotes en orden de
+id y crea sus notificaciones con ``bulk_create`` (un INSERT por lote en lugar
+de uno por cliente). Cada lote se confirma junto con el avance del envío, así
+que un envío interrumpido continúa desde el último cliente procesado. Solo
+producción activa ``NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO``; sin él
+(desarrollo) el envío se procesa en la misma petición y no hace falta el worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from clientes.models import Cliente
+from . import contadores
+from .models import Notificacion, NotificacionMasiva
+from .widgets import marcar_cambio_todos
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_COPIADOS = ('tipo', 'titulo', 'mensaje', 'prioridad', 'url_relacionada')
+
+
+def registrar_envio(usuario, datos):
+    """Registra el envío; si la cola está desactivada lo procesa en el acto"""
+    envio = NotificacionMasiva.objects.create(
+        creada_por=usuario,
+        total_destinatarios=Cliente.objects.count(),
+        **{campo: datos.get(campo) for campo in CAMPOS_COPIADOS if datos.get(campo) is not None}
+    )
+    if not getattr(settings, 'NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO', False):
+        procesar_envio(envio.pk)
+        envio.refresh_from_db()
+    return envio
+
+
+def reclamar_pendientes(limite):
+    """Pasa a 'procesando' hasta ``limite`` envíos pendientes y devuelve sus ids"""
+    candidatos = NotificacionMasiva.objects.filter(estado='pendiente').order_by('fecha_creacion').values_list('id', flat=True)[:limite]
+    reclamados = []
+    for envio_id in candidatos:
+        tomado = NotificacionMasiva.objects.filter(pk=envio_id, estado='pendiente').update(
+            estado='procesando',
+            fecha_actualizacion=timezone.now()
+        )
+        if tomado:
+            reclamados.append(envio_id)
+    return reclamados
+
+
+def liberar_atascados(minutos):
+    """Devuelve a la cola los envíos sin avance reciente; continúan donde quedaron"""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return NotificacionMasiva.objects.filter(estado='procesando', fecha_actualizacion__lt=limite).update(estado='pendiente')
+
+
+def _crear_lote(envio, cliente_ids):
+    plantilla = {campo: getattr(envio, campo) for campo in CAMPOS_COPIADOS}
+    with transaction.atomic():
+        Notificacion.objects.bulk_create(
+            [Notificacion(cliente_id=cliente_id, envio_masivo=envio, **plantilla) for cliente_id in cliente_ids]
+        )
+        # bulk_create no dispara señales: los contadores se ajustan con un UPDATE por lote
+        contadores.ajustar([contadores.clave_cliente(cliente_id) for cliente_id in cliente_ids], 1)
+        NotificacionMasiva.objects.filter(pk=envio.pk).update(
+            enviadas=F('enviadas') + len(cliente_ids),
+            ultimo_cliente_id=cliente_ids[-1],
+            fecha_actualizacion=timezone.now()
+        )
+    envio.enviadas += len(cliente_ids)
+    envio.ultimo_cliente_id = cliente_ids[-1]
+
+
+def procesar_envio(envio_id, tamano_lote=None, progreso=None):
+    """
+    Crea las notificaciones pendientes de un envío. ``progreso`` se llama con el
+    envío después de cada lote. Devuelve el estado final.
+    """
+    tamano_lote = tamano_lote or getattr(settings, 'NOTIFICACIONES_MASIVAS_LOTE', 1000)
+    envio = NotificacionMasiva.objects.get(pk=envio_id)
+    envio.estado = 'procesando'
+    envio.fecha_inicio = envio.fecha_inicio or timezone.now()
+    # Los clientes registrados después de crear el envío también lo reciben
+    envio.total_destinatarios = envio.enviadas + Cliente.objects.filter(pk__gt=envio.ultimo_cliente_id).count()
+    envio.save(update_fields=['estado', 'fecha_inicio', 'total_destinatarios', 'fecha_actualizacion'])
+
+    try:
+        while True:
+            cliente_ids = list(
+                Cliente.objects.filter(pk__gt=envio.ultimo_cliente_id).order_by('pk').values_list('pk', flat=True)[:tamano_lote]
+            )
+            if not cliente_ids:
+                break
+            _crear_lote(envio, cliente_ids)
+            marcar_cambio_todos()
+            if progreso:
+                progreso(envio)
+        envio.estado = 'completado'
+        envio.error = ''
+    except Exception as e:
+        logger.exception('Error procesando la notificación masiva %s', envio_id)
+        envio.estado = 'error'
+        envio.error = str(e)
+
+    envio.fecha_fin = timezone.now()
+    envio.save(update_fields=['estado', 'error', 'fecha_fin', 'fecha_actualizacion'])
+    return envio.estado
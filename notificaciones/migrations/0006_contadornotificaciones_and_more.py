@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0005_auto_20251028_1528'),
+        ('notificaciones', '0005_notificacion_para_admin'),
+        ('veterinario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorNotificaciones',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.CharField(max_length=40, unique=True, verbose_name='Destinatario')),
+                ('no_leidas', models.PositiveIntegerField(default=0, verbose_name='No leídas')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+            ],
+            options={
+                'verbose_name': 'Contador de notificaciones',
+                'verbose_name_plural': 'Contadores de notificaciones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['cliente', 'leida'], name='notif_cliente_leida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['veterinario', 'leida'], name='notif_veterinario_leida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['para_admin', 'leida'], name='notif_admin_leida_idx'),
+        ),
+    ]
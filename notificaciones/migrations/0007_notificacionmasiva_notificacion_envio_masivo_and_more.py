@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0006_contadornotificaciones_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionMasiva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('general', 'General'), ('cita', 'Cita'), ('vacuna', 'Vacuna'), ('desparasitacion', 'Desparasitación'), ('medicamento', 'Medicamento'), ('emergencia', 'Emergencia'), ('sistema', 'Sistema')], default='general', max_length=20)),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('prioridad', models.CharField(choices=[('baja', 'Baja'), ('normal', 'Normal'), ('alta', 'Alta'), ('urgente', 'Urgente')], default='normal', max_length=10, verbose_name='Prioridad')),
+                ('url_relacionada', models.URLField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('total_destinatarios', models.PositiveIntegerField(default=0, verbose_name='Total de destinatarios')),
+                ('enviadas', models.PositiveIntegerField(default=0, verbose_name='Notificaciones creadas')),
+                ('ultimo_cliente_id', models.BigIntegerField(default=0, verbose_name='Último cliente procesado')),
+                ('error', models.TextField(blank=True, verbose_name='Detalle del error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio de procesamiento')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Último avance')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin de procesamiento')),
+                ('creada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificaciones_masivas', to=settings.AUTH_USER_MODEL, verbose_name='Creada por')),
+            ],
+            options={
+                'verbose_name': 'Notificación masiva',
+                'verbose_name_plural': 'Notificaciones masivas',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='envio_masivo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificaciones', to='notificaciones.notificacionmasiva', verbose_name='Envío masivo'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacionmasiva',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='notificacio_estado_cfc3e9_idx'),
+        ),
+    ]
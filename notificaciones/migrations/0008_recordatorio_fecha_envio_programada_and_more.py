@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-18 11:50
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def poblar_fecha_envio_programada(apps, schema_editor):
+    Recordatorio = apps.get_model('notificaciones', 'Recordatorio')
+    pendientes = Recordatorio.objects.filter(activo=True, enviado=False).only('fecha_recordatorio', 'dias_anticipacion')
+    lote = []
+    for recordatorio in pendientes.iterator(chunk_size=1000):
+        recordatorio.fecha_envio_programada = recordatorio.fecha_recordatorio - timedelta(days=recordatorio.dias_anticipacion)
+        lote.append(recordatorio)
+        if len(lote) == 1000:
+            Recordatorio.objects.bulk_update(lote, ['fecha_envio_programada'])
+            lote = []
+    Recordatorio.objects.bulk_update(lote, ['fecha_envio_programada'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0005_auto_20251028_1528'),
+        ('notificaciones', '0007_notificacionmasiva_notificacion_envio_masivo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordatorio',
+            name='fecha_envio_programada',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recordatorio',
+            index=models.Index(condition=models.Q(('activo', True), ('enviado', False)), fields=['fecha_envio_programada'], name='recordatorio_por_enviar_idx'),
+        ),
+        migrations.RunPython(poblar_fecha_envio_programada, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0010_notificacion_clave'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoNotificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=60, verbose_name='Evento')),
+                ('datos', models.JSONField(default=dict, verbose_name='Datos')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Último cambio de estado')),
+            ],
+            options={
+                'verbose_name': 'Evento de notificación',
+                'verbose_name_plural': 'Eventos de notificación',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'id'], name='notificacio_estado_37fbf4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0011_eventonotificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventonotificacion',
+            name='proximo_intento',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento'),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
+from django.contrib.auth.models import User
 from clientes.models import Cliente
 from django.utils import timezone
+from veterinaria_project.modelos import CamposRastreadosMixin
 
-class Notificacion(models.Model):
+class Notificacion(CamposRastreadosMixin, models.Model):
     TIPO_CHOICES = [
         ('general', 'General'),
         ('cita', 'Cita'),
@@ -38,11 +40,26 @@ class Notificacion(models.Model):
         verbose_name="Prioridad"
     )
     fecha_lectura = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de lectura")
+    # Identifica notificaciones que no deben repetirse (p. ej. 'cumpleanos:<mascota>:<fecha>')
+    clave = models.CharField(max_length=100, unique=True, null=True, blank=True, editable=False)
+    envio_masivo = models.ForeignKey(
+        'NotificacionMasiva',
+        on_delete=models.SET_NULL,
+        related_name='notificaciones',
+        null=True,
+        blank=True,
+        verbose_name="Envío masivo"
+    )
 
     class Meta:
         ordering = ['-fecha_creacion']
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
+        indexes = [
+            models.Index(fields=['cliente', 'leida'], name='notif_cliente_leida_idx'),
+            models.Index(fields=['veterinario', 'leida'], name='notif_veterinario_leida_idx'),
+            models.Index(fields=['para_admin', 'leida'], name='notif_admin_leida_idx'),
+        ]
 
     def __str__(self):
         if self.para_admin:
@@ -82,15 +99,34 @@ class Recordatorio(models.Model):
     activo = models.BooleanField(default=True)
     objeto_relacionado_id = models.PositiveIntegerField(null=True, blank=True)  # ID del objeto relacionado (cita, vacuna, etc.)
     objeto_relacionado_tipo = models.CharField(max_length=50, blank=True)  # Tipo del objeto (cita, vacuna, etc.)
+    # fecha_recordatorio - dias_anticipacion, para seleccionar en SQL los que toca enviar
+    fecha_envio_programada = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['fecha_recordatorio']
         verbose_name = 'Recordatorio'
         verbose_name_plural = 'Recordatorios'
+        indexes = [
+            models.Index(
+                fields=['fecha_envio_programada'],
+                condition=models.Q(activo=True, enviado=False),
+                name='recordatorio_por_enviar_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.titulo} - {self.fecha_recordatorio.strftime('%d/%m/%Y %H:%M')}"
 
+    def calcular_fecha_envio_programada(self):
+        self.fecha_envio_programada = self.fecha_recordatorio - timezone.timedelta(days=self.dias_anticipacion)
+
+    def save(self, *args, **kwargs):
+        self.calcular_fecha_envio_programada()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'fecha_recordatorio', 'dias_anticipacion'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'fecha_envio_programada'}
+        super().save(*args, **kwargs)
+
     def debe_enviarse(self):
         """Verifica si el recordatorio debe enviarse hoy"""
         if not self.activo or self.enviado:
@@ -107,3 +143,146 @@ class Recordatorio(models.Model):
         self.enviado = True
         self.fecha_envio = timezone.now()
         self.save()
+
+
+
+class NotificacionMasiva(models.Model):
+    """
+    Notificación enviada a todos los clientes. La vista solo registra el envío;
+    las notificaciones individuales se crean por lotes fuera de la petición
+    (ver notificaciones/masivas.py).
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=Notificacion.TIPO_CHOICES, default='general')
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    prioridad = models.CharField(max_length=10, choices=Notificacion.PRIORIDAD_CHOICES, default='normal', verbose_name="Prioridad")
+    url_relacionada = models.URLField(blank=True, null=True)
+    creada_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='notificaciones_masivas', verbose_name="Creada por")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
+    total_destinatarios = models.PositiveIntegerField(default=0, verbose_name="Total de destinatarios")
+    enviadas = models.PositiveIntegerField(default=0, verbose_name="Notificaciones creadas")
+    ultimo_cliente_id = models.BigIntegerField(default=0, verbose_name="Último cliente procesado")
+    error = models.TextField(blank=True, verbose_name="Detalle del error")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio de procesamiento")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Último avance")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin de procesamiento")
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        verbose_name = 'Notificación masiva'
+        verbose_name_plural = 'Notificaciones masivas'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.titulo} ({self.get_estado_display()})"
+
+    @property
+    def terminado(self):
+        return self.estado in ('completado', 'error')
+
+    @property
+    def porcentaje(self):
+        if not self.total_destinatarios:
+            return 100 if self.terminado else 0
+        return min(100, round(self.enviadas * 100 / self.total_destinatarios))
+
+
+class ContadorNotificaciones(models.Model):
+    """
+    Notificaciones no leídas por destinatario, para no contar la tabla de
+    notificaciones en cada petición. ``destinatario`` es 'cliente:<id>',
+    'veterinario:<id>', 'admin' o 'admin+cliente:<id>' para las que son de
+    ambos (ver notificaciones/contadores.py).
+    """
+    destinatario = models.CharField(max_length=40, unique=True, verbose_name="Destinatario")
+    no_leidas = models.PositiveIntegerField(default=0, verbose_name="No leídas")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de actualización")
+
+    class Meta:
+        verbose_name = 'Contador de notificaciones'
+        verbose_name_plural = 'Contadores de notificaciones'
+
+    def __str__(self):
+        return f"{self.destinatario}: {self.no_leidas}"
+
+
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida de correos. Los comandos encolan los mensajes con una
+    clave única (repetir una ejecución no duplica el correo) y
+    notificaciones/correo.py los despacha registrando cada intento.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('error', 'Error'),
+    ]
+
+    clave = models.CharField(max_length=120, unique=True, verbose_name="Clave de idempotencia")
+    asunto = models.CharField(max_length=255, verbose_name="Asunto")
+    cuerpo = models.TextField(verbose_name="Cuerpo")
+    cuerpo_html = models.TextField(blank=True, verbose_name="Cuerpo HTML")
+    remitente = models.CharField(max_length=255, blank=True, verbose_name="Remitente")
+    destinatario = models.EmailField(verbose_name="Destinatario")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
+    intentos = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    ultimo_error = models.TextField(blank=True, verbose_name="Último error")
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name="Próximo intento")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de envío")
+
+    class Meta:
+        ordering = ['fecha_creacion']
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento']),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} -> {self.destinatario} ({self.get_estado_display()})"
+
+
+class EventoNotificacion(models.Model):
+    """
+    Efecto pendiente de una señal (crear recordatorios y notificaciones). Las
+    señales lo registran en la misma transacción que el cambio que lo origina
+    y el comando procesar_eventos lo ejecuta (ver notificaciones/eventos.py).
+    Los eventos procesados se borran; los que agotan los intentos quedan en 'error'.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('error', 'Error'),
+    ]
+
+    nombre = models.CharField(max_length=60, verbose_name="Evento")
+    datos = models.JSONField(default=dict, verbose_name="Datos")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
+    intentos = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    ultimo_error = models.TextField(blank=True, verbose_name="Último error")
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name="Próximo intento")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Último cambio de estado")
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento de notificación'
+        verbose_name_plural = 'Eventos de notificación'
+        indexes = [
+            models.Index(fields=['estado', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} {self.datos} ({self.get_estado_display()})"
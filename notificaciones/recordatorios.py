@@ -0,0 +1,182 @@
+"""
+Selección y envío de los recordatorios que vencen hoy y de las felicitaciones
+de cumpleaños.
+
+Un recordatorio se envía desde ``fecha_recordatorio - dias_anticipacion`` hasta
+el día del evento (ver ``Recordatorio.debe_enviarse``). La fecha de inicio está
+guardada en ``fecha_envio_programada`` con un índice parcial sobre los
+pendientes, así que la consulta solo recorre los que vencen y el costo no crece
+con el histórico de recordatorios.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import contadores
+from .models import Notificacion, Recordatorio
+from .widgets import marcar_cambio_usuario
+
+
+def recordatorios_por_enviar(ahora=None):
+    """Recordatorios activos y no enviados cuya ventana de envío incluye hoy"""
+    ahora = ahora or timezone.now()
+    # Mismo criterio de fechas que debe_enviarse(): días según la hora guardada (UTC)
+    inicio_dia = datetime.combine(ahora.date(), time.min, tzinfo=ahora.tzinfo)
+    return Recordatorio.objects.filter(
+        activo=True,
+        enviado=False,
+        fecha_envio_programada__lt=inicio_dia + timedelta(days=1),
+        fecha_recordatorio__gte=inicio_dia,
+    )
+
+
+def url_relacionada(recordatorio):
+    """Obtener URL relacionada según el tipo de recordatorio"""
+    if recordatorio.objeto_relacionado_tipo == 'cita':
+        return '/citas/mis-citas/'
+    elif recordatorio.objeto_relacionado_tipo == 'vacuna':
+        return f'/mascotas/detalle/{recordatorio.objeto_relacionado_id}/'
+    return None
+
+
+class _LoteTomado(Exception):
+    """Otra ejecución marcó parte del lote antes que esta; se deshace y se vuelve a leer"""
+
+
+def _reclamar_lote(pendientes, tamano_lote, ahora):
+    """
+    Lee y marca como enviado un lote dentro de la transacción en curso. En
+    PostgreSQL las filas se bloquean con SKIP LOCKED, así que varias
+    ejecuciones se reparten la cola; en bases sin bloqueo por filas (SQLite) el
+    UPDATE condicionado detecta si otra ejecución se adelantó.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        pendientes = pendientes.select_for_update(skip_locked=True, of=('self',))
+    lote = list(pendientes[:tamano_lote])
+    if lote:
+        marcados = Recordatorio.objects.filter(pk__in=[r.pk for r in lote], enviado=False).update(
+            enviado=True,
+            fecha_envio=ahora
+        )
+        if marcados != len(lote):
+            raise _LoteTomado
+    return lote
+
+
+def enviar_pendientes(ahora=None, tamano_lote=None, en_transaccion=None, metricas=None):
+    """
+    Crea las notificaciones de los recordatorios que vencen y los marca como
+    enviados, por lotes: un INSERT y un UPDATE por lote. Cada lote se reclama
+    y se confirma en su propia transacción, así que varias ejecuciones pueden
+    trabajar a la vez y una ejecución interrumpida no deja nada a medias.
+    Devuelve cada lote (con cliente y usuario cargados) después de confirmarlo.
+
+    ``en_transaccion`` se llama con el lote antes de confirmarlo (p. ej. para
+    encolar sus correos en la misma transacción). En ``metricas`` se suman los
+    'enviados' y los 'lotes_reintentados' (otra ejecución tomó parte del lote).
+    """
+    ahora = ahora or timezone.now()
+    tamano_lote = tamano_lote or getattr(settings, 'RECORDATORIOS_TAMANO_LOTE', 500)
+    metricas = metricas if metricas is not None else {}
+    metricas.setdefault('enviados', 0)
+    metricas.setdefault('lotes_reintentados', 0)
+    pendientes = recordatorios_por_enviar(ahora).select_related('cliente__usuario').order_by('pk')
+
+    while True:
+        try:
+            with transaction.atomic():
+                lote = _reclamar_lote(pendientes, tamano_lote, ahora)
+                if not lote:
+                    break
+                Notificacion.objects.bulk_create([
+                    Notificacion(
+                        cliente_id=recordatorio.cliente_id,
+                        tipo=recordatorio.tipo,
+                        titulo=recordatorio.titulo,
+                        mensaje=recordatorio.mensaje,
+                        url_relacionada=url_relacionada(recordatorio)
+                    )
+                    for recordatorio in lote
+                ])
+                # bulk_create no dispara señales: contadores y encabezado se ajustan a mano
+                contadores.sumar(contadores.clave_cliente(r.cliente_id) for r in lote)
+                if en_transaccion:
+                    en_transaccion(lote)
+        except _LoteTomado:
+            metricas['lotes_reintentados'] += 1
+            continue
+
+        marcar_cambio_usuario(*{r.cliente.usuario_id for r in lote})
+        for recordatorio in lote:
+            recordatorio.enviado = True
+            recordatorio.fecha_envio = ahora
+        metricas['enviados'] += len(lote)
+        yield lote
+
+
+def clave_cumpleanos(mascota, fecha):
+    return f'cumpleanos:{mascota.pk}:{fecha.isoformat()}'
+
+
+def notificar_cumpleanos(hoy=None, tamano_lote=None, en_transaccion=None, metricas=None):
+    """
+    Crea la notificación de cumpleaños de cada mascota que cumple años hoy. Las
+    mascotas se buscan por el índice de ``cumple_mmdd`` y cada notificación
+    lleva la clave única ``cumpleanos:<mascota>:<fecha>``, así que repetir la
+    ejecución no duplica nada: las claves existentes se descartan con una
+    consulta por lote y el resto se inserta con un solo INSERT. Si otra
+    ejecución inserta alguna clave a la vez, el lote se deshace y se vuelve a
+    leer. Devuelve cada lote con las mascotas notificadas después de confirmarlo.
+
+    ``en_transaccion`` se llama con esas mascotas antes de confirmar el lote. En
+    ``metricas`` se suman las 'cumpleanos' notificadas y los 'lotes_reintentados'.
+    """
+    from mascotas.models import Mascota
+
+    hoy = hoy or timezone.now().date()
+    tamano_lote = tamano_lote or getattr(settings, 'RECORDATORIOS_TAMANO_LOTE', 500)
+    metricas = metricas if metricas is not None else {}
+    metricas.setdefault('cumpleanos', 0)
+    metricas.setdefault('lotes_reintentados', 0)
+    cumpleaneras = Mascota.objects.filter(
+        cumple_mmdd=hoy.month * 100 + hoy.day,
+        fecha_nacimiento__lte=hoy
+    ).select_related('cliente__usuario').order_by('pk')
+
+    ultimo_id = 0
+    while True:
+        mascotas = list(cumpleaneras.filter(pk__gt=ultimo_id)[:tamano_lote])
+        if not mascotas:
+            break
+        por_clave = {clave_cumpleanos(mascota, hoy): mascota for mascota in mascotas}
+
+        try:
+            with transaction.atomic():
+                existentes = set(Notificacion.objects.filter(clave__in=por_clave).values_list('clave', flat=True))
+                nuevas = [mascota for clave, mascota in por_clave.items() if clave not in existentes]
+                Notificacion.objects.bulk_create([
+                    Notificacion(
+                        clave=clave_cumpleanos(mascota, hoy),
+                        cliente_id=mascota.cliente_id,
+                        tipo='cumpleanos',
+                        titulo=f'¡Feliz cumpleaños {mascota.nombre}!',
+                        mensaje=f'Hoy {mascota.nombre} cumple {mascota.edad()} años. ¡No olvides felicitarlo!',
+                        url_relacionada=f'/mascotas/{mascota.id}/',
+                        prioridad='normal'
+                    )
+                    for mascota in nuevas
+                ])
+                contadores.sumar(contadores.clave_cliente(m.cliente_id) for m in nuevas)
+                if en_transaccion and nuevas:
+                    en_transaccion(nuevas)
+        except IntegrityError:
+            metricas['lotes_reintentados'] += 1
+            continue
+
+        ultimo_id = mascotas[-1].pk
+        if nuevas:
+            marcar_cambio_usuario(*{m.cliente.usuario_id for m in nuevas})
+            metricas['cumpleanos'] += len(nuevas)
+            yield nuevas
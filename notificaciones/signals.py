@@ -1,82 +1,26 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.utils import timezone
-from datetime import timedelta, date
 from citas.models import Cita
 from mascotas.models import Vacuna, Mascota
 from tienda.models import Orden, Comentario
-from .models import Recordatorio, Notificacion
+from .models import Notificacion
+from . import contadores, eventos, manejadores  # noqa: F401 (registra los manejadores)
+from .widgets import marcar_cambio_destinatarios
+
+# Los efectos de estas señales se publican como eventos y se ejecutan después de
+# confirmar la transacción, por lotes (ver eventos.py y manejadores.py)
 
 @receiver(post_save, sender=Cita)
 def crear_recordatorio_cita(sender, instance, created, **kwargs):
     """Crear recordatorio automático cuando se crea una cita programada"""
     if created and instance.estado == 'programada':
-        # Crear recordatorio 1 día antes
-        Recordatorio.objects.create(
-            cliente=instance.mascota.cliente,
-            tipo='cita',
-            titulo=f'Recordatorio: Cita de {instance.mascota.nombre}',
-            mensaje=f'Tienes una cita programada para {instance.mascota.nombre} el {instance.fecha.strftime("%d/%m/%Y a las %H:%M")}. Tipo: {instance.get_tipo_display()}.',
-            fecha_recordatorio=instance.fecha,
-            dias_anticipacion=1,
-            objeto_relacionado_id=instance.id,
-            objeto_relacionado_tipo='cita'
-        )
-
-        # Determinar prioridad según el tipo de cita
-        prioridad = 'normal'
-        if instance.prioridad == 'urgente':
-            prioridad = 'alta'
-        elif instance.prioridad == 'emergencia':
-            prioridad = 'urgente'
-
-        # Crear notificación inmediata al cliente
-        Notificacion.objects.create(
-            cliente=instance.mascota.cliente,
-            tipo='cita',
-            titulo=f'Cita programada para {instance.mascota.nombre}',
-            mensaje=f'Se ha programado una cita para {instance.mascota.nombre} el {instance.fecha.strftime("%d/%m/%Y a las %H:%M")}. Tipo: {instance.get_tipo_display()}.',
-            url_relacionada=f'/citas/mis-citas/',
-            prioridad=prioridad
-        )
-
-        # Notificación al administrador
-        Notificacion.objects.create(
-            tipo='cita',
-            titulo=f'Nueva cita programada: {instance.mascota.nombre}',
-            mensaje=f'El cliente {instance.mascota.cliente} ha programado una cita para {instance.mascota.nombre} el {instance.fecha.strftime("%d/%m/%Y a las %H:%M")}. Tipo: {instance.get_tipo_display()}.',
-            url_relacionada=f'/admin/citas/cita/{instance.id}/change/',
-            prioridad=prioridad,
-            para_admin=True
-        )
+        eventos.publicar('cita_creada', cita_id=instance.pk)
 
 @receiver(post_save, sender=Vacuna)
 def crear_recordatorio_vacuna(sender, instance, created, **kwargs):
     """Crear recordatorio automático para la próxima vacuna"""
     if created and instance.fecha_proxima:
-        # Crear recordatorio 7 días antes (o menos si la fecha próxima es muy cercana)
-        dias_anticipacion = min(7, (instance.fecha_proxima - timezone.now().date()).days - 1)
-        if dias_anticipacion > 0:
-            Recordatorio.objects.create(
-                cliente=instance.mascota.cliente,
-                tipo='vacuna',
-                titulo=f'Recordatorio: Vacuna de {instance.mascota.nombre}',
-                mensaje=f'La próxima vacuna de {instance.mascota.nombre} ({instance.nombre}) está programada para el {instance.fecha_proxima.strftime("%d/%m/%Y")}.',
-                fecha_recordatorio=timezone.datetime.combine(instance.fecha_proxima, timezone.datetime.min.time()),
-                dias_anticipacion=dias_anticipacion,
-                objeto_relacionado_id=instance.id,
-                objeto_relacionado_tipo='vacuna'
-            )
-
-            # Las vacunas tienen prioridad alta por defecto
-            Notificacion.objects.create(
-                cliente=instance.mascota.cliente,
-                tipo='vacuna',
-                titulo=f'Vacuna registrada para {instance.mascota.nombre}',
-                mensaje=f'Se ha registrado la vacuna "{instance.nombre}" para {instance.mascota.nombre}. Próxima dosis: {instance.fecha_proxima.strftime("%d/%m/%Y")}.',
-                url_relacionada=f'/mascotas/{instance.mascota.id}/',
-                prioridad='alta'
-            )
+        eventos.publicar('vacuna_creada', vacuna_id=instance.pk)
 
 @receiver(post_save, sender=Cita)
 def notificar_cambio_estado_cita(sender, instance, created, **kwargs):
@@ -85,109 +29,89 @@ def notificar_cambio_estado_cita(sender, instance, created, **kwargs):
         # Solo notificar si el estado cambió
         if hasattr(instance, '_original_estado'):
             if instance._original_estado != instance.estado:
-                prioridad = 'normal'
-                if instance.estado == 'cancelada':
-                    prioridad = 'alta'
-                    titulo = f'Cita cancelada para {instance.mascota.nombre}'
-                    mensaje = f'La cita programada para {instance.mascota.nombre} el {instance.fecha.strftime("%d/%m/%Y a las %H:%M")} ha sido cancelada.'
-                elif instance.estado == 'reprogramada':
-                    prioridad = 'alta'
-                    titulo = f'Cita reprogramada para {instance.mascota.nombre}'
-                    mensaje = f'La cita de {instance.mascota.nombre} ha sido reprogramada. Nueva fecha: {instance.fecha.strftime("%d/%m/%Y a las %H:%M")}.'
-                elif instance.estado == 'confirmada':
-                    titulo = f'Cita confirmada para {instance.mascota.nombre}'
-                    mensaje = f'Su cita para {instance.mascota.nombre} el {instance.fecha.strftime("%d/%m/%Y a las %H:%M")} ha sido confirmada.'
-                elif instance.estado == 'completada':
-                    titulo = f'Cita completada para {instance.mascota.nombre}'
-                    mensaje = f'La cita de {instance.mascota.nombre} del {instance.fecha.strftime("%d/%m/%Y")} ha sido completada exitosamente.'
-                else:
-                    return  # No notificar otros cambios de estado
-
-                Notificacion.objects.create(
-                    cliente=instance.mascota.cliente,
-                    tipo='cita',
-                    titulo=titulo,
-                    mensaje=mensaje,
-                    url_relacionada='/citas/mis-citas/',
-                    prioridad=prioridad
-                )
+                eventos.publicar('cita_cambio_estado', cita_id=instance.pk, estado=instance.estado)
 
 @receiver(pre_save, sender=Cita)
 def guardar_estado_original_cita(sender, instance, **kwargs):
     """Guardar el estado original antes de cambios para detectar modificaciones"""
-    if instance.pk:
-        try:
-            instance._original_estado = Cita.objects.get(pk=instance.pk).estado
-        except Cita.DoesNotExist:
-            instance._original_estado = None
+    if instance.pk and not instance.campo_cargado('estado'):
+        # Cita armada a mano con un pk existente: no hay valores cargados que comparar
+        instance._original_estado = Cita.objects.filter(pk=instance.pk).values_list('estado', flat=True).first()
     else:
-        instance._original_estado = None
+        # Valor con que se cargó la cita (CamposRastreadosMixin), sin consultar la base
+        instance._original_estado = instance.valor_original('estado')
 
 @receiver(post_save, sender=Mascota)
 def crear_recordatorio_cumpleanos(sender, instance, created, **kwargs):
     """Crear recordatorio automático para cumpleaños de mascotas"""
     if created and instance.fecha_nacimiento:
-        # Crear recordatorio anual para el cumpleaños
-        hoy = timezone.now().date()
-        fecha_cumple = instance.fecha_nacimiento.replace(year=hoy.year)
-
-        # Si el cumpleaños ya pasó este año, programar para el próximo año
-        if fecha_cumple < hoy:
-            fecha_cumple = fecha_cumple.replace(year=hoy.year + 1)
-
-        Recordatorio.objects.create(
-            cliente=instance.cliente,
-            tipo='cumpleanos',
-            titulo=f'¡Feliz cumpleaños {instance.nombre}!',
-            mensaje=f'Hoy {instance.nombre} cumple {instance.edad() + 1 if instance.edad() else "años"}. ¡No olvides felicitarlo!',
-            fecha_recordatorio=timezone.datetime.combine(fecha_cumple, timezone.datetime.min.time()),
-            dias_anticipacion=0,  # El mismo día
-            objeto_relacionado_id=instance.id,
-            objeto_relacionado_tipo='mascota'
-        )
-
-        # Notificación inmediata de registro
-        Notificacion.objects.create(
-            cliente=instance.cliente,
-            tipo='sistema',
-            titulo=f'Mascota registrada: {instance.nombre}',
-            mensaje=f'Se ha registrado exitosamente a {instance.nombre} en el sistema veterinario.',
-            url_relacionada=f'/mascotas/{instance.id}/',
-            prioridad='normal'
-        )
-
-        # Notificación al administrador
-        Notificacion.objects.create(
-            tipo='sistema',
-            titulo=f'Nueva mascota registrada: {instance.nombre}',
-            mensaje=f'El cliente {instance.cliente} ha registrado una nueva mascota: {instance.nombre} ({instance.tipo}).',
-            url_relacionada=f'/admin/mascotas/mascota/{instance.id}/change/',
-            prioridad='normal',
-            para_admin=True
-        )
+        eventos.publicar('mascota_creada', mascota_id=instance.pk)
 
 @receiver(post_save, sender=Orden)
 def notificar_nueva_orden(sender, instance, created, **kwargs):
     """Notificar al administrador cuando se crea una nueva orden"""
     if created:
-        Notificacion.objects.create(
-            tipo='sistema',
-            titulo=f'Nueva orden creada: #{instance.numero_orden}',
-            mensaje=f'El cliente {instance.usuario.username} ha creado una nueva orden por ${instance.total}. Estado: {instance.get_estado_display()}.',
-            url_relacionada=f'/admin/tienda/orden/{instance.id}/change/',
-            prioridad='alta',
-            para_admin=True
-        )
+        eventos.publicar('orden_creada', orden_id=instance.pk)
 
 @receiver(post_save, sender=Comentario)
 def notificar_nuevo_comentario(sender, instance, created, **kwargs):
     """Notificar al administrador cuando se crea un nuevo comentario"""
     if created:
-        Notificacion.objects.create(
-            tipo='sistema',
-            titulo=f'Nuevo comentario en {instance.producto.nombre}',
-            mensaje=f'El usuario {instance.usuario.username} ha comentado en el producto "{instance.producto.nombre}". Calificación: {instance.calificacion} estrellas.',
-            url_relacionada=f'/admin/tienda/comentario/{instance.id}/change/',
-            prioridad='normal',
-            para_admin=True
-        )
\ No newline at end of file
+        eventos.publicar('comentario_creado', comentario_id=instance.pk)
+
+@receiver(post_save, sender=Notificacion)
+@receiver(post_delete, sender=Notificacion)
+def invalidar_contador_notificaciones(sender, instance, **kwargs):
+    """Avisar al encabezado de los destinatarios que su contador cambió (también a los anteriores)"""
+    claves = set(_claves(instance))
+    original = getattr(instance, '_original_contador', None)
+    if original:
+        claves.update(original[1])
+    marcar_cambio_destinatarios(*claves)
+
+
+def _claves(notificacion):
+    return contadores.claves_notificacion(notificacion.cliente_id, notificacion.veterinario_id, notificacion.para_admin)
+
+
+@receiver(pre_save, sender=Notificacion)
+def guardar_estado_original_notificacion(sender, instance, **kwargs):
+    """Guardar lectura y destinatarios originales para ajustar los contadores"""
+    instance._original_contador = None
+    if not instance.pk:
+        return
+    campos = ('leida', 'cliente', 'veterinario', 'para_admin')
+    if all(instance.campo_cargado(campo) for campo in campos):
+        # Valores con que se cargó (CamposRastreadosMixin), sin consultar la base
+        original = tuple(instance.valor_original(campo) for campo in campos)
+    else:
+        # Notificación armada a mano o con campos diferidos
+        original = Notificacion.objects.filter(pk=instance.pk).values_list(
+            'leida', 'cliente_id', 'veterinario_id', 'para_admin'
+        ).first()
+    if original:
+        leida, cliente_id, veterinario_id, para_admin = original
+        instance._original_contador = (leida, contadores.claves_notificacion(cliente_id, veterinario_id, para_admin))
+
+
+@receiver(post_save, sender=Notificacion)
+def actualizar_contadores_notificacion(sender, instance, created, **kwargs):
+    """Mantener al día los contadores de no leídas de los destinatarios"""
+    claves = _claves(instance)
+    original = getattr(instance, '_original_contador', None)
+    if created or original is None:
+        if not instance.leida:
+            contadores.ajustar(claves, 1)
+        return
+
+    leida_antes, claves_antes = original
+    if claves_antes != claves:
+        contadores.recalcular(set(claves_antes) | set(claves))
+    elif leida_antes != instance.leida:
+        contadores.ajustar(claves, -1 if instance.leida else 1)
+
+
+@receiver(post_delete, sender=Notificacion)
+def descontar_notificacion_eliminada(sender, instance, **kwargs):
+    if not instance.leida:
+        contadores.ajustar(_claves(instance), -1)
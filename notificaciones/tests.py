@@ -1,3 +1,557 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from clientes.models import Cliente
+from .models import Notificacion
+
+
+class EstadoWidgetsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='dueno', password='clave123')
+        self.cliente, _ = Cliente.objects.get_or_create(
+            usuario=self.usuario, defaults={'telefono': '3000000000', 'direccion': 'Calle 1'}
+        )
+        Notificacion.objects.create(cliente=self.cliente, titulo='Hola', mensaje='-')
+        self.url = reverse('notificaciones:estado_widgets')
+        self.client.login(username='dueno', password='clave123')
+
+    def test_responde_304_sin_consultar_la_base(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'total_no_leidas': 1, 'cantidad_carrito': 0})
+        etag = response['ETag']
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any(
+            'notificaciones_notificacion' in q['sql'] or 'tienda_itemcarrito' in q['sql']
+            for q in consultas.captured_queries
+        ))
+        self.assertEqual(response['ETag'], etag)
+
+    def test_nueva_notificacion_cambia_el_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Notificacion.objects.create(cliente=self.cliente, titulo='Otra', mensaje='-')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['total_no_leidas'], 2)
+
+    def test_marcar_todas_leidas_cambia_el_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.get(reverse('notificaciones:lista'), {'marcar_leidas': 1})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_no_leidas'], 0)
+
+    def test_cambio_en_carrito_cambia_el_etag(self):
+        from decimal import Decimal
+        from tienda.models import Carrito, Categoria, ItemCarrito, Producto
+
+        etag = self.client.get(self.url)['ETag']
+        producto = Producto.objects.create(
+            nombre='Collar', descripcion='-', precio=Decimal('10000.00'),
+            categoria=Categoria.objects.create(nombre='Accesorios'), stock=5
+        )
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=carrito, producto=producto, cantidad=2)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cantidad_carrito'], 2)
+
+
+class ContadoresNotificacionesTestCase(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='lector', password='clave123')
+        self.cliente, _ = Cliente.objects.get_or_create(
+            usuario=self.usuario, defaults={'telefono': '3000000000', 'direccion': 'Calle 1'}
+        )
+        self.client.login(username='lector', password='clave123')
+
+    def _contador(self, destinatario):
+        from .models import ContadorNotificaciones
+        return ContadorNotificaciones.objects.get(destinatario=destinatario).no_leidas
+
+    def test_crear_leer_y_borrar_ajustan_el_contador(self):
+        from .contadores import clave_cliente
+
+        clave = clave_cliente(self.cliente.pk)
+        primera = Notificacion.objects.create(cliente=self.cliente, titulo='Uno', mensaje='-')
+        segunda = Notificacion.objects.create(cliente=self.cliente, titulo='Dos', mensaje='-')
+        self.assertEqual(self._contador(clave), 2)
+
+        primera.marcar_como_leida()
+        self.assertEqual(self._contador(clave), 1)
+        primera.marcar_como_leida()
+        self.assertEqual(self._contador(clave), 1)
+
+        segunda.delete()
+        self.assertEqual(self._contador(clave), 0)
+
+    def test_guardar_no_consulta_la_notificacion_ni_sus_destinatarios(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .contadores import clave_cliente
+        from .widgets import etag_usuario
+
+        Notificacion.objects.create(cliente=self.cliente, titulo='Uno', mensaje='-')
+        etag = etag_usuario(self.usuario)
+        notificacion = Notificacion.objects.get()
+        with CaptureQueriesContext(connection) as consultas:
+            notificacion.marcar_como_leida()
+        self.assertFalse(any(q['sql'].startswith('SELECT') for q in consultas.captured_queries))
+        self.assertEqual(self._contador(clave_cliente(self.cliente.pk)), 0)
+        self.assertNotEqual(etag_usuario(self.usuario), etag)
+
+    def test_conteo_no_cuenta_la_tabla(self):
+        Notificacion.objects.create(cliente=self.cliente, titulo='Uno', mensaje='-')
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('notificaciones:conteo'))
+        self.assertEqual(response.json()['total_no_leidas'], 1)
+        self.assertFalse(any('notificaciones_notificacion' in q['sql'] for q in consultas.captured_queries))
+
+    def test_marcar_todas_leidas_y_reconciliar(self):
+        from .contadores import ADMIN, clave_cliente, reconciliar
+        from .models import ContadorNotificaciones
+
+        Notificacion.objects.create(cliente=self.cliente, titulo='Uno', mensaje='-')
+        Notificacion.objects.create(cliente=self.cliente, titulo='Dos', mensaje='-')
+        Notificacion.objects.create(titulo='Admin', mensaje='-', para_admin=True)
+        self.client.get(reverse('notificaciones:lista'), {'marcar_leidas': 1})
+        self.assertEqual(self._contador(clave_cliente(self.cliente.pk)), 0)
+
+        # Un desvío (p. ej. un update() masivo sin ajustar) lo corrige la reconciliación
+        ContadorNotificaciones.objects.filter(destinatario=ADMIN).update(no_leidas=7)
+        self.assertEqual(reconciliar(), {ADMIN: (7, 1)})
+        self.assertEqual(self._contador(ADMIN), 1)
+
+    def test_personal_con_perfil_cuenta_una_vez_las_que_son_de_ambos(self):
+        from .contadores import clave_admin_y, clave_cliente, no_leidas_usuario, reconciliar
+        from .models import ContadorNotificaciones
+
+        self.usuario.is_staff = True
+        self.usuario.save()
+        Notificacion.objects.create(cliente=self.cliente, titulo='Ambos', mensaje='-', para_admin=True)
+        Notificacion.objects.create(titulo='Admin', mensaje='-', para_admin=True)
+        self.assertEqual(no_leidas_usuario(self.usuario), 2)
+
+        clave = clave_admin_y(clave_cliente(self.cliente.pk))
+        ContadorNotificaciones.objects.filter(destinatario=clave).update(no_leidas=0)
+        self.assertEqual(reconciliar(), {clave: (0, 1)})
+
+        self.client.get(reverse('notificaciones:lista'), {'marcar_leidas': 1})
+        self.assertEqual(no_leidas_usuario(self.usuario), 0)
+        self.assertEqual(self._contador(clave), 0)
+
+
+@override_settings(NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO=True)
+class NotificacionMasivaTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='clave123', is_staff=True, is_superuser=True)
+        self.clientes = []
+        for i in range(5):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='clave123')
+            cliente, _ = Cliente.objects.get_or_create(
+                usuario=usuario, defaults={'telefono': '3000000000', 'direccion': 'Calle 1'}
+            )
+            self.clientes.append(cliente)
+
+    def _registrar(self):
+        from .masivas import registrar_envio
+        return registrar_envio(self.admin, {'tipo': 'general', 'titulo': 'Aviso', 'mensaje': 'Cerrado el lunes', 'prioridad': 'normal'})
+
+    def test_envio_por_lotes_con_progreso(self):
+        from .contadores import clave_cliente, no_leidas
+        from .masivas import procesar_envio
+
+        envio = self._registrar()
+        self.assertEqual(envio.estado, 'pendiente')
+        self.assertFalse(Notificacion.objects.exists())
+
+        avances = []
+        estado = procesar_envio(envio.pk, tamano_lote=2, progreso=lambda e: avances.append(e.enviadas))
+        self.assertEqual(estado, 'completado')
+        self.assertEqual(avances, [2, 4, 5])
+        self.assertEqual(Notificacion.objects.filter(envio_masivo=envio).count(), 5)
+        self.assertEqual(no_leidas([clave_cliente(c.pk) for c in self.clientes]), 5)
+
+        envio.refresh_from_db()
+        self.assertEqual((envio.enviadas, envio.total_destinatarios, envio.porcentaje), (5, 5, 100))
+
+    def test_envio_interrumpido_continua_sin_duplicar(self):
+        from .masivas import procesar_envio
+        from .models import NotificacionMasiva
+
+        envio = self._registrar()
+        NotificacionMasiva.objects.filter(pk=envio.pk).update(ultimo_cliente_id=self.clientes[2].pk, enviadas=3)
+        procesar_envio(envio.pk)
+        self.assertEqual(Notificacion.objects.filter(envio_masivo=envio).count(), 2)
+        envio.refresh_from_db()
+        self.assertEqual(envio.enviadas, 5)
+
+    def test_vista_registra_envio_y_api_de_avance(self):
+        self.client.login(username='admin', password='clave123')
+        response = self.client.post(reverse('administracion:crear_notificacion'), {
+            'destinatario': 'todos', 'tipo': 'general', 'titulo': 'Aviso',
+            'mensaje': 'Cerrado el lunes', 'prioridad': 'normal',
+        })
+        self.assertRedirects(response, reverse('administracion:gestion_notificaciones'), fetch_redirect_response=False)
+
+        from .models import NotificacionMasiva
+
+        envio = NotificacionMasiva.objects.get()
+        datos = self.client.get(reverse('administracion:estado_envio_masivo_api', args=[envio.pk])).json()
+        self.assertEqual(datos['estado'], 'pendiente')
+        self.assertEqual(datos['total_destinatarios'], 5)
+
+    def test_sin_cola_se_envia_en_la_peticion(self):
+        with override_settings(NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO=False):
+            envio = self._registrar()
+        self.assertEqual(envio.estado, 'completado')
+        self.assertEqual(Notificacion.objects.filter(envio_masivo=envio).count(), 5)
+
+
+class RecordatoriosPorEnviarTestCase(TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user(username='recordado', password='clave123')
+        self.cliente, _ = Cliente.objects.get_or_create(
+            usuario=usuario, defaults={'telefono': '3000000000', 'direccion': 'Calle 1', 'preferencias_comunicacion': 'sms'}
+        )
+
+    def _recordatorio(self, dias_hasta_evento, dias_anticipacion, **extra):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Recordatorio
+
+        return Recordatorio.objects.create(
+            cliente=self.cliente, tipo='cita', titulo='Cita', mensaje='-',
+            fecha_recordatorio=timezone.now() + timedelta(days=dias_hasta_evento, hours=1),
+            dias_anticipacion=dias_anticipacion, objeto_relacionado_tipo='cita', **extra
+        )
+
+    def test_seleccion_coincide_con_debe_enviarse(self):
+        from .models import Recordatorio
+        from .recordatorios import recordatorios_por_enviar
+
+        casos = [
+            self._recordatorio(1, 1),      # vence hoy
+            self._recordatorio(3, 7),      # ventana abierta desde hace días
+            self._recordatorio(0, 0),      # el mismo día del evento
+            self._recordatorio(5, 1),      # todavía no
+            self._recordatorio(-2, 1),     # el evento ya pasó
+            self._recordatorio(1, 1, enviado=True),
+            self._recordatorio(1, 1, activo=False),
+        ]
+        esperados = {r.pk for r in casos if r.debe_enviarse()}
+        self.assertEqual(len(esperados), 3)
+        self.assertEqual(set(recordatorios_por_enviar().values_list('pk', flat=True)), esperados)
+
+        # Guardar con otra anticipación recalcula la fecha programada
+        tardio = Recordatorio.objects.get(pk=casos[3].pk)
+        tardio.dias_anticipacion = 10
+        tardio.save(update_fields=['dias_anticipacion'])
+        self.assertIn(tardio.pk, set(recordatorios_por_enviar().values_list('pk', flat=True)))
+
+    def test_envio_por_lotes_con_consultas_constantes(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .contadores import clave_cliente, no_leidas
+        from .models import Recordatorio
+        from .recordatorios import enviar_pendientes
+
+        for _ in range(6):
+            self._recordatorio(1, 1)
+        self._recordatorio(9, 1)
+        self.assertEqual(no_leidas([clave_cliente(self.cliente.pk)]), 0)
+
+        # Por lote: SELECT, UPDATE de recordatorios, INSERT, UPDATE de contadores y el savepoint;
+        # al final, la lectura del lote vacío
+        with self.assertNumQueries(6 * 3 + 3):
+            lotes = [len(lote) for lote in enviar_pendientes(tamano_lote=2)]
+        self.assertEqual(lotes, [2, 2, 2])
+        self.assertEqual(Recordatorio.objects.filter(enviado=True, fecha_envio__isnull=False).count(), 6)
+        self.assertEqual(Notificacion.objects.filter(cliente=self.cliente, tipo='cita').count(), 6)
+        self.assertEqual(no_leidas([clave_cliente(self.cliente.pk)]), 6)
+
+        salida = StringIO()
+        call_command('procesar_recordatorios', stdout=salida)
+        self.assertIn('No hay recordatorios pendientes', salida.getvalue())
+
+
+    def test_lote_tomado_por_otra_ejecucion_se_reintenta(self):
+        from unittest import mock
+        from . import recordatorios
+
+        for _ in range(3):
+            self._recordatorio(1, 1)
+        reclamar = recordatorios._reclamar_lote
+        intentos = []
+
+        def otra_ejecucion_se_adelanta(*args):
+            intentos.append(1)
+            if len(intentos) == 1:
+                raise recordatorios._LoteTomado
+            return reclamar(*args)
+
+        metricas = {}
+        with mock.patch.object(recordatorios, '_reclamar_lote', side_effect=otra_ejecucion_se_adelanta):
+            lotes = list(recordatorios.enviar_pendientes(metricas=metricas))
+        self.assertEqual([len(lote) for lote in lotes], [3])
+        self.assertEqual(metricas, {'enviados': 3, 'lotes_reintentados': 1})
+        self.assertEqual(Notificacion.objects.filter(cliente=self.cliente).count(), 3)
+
+    def test_cumpleanos_por_indice_sin_duplicar(self):
+        from datetime import date
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from mascotas.models import Mascota
+        from .contadores import clave_cliente, no_leidas
+        from .models import Recordatorio
+        from .recordatorios import notificar_cumpleanos
+
+        hoy = timezone.now().date()
+        nacimiento = hoy.replace(year=hoy.year - 4)
+        cumpleaneras = [
+            Mascota.objects.create(nombre=f'Toby{i}', tipo='perro', sexo='macho', cliente=self.cliente, fecha_nacimiento=nacimiento)
+            for i in range(3)
+        ]
+        otra = Mascota.objects.create(nombre='Luna', tipo='gato', sexo='hembra', cliente=self.cliente, fecha_nacimiento=date(2020, 1, 1))
+        otra.fecha_nacimiento = nacimiento
+        otra.save(update_fields=['fecha_nacimiento'])
+        self.assertEqual(Mascota.objects.get(pk=otra.pk).cumple_mmdd, nacimiento.month * 100 + nacimiento.day)
+        cumpleaneras.append(otra)
+        Mascota.objects.create(nombre='Sin fecha', tipo='perro', sexo='macho', cliente=self.cliente)
+        previas = no_leidas([clave_cliente(self.cliente.pk)])
+
+        notificadas = [m for lote in notificar_cumpleanos(hoy=hoy, tamano_lote=2) for m in lote]
+        self.assertEqual(sorted(m.pk for m in notificadas), sorted(m.pk for m in cumpleaneras))
+        self.assertEqual(no_leidas([clave_cliente(self.cliente.pk)]), previas + 4)
+
+        # Re-ejecutar el comando el mismo día no repite las notificaciones (los
+        # recordatorios anuales que crea la señal se desactivan para aislar el caso)
+        Recordatorio.objects.update(activo=False)
+        salida = StringIO()
+        call_command('procesar_recordatorios', stdout=salida)
+        self.assertIn('Cumpleaños notificados: 0', salida.getvalue())
+        self.assertEqual(Notificacion.objects.filter(tipo='cumpleanos').count(), 4)
+        self.assertEqual(no_leidas([clave_cliente(self.cliente.pk)]), previas + 4)
+        self.assertEqual(
+            set(Notificacion.objects.filter(tipo='cumpleanos').values_list('titulo', flat=True)),
+            {f'¡Feliz cumpleaños {m.nombre}!' for m in cumpleaneras}
+        )
+
+class BandejaCorreoTestCase(TestCase):
+    def _encolar(self, cantidad, prefijo='prueba'):
+        from .correo import encolar_correo
+
+        for i in range(cantidad):
+            encolar_correo(f'{prefijo}:{i}', f'Asunto {i}', 'Cuerpo', f'cliente{i}@example.com', cuerpo_html='<p>Cuerpo</p>')
+
+    def test_despacho_concurrente_una_conexion_por_lote(self):
+        from unittest import mock
+        from django.core import mail
+        from django.core.mail.backends.locmem import EmailBackend
+        from .correo import despachar_pendientes
+        from .models import CorreoSaliente
+
+        self._encolar(7)
+        self._encolar(7)  # la misma clave no se encola dos veces
+        with mock.patch.object(EmailBackend, 'open', autospec=True, side_effect=EmailBackend.open) as abrir:
+            enviados, fallidos = despachar_pendientes(workers=2, tamano_lote=3, por_segundo=0)
+
+        self.assertEqual((enviados, fallidos), (7, 0))
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertEqual(abrir.call_count, 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(CorreoSaliente.objects.filter(estado='enviado', intentos=1).count(), 7)
+
+        # Una segunda ejecución no reenvía nada
+        self.assertEqual(despachar_pendientes(por_segundo=0), (0, 0))
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_fallo_se_reintenta_con_espera(self):
+        from unittest import mock
+        from django.core import mail
+        from django.core.mail.backends.locmem import EmailBackend
+        from django.utils import timezone
+        from .correo import despachar_pendientes
+        from .models import CorreoSaliente
+
+        self._encolar(2)
+        enviar = EmailBackend.send_messages
+
+        def falla_el_primero(backend, mensajes):
+            if mensajes[0].to == ['cliente0@example.com']:
+                raise ConnectionError('servidor ocupado')
+            return enviar(backend, mensajes)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=falla_el_primero):
+            self.assertEqual(despachar_pendientes(por_segundo=0, espera_base=60), (1, 1))
+
+        fallido = CorreoSaliente.objects.get(destinatario='cliente0@example.com')
+        self.assertEqual((fallido.estado, fallido.intentos), ('pendiente', 1))
+        self.assertIn('servidor ocupado', fallido.ultimo_error)
+        self.assertGreater(fallido.proximo_intento, timezone.now())
+
+        # Cuando vence la espera se envía
+        CorreoSaliente.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+        self.assertEqual(despachar_pendientes(por_segundo=0), (1, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_agota_intentos_y_libera_atascados(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.core.mail.backends.locmem import EmailBackend
+        from django.utils import timezone
+        from .correo import despachar_pendientes, liberar_atascados
+        from .models import CorreoSaliente
+
+        self._encolar(1)
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=ConnectionError('caído')):
+            despachar_pendientes(por_segundo=0, max_intentos=2, espera_base=0)
+        self.assertEqual(CorreoSaliente.objects.get().estado, 'error')
+        self.assertEqual(CorreoSaliente.objects.get().intentos, 2)
+
+        # Un correo que quedó en 'enviando' por una ejecución interrumpida vuelve a la cola
+        self._encolar(1, prefijo='otro')
+        CorreoSaliente.objects.filter(clave='otro:0').update(estado='enviando', proximo_intento=timezone.now() - timedelta(hours=1))
+        self.assertEqual(liberar_atascados(30), 1)
+        self.assertEqual(CorreoSaliente.objects.get(clave='otro:0').estado, 'pendiente')
+
+    def test_backend_que_no_se_puede_crear_devuelve_el_lote_a_la_cola(self):
+        from unittest import mock
+        from .correo import despachar_pendientes
+        from .models import CorreoSaliente
+
+        self._encolar(3)
+        with mock.patch('notificaciones.correo.get_connection', side_effect=ImportError('backend inexistente')):
+            self.assertEqual(despachar_pendientes(workers=2, tamano_lote=2, por_segundo=0), (0, 3))
+
+        self.assertEqual(CorreoSaliente.objects.filter(estado='pendiente', intentos=1).count(), 3)
+        self.assertIn('backend inexistente', CorreoSaliente.objects.first().ultimo_error)
+
+    def test_procesar_recordatorios_encola_y_envia(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import CorreoSaliente, Recordatorio
+
+        usuario = User.objects.create_user(username='correo', email='correo@example.com', password='clave123')
+        cliente, _ = Cliente.objects.get_or_create(
+            usuario=usuario, defaults={'telefono': '3000000000', 'direccion': 'Calle 1', 'preferencias_comunicacion': 'email'}
+        )
+        Recordatorio.objects.create(
+            cliente=cliente, tipo='control', titulo='Control', mensaje='-',
+            fecha_recordatorio=timezone.now() + timedelta(days=1, hours=1), dias_anticipacion=1
+        )
+
+        call_command('procesar_recordatorios', stdout=StringIO())
+        call_command('procesar_recordatorios', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['correo@example.com'])
+        self.assertEqual(CorreoSaliente.objects.get().estado, 'enviado')
+
+
+
+@override_settings(NOTIFICACIONES_EVENTOS_BACKEND='notificaciones.eventos.BackendCola')
+class EventosNotificacionesTestCase(TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user(username='eventos', password='clave123')
+        self.cliente, _ = Cliente.objects.get_or_create(
+            usuario=usuario, defaults={'telefono': '3000000000', 'direccion': 'Calle 1'}
+        )
+
+    def _mascota(self, nombre, **extra):
+        from datetime import date
+        from mascotas.models import Mascota
+
+        extra.setdefault('fecha_nacimiento', date(2020, 5, 1))
+        return Mascota.objects.create(nombre=nombre, tipo='perro', sexo='macho', cliente=self.cliente, **extra)
+
+    def test_backend_inline_se_ejecuta_al_confirmar(self):
+        from datetime import date
+        from .contadores import clave_cliente, no_leidas
+        from .models import EventoNotificacion, Recordatorio
+
+        with override_settings(NOTIFICACIONES_EVENTOS_BACKEND='notificaciones.eventos.BackendInline'):
+            with self.captureOnCommitCallbacks(execute=True):
+                mascota = self._mascota('Toby', fecha_nacimiento=date(2020, 5, 1))
+                self.assertFalse(Notificacion.objects.exists())
+
+        self.assertFalse(EventoNotificacion.objects.exists())
+        self.assertEqual(Recordatorio.objects.get().objeto_relacionado_id, mascota.pk)
+        self.assertEqual(Notificacion.objects.filter(cliente=self.cliente, titulo='Mascota registrada: Toby').count(), 1)
+        self.assertEqual(Notificacion.objects.filter(para_admin=True).count(), 1)
+        self.assertEqual(no_leidas([clave_cliente(self.cliente.pk)]), 1)
+
+    def test_mascota_sin_fecha_de_nacimiento_no_genera_avisos(self):
+        from .models import EventoNotificacion, Recordatorio
+
+        with override_settings(NOTIFICACIONES_EVENTOS_BACKEND='notificaciones.eventos.BackendInline'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._mascota('Sin fecha', fecha_nacimiento=None)
+
+        self.assertFalse(EventoNotificacion.objects.exists())
+        self.assertFalse(Recordatorio.objects.exists())
+        self.assertFalse(Notificacion.objects.exists())
+
+    def test_cola_procesa_por_lotes_con_un_insert(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .contadores import ADMIN, clave_cliente, no_leidas
+        from .models import EventoNotificacion
+
+        for i in range(4):
+            self._mascota(f'Luna{i}')
+        self.assertEqual(EventoNotificacion.objects.filter(nombre='mascota_creada', estado='pendiente').count(), 4)
+        self.assertFalse(Notificacion.objects.exists())
+
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('procesar_eventos', '--una-vez', stdout=StringIO())
+        inserts = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "notificaciones_notificacion"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notificacion.objects.count(), 8)
+        self.assertEqual(no_leidas([clave_cliente(self.cliente.pk)]), 4)
+        self.assertEqual(no_leidas([ADMIN]), 4)
+        self.assertFalse(EventoNotificacion.objects.exists())
+
+    def test_evento_que_falla_se_aisla_y_reintenta(self):
+        from django.utils import timezone
+        from . import eventos
+        from .models import EventoNotificacion
+
+        self._mascota('Bien')
+        rota = self._mascota('Mal')
+        EventoNotificacion.objects.filter(datos__mascota_id=rota.pk).update(datos={'otro': 1})
+
+        self.assertEqual(eventos.procesar_pendientes(max_intentos=2), (1, 1))
+        self.assertEqual(Notificacion.objects.filter(titulo='Mascota registrada: Bien').count(), 1)
+        fallido = EventoNotificacion.objects.get()
+        self.assertEqual((fallido.estado, fallido.intentos), ('pendiente', 1))
+        self.assertGreater(fallido.proximo_intento, timezone.now())
+
+        # No se reintenta hasta que vence su espera
+        self.assertEqual(eventos.procesar_pendientes(max_intentos=2), (0, 0))
+        EventoNotificacion.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+        self.assertEqual(eventos.procesar_pendientes(max_intentos=2), (0, 1))
+        self.assertEqual(EventoNotificacion.objects.get().estado, 'error')
+        self.assertEqual(eventos.procesar_pendientes(max_intentos=2), (0, 0))
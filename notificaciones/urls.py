@@ -9,4 +9,5 @@ urlpatterns = [
     path('<int:notificacion_id>/', views.detalle_notificacion, name='detalle'),
     path('marcar-leida/<int:notificacion_id>/', views.marcar_leida, name='marcar_leida'),
     path('conteo/', views.conteo_notificaciones, name='conteo'),
+    path('estado-widgets/', views.estado_widgets, name='estado_widgets'),
 ]
\ No newline at end of file
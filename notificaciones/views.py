@@ -1,10 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
+from .contadores import claves_notificacion, no_leidas_usuario, recalcular
 from .models import Notificacion, Recordatorio
+from .widgets import estado_usuario, etag_usuario, marcar_cambio_destinatarios, marcar_cambio_usuario
 from clientes.models import Cliente
 
 @login_required
@@ -37,14 +39,24 @@ def lista_notificaciones(request):
 
     # Marcar todas como leídas si se solicita
     if request.GET.get('marcar_leidas'):
+        # update() no dispara señales: se recalculan a mano los contadores de todos los destinatarios
+        # tocados (las de administradores también cuentan para su cliente) y se avisa al encabezado
+        claves = {
+            clave
+            for destinatarios in notificaciones_no_leidas.values_list('cliente_id', 'veterinario_id', 'para_admin').distinct()
+            for clave in claves_notificacion(*destinatarios)
+        }
         notificaciones_no_leidas.update(leida=True)
+        recalcular(claves)
+        marcar_cambio_usuario(request.user.pk)
+        marcar_cambio_destinatarios(*claves)
         messages.success(request, "Todas las notificaciones han sido marcadas como leídas.")
         return redirect('notificaciones:lista')
 
     context = {
         'notificaciones': notificaciones,
         'notificaciones_no_leidas': notificaciones_no_leidas,
-        'total_no_leidas': notificaciones_no_leidas.count(),
+        'total_no_leidas': no_leidas_usuario(request.user),
     }
 
     return render(request, 'notificaciones/lista_notificaciones.html', context)
@@ -65,10 +77,7 @@ def marcar_leida(request, notificacion_id):
             notificacion = get_object_or_404(notificaciones_queryset, id=notificacion_id)
             notificacion.marcar_como_leida()
 
-            total_no_leidas = Notificacion.objects.filter(
-                Q(veterinario=veterinario) | Q(para_admin=True) if request.user.is_staff or request.user.is_superuser else Q(veterinario=veterinario),
-                leida=False
-            ).count()
+            total_no_leidas = no_leidas_usuario(request.user)
 
             return JsonResponse({
                 'success': True,
@@ -82,10 +91,7 @@ def marcar_leida(request, notificacion_id):
             notificacion = get_object_or_404(notificaciones_queryset, id=notificacion_id)
             notificacion.marcar_como_leida()
 
-            total_no_leidas = Notificacion.objects.filter(
-                Q(cliente=cliente) | Q(para_admin=True) if request.user.is_staff or request.user.is_superuser else Q(cliente=cliente),
-                leida=False
-            ).count()
+            total_no_leidas = no_leidas_usuario(request.user)
 
             return JsonResponse({
                 'success': True,
@@ -154,27 +160,24 @@ def detalle_notificacion(request, notificacion_id):
 @login_required
 def conteo_notificaciones(request):
     """Vista AJAX para obtener el conteo de notificaciones no leídas"""
-    from django.contrib.auth.models import Group
-    from django.db.models import Q
-
     try:
-        if request.user.groups.filter(name='Veterinarios').exists():
-            veterinario = request.user.perfil_veterinario_app
-            total_no_leidas = Notificacion.objects.filter(
-                Q(veterinario=veterinario) | Q(para_admin=True) if request.user.is_staff or request.user.is_superuser else Q(veterinario=veterinario),
-                leida=False
-            ).count()
-        else:
-            cliente = request.user.cliente
-            total_no_leidas = Notificacion.objects.filter(
-                Q(cliente=cliente) | Q(para_admin=True) if request.user.is_staff or request.user.is_superuser else Q(cliente=cliente),
-                leida=False
-            ).count()
-
         return JsonResponse({
-            'total_no_leidas': total_no_leidas
+            'total_no_leidas': no_leidas_usuario(request.user)
         })
-    except (Cliente.DoesNotExist, AttributeError):
-        return JsonResponse({'total_no_leidas': 0})
     except Exception as e:
         return JsonResponse({'total_no_leidas': 0, 'error': str(e)})
+
+@login_required
+def estado_widgets(request):
+    """
+    Vista AJAX con los contadores del encabezado (notificaciones y carrito).
+    Responde 304 si la versión que tiene el navegador (If-None-Match) sigue vigente.
+    """
+    etag = etag_usuario(request.user)
+    if etag in request.headers.get('If-None-Match', ''):
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = JsonResponse(estado_usuario(request.user, etag))
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
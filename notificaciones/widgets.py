@@ -0,0 +1,106 @@
+"""
+Estado de los contadores del encabezado (notificaciones no leídas y carrito).
+
+Cada usuario tiene un número de versión en caché que las señales de
+``ItemCarrito`` incrementan cuando algo suyo cambia. Las señales de
+``Notificacion`` incrementan la versión de cada destinatario (las claves de
+``contadores``: cliente, veterinario o admin), que sale de los ids que ya tiene
+la notificación sin consultar a qué usuario pertenecen; la de 'admin' es la
+compartida por todo el personal. Los envíos masivos usan una versión común a
+todos los usuarios. La versión se publica como ETag del endpoint ``estado_widgets``: si
+el navegador envía la misma, se responde 304 sin tocar la base de datos.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_ADMIN = 'widgets:version:admin'
+VERSION_TODOS = 'widgets:version:todos'
+
+
+def _clave_version(usuario_id):
+    return f'widgets:version:{usuario_id}'
+
+
+def _clave_estado(etag):
+    return f'widgets:estado:{etag}'
+
+
+def _version(clave):
+    version = cache.get(clave)
+    if version is None:
+        # Se parte del reloj para no repetir versiones tras vaciar la caché
+        version = int(time.time() * 1000)
+        cache.add(clave, version, None)
+        version = cache.get(clave, version)
+    return version
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, int(time.time() * 1000), None)
+
+
+def marcar_cambio_usuario(*usuario_ids):
+    """Invalida los contadores de los usuarios indicados"""
+    for usuario_id in usuario_ids:
+        if usuario_id:
+            _incrementar(_clave_version(usuario_id))
+
+
+def marcar_cambio_destinatarios(*claves):
+    """Invalida los contadores de los destinatarios ``claves`` (ver ``contadores.claves_notificacion``)"""
+    for clave in claves:
+        _incrementar(_clave_version(clave))
+
+
+def marcar_cambio_admin():
+    """Invalida los contadores de todo el personal (notificaciones para administrador)"""
+    _incrementar(VERSION_ADMIN)
+
+
+def marcar_cambio_todos():
+    """Invalida los contadores de todos los usuarios (envíos masivos)"""
+    _incrementar(VERSION_TODOS)
+
+
+def _destinatarios(usuario):
+    """Claves de destinatario del perfil del usuario, cacheadas para que el 304 no consulte la base"""
+    from .contadores import ADMIN, claves_usuario
+
+    clave = f'widgets:destinatarios:{usuario.pk}'
+    claves = cache.get(clave)
+    if claves is None:
+        claves = [c for c in claves_usuario(usuario) if c != ADMIN]
+        if claves:
+            # Sin perfil no se cachea: se verá en cuanto lo cree
+            cache.set(clave, claves, getattr(settings, 'WIDGETS_ESTADO_TIMEOUT', 3600))
+    return claves
+
+
+def etag_usuario(usuario):
+    etag = f'{usuario.pk}-{_version(_clave_version(usuario.pk))}-{_version(VERSION_TODOS)}'
+    for clave in _destinatarios(usuario):
+        etag += f'-{_version(_clave_version(clave))}'
+    if usuario.is_staff or usuario.is_superuser:
+        etag += f'-{_version(VERSION_ADMIN)}'
+    return f'"{etag}"'
+
+
+def estado_usuario(usuario, etag):
+    """Contadores del usuario para la versión ``etag``; se calculan una sola vez por versión"""
+    from tienda.carrito import resumen_carrito_cacheado
+    from .contadores import no_leidas_usuario
+
+    clave = _clave_estado(etag)
+    estado = cache.get(clave)
+    if estado is None:
+        estado = {
+            'total_no_leidas': no_leidas_usuario(usuario),
+            'cantidad_carrito': resumen_carrito_cacheado(usuario.pk)['cantidad_total'],
+        }
+        cache.set(clave, estado, getattr(settings, 'WIDGETS_ESTADO_TIMEOUT', 3600))
+    return estado
@@ -21,54 +21,105 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    // Actualizar contador del carrito
-    function actualizarCarritoWidget() {
-        fetch('/tienda/carrito/widget/')
-            .then(response => response.json())
-            .then(data => {
-                const cartCount = document.getElementById('cart-count');
-                if (cartCount) {
-                    cartCount.textContent = data.cantidad_total;
-                    // Ocultar badge si no hay items
-                    if (data.cantidad_total === 0) {
-                        cartCount.style.display = 'none';
-                    } else {
-                        cartCount.style.display = 'flex';
-                    }
-                }
-            })
-            .catch(error => console.error('Error:', error));
+    // Contadores del encabezado (carrito y notificaciones)
+    const cartCount = document.getElementById('cart-count');
+    const notifCount = document.getElementById('notificaciones-count');
+
+    function mostrarCarrito(cantidad) {
+        if (!cartCount) return;
+        cartCount.textContent = cantidad;
+        // Ocultar badge si no hay items
+        cartCount.style.display = cantidad === 0 ? 'none' : 'flex';
+    }
+
+    function mostrarNotificaciones(total) {
+        if (!notifCount) return;
+        const navLink = notifCount.closest('.nav-link');
+        notifCount.textContent = total;
+        // Ocultar badge si no hay notificaciones
+        if (total === 0) {
+            notifCount.style.display = 'none';
+            if (navLink) navLink.classList.remove('has-notifications');
+        } else {
+            notifCount.style.display = 'flex';
+            if (navLink) navLink.classList.add('has-notifications');
+        }
+    }
+
+    function mostrarEstado(data) {
+        mostrarCarrito(data.cantidad_carrito);
+        mostrarNotificaciones(data.total_no_leidas);
     }
 
-    // Actualizar contador de notificaciones
-    function actualizarNotificacionesWidget() {
-        fetch('/notificaciones/conteo/')
-            .then(response => response.json())
-            .then(data => {
-                const notifCount = document.getElementById('notificaciones-count');
-                if (notifCount) {
-                    const navLink = notifCount.closest('.nav-link');
-                    notifCount.textContent = data.total_no_leidas;
-                    // Ocultar badge si no hay notificaciones
-                    if (data.total_no_leidas === 0) {
-                        notifCount.style.display = 'none';
-                        if (navLink) navLink.classList.remove('has-notifications');
-                    } else {
-                        notifCount.style.display = 'flex';
-                        if (navLink) navLink.classList.add('has-notifications');
-                    }
+    // El servidor responde 304 mientras nada cambie (ETag por usuario), así que
+    // la consulta es barata; aun así se espacia mientras no haya novedades y se
+    // detiene con la pestaña oculta.
+    const ESPERA_MINIMA = 15000;
+    const ESPERA_MAXIMA = 120000;
+    const CLAVE_COMPARTIDA = 'widgets-estado';
+    let etag = null;
+    let espera = ESPERA_MINIMA;
+    let temporizador = null;
+
+    function programarConsulta() {
+        clearTimeout(temporizador);
+        if (!document.hidden) {
+            temporizador = setTimeout(consultarEstado, espera);
+        }
+    }
+
+    function consultarEstado() {
+        const headers = {'X-Requested-With': 'XMLHttpRequest'};
+        if (etag) headers['If-None-Match'] = etag;
+
+        fetch('/notificaciones/estado-widgets/', {headers: headers, cache: 'no-store'})
+            .then(response => {
+                if (response.status === 304) {
+                    espera = Math.min(espera * 2, ESPERA_MAXIMA);
+                    return;
                 }
+                if (!response.ok) throw new Error(response.status);
+                const nuevoEtag = response.headers.get('ETag');
+                return response.json().then(data => {
+                    etag = nuevoEtag;
+                    espera = ESPERA_MINIMA;
+                    mostrarEstado(data);
+                    // Compartir con las demás pestañas abiertas para que no consulten lo mismo
+                    try {
+                        localStorage.setItem(CLAVE_COMPARTIDA, JSON.stringify({etag: etag, data: data}));
+                    } catch (e) {}
+                });
             })
-            .catch(error => console.error('Error:', error));
+            .catch(error => {
+                console.error('Error:', error);
+                espera = Math.min(espera * 2, ESPERA_MAXIMA);
+            })
+            .finally(programarConsulta);
     }
 
-    // Actualizar al cargar la página
-    actualizarCarritoWidget();
-    actualizarNotificacionesWidget();
+    if (cartCount || notifCount) {
+        consultarEstado();
 
-    // Actualizar cada 30 segundos
-    setInterval(actualizarCarritoWidget, 30000);
-    setInterval(actualizarNotificacionesWidget, 30000);
+        document.addEventListener('visibilitychange', function() {
+            if (document.hidden) {
+                clearTimeout(temporizador);
+            } else {
+                // Al volver a la pestaña se consulta enseguida
+                espera = ESPERA_MINIMA;
+                clearTimeout(temporizador);
+                consultarEstado();
+            }
+        });
+
+        window.addEventListener('storage', function(event) {
+            if (event.key !== CLAVE_COMPARTIDA || !event.newValue) return;
+            try {
+                const compartido = JSON.parse(event.newValue);
+                etag = compartido.etag;
+                mostrarEstado(compartido.data);
+            } catch (e) {}
+        });
+    }
 
     // Aplicar sticky a la caja de filtros de la tienda (detectada por icono de filtro)
     document.querySelectorAll('.card-header i.fa-filter').forEach(function(icon) {
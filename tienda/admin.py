@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Categoria, Producto, Carrito, ItemCarrito, Orden, ItemOrden, Comentario
+from .models import Categoria, Producto, Carrito, ItemCarrito, Orden, ItemOrden, Comentario, PagoEvento
+from .calificaciones import actualizar_calificaciones
 from django.db.models import F, Avg
 from django.contrib import messages
 from django.utils.translation import ngettext
@@ -79,6 +80,13 @@ class OrdenAdmin(admin.ModelAdmin):
     readonly_fields = ['numero_orden', 'fecha_creacion', 'fecha_actualizacion']
     list_editable = ['estado']
 
+@admin.register(PagoEvento)
+class PagoEventoAdmin(admin.ModelAdmin):
+    list_display = ['numero_orden', 'transaccion_id', 'cod_respuesta', 'estado', 'intentos', 'fecha_recepcion', 'fecha_procesado']
+    list_filter = ['estado', 'cod_respuesta']
+    search_fields = ['numero_orden', 'transaccion_id', 'ref_payco']
+    readonly_fields = [f.name for f in PagoEvento._meta.fields]
+
 @admin.register(Comentario)
 class ComentarioAdmin(admin.ModelAdmin):
     list_display = ['producto', 'usuario', 'calificacion', 'fecha_creacion', 'aprobado']
@@ -90,7 +98,9 @@ class ComentarioAdmin(admin.ModelAdmin):
 
     @admin.action(description='Aprobar comentarios seleccionados')
     def aprobar_comentarios(self, request, queryset):
+        producto_ids = set(queryset.values_list('producto_id', flat=True))
         updated = queryset.update(aprobado=True)
+        actualizar_calificaciones(producto_ids)
         self.message_user(
             request,
             ngettext('%d comentario aprobado.', '%d comentarios aprobados.', updated) % updated,
@@ -99,7 +109,9 @@ class ComentarioAdmin(admin.ModelAdmin):
 
     @admin.action(description='Rechazar comentarios seleccionados')
     def rechazar_comentarios(self, request, queryset):
+        producto_ids = set(queryset.values_list('producto_id', flat=True))
         updated = queryset.update(aprobado=False)
+        actualizar_calificaciones(producto_ids)
         self.message_user(
             request,
             ngettext('%d comentario rechazado.', '%d comentarios rechazados.', updated) % updated,
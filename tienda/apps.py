@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class TiendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tienda'
-    verbose_name = 'Tienda'
\ No newline at end of file
+    verbose_name = 'Tienda'
+
+    def ready(self):
+        import tienda.signals  # noqa
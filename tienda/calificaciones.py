@@ -0,0 +1,38 @@
+"""
+Mantenimiento de la calificación desnormalizada de los productos.
+
+``Producto.calificacion_media`` y ``Producto.num_calificaciones`` se recalculan
+con un único UPDATE que agrega los comentarios aprobados en una subconsulta,
+de modo que la operación es atómica y no depende del estado en memoria.
+"""
+from django.db.models import Avg, Count, DecimalField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Comentario, Producto
+from .vitrina import invalidar_vitrina
+
+
+def _subconsulta(agregado, output_field):
+    aprobados = (
+        Comentario.objects
+        .filter(producto=OuterRef('pk'), aprobado=True)
+        .order_by()
+        .values('producto')
+        .annotate(valor=agregado)
+        .values('valor')
+    )
+    return Coalesce(Subquery(aprobados, output_field=output_field), Value(0), output_field=output_field)
+
+
+def actualizar_calificaciones(producto_ids=None):
+    """Recalcula la calificación de los productos indicados (o de todos si es None)"""
+    productos = Producto.objects.all()
+    if producto_ids is not None:
+        productos = productos.filter(pk__in=producto_ids)
+    actualizados = productos.update(
+        calificacion_media=_subconsulta(Avg('calificacion'), DecimalField(max_digits=3, decimal_places=2)),
+        num_calificaciones=_subconsulta(Count('id'), IntegerField()),
+    )
+    # update() no dispara señales: la vitrina muestra la calificación y debe refrescarse
+    invalidar_vitrina()
+    return actualizados
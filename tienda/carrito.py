@@ -0,0 +1,62 @@
+"""
+Resumen del carrito de compras (cantidad de artículos y total).
+
+El resumen se calcula con una sola consulta agregada sobre ``ItemCarrito``,
+resolviendo ``Producto.precio_final`` en SQL con un ``Case``. Para el widget
+del encabezado, que se consulta periódicamente desde todas las pestañas
+abiertas, existe además una versión cacheada por usuario que las vistas que
+modifican el carrito invalidan.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ItemCarrito
+
+# Misma regla que Producto.precio_final, evaluada en la base de datos
+PRECIO_FINAL = Case(
+    When(
+        Q(producto__precio_descuento__isnull=False) & Q(producto__precio_descuento__lt=F('producto__precio')),
+        then=F('producto__precio_descuento'),
+    ),
+    default=F('producto__precio'),
+    output_field=DecimalField(max_digits=10, decimal_places=2),
+)
+
+
+def _clave_resumen(usuario_id):
+    return f'tienda:carrito:resumen:{usuario_id}'
+
+
+def calcular_resumen(items):
+    """Devuelve ``{'cantidad_total': int, 'total': Decimal}`` de un queryset de ItemCarrito"""
+    return items.aggregate(
+        cantidad_total=Coalesce(Sum('cantidad'), 0),
+        total=Coalesce(
+            Sum(F('cantidad') * PRECIO_FINAL, output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def resumen_carrito(usuario_id):
+    """Resumen del carrito del usuario, sin necesidad de cargar el carrito"""
+    return calcular_resumen(ItemCarrito.objects.filter(carrito__usuario_id=usuario_id))
+
+
+def resumen_carrito_cacheado(usuario_id):
+    """Resumen del carrito guardado en caché hasta que el carrito cambie"""
+    clave = _clave_resumen(usuario_id)
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = resumen_carrito(usuario_id)
+        cache.set(clave, resumen, getattr(settings, 'CARRITO_RESUMEN_TIMEOUT', 300))
+    return resumen
+
+
+def invalidar_resumen_carrito(usuario_id):
+    cache.delete(_clave_resumen(usuario_id))
@@ -0,0 +1,131 @@
+"""
+Inventario de la tienda: reserva, venta y liberación del stock de una orden.
+
+``Producto.stock`` es lo disponible para vender. Al pasar a pagar
+(``procesar_pago_epayco``) ``reservar`` aparta los items de la orden con un
+``UPDATE ... SET stock = stock - n WHERE stock >= n`` por producto: dos
+compradores no pueden llevarse la misma unidad y el stock nunca queda negativo.
+La reserva vence a los ``TIENDA_RESERVA_STOCK_MINUTOS``.
+
+- ``confirmar_pago`` marca la orden como pagada con su ``x_ref_payco`` y la
+  reserva pasa a venta. Solo se aplica la primera confirmación: Epayco puede
+  repetir el webhook y la consulta manual del estado puede llegar antes o después.
+- ``cancelar_pago`` y ``liberar_reservas_vencidas`` devuelven al stock lo
+  apartado por órdenes rechazadas o abandonadas. Si el pago de una reserva ya
+  liberada llega tarde, ``confirmar_pago`` vuelve a descontar lo que haya.
+
+Cada paso cambia la orden con un UPDATE condicionado a su estado anterior, así
+que repetirlo (o ejecutarlo en paralelo) no mueve el stock dos veces.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Orden, Producto
+from .vitrina import invalidar_vitrina
+
+logger = logging.getLogger(__name__)
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto):
+        self.producto = producto
+        super().__init__(f'No hay suficiente stock de "{producto.nombre}". Stock disponible: {producto.stock}')
+
+
+def _cantidades(orden):
+    """{producto_id: cantidad} de los items de la orden, siempre en el mismo orden para no cruzar bloqueos"""
+    cantidades = {}
+    for producto_id, cantidad in orden.items.order_by('producto_id').values_list('producto_id', 'cantidad'):
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def _descontar(cantidades):
+    """Descuenta cada cantidad si el stock alcanza; devuelve los ids de los productos que no alcanzaron"""
+    faltantes = []
+    for producto_id, cantidad in cantidades.items():
+        if not Producto.objects.filter(pk=producto_id, stock__gte=cantidad).update(stock=F('stock') - cantidad):
+            faltantes.append(producto_id)
+    return faltantes
+
+
+def _devolver(cantidades):
+    for producto_id, cantidad in cantidades.items():
+        Producto.objects.filter(pk=producto_id).update(stock=F('stock') + cantidad)
+
+
+def _cambiar(orden, condicion, **valores):
+    """Actualiza la orden solo si cumple ``condicion`` (lookups); True si se aplicó"""
+    if not Orden.objects.filter(pk=orden.pk, **condicion).update(fecha_actualizacion=timezone.now(), **valores):
+        return False
+    for campo, valor in valores.items():
+        setattr(orden, campo, valor)
+    return True
+
+
+def reservar(orden, minutos=None):
+    """
+    Aparta el stock de los items de ``orden``. Si algún producto no alcanza
+    lanza ``StockInsuficiente`` y no aparta nada.
+    """
+    minutos = minutos or getattr(settings, 'TIENDA_RESERVA_STOCK_MINUTOS', 30)
+    # Las cantidades se leen antes: en SQLite una transacción que empieza leyendo no
+    # puede pasar a escribir mientras otra escribe, y fallaría en lugar de esperar
+    cantidades = _cantidades(orden)
+    with transaction.atomic():
+        faltantes = _descontar(cantidades)
+        if faltantes:
+            raise StockInsuficiente(Producto.objects.get(pk=faltantes[0]))
+        _cambiar(orden, {}, estado_stock='reservado', reserva_expira=timezone.now() + timedelta(minutes=minutos))
+    transaction.on_commit(invalidar_vitrina)
+
+
+def liberar(orden):
+    """Devuelve al stock lo que ``orden`` tenía reservado; False si no tenía una reserva vigente"""
+    with transaction.atomic():
+        if not _cambiar(orden, {'estado_stock': 'reservado'}, estado_stock='liberado', reserva_expira=None):
+            return False
+        _devolver(_cantidades(orden))
+    transaction.on_commit(invalidar_vitrina)
+    return True
+
+
+def confirmar_pago(orden, referencia=None):
+    """
+    Marca ``orden`` como pagada con ``referencia`` (``x_ref_payco``) y convierte
+    su reserva en venta. Devuelve False sin tocar nada si la orden ya estaba
+    confirmada, por ejemplo al repetirse el webhook.
+    """
+    with transaction.atomic():
+        pendiente = {'referencia_pago__isnull': True, 'estado__in': ['pendiente', 'cancelada']}
+        if not _cambiar(orden, pendiente, estado='confirmada', referencia_pago=referencia or None):
+            logger.info(f'Confirmación repetida de la orden {orden.numero_orden} ({referencia}); se ignora')
+            return False
+        if not _cambiar(orden, {'estado_stock': 'reservado'}, estado_stock='descontado', reserva_expira=None):
+            # Sin reserva vigente (venció antes del pago): se descuenta ahora lo que haya
+            faltantes = _descontar(_cantidades(orden))
+            if faltantes:
+                logger.error(f'Orden {orden.numero_orden} pagada sin stock suficiente de los productos {faltantes}')
+            _cambiar(orden, {}, estado_stock='descontado', reserva_expira=None)
+    transaction.on_commit(invalidar_vitrina)
+    return True
+
+
+def cancelar_pago(orden):
+    """Pago rechazado: cancela la orden si seguía pendiente y libera su reserva"""
+    with transaction.atomic():
+        if not _cambiar(orden, {'estado': 'pendiente'}, estado='cancelada'):
+            return False
+        liberar(orden)
+    return True
+
+
+def liberar_reservas_vencidas(ahora=None):
+    """Libera las reservas de órdenes sin pagar cuyo plazo venció; devuelve cuántas liberó"""
+    vencidas = Orden.objects.filter(estado_stock='reservado', reserva_expira__lte=ahora or timezone.now())
+    return sum(liberar(orden) for orden in vencidas.only('pk', 'numero_orden'))
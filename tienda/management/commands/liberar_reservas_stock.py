@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from tienda.inventario import liberar_reservas_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Devuelve al inventario el stock reservado por órdenes cuyo plazo de pago venció'
+
+    def handle(self, *args, **options):
+        liberadas = liberar_reservas_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas liberadas'))
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tienda import pagos
+
+
+class Command(BaseCommand):
+    help = 'Aplica a las órdenes las confirmaciones de pago de Epayco recibidas por el webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=getattr(settings, 'TIENDA_PAGOS_LOTE', 100),
+            help='Eventos aplicados por cada vuelta'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando una vuelta no aplica ningún evento'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa lo que haya pendiente y termina'
+        )
+
+    def _estado(self):
+        cola = pagos.estado_cola()
+        return (f"{cola['pendientes']} pendientes (el más antiguo espera {cola['retraso_max']:.1f} s), "
+                f"{cola['errores']} con error")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Cola de pagos: {self._estado()}')
+
+        total_procesados = total_fallidos = 0
+        retraso_max = retraso_total = 0.0
+        while True:
+            procesados, fallidos, retrasos = pagos.procesar_pendientes(tamano_lote=options['lote'])
+            total_procesados += procesados
+            total_fallidos += fallidos
+            retraso_total += sum(retrasos)
+            retraso_max = max([retraso_max, *retrasos])
+            if procesados:
+                self.stdout.write(
+                    f'{procesados} pagos aplicados, retraso máximo {max(retrasos):.1f} s; cola: {self._estado()}'
+                )
+            if fallidos:
+                self.stdout.write(self.style.ERROR(f'{fallidos} pagos con error (se reintentarán)'))
+            if not procesados:
+                # Sin avance (nada pendiente o solo fallos, que esperan su reintento)
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+
+        promedio = retraso_total / total_procesados if total_procesados else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Pagos aplicados: {total_procesados}, con error: {total_fallidos}, '
+            f'retraso promedio {promedio:.1f} s, máximo {retraso_max:.1f} s'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from tienda.calificaciones import actualizar_calificaciones
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la calificación media y el número de calificaciones de los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'producto_ids',
+            nargs='*',
+            type=int,
+            help='IDs de productos a recalcular (por defecto, todos)'
+        )
+
+    def handle(self, *args, **options):
+        producto_ids = options['producto_ids'] or None
+        actualizados = actualizar_calificaciones(producto_ids)
+        self.stdout.write(self.style.SUCCESS(f'{actualizados} productos recalculados'))
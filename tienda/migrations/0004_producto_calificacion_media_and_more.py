@@ -0,0 +1,41 @@
+# Generated by Django 6.1.2 on 2026-10-18 11:32
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def poblar_calificaciones(apps, schema_editor):
+    Producto = apps.get_model('tienda', 'Producto')
+    Comentario = apps.get_model('tienda', 'Comentario')
+    agregados = (
+        Comentario.objects
+        .filter(aprobado=True)
+        .values('producto_id')
+        .annotate(media=Avg('calificacion'), total=Count('id'))
+    )
+    for fila in agregados.iterator():
+        Producto.objects.filter(pk=fila['producto_id']).update(
+            calificacion_media=round(fila['media'], 2),
+            num_calificaciones=fila['total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0003_producto_tipo_mascota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='calificacion_media',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3, verbose_name='Calificación media'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='num_calificaciones',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de calificaciones'),
+        ),
+        migrations.RunPython(poblar_calificaciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0005_producto_producto_catalogo_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orden',
+            name='estado_stock',
+            field=models.CharField(blank=True, choices=[('', 'Sin reserva'), ('reservado', 'Reservado'), ('descontado', 'Descontado'), ('liberado', 'Liberado')], default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='referencia_pago',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='orden',
+            name='reserva_expira',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['estado_stock', 'reserva_expira'], name='orden_reserva_idx'),
+        ),
+    ]
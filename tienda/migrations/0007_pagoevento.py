@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0006_orden_reserva_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PagoEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaccion_id', models.CharField(max_length=60, verbose_name='x_transaction_id')),
+                ('cod_respuesta', models.CharField(max_length=10, verbose_name='x_cod_response')),
+                ('ref_payco', models.CharField(blank=True, max_length=50, verbose_name='x_ref_payco')),
+                ('numero_orden', models.CharField(db_index=True, max_length=20, verbose_name='x_reference')),
+                ('datos', models.JSONField(default=dict, verbose_name='Datos recibidos')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesado', 'Procesado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_recepcion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_procesado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Pago',
+                'verbose_name_plural': 'Eventos de Pago',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'id'], name='tienda_pago_estado_ffb546_idx')],
+                'constraints': [models.UniqueConstraint(fields=('transaccion_id', 'cod_respuesta'), name='pagoevento_transaccion_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0007_pagoevento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagoevento',
+            name='proximo_intento',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from django.utils.functional import cached_property
 from decimal import Decimal
 
 class Categoria(models.Model):
@@ -48,6 +50,9 @@ class Producto(models.Model):
     stock_minimo = models.PositiveIntegerField(default=5)
     activo = models.BooleanField(default=True)
     destacado = models.BooleanField(default=False)
+    # Calificación desnormalizada de los comentarios aprobados (ver tienda.calificaciones)
+    calificacion_media = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False, verbose_name="Calificación media")
+    num_calificaciones = models.PositiveIntegerField(default=0, editable=False, verbose_name="Número de calificaciones")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -55,6 +60,14 @@ class Producto(models.Model):
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['-fecha_creacion']
+        # Paginación por clave del catálogo (ver tienda.vitrina.pagina_productos):
+        # orden (-fecha_creacion, -id) sobre los activos, con y sin cada filtro
+        indexes = [
+            models.Index(fields=['-fecha_creacion', '-id'], condition=models.Q(activo=True), name='producto_catalogo_idx'),
+            models.Index(fields=['categoria', '-fecha_creacion', '-id'], condition=models.Q(activo=True), name='producto_cat_categoria_idx'),
+            models.Index(fields=['tipo', '-fecha_creacion', '-id'], condition=models.Q(activo=True), name='producto_cat_tipo_idx'),
+            models.Index(fields=['tipo_mascota', '-fecha_creacion', '-id'], condition=models.Q(activo=True), name='producto_cat_mascota_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -79,9 +92,8 @@ class Producto(models.Model):
 
     @property
     def calificacion_promedio(self):
-        comentarios = self.comentarios.filter(aprobado=True)
-        if comentarios.exists():
-            return round(sum(c.calificacion for c in comentarios) / comentarios.count(), 1)
+        if self.num_calificaciones:
+            return round(float(self.calificacion_media), 1)
         return 0
 
     @property
@@ -109,13 +121,19 @@ class Carrito(models.Model):
     def __str__(self):
         return f"Carrito de {self.usuario.username}"
 
+    @cached_property
+    def resumen(self):
+        """Cantidad y total del carrito en una sola consulta (ver tienda.carrito)"""
+        from .carrito import calcular_resumen
+        return calcular_resumen(self.items.all())
+
     @property
     def total(self):
-        return sum(item.subtotal for item in self.items.all())
+        return self.resumen['total']
 
     @property
     def cantidad_total(self):
-        return sum(item.cantidad for item in self.items.all())
+        return self.resumen['cantidad_total']
 
 class ItemCarrito(models.Model):
     carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE, related_name='items')
@@ -145,6 +163,13 @@ class Orden(models.Model):
         ('cancelada', 'Cancelada'),
     ]
 
+    ESTADO_STOCK = [
+        ('', 'Sin reserva'),
+        ('reservado', 'Reservado'),
+        ('descontado', 'Descontado'),
+        ('liberado', 'Liberado'),
+    ]
+
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ordenes')
     numero_orden = models.CharField(max_length=20, unique=True)
     estado = models.CharField(max_length=20, choices=ESTADO_ORDEN, default='pendiente')
@@ -153,6 +178,11 @@ class Orden(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2)
     direccion_envio = models.TextField()
     notas = models.TextField(blank=True)
+    # Stock de los items apartado mientras se paga (ver tienda.inventario)
+    estado_stock = models.CharField(max_length=12, choices=ESTADO_STOCK, blank=True, default='')
+    reserva_expira = models.DateTimeField(null=True, blank=True)
+    # x_ref_payco del pago que confirmó la orden: una confirmación repetida no se aplica dos veces
+    referencia_pago = models.CharField(max_length=50, unique=True, null=True, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -160,6 +190,10 @@ class Orden(models.Model):
         verbose_name = 'Orden'
         verbose_name_plural = 'Órdenes'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Reservas vencidas por liberar
+            models.Index(fields=['estado_stock', 'reserva_expira'], name='orden_reserva_idx'),
+        ]
 
     def __str__(self):
         return f"Orden #{self.numero_orden} - {self.usuario.username}"
@@ -182,6 +216,46 @@ class ItemOrden(models.Model):
         self.subtotal = self.cantidad * self.precio
         super().save(*args, **kwargs)
 
+class PagoEvento(models.Model):
+    """
+    Confirmación de Epayco tal como llegó al webhook, con la firma ya
+    verificada. El webhook solo la guarda y responde; el comando
+    procesar_pagos la aplica a la orden (ver tienda/pagos.py). Las
+    confirmaciones repetidas de la misma transacción y estado no se guardan dos veces.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesado', 'Procesado'),
+        ('error', 'Error'),
+    ]
+
+    transaccion_id = models.CharField(max_length=60, verbose_name="x_transaction_id")
+    cod_respuesta = models.CharField(max_length=10, verbose_name="x_cod_response")
+    ref_payco = models.CharField(max_length=50, blank=True, verbose_name="x_ref_payco")
+    numero_orden = models.CharField(max_length=20, db_index=True, verbose_name="x_reference")
+    datos = models.JSONField(default=dict, verbose_name="Datos recibidos")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True, verbose_name="Último error")
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name="Próximo intento")
+    fecha_recepcion = models.DateTimeField(auto_now_add=True)
+    fecha_procesado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento de Pago'
+        verbose_name_plural = 'Eventos de Pago'
+        constraints = [
+            # Un pago pendiente que después se aprueba llega dos veces con el mismo x_transaction_id
+            models.UniqueConstraint(fields=['transaccion_id', 'cod_respuesta'], name='pagoevento_transaccion_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.numero_orden} {self.transaccion_id} ({self.get_estado_display()})"
+
 class Comentario(models.Model):
     CALIFICACION_CHOICES = [
         (1, '1 estrella'),
@@ -0,0 +1,177 @@
+"""
+Confirmaciones de pago de Epayco.
+
+El webhook (``confirmacion_pago``) verifica la firma, guarda la confirmación
+como ``PagoEvento`` con ``registrar`` y responde enseguida, sin tocar la orden:
+una base de datos lenta ya no hace que Epayco agote el tiempo y reintente. El
+comando ``procesar_pagos`` aplica los eventos pendientes con ``procesar_pendientes``:
+
+- en orden de llegada: un evento no se aplica mientras su orden tenga uno
+  anterior sin aplicar, así que un rechazo no se adelanta a la aprobación que
+  llegó antes ni al revés;
+- una sola vez: el evento pasa a 'procesado' con un UPDATE condicionado a que
+  siguiera pendiente, en la misma transacción en que se aplica a la orden
+  (``tienda.inventario``). Si algo falla se deshace todo y el evento se
+  reintenta con espera exponencial (``proximo_intento``), como la bandeja de
+  correos; mientras espera, los eventos siguientes de su orden también esperan.
+
+``estado_cola`` resume la cola (pendientes, con error y el retraso del más
+antiguo) para el comando y el monitoreo.
+"""
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Min, OuterRef
+from django.utils import timezone
+
+from .carrito import invalidar_resumen_carrito
+from .inventario import cancelar_pago, confirmar_pago
+from .models import ItemCarrito, Orden, PagoEvento
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_FIRMA = ('x_ref_payco', 'x_transaction_id', 'x_amount', 'x_currency_code')
+
+
+class EventoInvalido(Exception):
+    """El evento no se puede aplicar nunca (orden inexistente, monto insuficiente): no se reintenta"""
+
+
+def firma(datos):
+    """Firma de Epayco: sha256 de p_cust_id_cliente^p_key^x_ref_payco^x_transaction_id^x_amount^x_currency_code"""
+    partes = [settings.EPAYCO_P_CUST_ID_CLIENTE, settings.EPAYCO_P_KEY]
+    partes += [datos.get(campo, '') for campo in CAMPOS_FIRMA]
+    return hashlib.sha256('^'.join(partes).encode()).hexdigest()
+
+
+def firma_valida(datos):
+    """
+    True si ``x_signature`` coincide. Sin las claves de Epayco configuradas la
+    firma la podría calcular cualquiera, así que se rechaza todo.
+    """
+    if not (settings.EPAYCO_P_CUST_ID_CLIENTE and settings.EPAYCO_P_KEY):
+        logger.error('EPAYCO_P_CUST_ID_CLIENTE o EPAYCO_P_KEY sin configurar: se rechaza la confirmación de pago')
+        return False
+    return hmac.compare_digest(firma(datos), datos.get('x_signature', ''))
+
+
+def registrar(datos):
+    """
+    Guarda la confirmación ``datos`` (el POST del webhook) como evento
+    pendiente. Devuelve False si esa transacción ya llegó con el mismo estado.
+    """
+    evento = PagoEvento(
+        transaccion_id=datos['x_transaction_id'],
+        cod_respuesta=datos.get('x_cod_response', ''),
+        ref_payco=datos.get('x_ref_payco', ''),
+        numero_orden=datos.get('x_reference', ''),
+        datos=datos,
+    )
+    try:
+        with transaction.atomic():
+            evento.save(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _vaciar_carrito(usuario_id):
+    ItemCarrito.objects.filter(carrito__usuario_id=usuario_id).delete()
+    invalidar_resumen_carrito(usuario_id)
+
+
+def _aplicar(evento):
+    try:
+        orden = Orden.objects.get(numero_orden=evento.numero_orden)
+    except Orden.DoesNotExist:
+        raise EventoInvalido(f'Orden no encontrada: {evento.numero_orden}')
+
+    if evento.cod_respuesta == '1':  # Pago aprobado
+        try:
+            monto = Decimal(evento.datos.get('x_amount') or 0)
+        except InvalidOperation:
+            raise EventoInvalido(f'Monto inválido: {evento.datos.get("x_amount")}')
+        # El checkout envía el total sin decimales
+        if monto < int(orden.total):
+            raise EventoInvalido(f'El monto pagado {monto} no cubre el total de la orden {orden.total}')
+        if confirmar_pago(orden, evento.ref_payco):
+            _vaciar_carrito(orden.usuario_id)
+    elif evento.cod_respuesta == '3':  # Pago pendiente: la orden sigue igual hasta la respuesta final
+        pass
+    else:  # Rechazado, fallido o código desconocido
+        cancelar_pago(orden)
+
+
+def _registrar_fallo(evento, error, max_intentos, espera_base):
+    evento.intentos += 1
+    evento.ultimo_error = str(error) or error.__class__.__name__
+    if isinstance(error, EventoInvalido) or evento.intentos >= max_intentos:
+        evento.estado = 'error'
+    else:
+        evento.estado = 'pendiente'
+        evento.proximo_intento = timezone.now() + timedelta(seconds=espera_base * 2 ** (evento.intentos - 1))
+    evento.save(update_fields=['intentos', 'ultimo_error', 'estado', 'proximo_intento'])
+    logger.warning(f'Error aplicando el pago {evento.transaccion_id} de la orden {evento.numero_orden} '
+                   f'(intento {evento.intentos}): {error}')
+
+
+def listos(ahora=None):
+    """Eventos pendientes cuya espera venció y sin un evento anterior de su orden esperando un reintento"""
+    ahora = ahora or timezone.now()
+    esperando = PagoEvento.objects.filter(
+        numero_orden=OuterRef('numero_orden'),
+        pk__lt=OuterRef('pk'),
+        estado='pendiente',
+        proximo_intento__gt=ahora,
+    )
+    return PagoEvento.objects.filter(estado='pendiente', proximo_intento__lte=ahora).exclude(Exists(esperando))
+
+
+def procesar_pendientes(tamano_lote=None, max_intentos=None, espera_base=None):
+    """
+    Aplica hasta ``tamano_lote`` eventos listos, uno por transacción.
+    Devuelve ``(procesados, fallidos, retrasos)``, donde ``retrasos`` son los
+    segundos entre la recepción y la aplicación de cada evento procesado.
+    """
+    tamano_lote = tamano_lote or getattr(settings, 'TIENDA_PAGOS_LOTE', 100)
+    max_intentos = max_intentos or getattr(settings, 'TIENDA_PAGOS_MAX_INTENTOS', 5)
+    espera_base = getattr(settings, 'TIENDA_PAGOS_ESPERA_REINTENTO', 30) if espera_base is None else espera_base
+
+    procesados = fallidos = 0
+    retrasos = []
+    # Órdenes con un evento que falló en este lote: sus eventos siguientes esperan
+    detenidas = set()
+    for evento in listos().order_by('pk')[:tamano_lote]:
+        if evento.numero_orden in detenidas:
+            continue
+        try:
+            with transaction.atomic():
+                ahora = timezone.now()
+                if not PagoEvento.objects.filter(pk=evento.pk, estado='pendiente').update(
+                    estado='procesado', fecha_procesado=ahora
+                ):
+                    continue  # Lo aplicó otro worker
+                _aplicar(evento)
+        except Exception as e:
+            detenidas.add(evento.numero_orden)
+            _registrar_fallo(evento, e, max_intentos, espera_base)
+            fallidos += 1
+            continue
+        procesados += 1
+        retrasos.append((ahora - evento.fecha_recepcion).total_seconds())
+    return procesados, fallidos, retrasos
+
+
+def estado_cola(ahora=None):
+    """Eventos pendientes, con error y segundos que lleva esperando el pendiente más antiguo"""
+    pendientes = PagoEvento.objects.filter(estado='pendiente').aggregate(total=Count('id'), desde=Min('fecha_recepcion'))
+    return {
+        'pendientes': pendientes['total'],
+        'errores': PagoEvento.objects.filter(estado='error').count(),
+        'retraso_max': ((ahora or timezone.now()) - pendientes['desde']).total_seconds() if pendientes['desde'] else 0,
+    }
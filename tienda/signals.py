@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from notificaciones.widgets import marcar_cambio_usuario
+from .models import Categoria, Comentario, ItemCarrito, Producto
+from .calificaciones import actualizar_calificaciones
+from .vitrina import invalidar_vitrina
+
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+def actualizar_calificacion_producto(sender, instance, **kwargs):
+    """Mantener al día la calificación media del producto al cambiar sus comentarios"""
+    actualizar_calificaciones([instance.producto_id])
+
+
+@receiver(post_save, sender=ItemCarrito)
+@receiver(post_delete, sender=ItemCarrito)
+def invalidar_contador_carrito(sender, instance, **kwargs):
+    """Avisar al encabezado del dueño del carrito que su contador cambió"""
+    from .carrito import invalidar_resumen_carrito
+    from .models import Carrito
+
+    for usuario_id in Carrito.objects.filter(pk=instance.carrito_id).values_list('usuario_id', flat=True):
+        # Primero el resumen, para que la nueva versión no se calcule con datos viejos
+        invalidar_resumen_carrito(usuario_id)
+        marcar_cambio_usuario(usuario_id)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_vitrina(sender, instance, **kwargs):
+    """Descartar los fragmentos cacheados de la vitrina al cambiar el catálogo"""
+    invalidar_vitrina()
@@ -1,3 +1,521 @@
-from django.test import TestCase
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .models import Categoria, Comentario, Orden, Producto
+
+
+class CalificacionProductoTestCase(TestCase):
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Alimentos')
+        self.producto = Producto.objects.create(
+            nombre='Concentrado',
+            descripcion='Bulto de 10 kg',
+            precio=Decimal('50000.00'),
+            categoria=self.categoria,
+            stock=10
+        )
+        self.usuarios = [
+            User.objects.create_user(username=f'usuario{i}', password='clave123')
+            for i in range(3)
+        ]
+
+    def _comentar(self, usuario, calificacion, aprobado=True):
+        return Comentario.objects.create(
+            producto=self.producto,
+            usuario=usuario,
+            calificacion=calificacion,
+            comentario='Muy bueno',
+            aprobado=aprobado
+        )
+
+    def test_calificacion_se_actualiza_con_comentarios(self):
+        self._comentar(self.usuarios[0], 5)
+        self._comentar(self.usuarios[1], 4)
+        self._comentar(self.usuarios[2], 1, aprobado=False)
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.num_calificaciones, 2)
+        self.assertEqual(self.producto.calificacion_promedio, 4.5)
+        self.assertEqual(self.producto.estrellas_lista, ['full', 'full', 'full', 'full', 'half'])
+
+    def test_calificacion_se_actualiza_al_eliminar(self):
+        comentario = self._comentar(self.usuarios[0], 2)
+        self._comentar(self.usuarios[1], 4)
+        comentario.delete()
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.num_calificaciones, 1)
+        self.assertEqual(self.producto.calificacion_promedio, 4.0)
+
+    def test_calificacion_sin_consultas_adicionales(self):
+        self._comentar(self.usuarios[0], 3)
+        producto = Producto.objects.get(pk=self.producto.pk)
+        with self.assertNumQueries(0):
+            producto.calificacion_promedio
+            producto.estrellas_lista
+
+    def test_comando_recalcula_calificaciones(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        self._comentar(self.usuarios[0], 5)
+        Producto.objects.update(calificacion_media=0, num_calificaciones=0)
+        call_command('recalcular_calificaciones', stdout=StringIO())
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.num_calificaciones, 1)
+        self.assertEqual(self.producto.calificacion_promedio, 5.0)
+
+    def test_detalle_producto_muestra_calificacion(self):
+        self._comentar(self.usuarios[0], 4)
+        response = self.client.get(reverse('tienda:detalle_producto', args=[self.producto.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['calificacion_promedio'], 4.0)
+
+
+class ResumenCarritoTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.usuario = User.objects.create_user(username='comprador', password='clave123')
+        self.categoria = Categoria.objects.create(nombre='Accesorios')
+        self.normal = Producto.objects.create(
+            nombre='Collar', descripcion='-', precio=Decimal('10000.00'),
+            categoria=self.categoria, stock=20
+        )
+        self.oferta = Producto.objects.create(
+            nombre='Correa', descripcion='-', precio=Decimal('20000.00'),
+            precio_descuento=Decimal('15000.00'), categoria=self.categoria, stock=20
+        )
+        from .models import Carrito, ItemCarrito
+
+        self.carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.normal, cantidad=2)
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.oferta, cantidad=1)
+        self.client.login(username='comprador', password='clave123')
+
+    def test_resumen_en_una_consulta(self):
+        from .carrito import resumen_carrito
+
+        with self.assertNumQueries(1):
+            resumen = resumen_carrito(self.usuario.id)
+        self.assertEqual(resumen['cantidad_total'], 3)
+        self.assertEqual(resumen['total'], Decimal('35000.00'))
+
+    def test_total_coincide_con_subtotales(self):
+        from .models import Carrito
+
+        carrito = Carrito.objects.get(pk=self.carrito.pk)
+        esperado = sum(item.subtotal for item in carrito.items.all())
+        with self.assertNumQueries(1):
+            self.assertEqual(carrito.total, esperado)
+            self.assertEqual(carrito.cantidad_total, 3)
+
+    def test_widget_usa_cache_e_invalida_al_agregar(self):
+        url = reverse('tienda:carrito_widget')
+        self.assertEqual(self.client.get(url).json()['cantidad_total'], 3)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url)
+        self.assertFalse(any('tienda_itemcarrito' in q['sql'] for q in consultas.captured_queries))
+
+        self.client.post(reverse('tienda:agregar_al_carrito', args=[self.normal.pk]), {'cantidad': 1})
+        datos = self.client.get(url).json()
+        self.assertEqual(datos['cantidad_total'], 4)
+        self.assertEqual(datos['total'], 45000.0)
+
+    def test_vaciar_carrito_invalida_resumen(self):
+        url = reverse('tienda:carrito_widget')
+        self.client.get(url)
+        self.client.get(reverse('tienda:vaciar_carrito'))
+        self.assertEqual(self.client.get(url).json()['cantidad_total'], 0)
+
+    def test_ver_carrito_y_checkout(self):
+        response = self.client.get(reverse('tienda:ver_carrito'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Correa')
+        response = self.client.get(reverse('tienda:checkout'))
+        self.assertEqual(response.status_code, 200)
+
+
+class VitrinaTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Juguetes')
+        self.recientes = [
+            Producto.objects.create(nombre=f'Pelota {i}', descripcion='-', precio=Decimal('10000'), categoria=self.categoria, stock=5)
+            for i in range(4)
+        ]
+        self.oferta = Producto.objects.create(
+            nombre='Cuerda', descripcion='-', precio=Decimal('20000'), precio_descuento=Decimal('15000'),
+            categoria=self.categoria, stock=5
+        )
+        self.destacado = Producto.objects.create(
+            nombre='Hueso', descripcion='-', precio=Decimal('8000'), destacado=True, categoria=self.categoria, stock=5
+        )
+
+    def test_carrusel_en_una_consulta_y_cacheado(self):
+        from .vitrina import productos_carrusel, tablas_disponibles
+
+        tablas_disponibles()
+        with self.assertNumQueries(1):
+            carrusel = productos_carrusel()
+        self.assertEqual(carrusel[:2], [self.destacado, self.oferta])
+        self.assertEqual(len(carrusel), 6)
+
+        # Sin comprobar tablas en cada petición: la segunda visita no consulta la base
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(reverse('home'))
+        self.assertEqual(respuesta.context['productos_destacados'], carrusel)
+
+    def test_listado_cacheado_por_filtros_e_invalidado_al_cambiar_producto(self):
+        url = reverse('tienda:lista_productos')
+        self.client.get(url, {'tipo_mascota': 'todos'})
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(url, {'tipo_mascota': 'todos'})
+        self.assertEqual(len(respuesta.context['productos']), 6)
+
+        self.oferta.activo = False
+        self.oferta.save()
+        respuesta = self.client.get(url, {'tipo_mascota': 'todos'})
+        self.assertNotIn(self.oferta, respuesta.context['productos'])
+
+        # Las búsquedas por texto no se cachean
+        self.client.get(url, {'buscar': 'Hueso'})
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(url, {'buscar': 'Hueso'})
+        self.assertEqual(respuesta.context['productos'], [self.destacado])
+
+
+class CatalogoPaginadoTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from django.utils import timezone
+
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Alimentos')
+        self.otra = Categoria.objects.create(nombre='Juguetes')
+        for i in range(7):
+            Producto.objects.create(
+                nombre=f'Concentrado {i}', descripcion='-', precio=Decimal('30000'), stock=3,
+                categoria=self.categoria if i % 2 else self.otra, tipo='alimento' if i % 2 else 'juguete'
+            )
+        # Fechas repetidas: el id desempata sin saltar ni repetir productos
+        Producto.objects.filter(nombre__in=['Concentrado 2', 'Concentrado 3', 'Concentrado 4']).update(
+            fecha_creacion=timezone.now()
+        )
+        self.orden = list(Producto.objects.order_by('-fecha_creacion', '-id').values_list('id', flat=True))
+
+    def _recorrer(self, **filtros):
+        ids, despues = [], None
+        while True:
+            parametros = dict(filtros, tamano=3)
+            if despues:
+                parametros['despues'] = despues
+            datos = self.client.get(reverse('tienda:catalogo_api'), parametros).json()
+            ids += [producto['id'] for producto in datos['productos']]
+            despues = datos['siguiente']
+            if not despues:
+                return ids
+
+    def test_recorre_el_catalogo_por_cursor(self):
+        self.assertEqual(self._recorrer(), self.orden)
+
+        alimentos = list(
+            Producto.objects.filter(tipo='alimento').order_by('-fecha_creacion', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self._recorrer(tipo='alimento'), alimentos)
+        self.assertEqual(self._recorrer(categoria=self.categoria.id), alimentos)
+
+    def test_pagina_profunda_en_una_consulta(self):
+        url = reverse('tienda:catalogo_api')
+        siguiente = self.client.get(url, {'tamano': 3}).json()['siguiente']
+        siguiente = self.client.get(url, {'tamano': 3, 'despues': siguiente}).json()['siguiente']
+        with self.assertNumQueries(1):
+            datos = self.client.get(url, {'tamano': 3, 'despues': siguiente}).json()
+        self.assertEqual([p['id'] for p in datos['productos']], self.orden[6:])
+        self.assertIsNone(datos['siguiente'])
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get(reverse('tienda:catalogo_api'), {'despues': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.client.get(reverse('tienda:lista_productos'), {'despues': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_parametros_invalidos(self):
+        url = reverse('tienda:catalogo_api')
+        for parametros in ({'categoria': 'abc'}, {'tamano': '-5'}, {'tamano': '0'}, {'tamano': 'diez'}):
+            self.assertEqual(self.client.get(url, parametros).status_code, 400, parametros)
+        self.assertEqual(self.client.get(reverse('tienda:lista_productos'), {'categoria': 'abc'}).status_code, 400)
+        self.assertEqual(len(self.client.get(url, {'tamano': 500}).json()['productos']), len(self.orden))
+
+    def test_listado_html_enlaza_la_pagina_siguiente_con_los_filtros(self):
+        with self.settings(TIENDA_PRODUCTOS_POR_PAGINA=2):
+            respuesta = self.client.get(reverse('tienda:lista_productos'), {'tipo': 'alimento'})
+            self.assertEqual(len(respuesta.context['productos']), 2)
+            self.assertIn('tipo=alimento', respuesta.context['url_siguiente'])
+            self.assertContains(respuesta, 'Ver más productos')
+
+            respuesta = self.client.get(respuesta.context['url_siguiente'])
+            self.assertEqual(len(respuesta.context['productos']), 1)
+            self.assertIsNone(respuesta.context['url_siguiente'])
+
+            respuesta = self.client.get(reverse('tienda:productos_por_categoria', args=[self.otra.id]))
+            self.assertEqual(len(respuesta.context['productos']), 2)
+            self.assertIsNotNone(respuesta.context['url_siguiente'])
+
+
+class InventarioTestCase(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='inventario', password='clave123')
+        categoria = Categoria.objects.create(nombre='Alimentos')
+        self.producto = Producto.objects.create(
+            nombre='Concentrado', descripcion='-', precio=Decimal('30000.00'), categoria=categoria, stock=5
+        )
+
+    def _orden(self, cantidad, numero):
+        from .models import ItemOrden, Orden
+
+        orden = Orden.objects.create(
+            usuario=self.usuario, numero_orden=numero, subtotal=Decimal('30000.00'),
+            total=Decimal('35700.00'), direccion_envio='Calle 1'
+        )
+        ItemOrden.objects.create(orden=orden, producto=self.producto, cantidad=cantidad, precio=Decimal('30000.00'))
+        return orden
+
+    def _stock(self):
+        return Producto.objects.values_list('stock', flat=True).get(pk=self.producto.pk)
+
+    def test_la_reserva_nunca_deja_el_stock_negativo(self):
+        from .inventario import StockInsuficiente, reservar
+
+        reservar(self._orden(3, 'ORD1'))
+        self.assertEqual(self._stock(), 2)
+        segunda = self._orden(3, 'ORD2')
+        with self.assertRaises(StockInsuficiente):
+            reservar(segunda)
+        self.assertEqual(self._stock(), 2)
+        segunda.refresh_from_db()
+        self.assertEqual(segunda.estado_stock, '')
+
+    def test_confirmacion_repetida_descuenta_una_sola_vez(self):
+        from .inventario import cancelar_pago, confirmar_pago, reservar
+
+        orden = self._orden(2, 'ORD1')
+        reservar(orden)
+        self.assertTrue(confirmar_pago(orden, '9001'))
+        self.assertFalse(confirmar_pago(Orden.objects.get(pk=orden.pk), '9001'))
+        orden.refresh_from_db()
+        self.assertEqual((orden.estado, orden.estado_stock, orden.referencia_pago), ('confirmada', 'descontado', '9001'))
+        self.assertEqual(self._stock(), 3)
+
+        # Un rechazo que llega después del pago no cancela la orden ni devuelve stock
+        self.assertFalse(cancelar_pago(orden))
+        orden.refresh_from_db()
+        self.assertEqual(orden.estado, 'confirmada')
+        self.assertEqual(self._stock(), 3)
+
+    def test_rechazo_y_vencimiento_liberan_la_reserva(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .inventario import cancelar_pago, confirmar_pago, liberar_reservas_vencidas, reservar
+
+        rechazada = self._orden(2, 'ORD1')
+        reservar(rechazada)
+        self.assertTrue(cancelar_pago(rechazada))
+        self.assertFalse(cancelar_pago(rechazada))
+        self.assertEqual(self._stock(), 5)
+
+        abandonada = self._orden(4, 'ORD2')
+        reservar(abandonada, minutos=15)
+        self.assertEqual(liberar_reservas_vencidas(), 0)
+        self.assertEqual(liberar_reservas_vencidas(timezone.now() + timedelta(minutes=16)), 1)
+        self.assertEqual(self._stock(), 5)
+
+        # El pago que llega después de liberar la reserva descuenta lo que haya
+        self.assertTrue(confirmar_pago(abandonada, '9002'))
+        self.assertEqual(self._stock(), 1)
+
+
+@override_settings(EPAYCO_P_CUST_ID_CLIENTE='12345', EPAYCO_P_KEY='clave-de-prueba')
+class PagosEpaycoTestCase(TestCase):
+    """El webhook solo guarda la confirmación; procesar_pagos la aplica"""
+
+    _orden = InventarioTestCase._orden
+    _stock = InventarioTestCase._stock
+
+    def setUp(self):
+        InventarioTestCase.setUp(self)
+        from .inventario import reservar
+        from .models import Carrito, ItemCarrito
+
+        self.orden = self._orden(2, 'ORD1')
+        reservar(self.orden)
+        self.carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.producto, cantidad=2)
+
+    def _confirmacion(self, transaccion='T1', codigo='1', monto='35700'):
+        from .pagos import firma
+
+        datos = {
+            'x_reference': 'ORD1', 'x_ref_payco': '9001', 'x_transaction_id': transaccion,
+            'x_amount': monto, 'x_currency_code': 'COP', 'x_cod_response': codigo,
+        }
+        datos['x_signature'] = firma(datos)
+        return self.client.post(reverse('tienda:confirmacion_pago'), datos)
+
+    def test_webhook_verifica_la_firma_y_no_duplica_eventos(self):
+        from .models import PagoEvento
+
+        datos = {'x_reference': 'ORD1', 'x_transaction_id': 'T1', 'x_cod_response': '1', 'x_signature': 'falsa'}
+        self.assertEqual(self.client.post(reverse('tienda:confirmacion_pago'), datos).status_code, 400)
+        self.assertFalse(PagoEvento.objects.exists())
+
+        for _ in range(3):
+            self.assertEqual(self._confirmacion().status_code, 200)
+        self.assertEqual(PagoEvento.objects.count(), 1)
+        # El webhook no toca la orden
+        self.orden.refresh_from_db()
+        self.assertEqual(self.orden.estado, 'pendiente')
+
+    def test_webhook_rechaza_todo_sin_claves_configuradas(self):
+        from .models import PagoEvento
+
+        with override_settings(EPAYCO_P_CUST_ID_CLIENTE='', EPAYCO_P_KEY=''):
+            # La firma calculada con claves vacías la puede falsificar cualquiera
+            self.assertEqual(self._confirmacion().status_code, 400)
+        self.assertFalse(PagoEvento.objects.exists())
+
+    def test_worker_aplica_en_orden_y_una_sola_vez(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import PagoEvento
+        from .pagos import estado_cola, procesar_pendientes
+
+        self._confirmacion(codigo='3')
+        self._confirmacion(codigo='1')
+        self._confirmacion(codigo='1')  # reintento de Epayco
+        self._confirmacion(transaccion='T2', codigo='2')  # rechazo tardío de otro intento
+        self.assertEqual(estado_cola()['pendientes'], 3)
+
+        salida = StringIO()
+        call_command('procesar_pagos', '--una-vez', stdout=salida)
+        self.assertIn('Pagos aplicados: 3, con error: 0', salida.getvalue())
+        self.assertEqual(procesar_pendientes(), (0, 0, []))
+
+        self.orden.refresh_from_db()
+        self.assertEqual((self.orden.estado, self.orden.referencia_pago), ('confirmada', '9001'))
+        self.assertEqual(self._stock(), 3)
+        self.assertFalse(self.carrito.items.exists())
+        self.assertEqual(set(PagoEvento.objects.values_list('estado', flat=True)), {'procesado'})
+        self.assertEqual(estado_cola(), {'pendientes': 0, 'errores': 0, 'retraso_max': 0})
+
+    def test_evento_que_falla_detiene_los_siguientes_de_su_orden(self):
+        from .models import PagoEvento
+        from .pagos import procesar_pendientes
+
+        self._confirmacion(transaccion='T1', monto='100')  # no cubre el total: no se reintenta
+        self._confirmacion(transaccion='T2', codigo='2')
+        self.assertEqual(procesar_pendientes(), (0, 1, []))
+        fallido = PagoEvento.objects.get(transaccion_id='T1')
+        self.assertEqual((fallido.estado, fallido.intentos), ('error', 1))
+        self.assertIn('no cubre', fallido.ultimo_error)
+        self.assertEqual(PagoEvento.objects.get(transaccion_id='T2').estado, 'pendiente')
+
+        # En la vuelta siguiente el rechazo ya no tiene nada delante
+        self.assertEqual(procesar_pendientes()[:2], (1, 0))
+        self.orden.refresh_from_db()
+        self.assertEqual(self.orden.estado, 'cancelada')
+        self.assertEqual(self._stock(), 5)
+
+    def test_fallo_temporal_espera_su_reintento_y_retiene_su_orden(self):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import PagoEvento
+        from .pagos import procesar_pendientes
+
+        self._confirmacion(transaccion='T1', codigo='3')
+        self._confirmacion(transaccion='T2', codigo='1')
+        with mock.patch('tienda.pagos.Orden.objects.get', side_effect=RuntimeError('base ocupada')):
+            salida = StringIO()
+            call_command('procesar_pagos', '--una-vez', stdout=salida)
+        self.assertIn('Pagos aplicados: 0, con error: 1', salida.getvalue())
+
+        fallido = PagoEvento.objects.get(transaccion_id='T1')
+        self.assertEqual((fallido.estado, fallido.intentos), ('pendiente', 1))
+        self.assertGreater(fallido.proximo_intento, timezone.now())
+        # Mientras espera no se reintenta, y la aprobación que llegó después tampoco se adelanta
+        self.assertEqual(procesar_pendientes(), (0, 0, []))
+        self.assertEqual(PagoEvento.objects.get(transaccion_id='T2').estado, 'pendiente')
+
+        PagoEvento.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+        self.assertEqual(procesar_pendientes()[:2], (2, 0))
+        self.orden.refresh_from_db()
+        self.assertEqual(self.orden.estado, 'confirmada')
+
+
+class InventarioConcurrenteTestCase(TransactionTestCase):
+    """Compradores simultáneos del mismo producto: nunca se vende más que el stock"""
+
+    COMPRADORES = 8
+
+    def test_reservas_en_paralelo(self):
+        import threading
+        from django.db import connection
+        from .inventario import StockInsuficiente, reservar
+        from .models import ItemOrden, Orden
+
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('requiere una base de pruebas en archivo (ver DATABASES en settings/base.py)')
+
+        usuario = User.objects.create_user(username='concurrente', password='clave123')
+        producto = Producto.objects.create(
+            nombre='Arena', descripcion='-', precio=Decimal('20000.00'),
+            categoria=Categoria.objects.create(nombre='Higiene'), stock=5
+        )
+        ordenes = []
+        for i in range(self.COMPRADORES):
+            orden = Orden.objects.create(
+                usuario=usuario, numero_orden=f'ORD{i}', subtotal=Decimal('40000.00'),
+                total=Decimal('47600.00'), direccion_envio='Calle 1'
+            )
+            ItemOrden.objects.create(orden=orden, producto=producto, cantidad=2, precio=Decimal('20000.00'))
+            ordenes.append(orden)
+
+        barrera = threading.Barrier(self.COMPRADORES)
+        resultados = []
+
+        def comprar(orden):
+            try:
+                barrera.wait()
+                reservar(orden)
+                resultados.append('ok')
+            except StockInsuficiente:
+                resultados.append('sin stock')
+            except Exception as e:
+                resultados.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(orden,)) for orden in ordenes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(sorted(resultados, key=str), ['ok'] * 2 + ['sin stock'] * (self.COMPRADORES - 2))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 1)
 
-# Create your tests here.
@@ -9,6 +9,7 @@ urlpatterns = [
     path('', views.lista_productos, name='lista_productos'),
     path('categoria/<int:categoria_id>/', views.productos_por_categoria, name='productos_por_categoria'),
     path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
+    path('api/catalogo/', views.catalogo_api, name='catalogo_api'),
 
     # Carrito (requiere autenticación)
     path('carrito/', usuario_autenticado_required(views.ver_carrito), name='ver_carrito'),
@@ -2,58 +2,35 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Avg
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.urls import reverse
 from .models import Producto, Categoria, Carrito, ItemCarrito, Orden, ItemOrden, Comentario
 from .forms import OrdenForm, ComentarioForm
+from .carrito import invalidar_resumen_carrito, resumen_carrito_cacheado
+from .inventario import StockInsuficiente, cancelar_pago, confirmar_pago, reservar
+from .pagos import firma_valida, registrar
+from .vitrina import CursorInvalido, FiltroInvalido, categorias_activas, pagina_productos, productos_listado, tablas_disponibles
 import random
 import string
 from decimal import Decimal
 
 def lista_productos(request):
+    categoria_id = request.GET.get('categoria')
+    siguiente = None
     try:
-        # Verificar si las tablas existen usando SQL apropiado para PostgreSQL
-        from django.db import connection
-        with connection.cursor() as cursor:
-            if 'postgresql' in connection.vendor:
-                # PostgreSQL
-                cursor.execute("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'tienda_categoria');")
-                categoria_exists = cursor.fetchone()[0]
-                cursor.execute("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'tienda_producto');")
-                producto_exists = cursor.fetchone()[0]
-            else:
-                # SQLite
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tienda_categoria';")
-                categoria_exists = bool(cursor.fetchone())
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tienda_producto';")
-                producto_exists = bool(cursor.fetchone())
-
-        if not categoria_exists or not producto_exists:
+        if not tablas_disponibles():
             raise Exception("Tablas de tienda no existen")
 
-        categorias = Categoria.objects.filter(activo=True)
-        productos = Producto.objects.filter(activo=True)
-
-        # Filtros
-        categoria_id = request.GET.get('categoria')
-        tipo = request.GET.get('tipo')
-        tipo_mascota = request.GET.get('tipo_mascota')
-        buscar = request.GET.get('buscar')
-        categoria_filtro = request.GET.get('categoria_filtro')  # Nuevo filtro para categorías por nombre
-
-        if categoria_id:
-            productos = productos.filter(categoria_id=categoria_id)
-        if tipo:
-            productos = productos.filter(tipo=tipo)
-        if tipo_mascota and tipo_mascota != 'todos':
-            productos = productos.filter(tipo_mascota=tipo_mascota)
-        if buscar:
-            productos = productos.filter(nombre__icontains=buscar)
-        if categoria_filtro:
-            # Filtrar por nombre de categoría (para enlaces desde la página de inicio)
-            productos = productos.filter(categoria__nombre__icontains=categoria_filtro)
+        # Filtros: categoria, tipo, tipo_mascota, buscar y categoria_filtro (por nombre,
+        # para enlaces desde la página de inicio). Páginas cacheadas hasta que cambie el catálogo.
+        categorias = categorias_activas()
+        productos, siguiente = productos_listado(request.GET, request.GET.get('despues'))
+    except CursorInvalido:
+        return HttpResponseBadRequest('Cursor de paginación inválido')
+    except FiltroInvalido:
+        return HttpResponseBadRequest('Categoría inválida')
     except Exception as e:
         # Si hay error con la base de datos, mostrar página sin productos
         categorias = []
@@ -63,20 +40,77 @@ def lista_productos(request):
         'productos': productos,
         'categorias': categorias,
         'categoria_actual': int(categoria_id) if categoria_id else None,
+        'url_siguiente': _url_siguiente(request, siguiente),
     }
     return render(request, 'tienda/lista_productos.html', context)
 
+def _url_siguiente(request, cursor):
+    """Enlace a la página siguiente conservando los filtros de la petición"""
+    if not cursor:
+        return None
+    parametros = request.GET.copy()
+    parametros['despues'] = cursor
+    return f'{request.path}?{parametros.urlencode()}'
+
 def productos_por_categoria(request, categoria_id):
     categoria = get_object_or_404(Categoria, id=categoria_id, activo=True)
-    productos = Producto.objects.filter(categoria=categoria, activo=True)
-    
+    try:
+        productos, siguiente = pagina_productos(
+            Producto.objects.filter(categoria=categoria, activo=True).select_related('categoria'),
+            request.GET.get('despues')
+        )
+    except CursorInvalido:
+        return HttpResponseBadRequest('Cursor de paginación inválido')
+
     context = {
         'productos': productos,
         'categoria': categoria,
-        'categorias': Categoria.objects.filter(activo=True),
+        'categorias': categorias_activas(),
+        'url_siguiente': _url_siguiente(request, siguiente),
     }
     return render(request, 'tienda/productos_por_categoria.html', context)
 
+def catalogo_api(request):
+    """
+    Catálogo en JSON paginado por clave. Acepta los filtros del listado
+    (categoria, tipo, tipo_mascota, buscar), ``despues`` con el cursor que
+    devolvió la página anterior y ``tamano`` (de 1 a 100). ``siguiente`` es
+    null en la última página.
+    """
+    tamano = None
+    if request.GET.get('tamano'):
+        try:
+            tamano = min(int(request.GET['tamano']), 100)
+        except ValueError:
+            tamano = 0
+        if tamano < 1:
+            return JsonResponse({'error': 'tamano debe ser un número entre 1 y 100'}, status=400)
+    try:
+        productos, siguiente = productos_listado(request.GET, request.GET.get('despues'), tamano)
+    except CursorInvalido:
+        return JsonResponse({'error': 'Cursor de paginación inválido'}, status=400)
+    except FiltroInvalido:
+        return JsonResponse({'error': 'categoria debe ser un número'}, status=400)
+
+    return JsonResponse({
+        'productos': [
+            {
+                'id': producto.id,
+                'nombre': producto.nombre,
+                'precio': str(producto.precio),
+                'precio_final': str(producto.precio_final),
+                'categoria': {'id': producto.categoria_id, 'nombre': producto.categoria.nombre},
+                'tipo': producto.tipo,
+                'tipo_mascota': producto.tipo_mascota,
+                'imagen': producto.imagen.url if producto.imagen else None,
+                'en_stock': producto.stock > 0,
+                'url': reverse('tienda:detalle_producto', args=[producto.id]),
+            }
+            for producto in productos
+        ],
+        'siguiente': siguiente,
+    })
+
 def detalle_producto(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id, activo=True)
     productos_relacionados = Producto.objects.filter(
@@ -86,7 +120,7 @@ def detalle_producto(request, producto_id):
 
     # Comentarios del producto
     comentarios = producto.comentarios.filter(aprobado=True).select_related('usuario')
-    calificacion_promedio = comentarios.aggregate(Avg('calificacion'))['calificacion__avg'] or 0
+    calificacion_promedio = producto.calificacion_promedio
 
     # Formulario de comentario (solo para usuarios autenticados)
     comentario_form = None
@@ -121,6 +155,7 @@ def ver_carrito(request):
     carrito, created = Carrito.objects.get_or_create(usuario=request.user)
     context = {
         'carrito': carrito,
+        'items': carrito.items.select_related('producto__categoria'),
     }
     return render(request, 'tienda/carrito.html', context)
 
@@ -148,6 +183,7 @@ def agregar_al_carrito(request, producto_id):
     if not item_created:
         item.cantidad += cantidad
         item.save()
+    invalidar_resumen_carrito(request.user.id)
     
     messages.success(request, f'"{producto.nombre}" agregado al carrito')
 
@@ -177,17 +213,20 @@ def actualizar_carrito(request, item_id):
         item.save()
         messages.success(request, 'Carrito actualizado')
 
+    invalidar_resumen_carrito(request.user.id)
     return redirect('tienda:ver_carrito')
 
 def eliminar_del_carrito(request, item_id):
     item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
     item.delete()
+    invalidar_resumen_carrito(request.user.id)
     messages.success(request, 'Producto eliminado del carrito')
     return redirect('tienda:ver_carrito')
 
 def vaciar_carrito(request):
     carrito = get_object_or_404(Carrito, usuario=request.user)
     carrito.items.all().delete()
+    invalidar_resumen_carrito(request.user.id)
     messages.success(request, 'Carrito vaciado')
     return redirect('tienda:ver_carrito')
 
@@ -198,8 +237,10 @@ def checkout(request):
         messages.error(request, 'Tu carrito está vacío')
         return redirect('tienda:lista_productos')
 
+    items = list(carrito.items.select_related('producto'))
+
     # Verificar stock
-    for item in carrito.items.all():
+    for item in items:
         if item.cantidad > item.producto.stock:
             messages.error(request, f'No hay suficiente stock de "{item.producto.nombre}". Stock disponible: {item.producto.stock}')
             return redirect('tienda:ver_carrito')
@@ -220,6 +261,7 @@ def checkout(request):
 
     context = {
         'carrito': carrito,
+        'items': items,
         'form': form,
     }
     return render(request, 'tienda/checkout.html', context)
@@ -267,14 +309,24 @@ def procesar_pago_epayco(request, form_data, carrito):
     )
 
     # Crear items de orden (sin actualizar stock aún)
-    for item_carrito in carrito.items.all():
-        ItemOrden.objects.create(
+    ItemOrden.objects.bulk_create([
+        ItemOrden(
             orden=orden,
             producto=item_carrito.producto,
             cantidad=item_carrito.cantidad,
             precio=item_carrito.producto.precio_final,
             subtotal=item_carrito.subtotal
         )
+        for item_carrito in carrito.items.select_related('producto')
+    ])
+
+    # Apartar el stock mientras se paga: si otro comprador se llevó las unidades no se crea la orden
+    try:
+        reservar(orden)
+    except StockInsuficiente as e:
+        transaction.set_rollback(True)
+        messages.error(request, str(e))
+        return redirect('tienda:ver_carrito')
 
     # URLs de callback
     custom_response_url = getattr(settings, 'EPAYCO_RESPONSE_URL', None)
@@ -319,7 +371,7 @@ def procesar_pago_epayco(request, form_data, carrito):
     amount_int = int(total)
     if amount_int < 1000 or amount_int > 500000:
         messages.error(request, f'El monto {amount_int} no está en el rango válido para Epayco (1.000 - 500.000 COP).')
-        orden.delete()  # Eliminar orden creada si no es válida
+        transaction.set_rollback(True)  # Descartar la orden creada y su reserva de stock
         return redirect('tienda:checkout')
 
     # Renderizar template con datos para SDK
@@ -355,10 +407,10 @@ def detalle_orden(request, numero_orden):
 
 # Vista para el widget del carrito (AJAX)
 def carrito_widget(request):
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
+    resumen = resumen_carrito_cacheado(request.user.id)
     return JsonResponse({
-        'cantidad_total': carrito.cantidad_total,
-        'total': float(carrito.total)
+        'cantidad_total': resumen['cantidad_total'],
+        'total': float(resumen['total'])
     })
 def respuesta_pago(request, numero_orden):
     """Vista de respuesta para el usuario después del pago"""
@@ -373,77 +425,33 @@ def respuesta_pago(request, numero_orden):
     }
     return render(request, 'tienda/respuesta_pago.html', context)
 
+@csrf_exempt  # Lo llama Epayco, sin token CSRF: la firma autentica la petición
 def confirmacion_pago(request):
-    """Vista de confirmación para Epayco (webhook)"""
+    """
+    Vista de confirmación para Epayco (webhook). Solo verifica la firma y guarda
+    la confirmación; el comando procesar_pagos la aplica a la orden.
+    """
     import logging
     logger = logging.getLogger(__name__)
 
     if request.method == 'POST':
-        logger.info("=== RECEIVED EPAYCO CONFIRMATION ===")
-        logger.info(f"POST data: {dict(request.POST)}")
-
-        # Datos enviados por Epayco
-        x_ref_payco = request.POST.get('x_ref_payco')
-        x_transaction_id = request.POST.get('x_transaction_id')
-        x_amount = request.POST.get('x_amount')
-        x_currency_code = request.POST.get('x_currency_code')
-        x_signature = request.POST.get('x_signature')
-        x_cod_response = request.POST.get('x_cod_response')
-        x_response = request.POST.get('x_response')
-        x_response_reason_text = request.POST.get('x_response_reason_text')
-        x_reference = request.POST.get('x_reference')  # número de orden
-
-        logger.info(f"Order reference: {x_reference}")
-        logger.info(f"Response code: {x_cod_response}")
-        logger.info(f"Response: {x_response}")
-
-        # Verificar firma (opcional pero recomendado)
-        # Aquí deberías verificar la firma con tu p_key
+        datos = request.POST.dict()
+        x_reference = datos.get('x_reference')  # número de orden
 
-        try:
-            orden = Orden.objects.get(numero_orden=x_reference)
-            logger.info(f"Order found: {orden.numero_orden}")
-
-            if x_cod_response == '1':  # Pago aprobado
-                logger.info("Payment approved")
-                orden.estado = 'confirmada'
-                # Actualizar stock
-                for item in orden.items.all():
-                    producto = item.producto
-                    producto.stock -= item.cantidad
-                    producto.save()
-                    logger.info(f"Stock updated for {producto.nombre}: -{item.cantidad}")
-
-                # Vaciar carrito si existe
-                try:
-                    carrito = Carrito.objects.get(usuario=orden.usuario)
-                    carrito.items.all().delete()
-                    logger.info("Cart emptied")
-                except Exception as e:
-                    logger.warning(f"Could not empty cart: {e}")
-
-            elif x_cod_response == '2':  # Pago rechazado
-                logger.info("Payment rejected")
-                orden.estado = 'cancelada'
-            elif x_cod_response == '3':  # Pago pendiente
-                logger.info("Payment pending")
-                orden.estado = 'pendiente'
-            else:
-                logger.warning(f"Unknown response code: {x_cod_response}")
-                orden.estado = 'cancelada'
-
-            orden.save()
-            logger.info(f"Order status updated to: {orden.estado}")
-
-        except Orden.DoesNotExist:
-            logger.error(f"Order not found: {x_reference}")
-        except Exception as e:
-            logger.error(f"Error processing payment confirmation: {e}")
+        if not datos.get('x_transaction_id') or not firma_valida(datos):
+            logger.warning(f"Invalid Epayco signature for order {x_reference}")
+            return HttpResponseBadRequest('Firma inválida')
 
+        # Epayco reintenta hasta recibir 200: una confirmación repetida no se guarda dos veces
+        if registrar(datos):
+            logger.info(f"Epayco confirmation queued: order {x_reference}, response {datos.get('x_cod_response')}")
+        else:
+            logger.info(f"Duplicate Epayco confirmation ignored: order {x_reference}")
         return HttpResponse('OK')
 
     logger.warning("Confirmation received with non-POST method")
     return HttpResponse('Método no permitido', status=405)
+
 @login_required
 def consultar_estado_pago(request, numero_orden):
     """Vista para consultar el estado de un pago usando la API de Epayco"""
@@ -484,24 +492,19 @@ def consultar_estado_pago(request, numero_orden):
 
                 # Actualizar estado de la orden basado en la respuesta de Epayco
                 if status == 'aceptada' and orden.estado != 'confirmada':
-                    orden.estado = 'confirmada'
-                    # Actualizar stock
-                    for item in orden.items.all():
-                        producto = item.producto
-                        producto.stock -= item.cantidad
-                        producto.save()
-                    # Vaciar carrito
-                    try:
-                        carrito = Carrito.objects.get(usuario=orden.usuario)
-                        carrito.items.all().delete()
-                    except:
-                        pass
-                    orden.save()
+                    # Si el webhook ya la confirmó, confirmar_pago no vuelve a aplicar el pago
+                    if confirmar_pago(orden, transaction_data.get('ref_payco')):
+                        # Vaciar carrito
+                        try:
+                            carrito = Carrito.objects.get(usuario=orden.usuario)
+                            carrito.items.all().delete()
+                            invalidar_resumen_carrito(orden.usuario_id)
+                        except:
+                            pass
                     messages.success(request, '¡Pago confirmado! Tu orden ha sido procesada exitosamente.')
 
                 elif status in ['rechazada', 'cancelada'] and orden.estado != 'cancelada':
-                    orden.estado = 'cancelada'
-                    orden.save()
+                    cancelar_pago(orden)
                     messages.warning(request, 'El pago fue rechazado o cancelado.')
 
                 else:
@@ -0,0 +1,176 @@
+"""
+Caché de la vitrina: carrusel y promociones de la página de inicio, categorías
+activas y listados de productos por filtro, paginados por clave
+(``pagina_productos``) sobre (fecha_creacion, id).
+
+Todas las claves llevan una versión común que las señales de ``Producto`` y
+``Categoria`` incrementan (``invalidar_vitrina``), así que cualquier cambio en
+el catálogo descarta de una vez todos los fragmentos sin tener que conocer sus
+claves. Las búsquedas por texto libre no se cachean (el espacio de claves no
+tiene límite).
+
+La existencia de las tablas de la tienda (para instalaciones sin migrar) se
+comprueba una vez por proceso con ``tablas_disponibles`` en lugar de consultar
+el catálogo del motor en cada petición.
+"""
+import base64
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Categoria, Producto
+
+VERSION = 'tienda:vitrina:version'
+TABLAS = {'tienda_producto', 'tienda_categoria'}
+FILTROS_LISTADO = ('categoria', 'tipo', 'tipo_mascota', 'categoria_filtro')
+
+_tablas_disponibles = False
+
+
+def tablas_disponibles():
+    """True cuando las tablas de la tienda existen; un resultado positivo no se vuelve a consultar"""
+    global _tablas_disponibles
+    if not _tablas_disponibles:
+        _tablas_disponibles = TABLAS <= set(connection.introspection.table_names())
+    return _tablas_disponibles
+
+
+def invalidar_vitrina():
+    try:
+        cache.incr(VERSION)
+    except ValueError:
+        cache.set(VERSION, 1, None)
+
+
+def _version():
+    version = cache.get(VERSION)
+    if version is None:
+        cache.add(VERSION, 1, None)
+        version = cache.get(VERSION, 1)
+    return version
+
+
+def _cacheado(nombre, calcular):
+    clave = f'tienda:vitrina:{_version()}:{nombre}'
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, getattr(settings, 'VITRINA_TIMEOUT', 900))
+    return valor
+
+
+def _carrusel():
+    # Destacados primero, luego en oferta y luego recientes: una consulta para los 6 lugares
+    prioridad = Case(
+        When(destacado=True, then=Value(0)),
+        When(precio_descuento__isnull=False, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    return list(
+        Producto.objects.filter(activo=True)
+        .select_related('categoria')
+        .annotate(prioridad_vitrina=prioridad)
+        .order_by('prioridad_vitrina', '-fecha_creacion')[:6]
+    )
+
+
+def productos_carrusel():
+    """Hasta 6 productos para el carrusel de la página de inicio"""
+    return _cacheado('carrusel', _carrusel)
+
+
+def productos_promocion():
+    """Los 3 productos en oferta con imagen más recientes, para las promociones"""
+    return _cacheado('promocion', lambda: list(
+        Producto.objects.filter(
+            activo=True,
+            precio_descuento__isnull=False,
+            imagen__isnull=False
+        ).select_related('categoria').order_by('-fecha_creacion')[:3]
+    ))
+
+
+def categorias_activas():
+    return _cacheado('categorias', lambda: list(Categoria.objects.filter(activo=True)))
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+def filtrar_productos(productos, filtros):
+    """Aplica los filtros del listado de la tienda a un queryset de productos"""
+    if filtros.get('categoria'):
+        try:
+            categoria_id = int(filtros['categoria'])
+        except ValueError as e:
+            raise FiltroInvalido(f"categoria={filtros['categoria']}") from e
+        productos = productos.filter(categoria_id=categoria_id)
+    if filtros.get('tipo'):
+        productos = productos.filter(tipo=filtros['tipo'])
+    if filtros.get('tipo_mascota') and filtros['tipo_mascota'] != 'todos':
+        productos = productos.filter(tipo_mascota=filtros['tipo_mascota'])
+    if filtros.get('buscar'):
+        productos = productos.filter(nombre__icontains=filtros['buscar'])
+    if filtros.get('categoria_filtro'):
+        # Filtrar por nombre de categoría (para enlaces desde la página de inicio)
+        productos = productos.filter(categoria__nombre__icontains=filtros['categoria_filtro'])
+    return productos
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(producto):
+    valor = f'{producto.fecha_creacion.isoformat()}|{producto.pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        fecha, pk = valor.split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido(cursor) from e
+
+
+def pagina_productos(productos, despues=None, tamano=None):
+    """
+    Una página de ``productos`` en orden (-fecha_creacion, -id), buscando por
+    clave en lugar de OFFSET: la página N cuesta lo mismo que la primera.
+    ``despues`` es el cursor de la página anterior. Devuelve
+    ``(productos, cursor_siguiente)``; el cursor es None en la última página.
+    """
+    tamano = tamano or getattr(settings, 'TIENDA_PRODUCTOS_POR_PAGINA', 24)
+    if despues:
+        fecha, pk = decodificar_cursor(despues)
+        # El <= redundante le da al índice el punto de inicio; el OR solo no lo permite
+        productos = productos.filter(
+            Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, pk__lt=pk),
+            fecha_creacion__lte=fecha
+        )
+    pagina = list(productos.order_by('-fecha_creacion', '-pk')[:tamano + 1])
+    siguiente = codificar_cursor(pagina[tamano - 1]) if len(pagina) > tamano else None
+    return pagina[:tamano], siguiente
+
+
+def productos_listado(filtros, despues=None, tamano=None):
+    """
+    Página del listado de la tienda con los filtros dados. Las páginas se
+    cachean por combinación de filtros y cursor, salvo las búsquedas por texto.
+    """
+    tamano = tamano or getattr(settings, 'TIENDA_PRODUCTOS_POR_PAGINA', 24)
+    productos = filtrar_productos(Producto.objects.filter(activo=True).select_related('categoria'), filtros)
+    if filtros.get('buscar'):
+        return pagina_productos(productos, despues, tamano)
+
+    partes = '&'.join(f'{campo}={filtros.get(campo) or ""}' for campo in FILTROS_LISTADO)
+    clave = hashlib.md5(f'{partes}&despues={despues or ""}&tamano={tamano}'.encode(), usedforsecurity=False).hexdigest()
+    return _cacheado(f'listado:{clave}', lambda: pagina_productos(productos, despues, tamano))
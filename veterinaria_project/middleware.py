@@ -1,3 +1,6 @@
+import time
+
+from django.conf import settings
 from django.http import HttpResponseForbidden
 from django.urls import reverse
 from django.shortcuts import redirect
@@ -52,4 +55,41 @@ class RedirectAdminToDashboard:
             from django.urls import reverse
             return redirect(reverse('administracion:dashboard_admin'))
         
-        return response
\ No newline at end of file
+        return response
+class ActividadUsuarioMiddleware:
+    """Anota la última actividad del usuario autenticado (como máximo una escritura cada pocos minutos)"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            from administracion.actividad import registrar_actividad
+            registrar_actividad(request.user)
+        return self.get_response(request)
+
+class RenovarSesionMiddleware:
+    """
+    Reemplaza SESSION_SAVE_EVERY_REQUEST: la expiración de la sesión se
+    extiende solo cuando le quedan menos de SESION_RENOVAR_SI_QUEDAN segundos,
+    así que una sesión activa se escribe como mucho una vez por ese intervalo
+    y no en cada petición (incluidos los endpoints de sondeo).
+    """
+    CLAVE = '_sesion_vence'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        self._renovar(request.session)
+        return self.get_response(request)
+
+    def _renovar(self, sesion):
+        if sesion.session_key is None:
+            return  # Sin cookie de sesión: no crear una sesión para visitantes anónimos
+        vence = sesion.get(self.CLAVE, 0)
+        if sesion.session_key is None:
+            return  # La cookie no corresponde a ninguna sesión vigente
+        ahora = int(time.time())
+        if vence - ahora < getattr(settings, 'SESION_RENOVAR_SI_QUEDAN', settings.SESSION_COOKIE_AGE - 86400):
+            # Modificar la sesión hace que SessionMiddleware la guarde y reenvíe la cookie
+            sesion[self.CLAVE] = ahora + settings.SESSION_COOKIE_AGE
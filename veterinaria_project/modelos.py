@@ -0,0 +1,142 @@
+"""
+Utilidades compartidas por los modelos de las apps.
+"""
+from django.db import router, transaction
+
+
+class CamposRastreadosMixin:
+    """
+    Recuerda los valores con que se cargó cada campo (en ``from_db``) para
+    saber qué cambió sin volver a consultar la base de datos. Las señales
+    ``pre_save``/``post_save`` todavía ven los valores originales; después de
+    guardar (o de ``refresh_from_db``) pasan a ser los nuevos.
+
+    Los campos se comparan por ``attname`` (``veterinario_asignado_id``), así que
+    cambiar una relación no carga el objeto relacionado. Una instancia nueva o
+    un campo diferido no tienen valor original y se consideran modificados.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_originales = dict(zip(field_names, values))
+        return instancia
+
+    def _originales(self):
+        return self.__dict__.setdefault('_valores_originales', {})
+
+    def _attname(self, campo):
+        return self._meta.get_field(campo).attname
+
+    def campo_cargado(self, campo):
+        """True si se conoce el valor con que se cargó ``campo``"""
+        return self._attname(campo) in self._originales()
+
+    def valor_original(self, campo, default=None):
+        return self._originales().get(self._attname(campo), default)
+
+    def campo_modificado(self, campo):
+        attname = self._attname(campo)
+        originales = self._originales()
+        return attname not in originales or getattr(self, attname) != originales[attname]
+
+    def campos_modificados(self):
+        """Nombres de los campos cargados cuyo valor cambió (todos si la instancia es nueva)"""
+        originales = self._originales()
+        campos = [f for f in self._meta.concrete_fields if not f.primary_key]
+        if not originales:
+            return [f.name for f in campos]
+        return [
+            f.name for f in campos
+            if f.attname in originales and getattr(self, f.attname) != originales[f.attname]
+        ]
+
+    def guardar_cambios(self):
+        """
+        Guarda solo las columnas modificadas (más las ``auto_now``). Una
+        instancia nueva o sin valores cargados se guarda completa. Devuelve la
+        lista de campos escritos; vacía si no había cambios.
+        """
+        if self._state.adding or not self._originales():
+            self.save()
+            return self.campos_modificados()
+        campos = self.campos_modificados()
+        if campos:
+            campos += [f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False) and f.name not in campos]
+            self.save(update_fields=campos)
+        return campos
+
+    def _actualizar_originales(self, campos=None):
+        if campos is None:
+            attnames = [f.attname for f in self._meta.concrete_fields if f.attname in self.__dict__]
+        else:
+            attnames = [self._attname(campo) for campo in campos]
+        self._originales().update((attname, getattr(self, attname)) for attname in attnames)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._actualizar_originales(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._actualizar_originales(fields)
+
+
+class RegistroDesactualizado(Exception):
+    """La fila cambió o se borró desde que se cargó la instancia que se intenta guardar"""
+
+
+class VersionadoMixin(CamposRastreadosMixin):
+    """
+    Control optimista de concurrencia con un campo entero ``version``. Cada
+    UPDATE de una instancia cargada de la base incrementa la versión y solo se
+    aplica si la fila sigue en la versión con que se cargó; si otra petición la
+    guardó antes, se lanza ``RegistroDesactualizado`` en lugar de pisar sus
+    cambios. Las instancias sin versión cargada se guardan como siempre.
+    """
+
+    def save(self, *args, **kwargs):
+        version = self.valor_original('version')
+        if self._state.adding or version is None:
+            return super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if not update_fields:
+                return None
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        self.version = version + 1
+        try:
+            # En un punto de guardado propio, para que el conflicto no invalide la transacción de quien llama
+            with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+                super().save(*args, **kwargs)
+        except RegistroDesactualizado:
+            self.version = version
+            raise
+
+    def comprobar_version(self, version):
+        """
+        Comprueba que ``version`` (la que vio el usuario en su página o
+        formulario) siga siendo la de la instancia cargada; si no, lanza
+        ``RegistroDesactualizado``. Así un cambio hecho sobre una página vieja
+        no pisa el que otro usuario guardó mientras tanto.
+        """
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            raise RegistroDesactualizado(f'Versión no válida: {version!r}')
+        if version != self.valor_original('version'):
+            raise RegistroDesactualizado(self._mensaje_desactualizado())
+
+    def _mensaje_desactualizado(self):
+        return f'{self._meta.verbose_name} {self.pk} fue modificada por otro usuario; recarga los datos e inténtalo de nuevo.'
+
+    def _do_update(self, base_qs, *args, **kwargs):
+        # Solo se condiciona el queryset; el resto de argumentos cambia entre versiones de Django
+        version = self.valor_original('version')
+        if self._state.adding or version is None:
+            return super()._do_update(base_qs, *args, **kwargs)
+        actualizadas = super()._do_update(base_qs.filter(version=version), *args, **kwargs)
+        if not actualizadas:
+            raise RegistroDesactualizado(self._mensaje_desactualizado())
+        return actualizadas
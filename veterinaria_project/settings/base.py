@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     'veterinario',
     'tienda',
     'notificaciones',
+    'busqueda',
     
     # Aplicaciones de terceros
     'crispy_forms',
@@ -62,9 +63,11 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'veterinaria_project.middleware.RenovarSesionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'veterinaria_project.middleware.ActividadUsuarioMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'veterinaria_project.middleware.RestrictAdminMiddleware',
@@ -105,6 +108,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de pruebas en archivo: la de memoria comparte caché entre hilos y sus bloqueos
+        # fallan al instante en lugar de esperar, así que las pruebas concurrentes (reservas de
+        # agenda y de stock) no podrían correr. Django la borra al terminar.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -185,7 +192,12 @@ LOGOUT_REDIRECT_URL = '/'
 
 # Configuración de sesión
 SESSION_COOKIE_AGE = 1209600  # 2 semanas en segundos
-SESSION_SAVE_EVERY_REQUEST = True
+# Sesiones leídas desde la caché (Redis en producción) con respaldo en la base de datos.
+# No se guardan en cada petición: RenovarSesionMiddleware extiende la expiración solo
+# cuando a la sesión le quedan menos de SESION_RENOVAR_SI_QUEDAN segundos.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+SESSION_SAVE_EVERY_REQUEST = False
+SESION_RENOVAR_SI_QUEDAN = config('SESION_RENOVAR_SI_QUEDAN', default=SESSION_COOKIE_AGE - 86400, cast=int)
 
 # Configuración de seguridad (para desarrollo, en producción deben ser True)
 CSRF_COOKIE_SECURE = False
@@ -267,6 +279,67 @@ CACHES = {
     }
 }
 
+# Usuarios activos: minutos mínimos entre dos registros de actividad del mismo usuario
+ACTIVIDAD_USUARIO_MINUTOS = config('ACTIVIDAD_USUARIO_MINUTOS', default=5, cast=int)
+
+# Snapshot de métricas del dashboard: segundos antes de considerarlo obsoleto
+METRICAS_SNAPSHOT_MAX_EDAD = config('METRICAS_SNAPSHOT_MAX_EDAD', default=300, cast=int)
+
+# Exportaciones: filas leídas por lote al recorrer los querysets
+EXPORTACION_TAMANO_LOTE = config('EXPORTACION_TAMANO_LOTE', default=2000, cast=int)
+
+# Reportes PDF: False los genera en la petición; producción los encola para el comando procesar_reportes
+REPORTES_EN_SEGUNDO_PLANO = config('REPORTES_EN_SEGUNDO_PLANO', default=False, cast=bool)
+REPORTES_WORKERS = config('REPORTES_WORKERS', default=2, cast=int)
+REPORTES_MINUTOS_ATASCADO = config('REPORTES_MINUTOS_ATASCADO', default=30, cast=int)
+
+# Tienda: segundos que vive en caché el resumen del carrito (widget del encabezado)
+CARRITO_RESUMEN_TIMEOUT = config('CARRITO_RESUMEN_TIMEOUT', default=300, cast=int)
+
+# Tienda: segundos que viven en caché el carrusel, las promociones, las categorías y los
+# listados (se invalidan al cambiar productos o categorías)
+VITRINA_TIMEOUT = config('VITRINA_TIMEOUT', default=900, cast=int)
+
+# Tienda: productos por página del listado y de la API del catálogo (paginación por clave)
+TIENDA_PRODUCTOS_POR_PAGINA = config('TIENDA_PRODUCTOS_POR_PAGINA', default=24, cast=int)
+
+# Tienda: minutos que el stock de una orden queda apartado mientras se paga; el comando
+# liberar_reservas_stock devuelve al inventario las reservas vencidas
+TIENDA_RESERVA_STOCK_MINUTOS = config('TIENDA_RESERVA_STOCK_MINUTOS', default=30, cast=int)
+
+# Tienda: el webhook de Epayco guarda las confirmaciones y el comando procesar_pagos las aplica
+TIENDA_PAGOS_LOTE = config('TIENDA_PAGOS_LOTE', default=100, cast=int)
+TIENDA_PAGOS_MAX_INTENTOS = config('TIENDA_PAGOS_MAX_INTENTOS', default=5, cast=int)
+TIENDA_PAGOS_ESPERA_REINTENTO = config('TIENDA_PAGOS_ESPERA_REINTENTO', default=30, cast=int)
+
+# Encabezado: segundos que vive en caché el estado de los contadores para una versión (ETag)
+WIDGETS_ESTADO_TIMEOUT = config('WIDGETS_ESTADO_TIMEOUT', default=3600, cast=int)
+
+# Notificaciones a todos los clientes: False las crea en la petición; producción las encola para el
+# comando procesar_notificaciones_masivas
+NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO = config('NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO', default=False, cast=bool)
+NOTIFICACIONES_MASIVAS_LOTE = config('NOTIFICACIONES_MASIVAS_LOTE', default=1000, cast=int)
+NOTIFICACIONES_MASIVAS_MINUTOS_ATASCADO = config('NOTIFICACIONES_MASIVAS_MINUTOS_ATASCADO', default=10, cast=int)
+
+# Recordatorios: cuántos se envían por lote en procesar_recordatorios
+RECORDATORIOS_TAMANO_LOTE = config('RECORDATORIOS_TAMANO_LOTE', default=500, cast=int)
+
+# Bandeja de salida de correos (notificaciones/correo.py)
+CORREO_WORKERS = config('CORREO_WORKERS', default=4, cast=int)
+CORREO_TAMANO_LOTE = config('CORREO_TAMANO_LOTE', default=50, cast=int)
+CORREO_MAX_POR_SEGUNDO = config('CORREO_MAX_POR_SEGUNDO', default=10, cast=float)
+CORREO_MAX_INTENTOS = config('CORREO_MAX_INTENTOS', default=5, cast=int)
+CORREO_ESPERA_REINTENTO = config('CORREO_ESPERA_REINTENTO', default=60, cast=int)
+CORREO_MINUTOS_ATASCADO = config('CORREO_MINUTOS_ATASCADO', default=30, cast=int)
+
+# Efectos de las señales de notificaciones (notificaciones/eventos.py): BackendInline los ejecuta
+# al confirmar la transacción; producción usa BackendCola, que los guarda para el comando procesar_eventos
+NOTIFICACIONES_EVENTOS_BACKEND = config('NOTIFICACIONES_EVENTOS_BACKEND', default='notificaciones.eventos.BackendInline')
+NOTIFICACIONES_EVENTOS_LOTE = config('NOTIFICACIONES_EVENTOS_LOTE', default=200, cast=int)
+NOTIFICACIONES_EVENTOS_MAX_INTENTOS = config('NOTIFICACIONES_EVENTOS_MAX_INTENTOS', default=5, cast=int)
+NOTIFICACIONES_EVENTOS_ESPERA_REINTENTO = config('NOTIFICACIONES_EVENTOS_ESPERA_REINTENTO', default=30, cast=int)
+NOTIFICACIONES_EVENTOS_MINUTOS_ATASCADO = config('NOTIFICACIONES_EVENTOS_MINUTOS_ATASCADO', default=10, cast=int)
+
 # Configuración de internacionalización adicional
 LOCALE_PATHS = [
     BASE_DIR / 'locale',
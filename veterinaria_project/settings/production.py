@@ -55,6 +55,15 @@ EMAIL_USE_SSL = config('EMAIL_USE_SSL', default=False, cast=bool)
 # MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
 # DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
+# Reportes PDF en cola: requiere el worker `python manage.py procesar_reportes`
+REPORTES_EN_SEGUNDO_PLANO = config('REPORTES_EN_SEGUNDO_PLANO', default=True, cast=bool)
+
+# Envíos a todos los clientes en cola: requiere el worker `python manage.py procesar_notificaciones_masivas`
+NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO = config('NOTIFICACIONES_MASIVAS_EN_SEGUNDO_PLANO', default=True, cast=bool)
+
+# Efectos de las señales en cola: requiere el worker `python manage.py procesar_eventos`
+NOTIFICACIONES_EVENTOS_BACKEND = config('NOTIFICACIONES_EVENTOS_BACKEND', default='notificaciones.eventos.BackendCola')
+
 # Cache settings for production
 CACHES = {
     'default': {
@@ -1,5 +1,5 @@
 // Gestión de citas en el dashboard
-function cambiarEstadoCita(citaId, nuevoEstado) {
+function cambiarEstadoCita(citaId, nuevoEstado, version) {
     if (!confirm(`¿Estás seguro de cambiar el estado de esta cita a "${nuevoEstado.toUpperCase()}"?`)) {
         return;
     }
@@ -14,12 +14,10 @@ function cambiarEstadoCita(citaId, nuevoEstado) {
     fetch(`/administracion/citas/cambiar-estado/${citaId}/`, {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json',
             'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
         },
-        body: JSON.stringify({
-            estado: nuevoEstado
-        })
+        // La vista lee request.POST; version es la que tenía la cita al cargar la página
+        body: new URLSearchParams({estado: nuevoEstado, version: version})
     })
     .then(response => response.json())
     .then(data => {
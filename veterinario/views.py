@@ -16,6 +16,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
+from busqueda.indice import buscar
 from clientes.models import Cliente
 from mascotas.models import Mascota, HistorialMedico, Vacuna
 from citas.models import Cita
@@ -146,13 +147,7 @@ def dashboard_veterinario(request):
 
     # Filtro por búsqueda
     if cita_busqueda:
-        citas_query = citas_query.filter(
-            Q(mascota__nombre__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__first_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__last_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__username__icontains=cita_busqueda) |
-            Q(tipo__icontains=cita_busqueda)
-        )
+        citas_query = citas_query.filter(pk__in=buscar('cita', cita_busqueda))
 
     # Citas filtradas para gestión
     citas_gestion = citas_query.order_by('fecha')[:50]
@@ -216,11 +211,7 @@ def gestion_mascotas_veterinario(request):
         mascotas_query = mascotas_query.filter(tipo=tipo_filtro)
 
     if cliente_filtro:
-        mascotas_query = mascotas_query.filter(
-            Q(cliente__usuario__username__icontains=cliente_filtro) |
-            Q(cliente__usuario__first_name__icontains=cliente_filtro) |
-            Q(cliente__usuario__last_name__icontains=cliente_filtro)
-        )
+        mascotas_query = mascotas_query.filter(cliente_id__in=buscar('cliente', cliente_filtro))
 
     if estado_filtro == 'activas':
         mascotas_query = mascotas_query.filter(activo=True)
@@ -228,11 +219,7 @@ def gestion_mascotas_veterinario(request):
         mascotas_query = mascotas_query.filter(activo=False)
 
     if busqueda:
-        mascotas_query = mascotas_query.filter(
-            Q(nombre__icontains=busqueda) |
-            Q(raza__icontains=busqueda) |
-            Q(color__icontains=busqueda)
-        )
+        mascotas_query = mascotas_query.filter(pk__in=buscar('mascota', busqueda))
 
     # Ordenar y limitar
     mascotas = mascotas_query.order_by('-fecha_registro')[:100]
@@ -285,13 +272,7 @@ def gestion_citas_veterinario(request):
 
     # Filtro por búsqueda
     if cita_busqueda:
-        citas_query = citas_query.filter(
-            Q(mascota__nombre__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__first_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__last_name__icontains=cita_busqueda) |
-            Q(mascota__cliente__usuario__username__icontains=cita_busqueda) |
-            Q(tipo__icontains=cita_busqueda)
-        )
+        citas_query = citas_query.filter(pk__in=buscar('cita', cita_busqueda))
 
     # Citas para gestión
     citas = citas_query.order_by('fecha')[:100]